@@ -0,0 +1,139 @@
+"""
+日志管道
+
+- 所有日志走标准库 logging 的 "x11fan" 记录器，任何线程都可以直接写
+- BufferedHandler：把格式化好的日志行放进有上限的队列，由 GUI 定时器批量取走，
+  不再每条日志都同步追加到 QPlainTextEdit 并滚动
+- 可选的按大小轮转的日志文件（RotatingFileHandler）
+- WriteSummary：例行的风扇占空比写入只计数，每隔一段时间汇总成一行，
+  不逐条刷屏（逐条记录在 DEBUG 级别，仍可写进日志文件）
+"""
+
+import collections
+import logging
+import logging.handlers
+import sys
+import threading
+import time
+
+
+LOGGER_NAME = "x11fan"
+log = logging.getLogger(LOGGER_NAME)
+
+LOG_LEVELS = ("debug", "info", "warning", "error")
+
+# 日志文件默认 1 MB 轮转，保留 3 个旧文件
+LOG_FILE_MAX_BYTES = 1024 * 1024
+LOG_FILE_BACKUPS = 3
+# 例行写入汇总间隔（秒）
+WRITE_SUMMARY_INTERVAL = 300.0
+
+_GUI_FORMAT = logging.Formatter("[%(asctime)s] %(message)s", "%H:%M:%S")
+_CONSOLE_FORMAT = _GUI_FORMAT
+_FILE_FORMAT = logging.Formatter("%(asctime)s %(levelname)-7s [%(threadName)s] %(message)s")
+
+
+def parse_level(name: str) -> int:
+    if name not in LOG_LEVELS:
+        raise ValueError(f"未知的日志级别：{name}")
+    return getattr(logging, name.upper())
+
+
+def setup_logging(log_file=None, file_level=logging.INFO, max_bytes=LOG_FILE_MAX_BYTES, backups=LOG_FILE_BACKUPS):
+    """
+    配置 x11fan 记录器：记录器本身放行所有级别，由各个 handler 自己过滤。
+    给出 log_file 时加一个按大小轮转的文件 handler，返回它（否则返回 None）。
+    """
+    log.setLevel(logging.DEBUG)
+    log.propagate = False
+    if not log_file:
+        return None
+    handler = logging.handlers.RotatingFileHandler(
+        log_file, maxBytes=max_bytes, backupCount=backups, encoding="utf-8"
+    )
+    handler.setLevel(file_level)
+    handler.setFormatter(_FILE_FORMAT)
+    log.addHandler(handler)
+    return handler
+
+
+def add_console(level=logging.INFO, stream=None):
+    """命令行用：把 level 以上的日志打印到 stdout"""
+    handler = logging.StreamHandler(stream or sys.stdout)
+    handler.setLevel(level)
+    handler.setFormatter(_CONSOLE_FORMAT)
+    log.addHandler(handler)
+    return handler
+
+
+class BufferedHandler(logging.Handler):
+    """
+    线程安全的有界缓冲：emit() 只做格式化和入队，drain() 一次取走全部。
+    GUI 长时间没有取（窗口卡住等）时丢弃最旧的行，并在下一批开头注明丢了多少。
+    """
+
+    def __init__(self, level=logging.INFO, max_pending=1000):
+        super().__init__(level)
+        self.setFormatter(_GUI_FORMAT)
+        self.pending = collections.deque(maxlen=max_pending)
+        self.dropped = 0
+        self._lock = threading.Lock()
+
+    def emit(self, record):
+        try:
+            line = self.format(record)
+        except Exception:
+            self.handleError(record)
+            return
+        with self._lock:
+            if len(self.pending) == self.pending.maxlen:
+                self.dropped += 1
+            self.pending.append(line)
+
+    def drain(self):
+        with self._lock:
+            lines = list(self.pending)
+            self.pending.clear()
+            dropped, self.dropped = self.dropped, 0
+        if dropped:
+            lines.insert(0, f"……（日志过多，省略了 {dropped} 行）")
+        return lines
+
+
+class WriteSummary:
+    """例行写入计数：record() 每次写入调用，summarize() 到时间时返回汇总文本"""
+
+    def __init__(self, interval=WRITE_SUMMARY_INTERVAL):
+        self.interval = interval
+        self.started = time.monotonic()
+        self.counts = collections.Counter()   # zone → 成功次数
+        self.failures = 0
+        self.last_duty = {}
+
+    def record(self, zone, duty, ok=True):
+        if ok:
+            self.counts[zone] += 1
+            self.last_duty[zone] = duty
+        else:
+            self.failures += 1
+
+    def summarize(self, now=None, force=False):
+        now = time.monotonic() if now is None else now
+        elapsed = now - self.started
+        if not force and elapsed < self.interval:
+            return None
+        total = sum(self.counts.values())
+        text = None
+        if total or self.failures:
+            zones = "，".join(
+                f"zone{z} ×{n}（当前 {self.last_duty[z]}%）" for z, n in sorted(self.counts.items())
+            )
+            text = f"过去 {elapsed:.0f} 秒：风扇写入 {total} 次"
+            if zones:
+                text += f"（{zones}）"
+            if self.failures:
+                text += f"，失败 {self.failures} 次"
+        self.started = now
+        self.counts.clear()
+        self.failures = 0
+        return text
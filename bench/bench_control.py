@@ -0,0 +1,117 @@
+"""
+控制策略对比：在 bench/thermal_plant.py 的散热模型上跑同一段负载，比较
+曲线 / PID / PID + 前馈 的峰值温度、超温时间、平均占空比、占空比抖动和写入次数。
+
+负载：空闲 → 满载突发 → 中等负载 → 空闲，再来一次短促的满载尖峰。
+
+python bench/bench_control.py [--period 1] [--noise 0.3] [--json]
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from control import CurveController, DutyFilter, PidController  # noqa: E402
+from curve import DEFAULT_CURVE_POINTS, FanCurve  # noqa: E402
+from thermal_plant import ThermalPlant  # noqa: E402
+
+
+# (持续秒数, CPU 占用率)
+LOAD_PROFILE = [
+    (300, 0.05),
+    (900, 1.0),
+    (600, 0.4),
+    (600, 0.05),
+    (90, 1.0),
+    (600, 0.1),
+]
+
+
+def load_at(t):
+    for duration, load in LOAD_PROFILE:
+        if t < duration:
+            return load
+        t -= duration
+    return LOAD_PROFILE[-1][1]
+
+
+def simulate(controller, period, noise, limit):
+    plant = ThermalPlant(noise=noise)
+    duty_filter = DutyFilter()
+    total = sum(d for d, _ in LOAD_PROFILE)
+    t = 0.0
+    peak = plant.temp
+    over = 0.0
+    duty_sum = 0.0
+    variation = 0
+    last_duty = plant.duty
+    cpu = 0.0
+
+    while t < total:
+        load = load_at(t)
+        temp = plant.read()
+        start = time.perf_counter()
+        target = controller.update(temp, t, load if controller.uses_load else None)
+        cpu += time.perf_counter() - start
+        duty = duty_filter.update(temp if controller.follows_temp else None, target, t)
+        if duty is not None:
+            variation += abs(duty - last_duty)
+            last_duty = duty
+            plant.set_duty(duty)
+
+        plant.step(period, load)
+        t += period
+        peak = max(peak, plant.temp)
+        if plant.temp > limit:
+            over += period
+        duty_sum += plant.duty * period
+
+    samples = int(total / period)
+    return {
+        "peak_temp": round(peak, 2),
+        "seconds_over_limit": over,
+        "mean_duty": round(duty_sum / total, 1),
+        "duty_variation": variation,
+        "writes": duty_filter.issued,
+        "us_per_sample": round(cpu / samples * 1e6, 2),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="控制策略对比（模拟散热模型）")
+    parser.add_argument("--period", type=float, default=1.0, help="采样间隔（秒）")
+    parser.add_argument("--noise", type=float, default=0.3, help="读数噪声（±°C）")
+    parser.add_argument("--setpoint", type=float, default=70.0, help="PID 目标温度")
+    parser.add_argument("--limit", type=float, help="超温统计阈值（°C），默认目标温度 + 5")
+    parser.add_argument("--json", action="store_true", help="输出 JSON")
+    args = parser.parse_args()
+    limit = args.setpoint + 5.0 if args.limit is None else args.limit
+
+    strategies = {
+        "curve": CurveController(FanCurve(DEFAULT_CURVE_POINTS)),
+        "pid": PidController(args.setpoint, ff_slope=0.0),
+        "pid+ff": PidController(args.setpoint),
+        "pid+ff+load": PidController(args.setpoint, ff_load=30.0),
+    }
+    results = {
+        name: simulate(controller, args.period, args.noise, limit)
+        for name, controller in strategies.items()
+    }
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    print(f"{'策略':<12}{'峰值°C':>9}{'超温秒':>8}{'平均占空比':>10}{'占空比抖动':>10}{'写入':>6}{'µs/次':>8}")
+    for name, r in results.items():
+        print(
+            f"{name:<12}{r['peak_temp']:>9.1f}{r['seconds_over_limit']:>8.0f}{r['mean_duty']:>10.1f}"
+            f"{r['duty_variation']:>10}{r['writes']:>6}{r['us_per_sample']:>8.2f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+"""
+风扇曲线求值基准：逐个查表、批量查表（有 numpy 时向量化）与直接插值的对比。
+
+python bench/bench_curve.py -n 1000000
+"""
+
+import argparse
+import json
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from curve import DEFAULT_CURVE_POINTS, FanCurve, _numpy, interpolate  # noqa: E402
+
+np = _numpy()
+
+
+def rate(func, count):
+    start = time.perf_counter()
+    func()
+    return count / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="风扇曲线求值基准")
+    parser.add_argument("-n", "--count", type=int, default=1_000_000)
+    parser.add_argument("--points", type=int, default=len(DEFAULT_CURVE_POINTS), help="控制点数量")
+    parser.add_argument("--json", action="store_true", help="输出 JSON")
+    args = parser.parse_args()
+
+    if args.points == len(DEFAULT_CURVE_POINTS):
+        points = DEFAULT_CURVE_POINTS
+    else:
+        points = [(20 + i * 80 / (args.points - 1), 10 + i * 90 // (args.points - 1)) for i in range(args.points)]
+
+    rng = random.Random(1)
+    temps = [rng.uniform(30.0, 95.0) for _ in range(args.count)]
+
+    start = time.perf_counter()
+    curve = FanCurve(points)
+    compile_ms = (time.perf_counter() - start) * 1000.0
+    sorted_points = curve.points
+
+    results = {
+        "points": len(points),
+        "compile_ms": compile_ms,
+        "interpolate_per_s": rate(lambda: [interpolate(sorted_points, t) for t in temps], args.count),
+        "lookup_per_s": rate(lambda: [curve.lookup(t) for t in temps], args.count),
+        "evaluate_many_list_per_s": rate(lambda: curve.evaluate_many(temps), args.count),
+    }
+    if np is not None:
+        arr = np.asarray(temps)
+        results["evaluate_many_numpy_per_s"] = rate(lambda: curve.evaluate_many(arr), args.count)
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    for key, value in results.items():
+        print(f"{key:<28}{value:>16,.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+"""
+写入抑制基准：一天的温度曲线上，DutyFilter 相比“目标不变才跳过”省下多少次 BMC 写入。
+
+默认生成一条合成的 24 小时温度轨迹（空闲 / 突发负载 / 传感器噪声），
+也可以用 --trace 读取 CSV（每行：秒, 温度）。
+
+输出：
+- writes：写入决策次数；ipmi_commands：乘以风扇区数量后的 IPMI 命令数
+- deficit_mean / deficit_max：实际占空比低于曲线目标的平均 / 最大值（%），衡量抑制的代价
+
+python bench/bench_filter.py --deadband 2 --hyst-down 2 --min-dwell 30
+"""
+
+import argparse
+import csv
+import json
+import math
+import os
+import random
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from control import (  # noqa: E402
+    DEFAULT_DEADBAND,
+    DEFAULT_HYST_DOWN,
+    DEFAULT_HYST_UP,
+    DEFAULT_MIN_DWELL,
+    DutyFilter,
+)
+from curve import DEFAULT_CURVE_POINTS, FanCurve  # noqa: E402
+
+
+def synthetic_trace(hours=24.0, period=2.0, seed=1):
+    """一阶热模型：温度趋向当前负载对应的稳态温度，叠加 ±0.5°C 的读数噪声"""
+    rng = random.Random(seed)
+    t = 0.0
+    temp = 45.0
+    steady = 45.0
+    busy_until = 0.0
+    trace = []
+    while t < hours * 3600.0:
+        if t >= busy_until:
+            if rng.random() < 0.3:
+                steady = rng.uniform(60.0, 82.0)       # 突发负载
+                busy_until = t + rng.uniform(60.0, 1800.0)
+            else:
+                steady = rng.uniform(42.0, 55.0)       # 空闲 / 轻负载
+                busy_until = t + rng.uniform(120.0, 3600.0)
+        temp += (steady - temp) * (1.0 - math.exp(-period / 90.0))
+        trace.append((t, temp + rng.uniform(-0.5, 0.5)))
+        t += period
+    return trace
+
+
+def load_trace(path):
+    with open(path, newline="") as f:
+        return [(float(row[0]), float(row[1])) for row in csv.reader(f) if row]
+
+
+def simulate(trace, curve, duty_filter, zones):
+    writes = 0
+    applied = None
+    deficits = []
+    for t, temp in trace:
+        target = curve.lookup(temp)
+        if duty_filter is None:
+            duty = None if target == applied else target
+        else:
+            duty = duty_filter.update(temp, target, t)
+        if duty is not None:
+            writes += 1
+            applied = duty
+        deficits.append(max(0, target - applied))
+    return {
+        "samples": len(trace),
+        "writes": writes,
+        "ipmi_commands": writes * zones,
+        "deficit_mean": sum(deficits) / len(deficits),
+        "deficit_max": max(deficits),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="写入抑制基准")
+    parser.add_argument("--trace", help="CSV 温度轨迹（秒, 温度）；默认生成 24 小时合成轨迹")
+    parser.add_argument("--period", type=float, default=2.0, help="合成轨迹的采样间隔（秒）")
+    parser.add_argument("--zones", type=int, default=2)
+    parser.add_argument("--deadband", type=int, default=DEFAULT_DEADBAND)
+    parser.add_argument("--hyst-up", type=float, default=DEFAULT_HYST_UP)
+    parser.add_argument("--hyst-down", type=float, default=DEFAULT_HYST_DOWN)
+    parser.add_argument("--min-dwell", type=float, default=DEFAULT_MIN_DWELL)
+    parser.add_argument("--json", action="store_true", help="输出 JSON")
+    args = parser.parse_args()
+
+    trace = load_trace(args.trace) if args.trace else synthetic_trace(period=args.period)
+    curve = FanCurve(DEFAULT_CURVE_POINTS)
+    duty_filter = DutyFilter(args.deadband, args.hyst_up, args.hyst_down, args.min_dwell)
+
+    results = {
+        "baseline": simulate(trace, curve, None, args.zones),
+        "filtered": simulate(trace, curve, duty_filter, args.zones),
+    }
+    base = results["baseline"]["writes"]
+    results["saved_ratio"] = 1.0 - results["filtered"]["writes"] / base if base else 0.0
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    for name in ("baseline", "filtered"):
+        r = results[name]
+        print(
+            f"{name:<9} 采样 {r['samples']}  写入 {r['writes']}  IPMI 命令 {r['ipmi_commands']}  "
+            f"欠冷却 平均 {r['deficit_mean']:.2f}% / 最大 {r['deficit_max']}%"
+        )
+    print(f"节省写入 {results['saved_ratio'] * 100.0:.1f}%")
+
+
+if __name__ == "__main__":
+    main()
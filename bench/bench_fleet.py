@@ -0,0 +1,126 @@
+"""
+fleet 模式基准：一个本地 FakeBmcServer 提供 --hosts 台虚拟 BMC，fleet.Fleet 同时控制它们。
+
+其中 --slow 台每个响应延迟 --slow-latency 秒，--dead 台丢弃所有数据包（不可达），
+用来确认慢 / 不可达的主机不会拖慢其它主机：正常主机的采样次数应接近 duration / interval，
+每次采样的耗时与没有慢主机时相当。慢主机的第一次采样包含逐条下载 SDR 仓库，会明显更长。
+
+    python bench/bench_fleet.py --hosts 32 --slow 4 --dead 2 --duration 10
+"""
+
+import argparse
+import json
+import os
+import random
+import sys
+import threading
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from fake_bmc import FakeBmcServer  # noqa: E402
+from fleet import FLEET_DEFAULTS, Fleet, build_fleet_hosts  # noqa: E402
+
+
+def percentile(values, q):
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * q))]
+
+
+def drive_temps(server, stop, period=0.5):
+    """按随机游走改写每台虚拟 BMC 的 CPU 温度，让曲线产生写入"""
+    temps = [random.uniform(40, 60) for _ in server.bmcs]
+    while not stop.wait(period):
+        for i, bmc in enumerate(server.bmcs):
+            temps[i] = max(30.0, min(90.0, temps[i] + random.uniform(-3, 3)))
+            bmc.set_temp("CPU1 Temp", temps[i])
+            bmc.set_temp("CPU2 Temp", temps[i] - 2)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="fleet 模式基准（本地虚拟 BMC）")
+    parser.add_argument("--hosts", type=int, default=16)
+    parser.add_argument("--slow", type=int, default=2, help="慢主机台数")
+    parser.add_argument("--slow-latency", type=float, default=0.2, help="慢主机每个响应的延迟（秒）")
+    parser.add_argument("--dead", type=int, default=1, help="不可达主机台数")
+    parser.add_argument("--workers", type=int, default=FLEET_DEFAULTS["workers"])
+    parser.add_argument("--interval", type=float, default=1.0)
+    parser.add_argument("--duration", type=float, default=8.0)
+    parser.add_argument("--json", action="store_true", help="输出 JSON")
+    args = parser.parse_args()
+
+    with FakeBmcServer(count=args.hosts) as server:
+        kinds = ["ok"] * args.hosts
+        for i in range(args.slow):
+            kinds[i] = "slow"
+            server.bmcs[i].latency = args.slow_latency
+        for i in range(args.slow, args.slow + args.dead):
+            kinds[i] = "dead"
+            server.bmcs[i].loss = 1.0
+
+        config = dict(FLEET_DEFAULTS, password="ADMIN", interval=args.interval)
+        config["hosts"] = [
+            {"name": f"{kinds[i]}{i:03d}", "host": host, "port": port}
+            for i, (host, port) in enumerate(server.addresses)
+        ]
+        fleet = Fleet(build_fleet_hosts(config), workers=args.workers, max_backoff=args.duration)
+
+        elapsed = {kind: [] for kind in ("ok", "slow", "dead")}
+        fleet_finish = fleet._finish
+
+        def record(host, seconds, error, written):
+            elapsed[host.name.rstrip("0123456789")].append(seconds)
+            fleet_finish(host, seconds, error, written)
+
+        fleet._finish = record
+
+        stop = threading.Event()
+        driver = threading.Thread(target=drive_temps, args=(server, stop), daemon=True)
+        driver.start()
+        try:
+            fleet.run(args.duration)
+        finally:
+            stop.set()
+            driver.join()
+            fleet.close()
+        writes = sum(bmc.writes for bmc in server.bmcs)
+
+    status = fleet.status()
+    expected = args.duration / args.interval
+    result = {"params": vars(args), "expected_samples": expected, "bmc_writes": writes, "kinds": {}}
+    for kind in ("ok", "slow", "dead"):
+        rows = [s for s in status if s["name"].startswith(kind)]
+        if not rows:
+            continue
+        samples = [s["samples"] for s in rows]
+        result["kinds"][kind] = {
+            "hosts": len(rows),
+            "online": sum(s["online"] for s in rows),
+            "samples_min": min(samples),
+            "samples_mean": sum(samples) / len(samples),
+            "writes": sum(s["writes"] for s in rows),
+            "errors": sum(s["errors"] for s in rows),
+            "cycle_p50_ms": (percentile(elapsed[kind], 0.5) or 0.0) * 1000.0,
+            "cycle_p99_ms": (percentile(elapsed[kind], 0.99) or 0.0) * 1000.0,
+        }
+
+    if args.json:
+        print(json.dumps(result, indent=2, ensure_ascii=False))
+        return
+    print(
+        f"{args.hosts} 台主机（慢 {args.slow}，不可达 {args.dead}），{args.workers} 个工作线程，"
+        f"间隔 {args.interval:g} 秒，运行 {args.duration:g} 秒（每台应采样约 {expected:.0f} 次）"
+    )
+    for kind, row in result["kinds"].items():
+        print(
+            f"{kind:<5} {row['hosts']:>4} 台  在线 {row['online']:>4}  "
+            f"采样 最少 {row['samples_min']:>4} / 平均 {row['samples_mean']:>6.1f}  "
+            f"写入 {row['writes']:>5}  失败 {row['errors']:>4}  "
+            f"单次 p50 {row['cycle_p50_ms']:>8.1f} ms  p99 {row['cycle_p99_ms']:>8.1f} ms"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+"""
+IPMI 通道基准：每种后端发送同一条风扇 RAW 命令 N 次，统计单条命令延迟。
+
+- lan：连到本地假 BMC（bench/fake_bmc.py），不需要硬件
+- ipmicfg：--ipmicfg 指定 IPMICFG-Win.exe 路径时测试
+- native：--native 时测试本机驱动（Windows Microsoft_IPMI / Linux /dev/ipmi0）
+
+python bench/bench_ipmi.py -n 500
+"""
+
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fake_bmc import FakeBmcServer  # noqa: E402
+from ipmi import (  # noqa: E402
+    CIPHER_SUITES,
+    IpmicfgTransport,
+    LanTransport,
+    OpenIpmiTransport,
+    WinIpmiTransport,
+    _load_aes,
+    fan_duty_command,
+)
+
+
+def measure(transport, count):
+    samples = []
+    for i in range(count):
+        netfn, cmd, data = fan_duty_command(i % 2, 20 + i % 80)
+        start = time.perf_counter()
+        transport.raw(netfn, cmd, data)
+        samples.append((time.perf_counter() - start) * 1000.0)
+    samples.sort()
+    return {
+        "count": count,
+        "mean_ms": statistics.fmean(samples),
+        "p50_ms": samples[len(samples) // 2],
+        "p99_ms": samples[min(len(samples) - 1, int(len(samples) * 0.99))],
+        "max_ms": samples[-1],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="IPMI 通道延迟基准")
+    parser.add_argument("-n", "--count", type=int, default=200)
+    parser.add_argument("--ipmicfg", help="IPMICFG 可执行文件路径")
+    parser.add_argument("--native", action="store_true", help="测试本机 IPMI 驱动")
+    parser.add_argument("--json", action="store_true", help="输出 JSON")
+    args = parser.parse_args()
+
+    results = {}
+
+    with FakeBmcServer() as server:
+        host, port = server.addresses[0]
+        for suite in sorted(CIPHER_SUITES):
+            if CIPHER_SUITES[suite][2] and _load_aes() is None:
+                continue
+            start = time.perf_counter()
+            transport = LanTransport(host, "ADMIN", "ADMIN", port=port, cipher_suite=suite)
+            transport.open()
+            handshake_ms = (time.perf_counter() - start) * 1000.0
+            with transport:
+                res = measure(transport, args.count)
+            res["handshake_ms"] = handshake_ms
+            results[f"lan/cipher{suite}"] = res
+
+    if args.ipmicfg:
+        results["ipmicfg"] = measure(IpmicfgTransport(args.ipmicfg), max(1, args.count // 10))
+
+    if args.native:
+        factory = WinIpmiTransport if os.name == "nt" else OpenIpmiTransport
+        with factory() as transport:
+            results[transport.name] = measure(transport, args.count)
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+
+    print(f"{'后端':<16}{'次数':>8}{'平均ms':>10}{'p50ms':>10}{'p99ms':>10}{'最大ms':>10}")
+    for name, r in results.items():
+        print(
+            f"{name:<16}{r['count']:>8}{r['mean_ms']:>10.3f}{r['p50_ms']:>10.3f}"
+            f"{r['p99_ms']:>10.3f}{r['max_ms']:>10.3f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,331 @@
+"""
+采样 → 写入全链路基准：不需要硬件，在 Linux 上即可运行。
+
+温度按一条轨迹（默认 bench_filter 的合成轨迹，或 --trace CSV）驱动假的传感器后端，
+用 daemon.ControlLoop 逐个采样执行，模拟时钟跟随轨迹时间（不真的等待）。
+
+- 传感器：hwmon（bench/fake_sysfs.py）或 lhm（bench/fake_lhm.py，可加 WMI 延迟、回放录制数据）
+- IPMI：ipmicfg（bench/fake_ipmicfg.py，每条命令一个进程，可加延迟 / 失败率）、
+  lan（bench/fake_bmc.py）或 null（进程内直接交给 FakeBmc，只剩控制循环自身的开销）
+
+输出（--json / --output）：
+- stages：read（读传感器）、eval（策略 + 写入抑制 + 循环开销）、dispatch（单条 IPMI 命令）、
+  e2e（有写入的采样从开始读取到最后一条命令完成）的 mean / p50 / p99 / max，单位 µs
+- writes / writes_per_hour / write_errors
+- cpu：ControlLoop.step() 的进程 CPU 时间（不含改写假传感器；lan 时含同进程假 BMC 线程），
+  以及子进程（假 IPMICFG）的 CPU 时间
+
+--compare old.json 与之前的结果对比，任何延迟 / CPU 指标变差超过 --tolerance 时退出码为 1：
+
+    python bench/bench_pipeline.py --hours 6 --output before.json
+    python bench/bench_pipeline.py --hours 6 --compare before.json
+"""
+
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import fake_ipmicfg  # noqa: E402
+from bench_filter import load_trace, synthetic_trace  # noqa: E402
+from control import CurveController, DutyFilter  # noqa: E402
+from curve import DEFAULT_CURVE_POINTS, FanCurve  # noqa: E402
+from daemon import ControlLoop  # noqa: E402
+from fake_bmc import FakeBmc, FakeBmcServer  # noqa: E402
+from fake_lhm import FakeLhmConnection  # noqa: E402
+from fake_sysfs import FakeHwmon  # noqa: E402
+from ipmi import IpmiError, IpmicfgTransport, LanTransport  # noqa: E402
+from sensors import HwmonReader, LibreHWReader  # noqa: E402
+
+
+class TimedReader:
+    """包一层读取后端，累计本次采样 read_cpu_temps 的耗时"""
+
+    def __init__(self, reader):
+        self.reader = reader
+        self.elapsed = 0.0
+
+    def read_cpu_temps(self):
+        start = time.perf_counter()
+        try:
+            return self.reader.read_cpu_temps()
+        finally:
+            self.elapsed += time.perf_counter() - start
+
+    def __getattr__(self, name):
+        return getattr(self.reader, name)
+
+
+class TimedTransport:
+    """包一层 IPMI 通道，记录每条命令的耗时"""
+
+    def __init__(self, transport):
+        self.transport = transport
+        self.calls = []
+
+    def raw(self, netfn, cmd, data=b""):
+        start = time.perf_counter()
+        try:
+            return self.transport.raw(netfn, cmd, data)
+        finally:
+            self.calls.append(time.perf_counter() - start)
+
+    def __getattr__(self, name):
+        return getattr(self.transport, name)
+
+
+class NullTransport:
+    """进程内的假 BMC，没有进程 / 网络开销"""
+
+    name = "null"
+
+    def __init__(self):
+        self.bmc = FakeBmc("null")
+
+    def raw(self, netfn, cmd, data=b""):
+        completion, response = self.bmc.handle(netfn, cmd, bytes(data))
+        if completion != 0:
+            raise IpmiError(f"完成码 0x{completion:02x}")
+        return response
+
+    def close(self):
+        pass
+
+
+def stats(samples_s):
+    """秒 → µs 的统计"""
+    if not samples_s:
+        return {"count": 0}
+    us = sorted(s * 1e6 for s in samples_s)
+    return {
+        "count": len(us),
+        "mean_us": sum(us) / len(us),
+        "p50_us": us[len(us) // 2],
+        "p99_us": us[min(len(us) - 1, int(len(us) * 0.99))],
+        "max_us": us[-1],
+    }
+
+
+def git_version():
+    try:
+        out = subprocess.run(
+            ["git", "describe", "--always", "--dirty"],
+            cwd=ROOT, capture_output=True, text=True, timeout=5,
+        )
+    except (OSError, subprocess.SubprocessError):
+        return None
+    return out.stdout.strip() or None
+
+
+def run_pipeline(trace, reader, backend, transport, duty_filter, zones):
+    """逐个采样执行 ControlLoop.step()，返回结果字典"""
+    sim_now = [trace[0][0]]
+    timed_reader = TimedReader(reader)
+    timed_transport = TimedTransport(transport)
+    loop = ControlLoop(
+        timed_reader,
+        timed_transport,
+        CurveController(FanCurve(DEFAULT_CURVE_POINTS)),
+        zones,
+        duty_filter=duty_filter,
+        clock=lambda: sim_now[0],
+    )
+
+    read, evals, dispatch, e2e = [], [], [], []
+    cpu_s = 0.0
+    children_start = os.times()
+    for t, temp in trace:
+        backend(temp)
+        sim_now[0] = t
+        timed_reader.elapsed = 0.0
+        timed_transport.calls.clear()
+
+        cpu_before = time.process_time()
+        start = time.perf_counter()
+        loop.step()
+        total = time.perf_counter() - start
+        cpu_s += time.process_time() - cpu_before
+
+        calls = timed_transport.calls
+        read.append(timed_reader.elapsed)
+        evals.append(max(0.0, total - timed_reader.elapsed - sum(calls)))
+        dispatch.extend(calls)
+        if calls:
+            e2e.append(total)
+    children_end = os.times()
+    children_s = (children_end.children_user - children_start.children_user) + (
+        children_end.children_system - children_start.children_system
+    )
+
+    hours = max((trace[-1][0] - trace[0][0]) / 3600.0, 1e-9)
+    return {
+        "samples": len(trace),
+        "hours": hours,
+        "stages": {
+            "read": stats(read),
+            "eval": stats(evals),
+            "dispatch": stats(dispatch),
+            "e2e": stats(e2e),
+        },
+        "writes": loop.writes,
+        "writes_per_hour": loop.writes / hours,
+        "write_errors": loop.write_errors,
+        "suppressed": loop.suppressed,
+        "cpu": {
+            "loop_s": cpu_s,
+            "loop_us_per_sample": cpu_s * 1e6 / len(trace),
+            "children_s": children_s,
+        },
+    }
+
+
+# 对比时检查的指标：(路径, 越大越差)
+COMPARE_KEYS = [
+    ("stages.read.p50_us", True),
+    ("stages.read.p99_us", True),
+    ("stages.eval.p50_us", True),
+    ("stages.eval.p99_us", True),
+    ("stages.dispatch.p50_us", True),
+    ("stages.dispatch.p99_us", True),
+    ("stages.e2e.p50_us", True),
+    ("cpu.loop_us_per_sample", True),
+    ("writes_per_hour", True),
+]
+
+
+def lookup(doc, path):
+    for part in path.split("."):
+        if not isinstance(doc, dict) or part not in doc:
+            return None
+        doc = doc[part]
+    return doc
+
+
+def compare(old, new, tolerance):
+    """打印新旧对比，返回变差超过容差的指标列表"""
+    regressions = []
+    print(f"{'指标':<26}{'旧':>12}{'新':>12}{'比值':>8}")
+    for path, higher_is_worse in COMPARE_KEYS:
+        a, b = lookup(old, path), lookup(new, path)
+        if a is None or b is None:
+            continue
+        ratio = b / a if a else float("inf") if b else 1.0
+        worse = ratio > 1.0 + tolerance if higher_is_worse else ratio < 1.0 - tolerance
+        mark = "  ← 变差" if worse else ""
+        print(f"{path:<26}{a:>12.1f}{b:>12.1f}{ratio:>8.2f}{mark}")
+        if worse:
+            regressions.append(path)
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="采样 → 写入全链路基准")
+    parser.add_argument("--trace", help="CSV 温度轨迹（秒, 温度）；默认生成合成轨迹")
+    parser.add_argument("--hours", type=float, default=6.0, help="合成轨迹时长（小时）")
+    parser.add_argument("--period", type=float, default=2.0, help="合成轨迹的采样间隔（秒）")
+    parser.add_argument("--sensors", choices=("hwmon", "lhm"), default="hwmon")
+    parser.add_argument("--lhm-latency", type=float, default=0.0, help="假 LHM 每次 WQL 查询的延迟（秒）")
+    parser.add_argument("--lhm-frames", help="假 LHM 回放的录制数据（JSON 帧列表），代替轨迹温度")
+    parser.add_argument("--transport", choices=("ipmicfg", "lan", "null"), default="ipmicfg")
+    parser.add_argument("--ipmicfg-latency", type=float, default=0.0, help="假 IPMICFG 每条命令的额外延迟（秒）")
+    parser.add_argument("--ipmicfg-fail-rate", type=float, default=0.0, help="假 IPMICFG 的失败概率")
+    parser.add_argument("--zones", type=int, default=2)
+    parser.add_argument("--json", action="store_true", help="输出 JSON")
+    parser.add_argument("--output", help="把 JSON 结果写入文件")
+    parser.add_argument("--compare", help="与之前保存的 JSON 结果对比")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="对比时允许变差的比例")
+    args = parser.parse_args()
+
+    if args.trace:
+        trace = load_trace(args.trace)
+    else:
+        trace = synthetic_trace(hours=args.hours, period=args.period)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        fake_ipmicfg.configure(
+            args.ipmicfg_latency, args.ipmicfg_fail_rate, os.path.join(tmp, "ipmicfg.json")
+        )
+        server = None
+        if args.transport == "ipmicfg":
+            transport = IpmicfgTransport(fake_ipmicfg.command())
+        elif args.transport == "lan":
+            server = FakeBmcServer().__enter__()
+            host, port = server.addresses[0]
+            transport = LanTransport(host, "ADMIN", "ADMIN", port=port)
+            transport.open()
+        else:
+            transport = NullTransport()
+
+        fake = None
+        try:
+            if args.sensors == "hwmon":
+                fake = FakeHwmon(sockets=2, cores=16)
+                reader = HwmonReader(fake.root)
+                backend = fake.set_all
+            else:
+                conn = FakeLhmConnection(sockets=2, cores=16, latency=args.lhm_latency)
+                if args.lhm_frames:
+                    conn.load_frames(args.lhm_frames)
+                    backend = lambda _temp: None  # noqa: E731
+                else:
+                    backend = conn.set_all
+                reader = LibreHWReader(conn=conn)
+
+            zones = list(range(args.zones))
+            result = run_pipeline(trace, reader, backend, transport, DutyFilter(), zones)
+            reader.close()
+        finally:
+            transport.close()
+            if server is not None:
+                server.__exit__(None, None, None)
+            if fake is not None:
+                fake.cleanup()
+
+    result["meta"] = {
+        "version": git_version(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+    }
+    result["params"] = {
+        key: getattr(args, key)
+        for key in (
+            "trace", "hours", "period", "sensors", "lhm_latency", "transport",
+            "ipmicfg_latency", "ipmicfg_fail_rate", "zones",
+        )
+    }
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(result, f, indent=2, ensure_ascii=False)
+    if args.json:
+        print(json.dumps(result, indent=2, ensure_ascii=False))
+    else:
+        print(
+            f"采样 {result['samples']}（{result['hours']:.1f} 小时）  写入 {result['writes']} 次"
+            f"（{result['writes_per_hour']:.1f} 次/小时，失败 {result['write_errors']}）  "
+            f"CPU {result['cpu']['loop_us_per_sample']:.1f} µs/采样，子进程 {result['cpu']['children_s']:.2f} s"
+        )
+        for name, s in result["stages"].items():
+            if s["count"]:
+                print(
+                    f"{name:<9} n={s['count']:<7} 平均 {s['mean_us']:>10.1f} µs  "
+                    f"p50 {s['p50_us']:>10.1f}  p99 {s['p99_us']:>10.1f}  最大 {s['max_us']:>10.1f}"
+                )
+
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            old = json.load(f)
+        if compare(old, result, args.tolerance):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
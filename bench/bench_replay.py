@@ -0,0 +1,136 @@
+"""
+轨迹回放基准与一致性检查：同一条轨迹上评估多条候选曲线，对比
+
+- evaluate_curves() 的 numpy 向量化路径（没有 numpy 时跳过）
+- evaluate_curves() 的纯 Python 路径
+- 逐条曲线用 replay()（CurveController + DutyFilter 逐个采样）
+
+轨迹按 0.05 °C 的步长随机游走并经 .x11t 录制 / 读取一遍，大量采样落在 x.x5 °C，
+其中 x.25 / x.75 °C 正好是查表四舍五入的临界点。三条路径的写入次数、抑制次数和
+占空比时间线必须完全一致，平均占空比只允许求和顺序带来的误差；不一致时列出差异并以返回码 1 退出。
+
+    python bench/bench_replay.py --hours 24 --curves 20
+"""
+
+import argparse
+import contextlib
+import json
+import math
+import os
+import random
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import curve as curve_module  # noqa: E402
+import replay as replay_module  # noqa: E402
+from control import CurveController, DutyFilter  # noqa: E402
+from curve import FanCurve  # noqa: E402
+from replay import TraceRecorder, evaluate_curves, load_trace, replay  # noqa: E402
+
+
+@contextlib.contextmanager
+def pure_python():
+    """让 evaluate_curves / FanCurve.evaluate_many 走没有 numpy 时的路径"""
+    saved = curve_module._numpy, replay_module._numpy
+    curve_module._numpy = replay_module._numpy = lambda: None
+    try:
+        yield
+    finally:
+        curve_module._numpy, replay_module._numpy = saved
+
+
+def make_trace(path, hours, interval, rng):
+    """0.05 °C 步长的随机游走，录制成 .x11t 再读回（与实际录制的量化一致）"""
+    temp = 55.0
+    with TraceRecorder(path) as recorder:
+        for i in range(int(hours * 3600 / interval)):
+            temp = max(30.0, min(95.0, temp + rng.choice((-0.1, -0.05, 0.0, 0.05, 0.1))))
+            recorder.record(i * interval, round(temp, 2))
+    return load_trace(path)
+
+
+def make_curves(count, rng):
+    # 轨迹以 float32 保存，x.25 / x.75 °C 是精确的临界点；2 %/°C 的斜率让它们正好跨过整数占空比
+    curves = [FanCurve([(30, 20), (50, 20), (80, 100)]), FanCurve([(40, 0), (90, 100)])]
+    while len(curves) < count:
+        low = rng.randrange(35, 60)
+        high = rng.randrange(low + 10, 90)
+        # 控制点温度也取 x.x5，让临界点落在曲线内部
+        curves.append(FanCurve([(low + 0.05, rng.randrange(10, 40)), (high + 0.05, 100)]))
+    return curves
+
+
+def compare(label, expected, got):
+    """返回差异描述列表"""
+    problems = []
+    for a, b in zip(expected, got):
+        if a.writes != b.writes or a.suppressed != b.suppressed:
+            problems.append(
+                f"{label} {a.name}：写入 {a.writes}/{b.writes}，抑制 {a.suppressed}/{b.suppressed}"
+            )
+        elif list(a.duties) != list(b.duties):
+            problems.append(f"{label} {a.name}：占空比时间线不同")
+        elif not math.isclose(a.mean_duty, b.mean_duty, rel_tol=1e-9, abs_tol=1e-9):
+            problems.append(f"{label} {a.name}：平均占空比 {a.mean_duty!r} / {b.mean_duty!r}")
+    return problems
+
+
+def main():
+    parser = argparse.ArgumentParser(description="轨迹回放基准与一致性检查")
+    parser.add_argument("--hours", type=float, default=6.0, help="轨迹时长（小时）")
+    parser.add_argument("--interval", type=float, default=1.0, help="采样间隔（秒）")
+    parser.add_argument("--curves", type=int, default=10, help="候选曲线条数")
+    parser.add_argument("--no-filter", action="store_true", help="不做写入抑制")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--json", action="store_true", help="输出 JSON")
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    with tempfile.TemporaryDirectory() as tmp:
+        trace = make_trace(os.path.join(tmp, "bench.x11t"), args.hours, args.interval, rng)
+    curves = make_curves(args.curves, rng)
+    duty_filter = None if args.no_filter else DutyFilter()
+
+    timings = {}
+    start = time.perf_counter()
+    per_sample = [replay(trace, CurveController(c), duty_filter, name=str(i)) for i, c in enumerate(curves)]
+    timings["replay_s"] = time.perf_counter() - start
+    names = [str(i) for i in range(len(curves))]
+
+    start = time.perf_counter()
+    with pure_python():
+        pure = evaluate_curves(trace, curves, duty_filter, names=names)
+    timings["evaluate_pure_s"] = time.perf_counter() - start
+    problems = compare("纯 Python", per_sample, pure)
+
+    if curve_module._numpy() is not None:
+        start = time.perf_counter()
+        vectorized = evaluate_curves(trace, curves, duty_filter, names=names)
+        timings["evaluate_numpy_s"] = time.perf_counter() - start
+        problems += compare("numpy", per_sample, vectorized)
+
+    result = {
+        "samples": len(trace),
+        "curves": len(curves),
+        "writes": [r.writes for r in per_sample],
+        "timings": timings,
+        "mismatches": problems,
+    }
+    if args.json:
+        print(json.dumps(result, indent=2, ensure_ascii=False))
+    else:
+        print(f"{len(trace)} 个采样，{len(curves)} 条曲线，{'不' if args.no_filter else ''}做写入抑制")
+        for key, value in timings.items():
+            print(f"{key:<20}{value * 1000.0:>10.1f} ms")
+        print("结果一致" if not problems else "结果不一致：")
+        for line in problems:
+            print("  " + line)
+    return 1 if problems else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,80 @@
+"""
+BMC 传感器快照基准：对本地假 BMC 比较批量流水线读取与逐条读取的耗时。
+
+python bench/bench_sdr.py --latency 0.002 -n 50
+"""
+
+import argparse
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fake_bmc import FakeBmcServer  # noqa: E402
+from ipmi import IpmiTransport, LanTransport  # noqa: E402
+from sdr import BmcSensors  # noqa: E402
+
+
+class SequentialTransport(IpmiTransport):
+    """把 raw_many 退化成逐条发送，作为对照"""
+
+    name = "sequential"
+
+    def __init__(self, inner):
+        self.inner = inner
+
+    def raw(self, netfn, cmd, data=b""):
+        return self.inner.raw(netfn, cmd, data)
+
+
+def measure(sensors, count):
+    samples = [sensors.snapshot().elapsed_ms for _ in range(count)]
+    return {"count": count, "mean_ms": statistics.fmean(samples), "max_ms": max(samples)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="BMC 传感器快照基准")
+    parser.add_argument("-n", "--count", type=int, default=50)
+    parser.add_argument("--latency", type=float, default=0.001, help="假 BMC 每个响应的延迟（秒）")
+    parser.add_argument("--json", action="store_true", help="输出 JSON")
+    args = parser.parse_args()
+
+    results = {}
+    with FakeBmcServer() as server, tempfile.TemporaryDirectory() as tmp:
+        server.bmcs[0].latency = args.latency
+        host, port = server.addresses[0]
+        with LanTransport(host, "ADMIN", "ADMIN", port=port) as transport:
+            cache = os.path.join(tmp, "sdr.json")
+
+            start = time.perf_counter()
+            BmcSensors(transport, cache).refresh_sdr()
+            results["sdr_download_ms"] = (time.perf_counter() - start) * 1000.0
+
+            start = time.perf_counter()
+            BmcSensors(transport, cache).refresh_sdr()
+            results["sdr_cached_ms"] = (time.perf_counter() - start) * 1000.0
+
+            pipelined = BmcSensors(transport, cache)
+            sequential = BmcSensors(SequentialTransport(transport), cache)
+            pipelined.refresh_sdr()
+            sequential.refresh_sdr()
+            results["sensors"] = len(pipelined.records)
+            results["snapshot_pipelined"] = measure(pipelined, args.count)
+            results["snapshot_sequential"] = measure(sequential, args.count)
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    print(f"传感器数：{results['sensors']}")
+    print(f"SDR 下载：{results['sdr_download_ms']:.1f} ms，读缓存：{results['sdr_cached_ms']:.1f} ms")
+    for name in ("snapshot_pipelined", "snapshot_sequential"):
+        r = results[name]
+        print(f"{name:<22} 平均 {r['mean_ms']:.2f} ms  最大 {r['max_ms']:.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
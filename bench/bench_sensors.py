@@ -0,0 +1,100 @@
+"""
+温度读取后端基准：每次采样（read_cpu_temps）的耗时。
+
+- hwmon：默认读一棵假的 sysfs 树（bench/fake_sysfs.py），--hwmon-root 可指向真实的 /sys/class/hwmon
+- lhm：--lhm 时测试本机 LibreHardwareMonitor（WMI）
+- lhm-http：--lhm-http URL 时测试本机 LHM 的 Remote Web Server（/data.json）
+- --lhm-fake：不需要 Windows，对比两条 LHM 路径：假 WMI 源（每次查询加 --wmi-latency 秒）
+  与本地假 /data.json 服务（bench/fake_lhm.py）上的 LhmHttpReader，传感器集合相同
+
+python bench/bench_sensors.py -n 10000
+python bench/bench_sensors.py -n 2000 --lhm-fake --wmi-latency 0.004
+"""
+
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fake_lhm import FakeLhmConnection, FakeLhmHttpServer  # noqa: E402
+from fake_sysfs import FakeHwmon  # noqa: E402
+from sensors import HwmonReader, LhmHttpReader, LibreHWReader  # noqa: E402
+
+
+def measure(reader, count):
+    reader.read_cpu_temps()  # 第一次包含传感器发现
+    samples = []
+    for _ in range(count):
+        start = time.perf_counter()
+        reader.read_cpu_temps()
+        samples.append((time.perf_counter() - start) * 1e6)
+    samples.sort()
+    return {
+        "count": count,
+        "mean_us": statistics.fmean(samples),
+        "p50_us": samples[len(samples) // 2],
+        "p99_us": samples[min(len(samples) - 1, int(len(samples) * 0.99))],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="温度读取后端基准")
+    parser.add_argument("-n", "--count", type=int, default=5000)
+    parser.add_argument("--sockets", type=int, default=2)
+    parser.add_argument("--cores", type=int, default=16)
+    parser.add_argument("--hwmon-root", help="真实 hwmon 目录（默认用假 sysfs）")
+    parser.add_argument("--lhm", action="store_true", help="测试 LibreHardwareMonitor（WMI）")
+    parser.add_argument("--lhm-http", metavar="URL", help="测试 LibreHardwareMonitor 的 /data.json")
+    parser.add_argument("--lhm-fake", action="store_true", help="用假 LHM 对比 WMI 与 HTTP 两条路径")
+    parser.add_argument("--wmi-latency", type=float, default=0.004, help="假 WMI 每次查询的延迟（秒）")
+    parser.add_argument("--json", action="store_true", help="输出 JSON")
+    args = parser.parse_args()
+
+    results = {}
+    if args.hwmon_root:
+        with HwmonReader(args.hwmon_root) as reader:
+            results["hwmon"] = measure(reader, args.count)
+    else:
+        with FakeHwmon(sockets=args.sockets, cores=args.cores) as fake:
+            fake.set_all(50.0, jitter=10.0)
+            with HwmonReader(fake.root) as reader:
+                res = measure(reader, args.count)
+                res["sensors"] = len(reader.sensors)
+                results["hwmon/fake"] = res
+
+    if args.lhm:
+        with LibreHWReader() as reader:
+            results["lhm"] = measure(reader, max(1, args.count // 100))
+    if args.lhm_http:
+        with LhmHttpReader(args.lhm_http) as reader:
+            results["lhm-http"] = measure(reader, max(1, args.count // 10))
+
+    if args.lhm_fake:
+        conn = FakeLhmConnection(sockets=args.sockets, cores=args.cores)
+        conn.set_all(50.0)
+        # WMI 每次查询都要等 --wmi-latency，次数少一些
+        conn.latency = args.wmi_latency
+        with LibreHWReader(conn=conn) as reader:
+            results["lhm/fake-wmi"] = measure(reader, max(1, args.count // 10))
+        conn.latency = 0.0
+        with FakeLhmHttpServer(conn) as server:
+            with LhmHttpReader(server.url) as reader:
+                res = measure(reader, args.count)
+                res["document_bytes"] = len(conn.data_json())
+                res["full_parses"] = reader.full_parses
+                res["connects"] = reader.connects
+                results["lhm-http/fake"] = res
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    for name, r in results.items():
+        print(f"{name:<14} 平均 {r['mean_us']:.1f} µs  p50 {r['p50_us']:.1f} µs  p99 {r['p99_us']:.1f} µs")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,139 @@
+"""
+启动开销基准：无界面路径（fanctl / daemon）与 GUI 路径（main.py + QApplication）对比。
+
+每条路径在新的 Python 进程里执行若干次，记录：
+- wall_ms：从启动解释器到完成首次温度读取（或 GUI 初始化）的总耗时
+- import_ms：进程内 import 阶段耗时
+- peak_rss_mb：进程峰值常驻内存
+- qt_loaded：是否加载了 PyQt6
+
+python bench/bench_startup.py -n 5
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from fake_sysfs import FakeHwmon  # noqa: E402
+
+
+# 子进程里统计峰值 RSS（Linux：getrusage；Windows：GetProcessMemoryInfo）
+PEAK_RSS = r"""
+def _peak_rss_mb():
+    try:
+        import resource
+        rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return rss / (1024.0 * 1024.0) if sys.platform == "darwin" else rss / 1024.0
+    except ImportError:
+        import ctypes
+        from ctypes import wintypes
+
+        class Counters(ctypes.Structure):
+            _fields_ = [("cb", wintypes.DWORD), ("PageFaultCount", wintypes.DWORD)] + [
+                (n, ctypes.c_size_t)
+                for n in (
+                    "PeakWorkingSetSize", "WorkingSetSize", "QuotaPeakPagedPoolUsage",
+                    "QuotaPagedPoolUsage", "QuotaPeakNonPagedPoolUsage",
+                    "QuotaNonPagedPoolUsage", "PagefileUsage", "PeakPagefileUsage",
+                )
+            ]
+
+        c = Counters()
+        c.cb = ctypes.sizeof(c)
+        ctypes.windll.psapi.GetProcessMemoryInfo(
+            ctypes.windll.kernel32.GetCurrentProcess(), ctypes.byref(c), c.cb
+        )
+        return c.PeakWorkingSetSize / (1024.0 * 1024.0)
+"""
+
+HEADLESS = r"""
+import sys, time, json
+t0 = time.perf_counter()
+import fanctl
+from sensors import open_sensor_reader
+t1 = time.perf_counter()
+with open_sensor_reader("hwmon", sys.argv[1]) as reader:
+    reader.read_cpu_temps()
+""" + PEAK_RSS + r"""
+print(json.dumps({"import_ms": (t1 - t0) * 1000.0, "peak_rss_mb": _peak_rss_mb(),
+                  "qt_loaded": "PyQt6" in sys.modules}))
+"""
+
+GUI = r"""
+import os, sys, time, json
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+t0 = time.perf_counter()
+import main
+t1 = time.perf_counter()
+from PyQt6.QtWidgets import QApplication
+app = QApplication(sys.argv[:1])
+""" + PEAK_RSS + r"""
+print(json.dumps({"import_ms": (t1 - t0) * 1000.0, "peak_rss_mb": _peak_rss_mb(),
+                  "qt_loaded": "PyQt6" in sys.modules}))
+"""
+
+
+def run_once(code, *args):
+    start = time.perf_counter()
+    proc = subprocess.run(
+        [sys.executable, "-c", code, *args],
+        cwd=ROOT,
+        capture_output=True,
+        text=True,
+    )
+    wall_ms = (time.perf_counter() - start) * 1000.0
+    if proc.returncode != 0:
+        raise RuntimeError(proc.stderr.strip().splitlines()[-1] if proc.stderr else "子进程失败")
+    result = json.loads(proc.stdout.strip().splitlines()[-1])
+    result["wall_ms"] = wall_ms
+    return result
+
+
+def measure(code, count, *args):
+    runs = [run_once(code, *args) for _ in range(count)]
+    return {
+        "runs": count,
+        "wall_ms": statistics.median(r["wall_ms"] for r in runs),
+        "import_ms": statistics.median(r["import_ms"] for r in runs),
+        "peak_rss_mb": statistics.median(r["peak_rss_mb"] for r in runs),
+        "qt_loaded": runs[-1]["qt_loaded"],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="启动时间 / 内存基准")
+    parser.add_argument("-n", "--count", type=int, default=5)
+    parser.add_argument("--json", action="store_true", help="输出 JSON")
+    args = parser.parse_args()
+
+    results = {}
+    with FakeHwmon(sockets=2, cores=16) as fake:
+        fake.set_all(50.0)
+        results["headless"] = measure(HEADLESS, args.count, fake.root)
+    try:
+        results["gui"] = measure(GUI, args.count)
+    except RuntimeError as e:
+        results["gui"] = {"error": str(e)}
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    for name, r in results.items():
+        if "error" in r:
+            print(f"{name:<10} 无法运行：{r['error']}")
+            continue
+        print(
+            f"{name:<10} 启动 {r['wall_ms']:.0f} ms（import {r['import_ms']:.0f} ms）  "
+            f"峰值 RSS {r['peak_rss_mb']:.1f} MB  Qt {'已加载' if r['qt_loaded'] else '未加载'}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,428 @@
+"""
+本地假 BMC：在 127.0.0.1 上模拟 Supermicro X11 的 IPMI over LAN（RMCP+）。
+
+一个 FakeBmcServer 可以同时监听多个 UDP 端口，每个端口是一台独立的虚拟 BMC，
+各自有风扇模式 / 占空比状态，可分别设置响应延迟和丢包率。
+延迟是排队发送的，不会阻塞其它虚拟主机。
+
+单独运行：python bench/fake_bmc.py --count 4 --base-port 16230
+"""
+
+import argparse
+import heapq
+import os
+import random
+import selectors
+import socket
+import struct
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ipmi import (  # noqa: E402
+    CIPHER_SUITES,
+    NETFN_APP,
+    NETFN_SUPERMICRO,
+    CMD_FAN_DUTY,
+    CMD_FAN_MODE,
+    PAYLOAD_IPMI,
+    PAYLOAD_OPEN_SESSION_REQ,
+    PAYLOAD_OPEN_SESSION_RESP,
+    PAYLOAD_RAKP1,
+    PAYLOAD_RAKP2,
+    PAYLOAD_RAKP3,
+    PAYLOAD_RAKP4,
+    BMC_SLAVE_ADDR,
+    REMOTE_SWID,
+    IpmiError,
+    SessionCodec,
+    _load_aes,
+    hmac_sha1,
+    pack_message,
+    session_keys,
+    unpack_message,
+)
+from sdr import NETFN_SENSOR, NETFN_STORAGE, SENSOR_TYPE_FAN, SENSOR_TYPE_TEMPERATURE  # noqa: E402
+
+
+def full_sdr(record_id, number, name, sensor_type, unit, m=1, entity=0x07):
+    """生成一条 Full Sensor Record（阈值型、无符号、线性）"""
+    id_bytes = name.encode("ascii")
+    rec = bytearray(48)
+    struct.pack_into("<H", rec, 0, record_id)
+    rec[2] = 0x51
+    rec[3] = 0x01
+    rec[5] = 0x20
+    rec[7] = number
+    rec[8] = entity
+    rec[9] = 0x01
+    rec[12] = sensor_type
+    rec[13] = 0x01
+    rec[21] = unit
+    rec[24] = m & 0xFF
+    rec[25] = ((m >> 8) & 0x03) << 6
+    rec[47] = 0xC0 | len(id_bytes)
+    rec += id_bytes
+    rec[4] = len(rec) - 5
+    return bytes(rec)
+
+
+def compact_sdr(record_id, number, name, sensor_type):
+    """生成一条 Compact Sensor Record（离散传感器，读取时应被跳过）"""
+    id_bytes = name.encode("ascii")
+    rec = bytearray(32)
+    struct.pack_into("<H", rec, 0, record_id)
+    rec[2] = 0x51
+    rec[3] = 0x02
+    rec[5] = 0x20
+    rec[7] = number
+    rec[12] = sensor_type
+    rec[13] = 0x6F
+    rec[31] = 0xC0 | len(id_bytes)
+    rec += id_bytes
+    rec[4] = len(rec) - 5
+    return bytes(rec)
+
+
+# 仿 X11 的传感器：(编号, 名称, 类型, 单位, M)
+FAKE_SENSORS = [
+    (0x01, "CPU1 Temp", SENSOR_TYPE_TEMPERATURE, 1, 1),
+    (0x02, "CPU2 Temp", SENSOR_TYPE_TEMPERATURE, 1, 1),
+    (0x0A, "PCH Temp", SENSOR_TYPE_TEMPERATURE, 1, 1),
+    (0x0B, "System Temp", SENSOR_TYPE_TEMPERATURE, 1, 1),
+    (0x0C, "Peripheral Temp", SENSOR_TYPE_TEMPERATURE, 1, 1),
+    (0x0D, "Inlet Temp", SENSOR_TYPE_TEMPERATURE, 1, 1),
+    (0x10, "CPU1_VRMIN Temp", SENSOR_TYPE_TEMPERATURE, 1, 1),
+    (0x41, "FAN1", SENSOR_TYPE_FAN, 18, 100),
+    (0x42, "FAN2", SENSOR_TYPE_FAN, 18, 100),
+    (0x43, "FAN3", SENSOR_TYPE_FAN, 18, 100),
+    (0x44, "FANA", SENSOR_TYPE_FAN, 18, 100),
+]
+
+# 风扇属于哪个区：FAN1-3 = 区 0（CPU），FANA = 区 1（外设）
+FAKE_FAN_ZONES = {"FAN1": 0, "FAN2": 0, "FAN3": 0, "FANA": 1}
+
+
+class FakeBmc:
+    """一台虚拟 BMC 的状态与命令处理"""
+
+    def __init__(self, name="bmc"):
+        self.name = name
+        self.guid = os.urandom(16)
+        self.fan_mode = 0x01
+        self.duties = {0: 100, 1: 100}
+        self.latency = 0.0
+        self.loss = 0.0
+        self.requests = 0
+        self.writes = 0
+
+        self.sensors = {}   # 编号 -> (名称, 类型, M)
+        self.readings = {}  # 编号 -> 原始读数
+        self.sdr = []
+        for number, sname, stype, unit, m in FAKE_SENSORS:
+            self.sensors[number] = (sname, stype, m)
+            self.readings[number] = 35
+            self.sdr.append(full_sdr(len(self.sdr), number, sname, stype, unit, m))
+        self.sdr.append(compact_sdr(len(self.sdr), 0xC8, "PS1 Status", 0x08))
+        self.sdr_added = int(time.time())
+        self.reservation = 1
+
+    def set_temp(self, name, temp_c):
+        for number, (sname, stype, m) in self.sensors.items():
+            if sname == name:
+                self.readings[number] = max(0, min(255, int(round(temp_c / m))))
+                return
+        raise KeyError(name)
+
+    def fan_reading(self, number):
+        sname, _, m = self.sensors[number]
+        duty = self.duties.get(FAKE_FAN_ZONES.get(sname, 0), 100)
+        return max(0, min(255, int(round((300 + duty * 16) / m))))
+
+    def handle_storage(self, cmd, data):
+        if cmd == 0x20:  # Get SDR Repository Info
+            return 0, bytes([0x51]) + struct.pack("<HHII", len(self.sdr), 0x1000, self.sdr_added, 0) + b"\x00"
+        if cmd == 0x22:  # Reserve SDR Repository
+            self.reservation = (self.reservation + 1) & 0xFFFF or 1
+            return 0, struct.pack("<H", self.reservation)
+        if cmd == 0x23 and len(data) >= 6:  # Get SDR
+            reservation, record_id, offset, count = struct.unpack_from("<HHBB", data)
+            if offset and reservation != self.reservation:
+                return 0xC5, b""
+            if record_id >= len(self.sdr):
+                return 0xCB, b""
+            record = self.sdr[record_id]
+            next_id = record_id + 1 if record_id + 1 < len(self.sdr) else 0xFFFF
+            end = len(record) if count == 0xFF else offset + count
+            return 0, struct.pack("<H", next_id) + record[offset:end]
+        return 0xC1, b""
+
+    def handle(self, netfn, cmd, data):
+        """返回 (完成码, 响应数据)"""
+        self.requests += 1
+        if netfn == NETFN_STORAGE:
+            return self.handle_storage(cmd, data)
+        if netfn == NETFN_SENSOR and cmd == 0x2D and data:  # Get Sensor Reading
+            number = data[0]
+            if number not in self.sensors:
+                return 0xCB, b""
+            if self.sensors[number][1] == SENSOR_TYPE_FAN:
+                raw = self.fan_reading(number)
+            else:
+                raw = self.readings[number]
+            return 0, bytes([raw, 0xC0, 0x00, 0x80])
+        if netfn == NETFN_APP:
+            if cmd == 0x01:  # Get Device ID
+                return 0, bytes([0x20, 0x01, 0x01, 0x73, 0x02, 0xBF, 0x7C, 0x2A, 0x00, 0x93, 0x09, 0, 0, 0, 0])
+            if cmd == 0x3B and data:  # Set Session Privilege Level
+                return 0, bytes([data[0]])
+            return 0xC1, b""
+
+        if netfn == NETFN_SUPERMICRO:
+            if cmd == CMD_FAN_DUTY and len(data) >= 3 and data[0] == 0x66:
+                zone = data[2]
+                if data[1] == 0x01 and len(data) >= 4:
+                    if data[3] > 100:
+                        return 0xC9, b""
+                    self.duties[zone] = data[3]
+                    self.writes += 1
+                    return 0, b""
+                if data[1] == 0x00:
+                    if zone not in self.duties:
+                        return 0xC9, b""
+                    return 0, bytes([self.duties[zone]])
+            if cmd == CMD_FAN_MODE and data:
+                if data[0] == 0x01 and len(data) >= 2:
+                    self.fan_mode = data[1]
+                    self.writes += 1
+                    return 0, b""
+                if data[0] == 0x00:
+                    return 0, bytes([self.fan_mode])
+        return 0xC1, b""
+
+
+class _Session:
+    def __init__(self, console_sid, algos):
+        self.console_sid = console_sid
+        self.algos = algos
+        self.codec = SessionCodec()
+        self.active = False
+        self.seq = 0
+        self.rm = b""
+        self.rc = b""
+        self.role = 0
+        self.user = b""
+
+
+class FakeBmcServer:
+    """在若干个本地 UDP 端口上提供虚拟 BMC；start() 后在后台线程运行"""
+
+    def __init__(self, count=1, host="127.0.0.1", base_port=0, user="ADMIN", password="ADMIN"):
+        self.host = host
+        self.user = user.encode("utf-8")
+        self.kuid = password.encode("utf-8").ljust(20, b"\0")[:20]
+        self.selector = selectors.DefaultSelector()
+        self.bmcs = []
+        self._socks = []
+        self._sessions = {}  # (port, bmc_sid) -> _Session
+        self._pending = []   # (due, n, sock, packet, addr)
+        self._counter = 0
+        self._thread = None
+        self._stop = threading.Event()
+
+        for i in range(count):
+            sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+            sock.bind((host, base_port + i if base_port else 0))
+            sock.setblocking(False)
+            bmc = FakeBmc(name=f"bmc{i}")
+            self.selector.register(sock, selectors.EVENT_READ, bmc)
+            self._socks.append(sock)
+            self.bmcs.append(bmc)
+
+    @property
+    def addresses(self):
+        return [s.getsockname() for s in self._socks]
+
+    def start(self):
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._serve, name="fake-bmc", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(2.0)
+        for sock in self._socks:
+            self.selector.unregister(sock)
+            sock.close()
+        self._socks = []
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    # ----- 事件循环 -----
+
+    def _serve(self):
+        while not self._stop.is_set():
+            timeout = 0.05
+            if self._pending:
+                timeout = max(0.0, min(timeout, self._pending[0][0] - time.monotonic()))
+            for key, _ in self.selector.select(timeout):
+                try:
+                    packet, addr = key.fileobj.recvfrom(4096)
+                except OSError:
+                    continue
+                self._on_packet(key.fileobj, key.data, packet, addr)
+
+            now = time.monotonic()
+            while self._pending and self._pending[0][0] <= now:
+                _, _, sock, packet, addr = heapq.heappop(self._pending)
+                try:
+                    sock.sendto(packet, addr)
+                except OSError:
+                    pass
+
+    def _reply(self, sock, bmc, packet, addr):
+        if bmc.loss and random.random() < bmc.loss:
+            return
+        self._counter += 1
+        heapq.heappush(self._pending, (time.monotonic() + bmc.latency, self._counter, sock, packet, addr))
+
+    def _on_packet(self, sock, bmc, packet, addr):
+        port = sock.getsockname()[1]
+        if len(packet) < 16:
+            return
+        sid = struct.unpack_from("<I", packet, 6)[0]
+
+        if sid == 0:
+            try:
+                ptype, _, _, payload = SessionCodec().unwrap(packet)
+            except IpmiError:
+                return
+            handler = {
+                PAYLOAD_OPEN_SESSION_REQ: self._open_session,
+                PAYLOAD_RAKP1: self._rakp1,
+                PAYLOAD_RAKP3: self._rakp3,
+            }.get(ptype)
+            if handler is not None:
+                reply = handler(port, bmc, payload)
+                if reply is not None:
+                    self._reply(sock, bmc, reply, addr)
+            return
+
+        session = self._sessions.get((port, sid))
+        if session is None or not session.active:
+            return
+        try:
+            ptype, _, _, payload = session.codec.unwrap(packet)
+            netfn, seq, cmd, data = unpack_message(payload)
+        except IpmiError:
+            return
+        if ptype != PAYLOAD_IPMI:
+            return
+
+        if netfn == NETFN_APP and cmd == 0x3C:  # Close Session
+            self._sessions.pop((port, sid), None)
+            cc, resp = 0, b""
+        else:
+            cc, resp = bmc.handle(netfn, cmd, data)
+
+        msg = pack_message(netfn | 1, cmd, bytes([cc]) + resp, seq, dst=REMOTE_SWID, src=BMC_SLAVE_ADDR)
+        session.seq = (session.seq + 1) & 0xFFFFFFFF or 1
+        self._reply(sock, bmc, session.codec.wrap(PAYLOAD_IPMI, session.console_sid, session.seq, msg), addr)
+
+    # ----- 握手 -----
+
+    def _open_session(self, port, bmc, payload):
+        if len(payload) < 32:
+            return None
+        tag = payload[0]
+        console_sid = struct.unpack_from("<I", payload, 4)[0]
+        algos = (payload[12], payload[20], payload[28])
+        status = 0 if algos in CIPHER_SUITES.values() and (algos[2] == 0 or _load_aes() is not None) else 0x11
+
+        bmc_sid = struct.unpack("<I", os.urandom(4))[0] | 1
+        if status == 0:
+            self._sessions[(port, bmc_sid)] = _Session(console_sid, algos)
+        resp = bytes([tag, status, 0x04, 0]) + struct.pack("<II", console_sid, bmc_sid) + payload[8:32]
+        return SessionCodec().wrap(PAYLOAD_OPEN_SESSION_RESP, 0, 0, resp)
+
+    def _rakp1(self, port, bmc, payload):
+        if len(payload) < 28:
+            return None
+        tag = payload[0]
+        bmc_sid = struct.unpack_from("<I", payload, 4)[0]
+        session = self._sessions.get((port, bmc_sid))
+        if session is None:
+            return None
+
+        session.rm = payload[8:24]
+        session.role = payload[24]
+        session.user = payload[28 : 28 + payload[27]]
+        session.rc = os.urandom(16)
+        head = struct.pack("<I", session.console_sid)
+        if session.user != self.user:
+            return SessionCodec().wrap(PAYLOAD_RAKP2, 0, 0, bytes([tag, 0x0D, 0, 0]) + head)
+
+        who = bytes([session.role, len(session.user)]) + session.user
+        auth = hmac_sha1(
+            self.kuid,
+            struct.pack("<II", session.console_sid, bmc_sid) + session.rm + session.rc + bmc.guid + who,
+        )
+        resp = bytes([tag, 0, 0, 0]) + head + session.rc + bmc.guid + auth
+        return SessionCodec().wrap(PAYLOAD_RAKP2, 0, 0, resp)
+
+    def _rakp3(self, port, bmc, payload):
+        if len(payload) < 28:
+            return None
+        tag = payload[0]
+        bmc_sid = struct.unpack_from("<I", payload, 4)[0]
+        session = self._sessions.get((port, bmc_sid))
+        if session is None:
+            return None
+
+        head = struct.pack("<I", session.console_sid)
+        who = bytes([session.role, len(session.user)]) + session.user
+        expected = hmac_sha1(self.kuid, session.rc + head + who)
+        if expected != payload[8:28]:
+            self._sessions.pop((port, bmc_sid), None)
+            return SessionCodec().wrap(PAYLOAD_RAKP4, 0, 0, bytes([tag, 0x0F, 0, 0]) + head)
+
+        sik, k1, k2 = session_keys(self.kuid, session.rm, session.rc, session.role, session.user)
+        _, integ, conf = session.algos
+        session.codec = SessionCodec(k1 if integ else None, k2 if conf else None)
+        session.active = True
+        icv = hmac_sha1(sik, session.rm + struct.pack("<I", bmc_sid) + bmc.guid)[:12]
+        return SessionCodec().wrap(PAYLOAD_RAKP4, 0, 0, bytes([tag, 0, 0, 0]) + head + icv)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="本地假 BMC（RMCP+）")
+    parser.add_argument("--count", type=int, default=1, help="虚拟 BMC 数量")
+    parser.add_argument("--base-port", type=int, default=16230)
+    parser.add_argument("--latency", type=float, default=0.0, help="每个响应的延迟（秒）")
+    parser.add_argument("--loss", type=float, default=0.0, help="丢包率 0..1")
+    args = parser.parse_args()
+
+    server = FakeBmcServer(count=args.count, base_port=args.base_port)
+    for bmc in server.bmcs:
+        bmc.latency = args.latency
+        bmc.loss = args.loss
+    server.start()
+    for host, port in server.addresses:
+        print(f"假 BMC 监听 {host}:{port}（ADMIN / ADMIN）")
+    try:
+        while True:
+            time.sleep(1.0)
+    except KeyboardInterrupt:
+        server.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+"""
+假 IPMICFG-Win.exe：命令行与真实工具一致（-raw netfn cmd data...），不需要硬件。
+
+每次调用是一个新进程（与真实 IPMICFG 一样），命令交给 fake_bmc.FakeBmc 处理，
+风扇模式 / 占空比保存在状态文件里，跨进程保持。行为由环境变量控制：
+
+- FAKE_IPMICFG_LATENCY：每条命令额外的延迟（秒），模拟 IPMICFG 访问驱动的开销
+- FAKE_IPMICFG_FAIL_RATE：失败概率（0..1），失败时退出码为 1
+- FAKE_IPMICFG_STATE：状态文件路径（JSON），不设置时每次都从默认状态开始
+
+IpmicfgTransport 用法：
+
+    configure(latency=0.05, fail_rate=0.01, state=path)
+    IpmicfgTransport(command())
+"""
+
+import json
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from fake_bmc import FakeBmc  # noqa: E402
+
+
+ENV_LATENCY = "FAKE_IPMICFG_LATENCY"
+ENV_FAIL_RATE = "FAKE_IPMICFG_FAIL_RATE"
+ENV_STATE = "FAKE_IPMICFG_STATE"
+
+
+def command():
+    """IpmicfgTransport 的命令前缀：[python, 本脚本]（脚本路径必须在最后，transport 用它定位工作目录）"""
+    return [sys.executable, os.path.abspath(__file__)]
+
+
+def configure(latency=0.0, fail_rate=0.0, state=None):
+    """设置本进程的环境变量，之后启动的假 IPMICFG 子进程都会继承"""
+    os.environ[ENV_LATENCY] = str(latency)
+    os.environ[ENV_FAIL_RATE] = str(fail_rate)
+    if state:
+        os.environ[ENV_STATE] = state
+    else:
+        os.environ.pop(ENV_STATE, None)
+
+
+def load_state(bmc, path):
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            doc = json.load(f)
+    except (OSError, ValueError):
+        return
+    bmc.fan_mode = doc.get("fan_mode", bmc.fan_mode)
+    bmc.duties = {int(z): d for z, d in doc.get("duties", {}).items()}
+    bmc.writes = doc.get("writes", 0)
+
+
+def save_state(bmc, path):
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump({"fan_mode": bmc.fan_mode, "duties": bmc.duties, "writes": bmc.writes}, f)
+    os.replace(tmp, path)
+
+
+def main(argv):
+    if len(argv) < 3 or argv[0].lower() != "-raw":
+        print("用法：fake_ipmicfg.py -raw <netfn> <cmd> [data ...]")
+        return 2
+    try:
+        netfn, cmd, *data = (int(token, 16) for token in argv[1:])
+    except ValueError:
+        print("Invalid raw data")
+        return 2
+
+    latency = float(os.environ.get(ENV_LATENCY, "0") or 0)
+    fail_rate = float(os.environ.get(ENV_FAIL_RATE, "0") or 0)
+    state = os.environ.get(ENV_STATE)
+    if latency > 0:
+        time.sleep(latency)
+    if fail_rate > 0 and random.random() < fail_rate:
+        print("Error: Unable to send RAW command", file=sys.stderr)
+        return 1
+
+    bmc = FakeBmc("ipmicfg")
+    if state:
+        load_state(bmc, state)
+    completion, response = bmc.handle(netfn, cmd, bytes(data))
+    if completion != 0:
+        print(f"Error: completion code 0x{completion:02x}", file=sys.stderr)
+        return 1
+    if state:
+        save_state(bmc, state)
+    print(" ".join(f"{b:02x}" for b in response))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,227 @@
+"""
+假 LibreHardwareMonitor WMI 源：LibreHWReader(conn=FakeLhmConnection(...)) 直接可用，
+不需要 Windows / pythoncom / wmi。
+
+只实现 LibreHWReader 用到的几种 WQL（枚举 Hardware、枚举温度传感器、按 Identifier 取 Value），
+每次 query() 可以加固定延迟，模拟 WMI 的往返开销。
+
+传感器集合可以是合成的（sockets × cores + 若干其它温度），也可以回放录制的数据：
+JSON 列表，每帧一个 {"硬件名/传感器名": 温度}，每次按 Identifier 取值时前进一帧。
+
+FakeLhmHttpServer 把同一个传感器集合按 LHM Remote Web Server 的 /data.json 格式提供出来
+（HTTP/1.1 keep-alive），给 LhmHttpReader 用；每次 GET 前进一帧。
+树里除了温度还带有负载 / 频率 / 电压等传感器，文档大小接近真实的 LHM。
+
+用法：
+
+    conn = FakeLhmConnection(sockets=2, cores=16, latency=0.004)
+    conn.set_all(55.0)
+    reader = LibreHWReader(conn=conn)
+
+    with FakeLhmHttpServer(conn) as server:
+        reader = LhmHttpReader(server.url)
+"""
+
+import http.server
+import json
+import re
+import threading
+import time
+
+
+class _Row:
+    """模拟 wmi 返回的行对象：属性访问"""
+
+    def __init__(self, **fields):
+        self.__dict__.update(fields)
+
+
+_IDENT_RE = re.compile(r"Identifier = '([^']*)'")
+
+
+class FakeLhmConnection:
+    def __init__(self, sockets=2, cores=8, extra=("NVMe/Temperature", "Motherboard/PCH"), latency=0.0):
+        self.latency = latency
+        self.queries = 0
+        self.hardware = []   # (Identifier, Name, HardwareType)
+        self.sensors = {}    # Identifier -> [Name, Parent, Value]
+        self.keys = {}       # "硬件名/传感器名" -> Identifier
+        self.frames = None
+        self.frame = 0
+        self.document = None   # 缓存的 data.json，读数变化时作废
+
+        for s in range(sockets):
+            parent = f"/intelcpu/{s}"
+            self.hardware.append((parent, f"Intel Xeon #{s}", "Cpu"))
+            self._add(parent, f"/intelcpu/{s}/temperature/0", "CPU Package")
+            for c in range(cores):
+                self._add(parent, f"/intelcpu/{s}/temperature/{c + 1}", f"CPU Core #{c + 1}")
+                # LHM 同时提供的差值传感器，LibreHWReader 应当忽略它
+                self._add(parent, f"/intelcpu/{s}/temperature/{c + 1 + cores}", f"CPU Core #{c + 1} Distance to TjMax")
+        for i, key in enumerate(extra):
+            hw_name, sensor_name = key.split("/", 1)
+            parent = f"/other/{i}"
+            self.hardware.append((parent, hw_name, "Storage" if "NVMe" in hw_name else "Motherboard"))
+            self._add(parent, f"{parent}/temperature/0", sensor_name)
+
+    def _add(self, parent, ident, name):
+        self.sensors[ident] = [name, parent, 40.0]
+        hw_name = next(h[1] for h in self.hardware if h[0] == parent)
+        self.keys[f"{hw_name}/{name}"] = ident
+
+    # ----- 设置读数 -----
+
+    def set_all(self, temp_c):
+        for sensor in self.sensors.values():
+            sensor[2] = temp_c
+        self.document = None
+
+    def set_temp(self, key, temp_c):
+        self.sensors[self.keys[key]][2] = temp_c
+        self.document = None
+
+    def load_frames(self, path):
+        """回放录制的传感器集合（JSON 列表，每帧 {"硬件名/传感器名": 温度}）"""
+        with open(path, "r", encoding="utf-8") as f:
+            self.set_frames(json.load(f))
+
+    def set_frames(self, frames):
+        self.frames = list(frames)
+        self.frame = 0
+
+    def _advance(self):
+        if not self.frames:
+            return
+        for key, value in self.frames[self.frame % len(self.frames)].items():
+            if key in self.keys:
+                self.sensors[self.keys[key]][2] = value
+        self.frame += 1
+        self.document = None
+
+    # ----- WQL -----
+
+    def query(self, wql):
+        self.queries += 1
+        if self.latency:
+            time.sleep(self.latency)
+
+        if "FROM Hardware" in wql:
+            return [_Row(Identifier=i, Name=n, HardwareType=t) for i, n, t in self.hardware]
+        if "SensorType = 'Temperature'" in wql:
+            if "Name" in wql:
+                return [
+                    _Row(Identifier=i, Name=name, Parent=parent)
+                    for i, (name, parent, _value) in self.sensors.items()
+                ]
+            return [_Row(Identifier=i) for i in self.sensors]
+
+        idents = _IDENT_RE.findall(wql)
+        if not idents:
+            raise ValueError(f"假 LHM 不支持的查询：{wql}")
+        self._advance()
+        return [
+            _Row(Identifier=i, Value=self.sensors[i][2]) for i in idents if i in self.sensors
+        ]
+
+    # ----- data.json -----
+
+    def tree(self):
+        """按 LHM /data.json 的结构生成传感器树：根 → 主机 → 硬件 → 传感器分组 → 传感器"""
+        next_id = iter(range(1_000_000))
+
+        def node(text, children=(), image="", **fields):
+            item = {"id": next(next_id), "Text": text, "Min": "", "Value": "", "Max": "", "ImageURL": image}
+            item.update(fields)
+            item["Children"] = list(children)
+            return item
+
+        def sensor(ident, name, value, kind, unit):
+            text = f"{value:.1f} {unit}"
+            return node(
+                name, image="images/transparent.png",
+                Min=text, Value=text, Max=text, SensorId=ident, Type=kind,
+            )
+
+        hardware = []
+        for hw_ident, hw_name, hw_type in self.hardware:
+            temps = [
+                sensor(ident, name, value, "Temperature", "°C")
+                for ident, (name, parent, value) in self.sensors.items()
+                if parent == hw_ident
+            ]
+            groups = [node("Temperatures", temps, "images_icon/temperature.png")]
+            if hw_type == "Cpu":
+                count = sum(1 for t in temps if t["Text"].startswith("CPU Core #") and "Distance" not in t["Text"])
+                groups += [
+                    node("Clocks", [
+                        sensor(f"{hw_ident}/clock/{c}", f"CPU Core #{c}", 3000.0, "Clock", "MHz")
+                        for c in range(1, count + 1)
+                    ], "images_icon/clock.png"),
+                    node("Load", [
+                        sensor(f"{hw_ident}/load/{c}", f"CPU Core #{c}", 12.5, "Load", "%")
+                        for c in range(count + 1)
+                    ], "images_icon/load.png"),
+                    node("Powers", [
+                        sensor(f"{hw_ident}/power/0", "CPU Package", 85.0, "Power", "W"),
+                    ], "images_icon/power.png"),
+                ]
+                image = "images_icon/cpu.png"
+            else:
+                image = "images_icon/hdd.png" if hw_type == "Storage" else "images_icon/mainboard.png"
+            hardware.append(node(hw_name, groups, image, HardwareId=hw_ident))
+        return node("Sensor", [node("FAKE-HOST", hardware, "images_icon/computer.png")])
+
+    def data_json(self) -> bytes:
+        self._advance()
+        if self.document is None:
+            self.document = json.dumps(self.tree(), ensure_ascii=False).encode("utf-8")
+        return self.document
+
+
+class _DataJsonHandler(http.server.BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # 头和正文分两次写；不关 Nagle 的话会和客户端的延迟 ACK 叠出约 40 ms
+    disable_nagle_algorithm = True
+    conn = None
+    latency = 0.0
+
+    def do_GET(self):
+        if self.path.split("?", 1)[0] != "/data.json":
+            self.send_error(404)
+            return
+        if self.latency:
+            time.sleep(self.latency)
+        body = self.conn.data_json()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class FakeLhmHttpServer:
+    """在 127.0.0.1 的随机端口上提供 /data.json；latency 为每个请求的额外延迟（秒）"""
+
+    def __init__(self, conn, latency=0.0, host="127.0.0.1", port=0):
+        handler = type("FakeLhmHandler", (_DataJsonHandler,), {"conn": conn, "latency": latency})
+        self.httpd = http.server.ThreadingHTTPServer((host, port), handler)
+        self.httpd.daemon_threads = True
+        self.thread = None
+
+    @property
+    def url(self):
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}/data.json"
+
+    def __enter__(self):
+        self.thread = threading.Thread(target=self.httpd.serve_forever, name="fake-lhm-http", daemon=True)
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.httpd.shutdown()
+        self.thread.join()
+        self.httpd.server_close()
@@ -0,0 +1,70 @@
+"""
+假的 /sys/class/hwmon 目录树，用来在没有硬件的机器上测试 HwmonReader。
+
+    with FakeHwmon(sockets=2, cores=8, nvme=1) as fake:
+        reader = HwmonReader(fake.root)
+        fake.set_all(55.0)
+"""
+
+import os
+import random
+import shutil
+import tempfile
+
+
+class FakeHwmon:
+    """按 coretemp / nvme / 主板 的布局生成一棵 hwmon 目录树"""
+
+    def __init__(self, sockets=2, cores=8, nvme=1, root=None):
+        self._owns_root = root is None
+        self.root = root or tempfile.mkdtemp(prefix="fake-hwmon-")
+        self.inputs = {}  # 传感器名 -> temp*_input 路径
+        index = 0
+
+        for socket in range(sockets):
+            labels = [f"Package id {socket}"] + [f"Core {c}" for c in range(cores)]
+            self._add_device(index, "coretemp", labels, prefix=f"coretemp{socket}")
+            index += 1
+        for n in range(nvme):
+            self._add_device(index, "nvme", ["Composite", "Sensor 1"], prefix=f"nvme{n}")
+            index += 1
+        self._add_device(index, "nct6779", ["SYSTIN", "CPUTIN", "AUXTIN0"], prefix="nct67790")
+
+    def _add_device(self, index, driver, labels, prefix):
+        path = os.path.join(self.root, f"hwmon{index}")
+        os.makedirs(path)
+        with open(os.path.join(path, "name"), "w") as f:
+            f.write(driver + "\n")
+        for i, label in enumerate(labels, start=1):
+            with open(os.path.join(path, f"temp{i}_label"), "w") as f:
+                f.write(label + "\n")
+            input_path = os.path.join(path, f"temp{i}_input")
+            self.inputs[f"{prefix}/{label}"] = input_path
+            self._write(input_path, 40.0)
+
+    @staticmethod
+    def _write(path, temp_c):
+        # 原地改写，不替换文件，已打开的 fd 能读到新值
+        with open(path, "r+" if os.path.exists(path) else "w") as f:
+            f.write(f"{int(round(temp_c * 1000))}\n")
+            f.truncate()
+
+    def set_temp(self, name, temp_c):
+        self._write(self.inputs[name], temp_c)
+
+    def set_all(self, temp_c, jitter=0.0, rng=random):
+        for path in self.inputs.values():
+            self._write(path, temp_c + (rng.uniform(-jitter, jitter) if jitter else 0.0))
+
+    def remove_device(self, index):
+        shutil.rmtree(os.path.join(self.root, f"hwmon{index}"))
+
+    def cleanup(self):
+        if self._owns_root:
+            shutil.rmtree(self.root, ignore_errors=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.cleanup()
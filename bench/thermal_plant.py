@@ -0,0 +1,69 @@
+"""
+简化的 CPU 散热模型，用来在没有硬件的情况下测试 / 整定控制策略。
+
+    C·dT/dt = P(load) - G(fan)·(T - T_amb)
+
+- P：发热功率，空闲 idle_w，满载再加 tdp_w
+- G：散热器到环境的热导，随风扇实际转速线性增加
+- 风扇实际转速以 fan_tau 的时间常数跟随设定占空比（风扇响应慢）
+- 读数可叠加均匀噪声
+
+    plant = ThermalPlant()
+    plant.set_duty(40)
+    plant.step(1.0, load=0.8)
+    plant.read()
+"""
+
+import math
+import random
+
+
+class ThermalPlant:
+    def __init__(
+        self,
+        ambient=30.0,
+        capacity=300.0,
+        idle_w=60.0,
+        tdp_w=250.0,
+        g_min=1.5,
+        g_fan=8.0,
+        fan_tau=8.0,
+        noise=0.0,
+        seed=0,
+        temp=None,
+        duty=30,
+    ):
+        self.ambient = ambient
+        self.capacity = capacity
+        self.idle_w = idle_w
+        self.tdp_w = tdp_w
+        self.g_min = g_min
+        self.g_fan = g_fan
+        self.fan_tau = fan_tau
+        self.noise = noise
+        self.rng = random.Random(seed)
+        self.duty = duty
+        self.fan = duty / 100.0
+        self.temp = self.steady_temp(0.0, self.fan) if temp is None else temp
+
+    def steady_temp(self, load, fan):
+        """给定负载和风扇转速（0..1）下的稳态温度"""
+        return self.ambient + (self.idle_w + self.tdp_w * load) / (self.g_min + self.g_fan * fan)
+
+    def set_duty(self, duty):
+        self.duty = max(0, min(100, duty))
+
+    def step(self, dt, load):
+        # 小步长积分，dt 较大时也保持稳定
+        steps = max(1, int(math.ceil(dt / 0.25)))
+        h = dt / steps
+        for _ in range(steps):
+            self.fan += (self.duty / 100.0 - self.fan) * (1.0 - math.exp(-h / self.fan_tau))
+            power = self.idle_w + self.tdp_w * load
+            conductance = self.g_min + self.g_fan * self.fan
+            self.temp += h * (power - conductance * (self.temp - self.ambient)) / self.capacity
+
+    def read(self):
+        if self.noise:
+            return self.temp + self.rng.uniform(-self.noise, self.noise)
+        return self.temp
@@ -0,0 +1,299 @@
+"""
+自动控制：温度 → 目标占空比 → 实际写入 BMC 的占空比。
+
+- Controller：控制策略，每次采样 update() 一次，O(1)
+  - CurveController：原来的分段线性曲线（查表）
+  - PidController：跟踪目标温度的 PID，带抗积分饱和，可叠加温度斜率 / CPU 占用率前馈
+- DutyFilter 位于策略输出和 IPMI 写入之间，过滤掉没有意义的小幅变化：
+  温度在曲线某一段附近来回波动时，目标占空比会 ±1% 抖动，每次抖动都要写两个风扇区。
+- SensorFallback：CPU 温度读取失败 / 超时时改用 BMC 的 CPU 温度，都没有时给出失效保护占空比。
+"""
+
+
+# 默认抑制参数
+DEFAULT_DEADBAND = 2        # %，目标与当前占空比相差不超过它时不写
+DEFAULT_HYST_UP = 0.5       # °C，升速前温度至少比上次写入时高这么多
+DEFAULT_HYST_DOWN = 2.0     # °C，降速前温度至少比上次写入时低这么多
+DEFAULT_MIN_DWELL = 30.0    # 秒，距上次写入不到这么久不降速
+
+
+class DutyFilter:
+    """
+    写入抑制：update() 返回应写入的占空比，不需要写时返回 None。
+
+    - 升速：超出 deadband 且温度比上次写入时高出 hyst_up 即立即写入；
+      目标达到 max_duty（满速）时总是立即写入
+    - 降速：超出 deadband、温度比上次写入时低 hyst_down，且距上次写入满 min_dwell 秒
+    - 写入失败或切换模式后调用 reset()，下一次采样无条件写入
+
+    issued / suppressed 统计写入和被抑制的次数（按采样计，与风扇区数量无关）。
+    """
+
+    def __init__(
+        self,
+        deadband=DEFAULT_DEADBAND,
+        hyst_up=DEFAULT_HYST_UP,
+        hyst_down=DEFAULT_HYST_DOWN,
+        min_dwell=DEFAULT_MIN_DWELL,
+        max_duty=100,
+    ):
+        if deadband < 0 or hyst_up < 0 or hyst_down < 0 or min_dwell < 0:
+            raise ValueError("写入抑制参数不能为负数")
+        self.deadband = deadband
+        self.hyst_up = hyst_up
+        self.hyst_down = hyst_down
+        self.min_dwell = min_dwell
+        self.max_duty = max_duty
+
+        self.duty = None        # 最近一次写入的占空比
+        self.temp = None        # 最近一次写入时的温度
+        self.written_at = None  # 最近一次写入的时间（单调时钟秒）
+        self.issued = 0
+        self.suppressed = 0
+
+    def reset(self):
+        self.duty = None
+        self.temp = None
+        self.written_at = None
+
+    def reset_counters(self):
+        self.issued = 0
+        self.suppressed = 0
+
+    @property
+    def saved_ratio(self) -> float:
+        """被抑制的比例（0..1）"""
+        total = self.issued + self.suppressed
+        return self.suppressed / total if total else 0.0
+
+    def update(self, temp, target: int, now: float):
+        """temp 可以为 None（目标不直接来自温度时），此时不做温度迟滞判断"""
+        if target == self.duty:
+            # 与已写入值相同：原本就不会写，不计入 suppressed
+            return None
+        if self.duty is None or self._passes(temp, target, now):
+            self.duty = target
+            self.temp = temp
+            self.written_at = now
+            self.issued += 1
+            return target
+        self.suppressed += 1
+        return None
+
+    def _passes(self, temp, target, now) -> bool:
+        delta = target - self.duty
+        if delta > 0:
+            if target >= self.max_duty:
+                return True
+            if delta <= self.deadband:
+                return False
+            return temp is None or self.temp is None or temp >= self.temp + self.hyst_up
+
+        if -delta <= self.deadband:
+            return False
+        if now - self.written_at < self.min_dwell:
+            return False
+        return temp is None or self.temp is None or temp <= self.temp - self.hyst_down
+
+
+# ---------- 控制策略 ----------
+
+CONTROLLER_KINDS = ("curve", "pid")
+
+# PID 默认参数（按 bench/thermal_plant.py 的模型整定）
+DEFAULT_PID_SETPOINT = 70.0   # °C
+DEFAULT_PID_KP = 6.0          # %/°C
+DEFAULT_PID_KI = 0.1          # %/(°C·s)
+DEFAULT_PID_KD = 0.0          # %/(°C/s)
+DEFAULT_FF_SLOPE = 15.0       # 温度上升 1°C/s 额外加多少 %
+DEFAULT_FF_LOAD = 0.0         # CPU 满载额外加多少 %
+
+
+class Controller:
+    """
+    控制策略接口：update(temp, now, load) 返回目标占空比（%）。
+    now 为单调时钟秒数；load 为 CPU 占用率 0..1，没有时为 None。
+    """
+
+    name = "base"
+    # 输出是否是温度的单调函数（是则 DutyFilter 做温度迟滞判断）
+    follows_temp = True
+    # 是否用到 CPU 占用率（用不到时调用方不必采集）
+    uses_load = False
+
+    def update(self, temp: float, now: float, load=None) -> int:
+        raise NotImplementedError
+
+    def reset(self):
+        pass
+
+    def breakpoints(self):
+        """温度关键点，自适应采样在这些点附近加密"""
+        return ()
+
+    def describe(self) -> str:
+        return self.name
+
+
+class CurveController(Controller):
+    """分段线性曲线：无状态，直接查表"""
+
+    name = "curve"
+
+    def __init__(self, curve):
+        self.curve = curve
+
+    def update(self, temp, now, load=None):
+        return self.curve.lookup(temp)
+
+    def breakpoints(self):
+        return self.curve.temps
+
+    def describe(self) -> str:
+        return f"曲线 {[(t, p) for t, p in self.curve.points]}"
+
+
+class PidController(Controller):
+    """
+    跟踪目标温度的 PID（温度高于目标 → 提高占空比）：
+
+        u = min_duty + Kp·e + I + Kd·s + Kff·max(s, 0) + Kload·load
+
+    e = 温度 - 目标，s 为 EWMA 平滑后的温度斜率（°C/s），微分项作用于测量值而非误差，
+    改目标温度时不会跳变。输出已饱和且误差继续往饱和方向推时不再积分（抗积分饱和）。
+    斜率前馈只在升温时起作用：负载突增时风扇先转起来，不必等温度冲到峰值。
+    """
+
+    name = "pid"
+    follows_temp = False
+
+    def __init__(
+        self,
+        setpoint=DEFAULT_PID_SETPOINT,
+        kp=DEFAULT_PID_KP,
+        ki=DEFAULT_PID_KI,
+        kd=DEFAULT_PID_KD,
+        ff_slope=DEFAULT_FF_SLOPE,
+        ff_load=DEFAULT_FF_LOAD,
+        min_duty=20,
+        max_duty=100,
+        slope_alpha=0.3,
+    ):
+        if not 0 <= min_duty < max_duty <= 100:
+            raise ValueError("PID 占空比范围需满足 0 <= min_duty < max_duty <= 100")
+        self.setpoint = setpoint
+        self.kp = kp
+        self.ki = ki
+        self.kd = kd
+        self.ff_slope = ff_slope
+        self.ff_load = ff_load
+        self.min_duty = min_duty
+        self.max_duty = max_duty
+        self.slope_alpha = slope_alpha
+        self.reset()
+
+    @property
+    def uses_load(self) -> bool:
+        return self.ff_load != 0.0
+
+    def reset(self):
+        self.integral = 0.0
+        self.slope = 0.0
+        self.last_t = None
+        self.last_temp = None
+        self.output = None
+
+    def update(self, temp, now, load=None):
+        dt = 0.0
+        if self.last_t is not None and now > self.last_t:
+            dt = now - self.last_t
+            slope = (temp - self.last_temp) / dt
+            self.slope += self.slope_alpha * (slope - self.slope)
+        self.last_t = now
+        self.last_temp = temp
+
+        error = temp - self.setpoint
+        base = self.min_duty + self.kp * error + self.kd * self.slope
+        if self.slope > 0:
+            base += self.ff_slope * self.slope
+        if load is not None:
+            base += self.ff_load * load
+
+        integral = self.integral + self.ki * error * dt
+        u = base + integral
+        if not ((u > self.max_duty and error > 0) or (u < self.min_duty and error < 0)):
+            self.integral = integral
+        u = base + self.integral
+
+        self.output = int(round(max(self.min_duty, min(self.max_duty, u))))
+        return self.output
+
+    def breakpoints(self):
+        return (self.setpoint,)
+
+    def describe(self) -> str:
+        return (
+            f"PID 目标 {self.setpoint:g} °C（Kp {self.kp:g}，Ki {self.ki:g}，Kd {self.kd:g}，"
+            f"斜率前馈 {self.ff_slope:g}，负载前馈 {self.ff_load:g}）"
+        )
+
+
+# ---------- 读取失败时的退路 ----------
+
+DEFAULT_FAILSAFE_DUTY = 100     # %
+DEFAULT_FAILSAFE_AFTER = 10.0   # 秒，CPU 温度连续读不到这么久、又没有 BMC 温度时写失效保护占空比
+DEFAULT_FALLBACK_MAX_AGE = 30.0  # 秒，BMC 温度读数超过这么久不再使用
+
+
+class SensorFallback:
+    """
+    CPU 温度（主温度源）读不到时选择退路，每次失败的采样调用一次 fail()：
+
+    - 有不超过 max_age 秒的 BMC CPU 温度："bmc"，照常用它计算占空比
+    - 否则失败已持续 failsafe_after 秒："failsafe"，直接写 failsafe_duty
+    - 否则 (None, None)：保持当前占空比
+
+    主温度源恢复时调用 recovered()，返回这次中断的秒数。
+    state 为当前退路（None / "bmc" / "failsafe"），调用方据此只在切换时记日志。
+    """
+
+    def __init__(
+        self,
+        failsafe_duty=DEFAULT_FAILSAFE_DUTY,
+        failsafe_after=DEFAULT_FAILSAFE_AFTER,
+        max_age=DEFAULT_FALLBACK_MAX_AGE,
+    ):
+        if not 0 <= failsafe_duty <= 100:
+            raise ValueError("失效保护占空比必须在 0..100 之间")
+        if failsafe_after < 0 or max_age < 0:
+            raise ValueError("退路参数不能为负数")
+        self.failsafe_duty = int(failsafe_duty)
+        self.failsafe_after = failsafe_after
+        self.max_age = max_age
+        self.failed_since = None
+        self.state = None
+        self.engaged = {"bmc": 0, "failsafe": 0}   # 进入各退路的次数
+
+    def fail(self, now: float, bmc_temp=None, bmc_age=None):
+        """返回 (退路, 值)：("bmc", 温度) / ("failsafe", 占空比) / (None, None)"""
+        if self.failed_since is None:
+            self.failed_since = now
+        if bmc_temp is not None and bmc_age is not None and bmc_age <= self.max_age:
+            kind, value = "bmc", bmc_temp
+        elif now - self.failed_since >= self.failsafe_after:
+            kind, value = "failsafe", self.failsafe_duty
+        else:
+            kind, value = None, None
+        if kind is not None and kind != self.state:
+            self.engaged[kind] += 1
+        self.state = kind
+        return kind, value
+
+    def recovered(self, now: float):
+        """主温度源读到了：返回中断的秒数，没有中断时为 None"""
+        if self.failed_since is None:
+            return None
+        outage = now - self.failed_since
+        self.failed_since = None
+        self.state = None
+        return outage
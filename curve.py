@@ -0,0 +1,108 @@
+"""
+风扇曲线：N 个 (温度 °C, 占空比 %) 控制点，点与点之间线性插值。
+
+曲线在构造时编译成 0.1°C 分辨率的占空比表，之后每次查表是 O(1)；
+控制点变化时重新构造一个 FanCurve 即可（对象本身不可变）。
+"""
+
+import bisect
+import math
+from array import array
+
+
+DEFAULT_CURVE_POINTS = [(50, 20), (65, 30), (75, 60), (80, 100)]
+
+
+def _numpy():
+    try:
+        import numpy
+    except ImportError:  # 没有 numpy 时批量求值退回逐个查表
+        return None
+    return numpy
+
+
+def interpolate(points, temp_c: float) -> int:
+    """
+    直接按控制点插值（不查表），points 必须已按温度排序。
+    两点温度相同时取较大的占空比。
+    """
+    if temp_c <= points[0][0]:
+        return points[0][1]
+    if temp_c >= points[-1][0]:
+        return points[-1][1]
+
+    temps = [p[0] for p in points]
+    i = max(1, bisect.bisect_left(temps, temp_c))
+    (t1, p1), (t2, p2) = points[i - 1], points[i]
+    if t2 == t1:
+        return max(p1, p2)
+    frac = (temp_c - t1) / (t2 - t1)
+    return int(round(p1 + frac * (p2 - p1)))
+
+
+class FanCurve:
+    """编译好的风扇曲线"""
+
+    def __init__(self, points, step=0.1):
+        if not points:
+            raise ValueError("风扇曲线至少需要一个控制点")
+        self.points = sorted(((float(t), int(p)) for t, p in points), key=lambda x: x[0])
+        for t, p in self.points:
+            if not math.isfinite(t):
+                raise ValueError(f"控制点温度无效：{t}")
+            if not 0 <= p <= 100:
+                raise ValueError(f"控制点占空比超出 0..100：{p}")
+        self.step = step
+        self.scale = 1.0 / step
+
+        self.t_min = self.points[0][0]
+        self.t_max = self.points[-1][0]
+        self.low_duty = self.points[0][1]
+        self.high_duty = self.points[-1][1]
+
+        count = int(round((self.t_max - self.t_min) * self.scale)) + 1
+        base = self.t_min * self.scale
+        self.table = array(
+            "B",
+            (interpolate(self.points, (base + i) / self.scale) for i in range(count)),
+        )
+        self.table[-1] = self.high_duty
+        self._np_table = None
+
+    def __eq__(self, other):
+        return isinstance(other, FanCurve) and self.points == other.points and self.step == other.step
+
+    def __repr__(self):
+        return f"FanCurve({[(t, p) for t, p in self.points]})"
+
+    @property
+    def temps(self):
+        return [p[0] for p in self.points]
+
+    def lookup(self, temp_c: float) -> int:
+        """温度 → 占空比（%），温度按 step 四舍五入"""
+        if temp_c <= self.t_min:
+            return self.low_duty
+        if temp_c >= self.t_max:
+            return self.high_duty
+        return self.table[int((temp_c - self.t_min) * self.scale + 0.5)]
+
+    __call__ = lookup
+
+    def evaluate_many(self, temps):
+        """
+        批量求值。有 numpy 时传入数组得到 uint8 数组（全程向量化），
+        否则返回 array('B')。numpy 在第一次批量求值时才导入，不拖慢启动。
+        """
+        np = _numpy()
+        if np is not None:
+            if self._np_table is None:
+                self._np_table = np.frombuffer(self.table, dtype=np.uint8)
+            t = np.asarray(temps, dtype=np.float64)
+            # 与 lookup() 一样四舍五入（np.rint 是银行家舍入，x.x5 °C 会差 1%）
+            idx = np.floor((t - self.t_min) * self.scale + 0.5)
+            np.clip(idx, 0, len(self.table) - 1, out=idx)
+            return self._np_table[idx.astype(np.intp)]
+
+        lookup = self.lookup
+        return array("B", map(lookup, temps))
@@ -0,0 +1,628 @@
+"""
+无界面控制循环：温度读取 → 风扇曲线 → 写入占空比。
+
+不导入 Qt，供 fanctl.py（服务器 / 计划任务 / 脚本）使用；
+读取后端、曲线、IPMI 通道和自适应采样都与 GUI 共用同一套模块。
+"""
+
+import json
+import os
+import queue
+import threading
+import time
+
+from applog import WRITE_SUMMARY_INTERVAL, WriteSummary
+from control import (
+    CONTROLLER_KINDS,
+    DEFAULT_DEADBAND,
+    DEFAULT_FAILSAFE_AFTER,
+    DEFAULT_FAILSAFE_DUTY,
+    DEFAULT_FALLBACK_MAX_AGE,
+    DEFAULT_FF_LOAD,
+    DEFAULT_FF_SLOPE,
+    DEFAULT_HYST_DOWN,
+    DEFAULT_HYST_UP,
+    DEFAULT_MIN_DWELL,
+    DEFAULT_PID_KD,
+    DEFAULT_PID_KI,
+    DEFAULT_PID_KP,
+    DEFAULT_PID_SETPOINT,
+    CurveController,
+    DutyFilter,
+    PidController,
+    SensorFallback,
+)
+from curve import DEFAULT_CURVE_POINTS, FanCurve
+from ipmi import BMC_AUTO_FAN_MODE, IpmiError, fan_duty_command, fan_mode_command, TRANSPORT_KINDS
+from metrics import METRICS_HOST, METRICS_JSON_INTERVAL
+from scheduler import MAX_INTERVAL, MIN_INTERVAL, AdaptiveInterval, DeadlineSchedule
+from sensors import HWMON_ROOT, LHM_HTTP_URL, READ_TIMEOUT, READER_KINDS, CpuLoad
+from zones import CPU_SENSOR, build_zone_map
+
+
+# ControlLoop 的控制方式：按策略自动控制 / 固定的手动占空比 / 交还 BMC（不写入）
+CONTROL_AUTO = "auto"
+CONTROL_MANUAL = "manual"
+CONTROL_BMC = "bmc"
+CONTROL_MODES = (CONTROL_AUTO, CONTROL_MANUAL, CONTROL_BMC)
+
+DEFAULT_CONFIG = {
+    "transport": "auto",
+    "sensors": "auto",
+    "hwmon_root": HWMON_ROOT,
+    "lhm_url": LHM_HTTP_URL,   # sensors 为 lhm-http 时的 data.json 地址
+    "host": None,
+    "port": 623,
+    "user": "ADMIN",
+    "password": None,       # None：取环境变量 IPMI_PASSWORD
+    "controller": "curve",
+    "curve": [list(p) for p in DEFAULT_CURVE_POINTS],
+    "pid": {},
+    "zones": [0, 1],
+    "zone_map": None,       # 多风扇区映射（见 zones.py）；给出时忽略 controller / zones
+    "poll_min": MIN_INTERVAL,
+    "poll_max": MAX_INTERVAL,
+    "deadband": DEFAULT_DEADBAND,
+    "hyst_up": DEFAULT_HYST_UP,
+    "hyst_down": DEFAULT_HYST_DOWN,
+    "min_dwell": DEFAULT_MIN_DWELL,
+    "restore_auto_on_exit": True,
+    "metrics_host": METRICS_HOST,
+    "metrics_port": None,   # 给出时在该端口提供 /metrics（Prometheus 文本格式）
+    "metrics_json": None,   # 给出时每 metrics_interval 秒把指标写成 JSON
+    "metrics_interval": METRICS_JSON_INTERVAL,
+    "record_trace": None,   # 给出时把温度采样流录制成轨迹文件（见 replay.py）
+    "service_listen": None,       # 给出时（如 "127.0.0.1:9843"）作为控制服务，供 GUI / watch 连接（见 service.py）
+    "service_token_file": None,   # 控制令牌文件；null 为数据目录下的 service.token
+    "read_timeout": READ_TIMEOUT,   # 单次温度读取的时限（秒）；0 或 null 为不限时
+    "fallback_bmc": True,   # CPU 温度读不到时改用 BMC 的 CPU 温度（IPMICFG 通道除外）
+    "failsafe_duty": DEFAULT_FAILSAFE_DUTY,
+    "failsafe_after": DEFAULT_FAILSAFE_AFTER,   # CPU 温度读不到、又没有 BMC 温度这么久后写 failsafe_duty
+}
+
+# zone_map 用到 BMC 传感器时，两次 BMC 快照之间的间隔（秒）
+BMC_SNAPSHOT_INTERVAL = 10.0
+
+# "pid" 一节的缺省值
+DEFAULT_PID_CONFIG = {
+    "setpoint": DEFAULT_PID_SETPOINT,
+    "kp": DEFAULT_PID_KP,
+    "ki": DEFAULT_PID_KI,
+    "kd": DEFAULT_PID_KD,
+    "ff_slope": DEFAULT_FF_SLOPE,
+    "ff_load": DEFAULT_FF_LOAD,
+    "min_duty": 20,
+    "max_duty": 100,
+}
+
+
+def load_config(path=None) -> dict:
+    """
+    读取 JSON 配置文件，缺省项取 DEFAULT_CONFIG。
+    未知的键、非法的通道 / 温度来源 / 曲线都会抛 ValueError。
+    """
+    config = dict(DEFAULT_CONFIG)
+    if path:
+        with open(path, "r", encoding="utf-8") as f:
+            doc = json.load(f)
+        if not isinstance(doc, dict):
+            raise ValueError(f"配置文件顶层必须是对象：{path}")
+        unknown = sorted(set(doc) - set(DEFAULT_CONFIG))
+        if unknown:
+            raise ValueError(f"配置文件中有未知的键：{', '.join(unknown)}")
+        config.update(doc)
+
+    if config["password"] is None:
+        config["password"] = os.environ.get("IPMI_PASSWORD", "")
+    if config["transport"] not in TRANSPORT_KINDS:
+        raise ValueError(f"未知的 IPMI 通道：{config['transport']}")
+    if config["sensors"] not in READER_KINDS:
+        raise ValueError(f"未知的温度读取后端：{config['sensors']}")
+    if config["controller"] not in CONTROLLER_KINDS:
+        raise ValueError(f"未知的控制方式：{config['controller']}")
+    unknown = sorted(set(config["pid"]) - set(DEFAULT_PID_CONFIG))
+    if unknown:
+        raise ValueError(f"pid 配置中有未知的键：{', '.join(unknown)}")
+    try:
+        config["curve"] = [(float(t), int(p)) for t, p in config["curve"]]
+        config["zones"] = [int(z) for z in config["zones"]]
+        pid = dict(DEFAULT_PID_CONFIG, **config["pid"])
+        config["pid"] = {k: type(DEFAULT_PID_CONFIG[k])(v) for k, v in pid.items()}
+    except (TypeError, ValueError) as e:
+        raise ValueError(f"曲线、风扇区或 PID 参数格式错误：{e}") from e
+    FanCurve(config["curve"])  # 空曲线在这里报错
+    if config["metrics_port"] is not None and not 0 <= int(config["metrics_port"]) <= 0xFFFF:
+        raise ValueError(f"指标端口超出范围：{config['metrics_port']}")
+    if config["metrics_interval"] <= 0:
+        raise ValueError("metrics_interval 必须为正数")
+    if not 0 < config["poll_min"] <= config["poll_max"]:
+        raise ValueError("采样间隔需满足 0 < poll_min <= poll_max")
+    config["read_timeout"] = normalize_read_timeout(config["read_timeout"])
+    build_duty_filter(config)  # 参数非法时在这里报错
+    build_fallback(config)
+    build_controller(config)
+    if config["zone_map"] is not None:
+        config["zones"] = list(build_zone_map_from_config(config).zones)
+    return config
+
+
+def normalize_read_timeout(value):
+    """读取时限：0 和 None 都表示不限时（返回 None），负数报错"""
+    if value is not None and value < 0:
+        raise ValueError("read_timeout 不能为负数（0 或 null 为不限时）")
+    return value or None
+
+
+def build_controller(config):
+    if config["controller"] == "pid":
+        return PidController(**config["pid"])
+    return CurveController(FanCurve(config["curve"]))
+
+
+def build_duty_filter(config) -> DutyFilter:
+    return DutyFilter(
+        config["deadband"], config["hyst_up"], config["hyst_down"], config["min_dwell"]
+    )
+
+
+def build_fallback(config) -> SensorFallback:
+    return SensorFallback(config["failsafe_duty"], config["failsafe_after"], DEFAULT_FALLBACK_MAX_AGE)
+
+
+def build_zone_map_from_config(config):
+    """config["zone_map"] → ZoneMap；没有配置时返回 None"""
+    if config["zone_map"] is None:
+        return None
+    return build_zone_map(config["zone_map"], config["curve"], lambda: build_duty_filter(config))
+
+
+def set_duty(transport, zones, percent):
+    """把若干风扇区设成同一占空比"""
+    for zone in zones:
+        transport.raw(*fan_duty_command(zone, percent))
+
+
+def restore_bmc_auto(transport):
+    transport.raw(*fan_mode_command(BMC_AUTO_FAN_MODE))
+
+
+class ControlLoop:
+    """
+    温度 → 控制策略 → 占空比的闭环，在调用 run() 的线程里执行。
+
+    reader / transport 由调用方创建（reader 必须属于当前线程）；
+    策略输出先经过 DutyFilter（死区 / 迟滞 / 最短停留），通过后只写占空比有变化的风扇区，
+    写入失败的区下次采样重写。逐条写入只交给 debug_log，log 上定期输出一行汇总。
+
+    给出 zone_map 时改为多风扇区映射（忽略 controller / zones / duty_filter）：
+    每次采样把 CPU 温度、读取后端的其它传感器和最近一次 BMC 快照（bmc_sensors，
+    每 bmc_interval 秒读一次）拼成一份 {名称: 温度}，一次算完所有风扇区。
+
+    给出 fan_state（ipmi.FanState）时，不知道某个风扇区当前占空比（刚启动、写入失败后）
+    先问 BMC，BMC 在 Full 模式且已经是这个值就不写。
+
+    给出 fallback（control.SensorFallback）时，CPU 温度读取失败 / 超时的采样
+    改用 BMC 快照里的 CPU 温度（bmc_sensors，没有时用 fallback_bmc，只在这时才读），
+    都没有时所有风扇区写失效保护占空比。
+
+    其它线程（控制服务）通过 submit() 改控制方式 / 曲线 / 手动占空比，
+    命令在采样间隙于本线程执行，不与采样并发写 BMC；
+    add_listener() 注册的回调在每次采样后于本线程调用。
+    """
+
+    def __init__(
+        self,
+        reader,
+        transport,
+        controller,
+        zones=(0, 1),
+        sampler=None,
+        duty_filter=None,
+        log=None,
+        debug_log=None,
+        summary_interval=WRITE_SUMMARY_INTERVAL,
+        zone_map=None,
+        bmc_sensors=None,
+        bmc_interval=BMC_SNAPSHOT_INTERVAL,
+        clock=time.monotonic,
+        metrics=None,
+        recorder=None,
+        fallback=None,
+        fallback_bmc=None,
+        fan_state=None,
+    ):
+        self.reader = reader
+        self.transport = transport
+        self.controller = controller
+        self.zone_map = zone_map
+        self.clock = clock   # 单调时钟；基准测试可换成模拟时钟
+        self.recorder = recorder   # replay.TraceRecorder：录制采样流
+        self.sampler = sampler or AdaptiveInterval()
+        self.duty_filter = duty_filter or DutyFilter()
+        if zone_map is not None:
+            self.zones = zone_map.zones
+            self.sampler.set_breakpoints(zone_map.breakpoints())
+            uses_load = any(s.controller.uses_load for s in zone_map.specs)
+            reader.watch(zone_map.sensor_names())
+        else:
+            self.zones = tuple(zones)
+            self.sampler.set_breakpoints(controller.breakpoints())
+            uses_load = controller.uses_load
+        self.cpu_load = CpuLoad() if uses_load else None
+        self.bmc_sensors = bmc_sensors
+        self.bmc_interval = bmc_interval
+        self.bmc_temps = {}
+        self.bmc_cpu_temp = None
+        self.bmc_at = None      # 最近一次 BMC 快照的时间（clock）
+        self.next_bmc = 0.0
+        self.fallback = fallback
+        self.fallback_bmc = fallback_bmc
+        self.fan_state = fan_state
+        self.log = log
+        # 逐条写入记录走 debug_log；log 上每 summary_interval 秒只出一行汇总
+        self.debug_log = debug_log
+        self.write_summary = WriteSummary(summary_interval)
+        self.stop_event = threading.Event()
+        self.wakeup = threading.Event()
+        self.commands = queue.SimpleQueue()   # (fn, done)，见 submit()
+        self.listeners = []
+        self.control = CONTROL_AUTO
+        self.manual = {}        # zone → 手动占空比（CONTROL_MANUAL）
+        # 最近一次采样，供 listeners 读取
+        self.last_temps = None
+        self.last_read_s = 0.0
+        self.last_target = None
+        # 下一次截止 = 上一次截止 + 间隔，读取 / 写入的耗时不会累积成漂移
+        self.schedule = DeadlineSchedule(clock)
+
+        self.last_duty = {}     # zone → 最近一次成功写入（或从 BMC 读到）的占空比
+        self.failed_zones = set()
+        self.samples = 0
+        self.read_errors = 0
+        self.writes = 0
+        self.write_errors = 0
+
+        # 运行指标（metrics.Metrics）：采样路径上只做计时和计数，抑制次数在抓取时读取
+        self.metrics = metrics
+        if metrics is not None:
+            metrics.set_info("x11fan_sensor_backend_info", backend=reader.name)
+            metrics.set_info("x11fan_ipmi_transport_info", transport=transport.name)
+            metrics.add_collector(self.collect_metrics)
+            if hasattr(reader, "collect_metrics"):
+                metrics.add_collector(reader.collect_metrics)
+
+    def logmsg(self, msg: str):
+        if self.log is not None:
+            self.log(msg)
+
+    def flush_summary(self, force=False):
+        summary = self.write_summary.summarize(force=force)
+        if summary:
+            self.logmsg(summary)
+
+    def stop(self):
+        """可以从其它线程或信号处理函数调用"""
+        self.stop_event.set()
+        self.wakeup.set()
+
+    def add_listener(self, fn):
+        """fn(loop) 在每次采样后于控制线程调用；不能阻塞"""
+        self.listeners.append(fn)
+
+    def submit(self, fn, done=None):
+        """
+        可以从任何线程调用：fn(loop) 在控制线程的采样间隙执行，
+        完成后调用 done(ok, 说明)（同样在控制线程里）
+        """
+        self.commands.put((fn, done))
+        self.wakeup.set()
+
+    def run_commands(self):
+        while True:
+            try:
+                fn, done = self.commands.get_nowait()
+            except queue.Empty:
+                return
+            try:
+                message = fn(self) or ""
+                ok = True
+            except (ValueError, IpmiError) as e:
+                message = str(e)
+                ok = False
+            if done is not None:
+                done(ok, message)
+
+    # ----- 命令（在控制线程里执行） -----
+
+    def set_auto(self):
+        """回到按策略自动控制；下一次采样无条件按策略写入"""
+        self.control = CONTROL_AUTO
+        self.manual.clear()
+        if self.zone_map is not None:
+            self.zone_map.reset()
+        else:
+            self.duty_filter.reset()
+        self.logmsg("切换到自动控制")
+        return "自动控制"
+
+    def set_manual(self, zone, duty):
+        """zone 固定为 duty（其它风扇区保持当前值），暂停自动控制"""
+        if zone not in self.zones:
+            raise ValueError(f"没有风扇区 {zone}（{', '.join(map(str, self.zones))}）")
+        duty = max(0, min(100, int(duty)))
+        if self.control != CONTROL_MANUAL:
+            self.logmsg("切换到手动控制")
+        self.control = CONTROL_MANUAL
+        self.manual[zone] = duty
+        if self.current_duty(zone) != duty and not self.write_zone(zone, duty, None, "手动"):
+            raise ValueError(f"写入 zone={zone} 失败，下次采样重试")
+        return f"zone {zone} → {duty}%"
+
+    def release_to_bmc(self):
+        """恢复 BMC 自动风扇模式，之后不再写入，直到 set_auto() / set_manual()"""
+        restore_bmc_auto(self.transport)
+        self.control = CONTROL_BMC
+        self.manual.clear()
+        # BMC 接管后占空比由它决定
+        self.last_duty.clear()
+        if self.fan_state is not None:
+            self.fan_state.invalidate()
+        self.logmsg("已恢复 BMC 自动风扇模式")
+        return "BMC 自动风扇模式"
+
+    def set_curve(self, points):
+        """换成新的风扇曲线（单曲线模式）；下一次采样按新曲线写入。曲线没有变化时什么也不做"""
+        if self.zone_map is not None:
+            raise ValueError("使用多风扇区映射时不能修改曲线")
+        curve = FanCurve(points)
+        if isinstance(self.controller, CurveController) and self.controller.curve == curve:
+            return self.controller.describe()
+        controller = CurveController(curve)
+        self.controller = controller
+        self.sampler.set_breakpoints(controller.breakpoints())
+        self.duty_filter.reset()
+        self.logmsg(f"控制方式：{controller.describe()}")
+        return controller.describe()
+
+    @property
+    def suppressed(self) -> int:
+        if self.zone_map is not None:
+            return self.zone_map.suppressed
+        return self.duty_filter.suppressed
+
+    def collect_metrics(self, metrics):
+        metrics.set_counter("x11fan_fan_writes_suppressed_total", self.suppressed)
+        metrics.set_counter("x11fan_sample_overruns_total", self.schedule.overruns)
+        if self.fallback is not None:
+            for kind, count in self.fallback.engaged.items():
+                metrics.set_counter("x11fan_sensor_fallbacks_total", count, kind=kind)
+
+    def write_zone(self, zone, duty, temp, source=None) -> bool:
+        metrics = self.metrics
+        if metrics is not None and zone in self.failed_zones:
+            metrics.inc("x11fan_fan_write_retries_total", zone=zone)
+        start = time.perf_counter()
+        try:
+            self.transport.raw(*fan_duty_command(zone, duty))
+        except IpmiError as e:
+            if metrics is not None:
+                metrics.observe("x11fan_ipmi_command_seconds", time.perf_counter() - start)
+                metrics.inc("x11fan_ipmi_errors_total")
+            self.write_errors += 1
+            self.write_summary.record(zone, duty, ok=False)
+            self.last_duty.pop(zone, None)
+            self.failed_zones.add(zone)
+            if self.fan_state is not None:
+                self.fan_state.invalidate(zone)
+            self.logmsg(f"写入 zone={zone} 失败：{e}")
+            return False
+        if metrics is not None:
+            metrics.observe("x11fan_ipmi_command_seconds", time.perf_counter() - start)
+            metrics.inc("x11fan_fan_writes_total", zone=zone)
+            metrics.set("x11fan_zone_duty_percent", duty, zone=zone)
+            if temp is not None:
+                metrics.set("x11fan_zone_temperature_celsius", temp, zone=zone)
+        self.failed_zones.discard(zone)
+        self.writes += 1
+        self.last_duty[zone] = duty
+        if self.fan_state is not None:
+            self.fan_state.record_duty(zone, duty)
+        self.write_summary.record(zone, duty)
+        if self.debug_log is not None:
+            if source is None:
+                source = "失效保护" if temp is None else f"{temp:.1f} °C"
+            self.debug_log(f"{source} → zone={zone} {duty}%")
+        return True
+
+    def current_duty(self, zone):
+        """
+        zone 当前的占空比：最近一次成功写入的值；不知道时问 BMC（fan_state 缓存）。
+        BMC 不在 Full 模式时它自己在调速，读到的值不算数，返回 None（第一次必写）
+        """
+        duty = self.last_duty.get(zone)
+        if duty is None and self.fan_state is not None:
+            duty = self.fan_state.held_duty(zone)
+            if duty is not None:
+                self.last_duty[zone] = duty
+        return duty
+
+    def refresh_bmc(self, now):
+        """距上次 BMC 快照满 bmc_interval 秒时再读一次"""
+        sensors = self.bmc_sensors if self.bmc_sensors is not None else self.fallback_bmc
+        if sensors is None or now < self.next_bmc:
+            return
+        self.next_bmc = now + self.bmc_interval
+        try:
+            snapshot = sensors.snapshot()
+        except IpmiError as e:
+            self.logmsg(f"读取 BMC 传感器失败：{e}")
+            return
+        self.bmc_temps = snapshot.temperatures()
+        self.bmc_cpu_temp = snapshot.cpu_temperature()
+        self.bmc_at = now
+
+    def sensor_values(self, cpu_temp, now):
+        """本次采样的 {名称: 温度}：CPU 最大温度 + 读取后端的其它传感器 + BMC 快照"""
+        if self.bmc_sensors is not None:
+            self.refresh_bmc(now)
+        values = dict(self.bmc_temps)
+        values.update(self.reader.read_sensors())
+        values[CPU_SENSOR] = cpu_temp
+        return values
+
+    def step(self):
+        """采样并按需写入一次，返回 (温度, 目标占空比)；读取失败时两者为 None，
+        多风扇区时目标为 {zone: 目标占空比}
+        """
+        self.samples += 1
+        metrics = self.metrics
+        start = time.perf_counter()
+        try:
+            temps = self.reader.read_cpu_temps()
+        except Exception as e:
+            self.read_errors += 1
+            if metrics is not None:
+                metrics.inc("x11fan_sensor_read_errors_total")
+            self.logmsg(f"读取温度失败：{e}")
+            self.last_temps = None
+            temp = None
+        else:
+            self.last_temps = temps
+            temp = temps.max
+            if metrics is not None:
+                metrics.observe("x11fan_sensor_read_seconds", time.perf_counter() - start)
+                metrics.inc("x11fan_samples_total")
+                if temp is not None:
+                    metrics.set("x11fan_cpu_temperature_celsius", temp)
+
+        self.last_read_s = time.perf_counter() - start
+        self.last_target = None
+        if self.control != CONTROL_AUTO:
+            self.step_manual()
+            return temp, None
+
+        now = self.clock()
+        primary = temp is not None
+        if not primary:
+            if self.fallback is None:
+                return None, None
+            temp = self.fallback_temp(now)
+            if temp is None:
+                return None, None
+        elif self.fallback is not None:
+            outage = self.fallback.recovered(now)
+            if outage is not None:
+                if metrics is not None:
+                    metrics.set("x11fan_sensor_last_outage_seconds", outage)
+                self.logmsg(f"CPU 温度读取已恢复，中断 {outage:.1f} 秒")
+
+        load = self.cpu_load.read() if self.cpu_load is not None else None
+        if self.zone_map is not None:
+            return temp, self.step_zones(temp, now, load, record=primary)
+        if self.recorder is not None and primary:
+            self.recorder.record(time.time(), temp)
+
+        target = self.controller.update(temp, now, load)
+        self.last_target = target
+        if self.duty_filter.duty is None and all(self.current_duty(z) == target for z in self.zones):
+            # BMC 已经是这个值（刚启动时读回的状态）：不经过写入抑制，不计入写入，也不移动迟滞基准
+            return temp, target
+        duty = self.duty_filter.update(
+            temp if self.controller.follows_temp else None, target, now
+        )
+        if duty is None and len(self.last_duty) == len(self.zones):
+            return temp, target
+        if duty is None:
+            # 有风扇区上次写入失败：按已接受的占空比重写
+            duty = self.duty_filter.duty
+
+        for zone in self.zones:
+            if self.current_duty(zone) != duty:
+                self.write_zone(zone, duty, temp)
+        return temp, target
+
+    def step_manual(self):
+        """手动 / BMC 模式的采样：只重写上次没写成功的手动占空比"""
+        for zone, duty in self.manual.items():
+            if self.current_duty(zone) != duty:
+                self.write_zone(zone, duty, None, "手动")
+
+    def fallback_temp(self, now):
+        """
+        CPU 温度读不到的采样：返回可以代替它的 BMC CPU 温度；
+        没有时按 fallback 的判断写失效保护占空比（或保持不动），返回 None
+        """
+        self.refresh_bmc(now)
+        age = None if self.bmc_at is None else now - self.bmc_at
+        previous = self.fallback.state
+        kind, value = self.fallback.fail(now, self.bmc_cpu_temp, age)
+        if kind != previous:
+            if kind == "bmc":
+                self.logmsg(f"CPU 温度不可用，改用 BMC 的 CPU 温度（{value:.1f} °C）")
+            elif kind == "failsafe":
+                self.logmsg(f"CPU 温度持续不可用，所有风扇区写失效保护占空比 {value}%")
+        if kind == "bmc":
+            return value
+        if kind == "failsafe":
+            self.write_failsafe(value)
+        return None
+
+    def write_failsafe(self, duty):
+        """所有风扇区写 duty；写入抑制清零，CPU 温度恢复后的第一次采样按策略重写"""
+        for zone in self.zones:
+            if self.current_duty(zone) != duty:
+                self.write_zone(zone, duty, None)
+        if self.zone_map is not None:
+            for zone in self.zones:
+                self.zone_map.mark_failed(zone)
+        else:
+            self.duty_filter.reset()
+
+    def step_zones(self, cpu_temp, now, load, record=True):
+        """多风扇区：一次算完所有区，只写占空比有变化的区；返回 {zone: 目标占空比}"""
+        values = self.sensor_values(cpu_temp, now)
+        if self.recorder is not None and record:
+            self.recorder.record(time.time(), cpu_temp, values)
+        for zone, duty, temp in self.zone_map.update(values, now, load):
+            if self.current_duty(zone) == duty:
+                continue
+            if not self.write_zone(zone, duty, temp):
+                self.zone_map.mark_failed(zone)
+        if self.metrics is not None:
+            for spec in self.zone_map.specs:
+                if spec.temp is not None:
+                    self.metrics.set("x11fan_zone_temperature_celsius", spec.temp, zone=spec.zone)
+        self.last_target = {s.zone: s.target for s in self.zone_map.specs}
+        return self.last_target
+
+    def idle(self, wait):
+        """等 wait 秒到下一次采样；期间 submit() 的命令立即执行"""
+        end = self.clock() + wait
+        while not self.stop_event.is_set():
+            self.run_commands()
+            remaining = end - self.clock()
+            if remaining <= 0:
+                return
+            self.wakeup.wait(remaining)
+            self.wakeup.clear()
+
+    def run(self):
+        schedule = self.schedule
+        metrics = self.metrics
+        while not self.stop_event.is_set():
+            jitter = schedule.begin()
+            if metrics is not None:
+                metrics.observe("x11fan_sample_jitter_seconds", jitter)
+            temp, _target = self.step()
+            self.flush_summary()
+            interval = self.sampler.update(self.clock(), temp)
+            for fn in self.listeners:
+                fn(self)
+            wait = schedule.advance(interval)
+            report = schedule.overrun_report()
+            if report is not None:
+                count, behind = report
+                self.logmsg(
+                    f"采样超时 {count} 次：读取耗时超过采样间隔（最近一次落后 {behind * 1000.0:.0f} ms）"
+                )
+            self.idle(wait)
@@ -0,0 +1,599 @@
+"""
+X11 Fan Master 命令行 / 无界面守护进程（不导入 Qt）
+
+    python fanctl.py run --config fan.json      # 常驻：按曲线自动控制风扇
+    python fanctl.py run --listen 127.0.0.1:9843
+                                                # 同时作为控制服务，GUI 用 main.py --connect 连接
+    python fanctl.py watch [--json]             # 只读查看控制服务的遥测和日志
+    python fanctl.py read-temp [--json]         # 读一次 CPU 温度
+    python fanctl.py set-duty 40 [--zone 0 ...] # 手动设置占空比
+    python fanctl.py reset-auto                 # 恢复 BMC 自动风扇模式
+    python fanctl.py fan-state [--json]         # 读 BMC 当前的风扇模式和各区占空比
+    python fanctl.py fleet --config fleet.json  # 通过 IPMI over LAN 同时控制多台 BMC
+    python fanctl.py replay week.x11t --curve 50:20,80:100 --curve 45:25,75:100
+                                                # 在录制的轨迹上比较候选曲线（不需要硬件）
+
+命令行参数覆盖配置文件里的同名项。
+"""
+
+import argparse
+import contextlib
+import json
+import logging
+import os
+import signal
+import sys
+import time
+
+import applog
+from control import CONTROLLER_KINDS, CurveController
+from curve import FanCurve
+from daemon import (
+    ControlLoop,
+    build_controller,
+    build_duty_filter,
+    build_fallback,
+    build_zone_map_from_config,
+    load_config,
+    normalize_read_timeout,
+    restore_bmc_auto,
+    set_duty,
+)
+from fleet import Fleet, build_fleet_hosts, load_fleet_config
+from ipmi import IpmiError, TRANSPORT_KINDS, FanState, describe_fan_mode, open_transport
+from metrics import JsonDumper, Metrics, MetricsServer
+from replay import (
+    DEFAULT_THRESHOLD,
+    TraceRecorder,
+    evaluate_curves,
+    export_timeline,
+    load_trace,
+    parse_curve,
+    replay,
+)
+from runtime import LhmSupervisor, find_ipmicfg, is_admin, user_data_dir
+from scheduler import AdaptiveInterval
+from sdr import BmcSensors
+from sensors import READER_KINDS, BoundedReader, open_sensor_reader, resolve_reader_kind
+from service import (
+    MSG_LOG,
+    MSG_STATE,
+    MSG_TELEMETRY,
+    MODE_LABELS,
+    SERVICE_ADDRESS,
+    ControlService,
+    ServiceClient,
+    create_token,
+    default_token_path,
+)
+
+
+def log(msg: str, level=logging.INFO):
+    applog.log.log(level, msg)
+
+
+def debug(msg: str):
+    applog.log.debug(msg)
+
+
+# 常驻子命令默认另写一份轮转日志文件
+DEFAULT_LOG_FILES = {"run": "fanctl.log", "fleet": "fleet.log"}
+
+
+def setup_logging(args):
+    """stdout 按 --log-level 输出；run / fleet 默认另写一份轮转日志文件"""
+    level = applog.parse_level(args.log_level)
+    log_file = args.log_file
+    if log_file is None and args.command in DEFAULT_LOG_FILES:
+        log_file = os.path.join(user_data_dir(), DEFAULT_LOG_FILES[args.command])
+    if log_file:
+        os.makedirs(os.path.dirname(os.path.abspath(log_file)), exist_ok=True)
+    applog.setup_logging(log_file, level)
+    applog.add_console(level)
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(prog="fanctl", description="X11 Fan Master（无界面）")
+    parser.add_argument("--config", help="JSON 配置文件（曲线、风扇区、通道等）")
+    parser.add_argument("--transport", choices=TRANSPORT_KINDS, help="IPMI 通道")
+    parser.add_argument("--sensors", choices=READER_KINDS, help="温度来源")
+    parser.add_argument("--hwmon-root", help="hwmon 目录（默认 /sys/class/hwmon）")
+    parser.add_argument("--lhm-url", help="LibreHardwareMonitor 的 data.json 地址（--sensors lhm-http）")
+    parser.add_argument("--host", help="BMC 地址（IPMI over LAN）")
+    parser.add_argument("--port", type=int)
+    parser.add_argument("--user")
+    parser.add_argument("--password", help="BMC 密码，默认取环境变量 IPMI_PASSWORD")
+    parser.add_argument("--log-file", help="日志文件（按大小轮转）；run 默认写到用户数据目录，传空字符串不写")
+    parser.add_argument(
+        "--log-level",
+        choices=applog.LOG_LEVELS,
+        default="info",
+        help="日志级别；debug 时逐条记录风扇写入",
+    )
+
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    run = sub.add_parser("run", help="常驻运行，按曲线自动控制风扇")
+    run.add_argument("--poll-min", type=float, help="最短采样间隔（秒）")
+    run.add_argument("--poll-max", type=float, help="最长采样间隔（秒）")
+    run.add_argument("--controller", choices=CONTROLLER_KINDS, help="控制方式：curve / pid")
+    run.add_argument("--setpoint", type=float, help="PID 目标温度（°C）")
+    run.add_argument("--metrics-port", type=int, help="在该端口提供 /metrics（Prometheus 文本格式）")
+    run.add_argument("--metrics-json", help="定期把指标写成 JSON 文件")
+    run.add_argument("--record-trace", help="把温度采样流录制成轨迹文件（.x11t，可追加）")
+    run.add_argument("--read-timeout", type=float, help="单次温度读取的时限（秒），0 为不限时")
+    run.add_argument("--failsafe-duty", type=int, help="CPU 温度持续不可用时写入的占空比（%%）")
+    run.add_argument(
+        "--listen",
+        dest="service_listen",
+        nargs="?",
+        const=SERVICE_ADDRESS,
+        help=f"作为控制服务监听（默认 {SERVICE_ADDRESS}；POSIX 上可用 unix:/路径）",
+    )
+    run.add_argument("--token-file", dest="service_token_file", help="控制令牌文件（默认数据目录下的 service.token）")
+
+    watch = sub.add_parser("watch", help="连接控制服务，只读查看遥测和日志")
+    watch.add_argument("address", nargs="?", help=f"控制服务地址（默认取配置文件 service_listen 或 {SERVICE_ADDRESS}）")
+    watch.add_argument("--count", type=int, help="收到这么多次遥测后退出")
+    watch.add_argument("--json", action="store_true", help="每次遥测输出一行 JSON")
+
+    read = sub.add_parser("read-temp", help="读取一次 CPU 温度")
+    read.add_argument("--json", action="store_true", help="输出 JSON")
+
+    duty = sub.add_parser("set-duty", help="设置风扇占空比（%%）")
+    duty.add_argument("percent", type=int)
+    duty.add_argument(
+        "--zone",
+        type=int,
+        action="append",
+        help="风扇区，可重复；默认取配置文件中的 zones",
+    )
+
+    sub.add_parser("reset-auto", help="恢复 BMC 自动风扇模式")
+
+    state = sub.add_parser("fan-state", help="读取 BMC 当前的风扇模式和各风扇区占空比")
+    state.add_argument("--json", action="store_true", help="输出 JSON")
+
+    fleet = sub.add_parser("fleet", help="通过 IPMI over LAN 同时控制多台 BMC（--config 给出 fleet 配置）")
+    fleet.add_argument("--workers", type=int, help="工作线程数（同时进行的主机数上限）")
+    fleet.add_argument("--duration", type=float, help="运行指定秒数后退出（默认一直运行）")
+    fleet.add_argument("--metrics-port", type=int, help="在该端口提供 /metrics（Prometheus 文本格式）")
+
+    rp = sub.add_parser("replay", help="在录制的温度轨迹上回放 / 比较风扇曲线（不需要硬件）")
+    rp.add_argument("trace", help="轨迹文件：--record-trace 录制的 .x11t，或 CSV（每行：秒, 温度）")
+    rp.add_argument(
+        "--curve",
+        action="append",
+        help="候选曲线 温度:占空比,温度:占空比,...，可重复；默认取配置文件中的 curve",
+    )
+    rp.add_argument("--curves", help="候选曲线 JSON 文件：{名称: [[温度, 占空比], ...]}")
+    rp.add_argument("--pid", action="store_true", help="同时回放配置文件中的 PID 参数")
+    rp.add_argument("--sensor", default="cpu", help="用哪一列温度（默认 cpu）")
+    rp.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD, help="统计高温时长的阈值（°C）")
+    rp.add_argument("--no-filter", action="store_true", help="不做写入抑制（目标一变就写）")
+    rp.add_argument("--timeline", help="把各候选的占空比时间线写成 CSV")
+    rp.add_argument("--json", action="store_true", help="输出 JSON")
+    return parser.parse_args(argv)
+
+
+def build_config(args) -> dict:
+    config = load_config(args.config)
+    for key in ("transport", "sensors", "hwmon_root", "lhm_url", "host", "port", "user", "password"):
+        value = getattr(args, key)
+        if value is not None:
+            config[key] = value
+    for key in (
+        "poll_min", "poll_max", "controller", "metrics_port", "metrics_json", "record_trace",
+        "read_timeout", "failsafe_duty", "service_listen", "service_token_file",
+    ):
+        value = getattr(args, key, None)
+        if value is not None:
+            config[key] = value
+    if getattr(args, "setpoint", None) is not None:
+        config["pid"]["setpoint"] = args.setpoint
+    config["poll_max"] = max(config["poll_min"], config["poll_max"])
+    config["read_timeout"] = normalize_read_timeout(config["read_timeout"])
+    return config
+
+
+def open_config_transport(config):
+    try:
+        ipmi_exe = find_ipmicfg()
+    except FileNotFoundError:
+        ipmi_exe = None
+    return open_transport(
+        config["transport"],
+        ipmi_exe=ipmi_exe,
+        host=config["host"],
+        user=config["user"],
+        password=config["password"],
+        port=config["port"],
+        log=log,
+    )
+
+
+def open_config_reader(config, quiet=False):
+    kind = resolve_reader_kind(config["sensors"])
+    supervisor = None
+    if kind == "lhm":
+        supervisor = LhmSupervisor(log=None if quiet else log)
+    try:
+        if supervisor is not None:
+            supervisor.start()
+        return open_sensor_reader(
+            kind, config["hwmon_root"], lhm_supervisor=supervisor, lhm_url=config["lhm_url"]
+        )
+    except Exception:
+        if supervisor is not None:
+            supervisor.close()
+        raise
+
+
+def open_run_reader(config):
+    """run 用的读取后端：给出 read_timeout 时放进限时读取线程"""
+    if config["read_timeout"] is None:
+        return open_config_reader(config)
+    return BoundedReader(lambda: open_config_reader(config), config["read_timeout"], log=log)
+
+
+def open_fallback_bmc_sensors(config, transport):
+    """CPU 温度读不到时备用的 BMC 传感器（IPMICFG 通道下每个传感器都要启动一次进程，不用）"""
+    if not config["fallback_bmc"] or transport.name == "ipmicfg":
+        return None
+    return BmcSensors(transport, os.path.join(user_data_dir(), "sdr_cache.json"), log=log)
+
+
+def open_zone_bmc_sensors(zone_map, reader, transport):
+    """zone_map 用到读取后端没有的传感器时，从 BMC 读（IPMICFG 通道除外）"""
+    reader.watch(zone_map.sensor_names())
+    reader.read_cpu_temps()
+    missing = zone_map.sensor_names() - set(reader.read_sensors())
+    if not missing:
+        return None
+    if transport.name == "ipmicfg":
+        log(f"IPMICFG 通道下不读取 BMC 传感器，以下传感器不可用：{', '.join(sorted(missing))}", logging.WARNING)
+        return None
+    log(f"从 BMC 读取：{', '.join(sorted(missing))}")
+    return BmcSensors(transport, os.path.join(user_data_dir(), "sdr_cache.json"), log=log)
+
+
+# ---------- 子命令 ----------
+
+def cmd_read_temp(config, args):
+    with open_config_reader(config, quiet=args.json) as reader:
+        temps = reader.read_cpu_temps()
+    if args.json:
+        print(json.dumps({
+            "max": temps.max,
+            "sockets": [s._asdict() for s in temps.sockets],
+        }))
+    else:
+        print("CPU 最大温度：" + ("--.-" if temps.max is None else f"{temps.max:.1f}") + " °C")
+        for s in temps.sockets:
+            core = "--.-" if s.max_core is None else f"{s.max_core:.1f}"
+            package = "--.-" if s.package is None else f"{s.package:.1f}"
+            print(f"CPU{s.socket}：核心 {core} / 封装 {package} °C")
+    return 0 if temps.max is not None else 1
+
+
+def cmd_set_duty(config, args):
+    zones = args.zone or config["zones"]
+    with open_config_transport(config) as transport:
+        set_duty(transport, zones, args.percent)
+    print(f"zone {', '.join(map(str, zones))} → {max(0, min(100, args.percent))}%")
+    return 0
+
+
+def cmd_reset_auto(config, args):
+    with open_config_transport(config) as transport:
+        restore_bmc_auto(transport)
+    print("已恢复 BMC 自动风扇模式")
+    return 0
+
+
+def cmd_fan_state(config, args):
+    with open_config_transport(config) as transport:
+        state = FanState(transport, config["zones"])
+        mode = state.mode()
+        duties = state.duties()
+    if args.json:
+        print(json.dumps({
+            "mode": mode,
+            "mode_name": describe_fan_mode(mode),
+            "duties": {str(z): d for z, d in sorted(duties.items())},
+        }))
+    else:
+        print(f"风扇模式：{describe_fan_mode(mode)}")
+        for zone in config["zones"]:
+            duty = duties.get(zone)
+            print(f"zone {zone}：" + ("--" if duty is None else f"{duty}%"))
+    return 0 if mode is not None else 1
+
+
+def format_telemetry(t):
+    temp = "--.-" if t.temp is None else f"{t.temp:.1f}"
+    zones = "  ".join(
+        f"zone{z} " + ("--" if duty is None else f"{duty}%") + ("" if target is None else f"（目标 {target}%）")
+        for z, (duty, target) in sorted(t.zones.items())
+    )
+    mode = MODE_LABELS.get(t.mode, t.mode)
+    if t.fallback:
+        mode += f"，退路 {t.fallback}"
+    return (
+        f"{time.strftime('%H:%M:%S', time.localtime(t.time))}  CPU {temp} °C  {zones}  [{mode}]  "
+        f"读取 {t.read_ms:.1f} ms，间隔 {t.interval:.2f} s，写入 {t.writes}，抑制 {t.suppressed}"
+    )
+
+
+def cmd_watch(config, args):
+    address = args.address or config["service_listen"] or SERVICE_ADDRESS
+    received = 0
+    # 查看端不带令牌：只读
+    with ServiceClient(address) as client:
+        if not args.json:
+            print(f"已连接控制服务 {address}（只读）")
+        while args.count is None or received < args.count:
+            message = client.recv()
+            if message is None:
+                print("控制服务已断开", file=sys.stderr)
+                return 1
+            kind, body = message
+            if kind == MSG_TELEMETRY:
+                received += 1
+                if args.json:
+                    doc = body._asdict()
+                    doc["zones"] = {str(z): {"duty": d, "target": t} for z, (d, t) in body.zones.items()}
+                    doc["sockets"] = [s._asdict() for s in body.sockets]
+                    print(json.dumps(doc), flush=True)
+                else:
+                    print(format_telemetry(body), flush=True)
+            elif args.json:
+                continue
+            elif kind == MSG_LOG:
+                print(f"[服务 {time.strftime('%H:%M:%S', time.localtime(body.time))}] {body.text}", flush=True)
+            elif kind == MSG_STATE:
+                print(f"[服务] 控制方式：{MODE_LABELS.get(body.mode, body.mode)}，{body.controller}", flush=True)
+    return 0
+
+
+def load_candidates(config, args):
+    """--curve / --curves → [(名称, FanCurve), ...]；都没给时用配置文件中的曲线"""
+    candidates = [(text, FanCurve(parse_curve(text))) for text in args.curve or ()]
+    if args.curves:
+        with open(args.curves, "r", encoding="utf-8") as f:
+            doc = json.load(f)
+        if not isinstance(doc, dict):
+            raise ValueError("--curves 文件必须是 {名称: [[温度, 占空比], ...]}")
+        try:
+            candidates += [
+                (str(name), FanCurve([(float(t), int(p)) for t, p in points])) for name, points in doc.items()
+            ]
+        except (TypeError, ValueError) as e:
+            raise ValueError(f"--curves 中的曲线格式错误：{e}") from e
+    if not candidates and not args.pid:
+        candidates.append(("config", FanCurve(config["curve"])))
+    return candidates
+
+
+def cmd_replay(config, args):
+    trace = load_trace(args.trace)
+    if not len(trace):
+        raise ValueError(f"轨迹为空：{args.trace}")
+    duty_filter = None if args.no_filter else build_duty_filter(config)
+    candidates = load_candidates(config, args)
+
+    start = time.perf_counter()
+    results = evaluate_curves(
+        trace,
+        [curve for _, curve in candidates],
+        duty_filter,
+        args.threshold,
+        args.sensor,
+        names=[name for name, _ in candidates],
+    )
+    if args.pid:
+        controller = build_controller(dict(config, controller="pid"))
+        results.append(
+            replay(trace, controller, duty_filter, args.threshold, args.sensor, name="pid")
+        )
+    elapsed = time.perf_counter() - start
+
+    if args.timeline:
+        export_timeline(args.timeline, results)
+    if args.json:
+        print(json.dumps(
+            {"trace": args.trace, "elapsed_s": elapsed, "results": [r.summary() for r in results]},
+            ensure_ascii=False,
+            indent=2,
+        ))
+        return 0
+
+    hours = results[0].seconds / 3600.0 if results else 0.0
+    print(
+        f"轨迹 {len(trace)} 个采样（{hours:.1f} 小时），{len(results)} 个候选，"
+        f"回放耗时 {elapsed:.2f} s（{hours * 3600.0 / max(elapsed, 1e-9):,.0f} 倍实时）"
+    )
+    print(f"{'候选':<28}{'写入':>7}{'次/小时':>9}{'抑制':>8}{'平均占空比':>11}{'欠缺':>7}"
+          f"{'>' + format(args.threshold, 'g') + '°C':>10}{'其中未满速':>11}")
+    for r in results:
+        print(
+            f"{r.name[:27]:<28}{r.writes:>7}{r.writes_per_hour:>9.1f}{r.suppressed:>8}"
+            f"{r.mean_duty:>10.1f}%{r.deficit_mean:>6.2f}%"
+            f"{r.above_s / 60.0:>8.1f}min{r.above_not_full_s / 60.0:>8.1f}min"
+        )
+    return 0
+
+
+def cmd_fleet(_config, args):
+    if not args.config:
+        raise ValueError("fleet 需要 --config 给出主机列表")
+    config = load_fleet_config(args.config)
+    if args.workers is not None:
+        config["workers"] = args.workers
+    hosts = build_fleet_hosts(config, cache_dir=os.path.join(user_data_dir(), "sdr"))
+
+    metrics = None
+    server = None
+    if args.metrics_port is not None:
+        metrics = Metrics()
+    fleet = Fleet(
+        hosts,
+        workers=config["workers"],
+        max_backoff=config["max_backoff"],
+        log=log,
+        debug_log=debug,
+        metrics=metrics,
+    )
+    if metrics is not None:
+        server = MetricsServer(metrics, port=args.metrics_port).start()
+        host, port = server.address
+        log(f"指标：http://{host}:{port}/metrics")
+
+    def on_signal(_signum, _frame):
+        fleet.stop()
+
+    for name in ("SIGINT", "SIGTERM", "SIGBREAK"):
+        if hasattr(signal, name):
+            signal.signal(getattr(signal, name), on_signal)
+
+    log(f"开始控制 {len(hosts)} 台 BMC（{config['workers']} 个工作线程）")
+    try:
+        fleet.run(args.duration)
+    finally:
+        if config["restore_auto_on_exit"]:
+            errors = fleet.restore_auto()
+            for name, error in sorted(errors.items()):
+                log(f"{name}：恢复 BMC 自动风扇模式失败：{error}", logging.ERROR)
+            log(f"已恢复 {len(hosts) - len(errors)}/{len(hosts)} 台 BMC 的自动风扇模式")
+        fleet.close()
+        if server is not None:
+            server.close()
+        for status in fleet.status():
+            log(
+                f"{status['name']}：采样 {status['samples']} 次，写入 {status['writes']} 次，"
+                f"失败 {status['errors']} 次" + ("" if status["online"] else f"，离线（{status['last_error']}）")
+            )
+    return 0 if any(status["online"] for status in fleet.status()) else 1
+
+
+def cmd_run(config, args):
+    if not is_admin():
+        log("警告：当前进程不是管理员，可能无法访问 BMC。", logging.WARNING)
+
+    controller = build_controller(config)
+    sampler = AdaptiveInterval(config["poll_min"], config["poll_max"])
+    zone_map = build_zone_map_from_config(config)
+    # 每个资源打开后立即登记，任何一步出错都按相反顺序关闭已经打开的部分
+    with contextlib.ExitStack() as stack:
+        transport = open_config_transport(config)
+        stack.callback(transport.close)
+        reader = open_run_reader(config)
+        stack.callback(reader.close)
+        bmc_sensors = None
+        if zone_map is not None:
+            bmc_sensors = open_zone_bmc_sensors(zone_map, reader, transport)
+        fallback_bmc = open_fallback_bmc_sensors(config, transport) if bmc_sensors is None else None
+        # 启动时先读 BMC 的实际状态，已经是目标占空比的区不再重写
+        fan_state = FanState(transport, config["zones"], log=log)
+        fan_state.refresh()
+        log(fan_state.describe())
+
+        metrics = None
+        if config["metrics_port"] is not None or config["metrics_json"]:
+            metrics = Metrics()
+        recorder = None
+        if config["record_trace"]:
+            recorder = TraceRecorder(config["record_trace"], sorted(zone_map.sensor_names()) if zone_map else ())
+            stack.callback(recorder.close)
+            log(f"录制温度轨迹：{config['record_trace']}")
+
+        loop = ControlLoop(
+            reader,
+            transport,
+            controller,
+            config["zones"],
+            sampler,
+            duty_filter=build_duty_filter(config),
+            log=log,
+            debug_log=debug,
+            zone_map=zone_map,
+            bmc_sensors=bmc_sensors,
+            metrics=metrics,
+            recorder=recorder,
+            fallback=build_fallback(config),
+            fallback_bmc=fallback_bmc,
+            fan_state=fan_state,
+        )
+
+        if config["metrics_port"] is not None:
+            server = MetricsServer(metrics, config["metrics_host"], config["metrics_port"]).start()
+            stack.callback(server.close)
+            host, port = server.address
+            log(f"指标：http://{host}:{port}/metrics")
+        if config["metrics_json"]:
+            dumper = JsonDumper(metrics, config["metrics_json"], config["metrics_interval"], log=log).start()
+            stack.callback(dumper.close)
+
+        if config["service_listen"]:
+            token_path = config["service_token_file"] or default_token_path()
+            service = ControlService(loop, config["service_listen"], create_token(token_path), log=log).start()
+            stack.callback(service.close)
+            log(f"控制服务：{service.address}（控制令牌 {token_path}）")
+
+        def on_signal(_signum, _frame):
+            loop.stop()
+
+        for name in ("SIGINT", "SIGTERM", "SIGBREAK"):
+            if hasattr(signal, name):
+                signal.signal(getattr(signal, name), on_signal)
+
+        if zone_map is None:
+            log(f"开始自动控制：{transport.describe()} / {reader.describe()}，{controller.describe()}")
+        else:
+            log(f"开始自动控制：{transport.describe()} / {reader.describe()}，多风扇区映射")
+            for line in zone_map.describe():
+                log("  " + line)
+        try:
+            loop.run()
+        finally:
+            if config["restore_auto_on_exit"]:
+                try:
+                    restore_bmc_auto(transport)
+                    log("已恢复 BMC 自动风扇模式")
+                except IpmiError as e:
+                    log(f"恢复 BMC 自动风扇模式失败：{e}", logging.ERROR)
+            loop.flush_summary(force=True)
+            log(
+                f"退出：采样 {loop.samples} 次，写入 {loop.writes} 次，"
+                f"读取失败 {loop.read_errors} 次，写入失败 {loop.write_errors} 次，"
+                f"抑制 {loop.suppressed} 次"
+            )
+    return 0
+
+
+COMMANDS = {
+    "run": cmd_run,
+    "read-temp": cmd_read_temp,
+    "set-duty": cmd_set_duty,
+    "reset-auto": cmd_reset_auto,
+    "fan-state": cmd_fan_state,
+    "watch": cmd_watch,
+    "fleet": cmd_fleet,
+    "replay": cmd_replay,
+}
+
+
+def main(argv=None):
+    args = parse_args(sys.argv[1:] if argv is None else argv)
+    try:
+        setup_logging(args)
+        # fleet 的配置文件格式不同，由 cmd_fleet 自己读取
+        config = None if args.command == "fleet" else build_config(args)
+        return COMMANDS[args.command](config, args)
+    except (OSError, ValueError, RuntimeError, IpmiError) as e:
+        print(f"错误：{e}", file=sys.stderr)
+        return 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,437 @@
+"""
+多台 BMC 的集中控制（IPMI over LAN）：一个进程管一整柜 X11 主板。
+
+- 每台主机一个持久的 LanTransport 会话（会话被 BMC 回收时由 transport 自行重新握手），
+  温度取自该 BMC 的 SDR 传感器（BmcSensors 批量读取），风扇区映射 / 曲线 / 写入抑制各自独立；
+- 工作在有界线程池里：每台主机同一时刻最多一个任务在执行，到期的主机按到期时间先后派发；
+- 一台主机失败只影响它自己：连续失败时按指数退避推迟下一次（最长 max_backoff 秒）；
+  失败 / 慢的主机最多占一半工作线程，正常主机总有线程可用，
+  LAN 通道的超时 / 重试也设得很短，一台慢主机占住一个线程的时间有上限。
+
+配置文件（fanctl.py fleet --config fleet.json）：
+
+    {
+      "workers": 8,
+      "interval": 5,
+      "user": "ADMIN",
+      "curve": [[40, 20], [80, 100]],
+      "hosts": [
+        {"name": "r1-n01", "host": "10.0.0.11"},
+        {"name": "r1-n02", "host": "10.0.0.12", "curve": [[45, 25], [75, 100]]},
+        {"host": "10.0.0.13", "zone_map": [{"zone": 1, "sensors": ["PCH Temp"]}]}
+      ]
+    }
+
+主机项里的 port / user / password / curve / zones / zone_map / interval 覆盖顶层的同名项。
+传感器名与 BMC 的 SDR 一致（"PCH Temp"、"Inlet Temp"...），"cpu" 表示所有 "CPUn Temp" 的最大值。
+"""
+
+import concurrent.futures
+import json
+import os
+import queue
+import re
+import threading
+import time
+
+from control import (
+    DEFAULT_DEADBAND,
+    DEFAULT_HYST_DOWN,
+    DEFAULT_HYST_UP,
+    DEFAULT_MIN_DWELL,
+    DutyFilter,
+)
+from curve import DEFAULT_CURVE_POINTS, FanCurve
+from ipmi import BMC_AUTO_FAN_MODE, IpmiError, LanTransport, fan_duty_command, fan_mode_command
+from sdr import CPU_TEMP_RE, BmcSensors
+from zones import CPU_SENSOR, build_zone_map
+
+
+FLEET_DEFAULTS = {
+    "workers": 8,
+    "interval": 5.0,        # 每台主机的采样间隔（秒）
+    "max_backoff": 60.0,    # 连续失败时推迟下一次的上限（秒）
+    "timeout": 0.5,         # 单个 UDP 来回的超时（秒）
+    "retries": 1,
+    "port": 623,
+    "user": "ADMIN",
+    "password": None,       # None：取环境变量 IPMI_PASSWORD
+    "curve": [list(p) for p in DEFAULT_CURVE_POINTS],
+    "zones": [0, 1],
+    "zone_map": None,
+    "deadband": DEFAULT_DEADBAND,
+    "hyst_up": DEFAULT_HYST_UP,
+    "hyst_down": DEFAULT_HYST_DOWN,
+    "min_dwell": DEFAULT_MIN_DWELL,
+    "sdr_cache_dir": None,  # 每台主机的 SDR 缓存放在这里（文件名取主机名）
+    "restore_auto_on_exit": True,
+    "hosts": [],
+}
+
+# 主机项允许的键
+FLEET_HOST_KEYS = ("name", "host", "port", "user", "password", "curve", "zones", "zone_map", "interval")
+
+
+def load_fleet_config(path) -> dict:
+    """读取 fleet 配置文件，缺省项取 FLEET_DEFAULTS；格式错误抛 ValueError"""
+    with open(path, "r", encoding="utf-8") as f:
+        doc = json.load(f)
+    if not isinstance(doc, dict):
+        raise ValueError(f"配置文件顶层必须是对象：{path}")
+    unknown = sorted(set(doc) - set(FLEET_DEFAULTS))
+    if unknown:
+        raise ValueError(f"配置文件中有未知的键：{', '.join(unknown)}")
+    config = dict(FLEET_DEFAULTS, **doc)
+    if config["password"] is None:
+        config["password"] = os.environ.get("IPMI_PASSWORD", "")
+    if int(config["workers"]) < 1:
+        raise ValueError("workers 必须至少为 1")
+    if config["interval"] <= 0 or config["max_backoff"] <= 0:
+        raise ValueError("interval / max_backoff 必须为正数")
+
+    hosts = config["hosts"]
+    if not isinstance(hosts, list) or not hosts:
+        raise ValueError("hosts 必须是非空列表")
+    names = set()
+    for entry in hosts:
+        if not isinstance(entry, dict) or "host" not in entry:
+            raise ValueError("hosts 的每一项都必须是带 host 的对象")
+        unknown = sorted(set(entry) - set(FLEET_HOST_KEYS))
+        if unknown:
+            raise ValueError(f"主机 {entry['host']} 中有未知的键：{', '.join(unknown)}")
+        name = str(entry.get("name", entry["host"]))
+        if name in names:
+            raise ValueError(f"主机名重复：{name}")
+        names.add(name)
+        build_host_zone_map(config, entry)  # 曲线 / 风扇区映射非法时在这里报错
+    return config
+
+
+def host_setting(config, entry, key):
+    return entry[key] if key in entry else config[key]
+
+
+def build_host_zone_map(config, entry):
+    """一台主机的 ZoneMap：有 zone_map 时照用，否则每个 zone 都跟随 "cpu" 和该主机的曲线"""
+    try:
+        curve = [(float(t), int(p)) for t, p in host_setting(config, entry, "curve")]
+    except (TypeError, ValueError) as e:
+        raise ValueError(f"主机 {entry['host']} 的曲线格式错误：{e}") from e
+    FanCurve(curve)
+    entries = host_setting(config, entry, "zone_map")
+    if entries is None:
+        entries = [{"zone": int(z)} for z in host_setting(config, entry, "zones")]
+
+    def filter_factory():
+        return DutyFilter(config["deadband"], config["hyst_up"], config["hyst_down"], config["min_dwell"])
+
+    return build_zone_map(entries, curve, filter_factory)
+
+
+class FleetHost:
+    """
+    一台 BMC：持久会话 + SDR 传感器 + 风扇区映射，以及它自己的调度 / 失败状态。
+    step() 只会在一个工作线程里执行（Fleet 保证同一主机不会并发）。
+    """
+
+    def __init__(self, name, transport, zone_map, interval, bmc_sensors=None):
+        self.name = name
+        self.transport = transport
+        self.zone_map = zone_map
+        self.interval = interval
+        self.bmc_sensors = bmc_sensors or BmcSensors(transport)
+
+        self.next_due = 0.0
+        self.busy = False
+        self.started = 0.0         # 本次任务的派发时间（Fleet 的时钟）
+        self.failures = 0          # 连续失败次数；成功一次清零
+        self.last_error = None
+        self.last_ok = None        # 最近一次成功的时间（Fleet 的时钟）
+        self.last_elapsed = 0.0    # 最近一次 step() 的耗时（秒）
+        self.temps = {}
+        self.duties = {}           # zone → 最近一次成功写入的占空比
+        self.samples = 0
+        self.writes = 0
+        self.write_errors = 0
+        self.errors = 0
+
+    @property
+    def online(self) -> bool:
+        return self.failures == 0 and self.last_ok is not None
+
+    def degraded(self, now) -> bool:
+        """失败中、上次耗时超过采样间隔，或本次已经执行得比采样间隔还久"""
+        if self.busy and now - self.started > self.interval:
+            return True
+        return self.failures > 0 or self.last_elapsed > self.interval
+
+    def sensor_values(self):
+        temps = self.bmc_sensors.snapshot().temperatures()
+        if not temps:
+            raise IpmiError("BMC 没有可用的温度读数")
+        values = dict(temps)
+        cpu = [v for n, v in temps.items() if CPU_TEMP_RE.match(n)]
+        if cpu:
+            values[CPU_SENSOR] = max(cpu)
+        return values
+
+    def step(self, now):
+        """读一次传感器，把需要改变的风扇区在一个流水线批次里写完；返回 [(zone, duty, 是否成功), ...]"""
+        self.samples += 1
+        values = self.sensor_values()
+        self.temps = values
+        changes = self.zone_map.update(values, now)
+        if not changes:
+            return []
+        try:
+            results = self.transport.raw_many([fan_duty_command(zone, duty) for zone, duty, _t in changes])
+        except IpmiError:
+            # 会话重建失败：这些区都没写成，下次采样重写
+            for zone, _duty, _temp in changes:
+                self.duties.pop(zone, None)
+                self.zone_map.mark_failed(zone)
+            raise
+        written = []
+        for (zone, duty, _temp), result in zip(changes, results):
+            ok = not isinstance(result, Exception)
+            if ok:
+                self.writes += 1
+                self.duties[zone] = duty
+            else:
+                self.write_errors += 1
+                self.duties.pop(zone, None)
+                self.zone_map.mark_failed(zone)
+            written.append((zone, duty, ok))
+        return written
+
+    def restore_auto(self):
+        self.transport.raw(*fan_mode_command(BMC_AUTO_FAN_MODE))
+
+    def close(self):
+        self.transport.close()
+
+    def status(self) -> dict:
+        return {
+            "name": self.name,
+            "online": self.online,
+            "failures": self.failures,
+            "last_error": self.last_error,
+            "cpu": self.temps.get(CPU_SENSOR),
+            "duties": dict(self.duties),
+            "samples": self.samples,
+            "writes": self.writes,
+            "write_errors": self.write_errors,
+            "errors": self.errors,
+            "elapsed_ms": self.last_elapsed * 1000.0,
+        }
+
+
+def build_fleet_hosts(config, cache_dir=None):
+    """按配置为每台主机创建 LanTransport（尚未握手）和 ZoneMap"""
+    cache_dir = config["sdr_cache_dir"] or cache_dir
+    hosts = []
+    for entry in config["hosts"]:
+        name = str(entry.get("name", entry["host"]))
+        transport = LanTransport(
+            entry["host"],
+            host_setting(config, entry, "user"),
+            host_setting(config, entry, "password"),
+            port=int(host_setting(config, entry, "port")),
+            timeout=config["timeout"],
+            retries=config["retries"],
+        )
+        cache = os.path.join(cache_dir, f"sdr_{re.sub(r'[^A-Za-z0-9_.-]', '_', name)}.json") if cache_dir else None
+        hosts.append(
+            FleetHost(
+                name,
+                transport,
+                build_host_zone_map(config, entry),
+                float(host_setting(config, entry, "interval")),
+                BmcSensors(transport, cache),
+            )
+        )
+    return hosts
+
+
+class Fleet:
+    """
+    有界线程池上的多主机调度。run() 所在的线程独占调度堆：
+    到期且空闲的主机交给线程池，完成后经队列回到调度线程，按结果排下一次。
+    """
+
+    def __init__(
+        self,
+        hosts,
+        workers=FLEET_DEFAULTS["workers"],
+        max_backoff=FLEET_DEFAULTS["max_backoff"],
+        log=None,
+        debug_log=None,
+        clock=time.monotonic,
+        metrics=None,
+    ):
+        names = [h.name for h in hosts]
+        if len(set(names)) != len(names):
+            raise ValueError("主机名重复")
+        self.hosts = list(hosts)
+        self.workers = workers
+        # 失败 / 慢的主机最多同时占用的工作线程数
+        self.degraded_slots = max(1, workers // 2)
+        self.max_backoff = max_backoff
+        self.log = log
+        self.debug_log = debug_log
+        self.clock = clock
+        self.stop_event = threading.Event()
+        self.done = queue.Queue()
+        self.pool = None
+        self.cycles = 0
+
+        self.metrics = metrics
+        if metrics is not None:
+            metrics.add_collector(self.collect_metrics)
+
+    def logmsg(self, msg: str):
+        if self.log is not None:
+            self.log(msg)
+
+    def stop(self):
+        """可以从其它线程或信号处理函数调用"""
+        self.stop_event.set()
+        self.done.put(None)  # 唤醒调度线程
+
+    def collect_metrics(self, metrics):
+        for host in self.hosts:
+            metrics.set("x11fan_fleet_host_up", 1 if host.online else 0, host=host.name)
+            metrics.set_counter("x11fan_fleet_host_errors_total", host.errors, host=host.name)
+            metrics.set_counter("x11fan_fan_writes_total", host.writes, host=host.name)
+            metrics.set_counter(
+                "x11fan_fan_writes_suppressed_total", host.zone_map.suppressed, host=host.name
+            )
+            for zone, duty in host.duties.items():
+                metrics.set("x11fan_zone_duty_percent", duty, host=host.name, zone=zone)
+
+    # ----- 工作线程 -----
+
+    def _work(self, host, now):
+        start = time.perf_counter()
+        error = None
+        written = []
+        try:
+            written = host.step(now)
+        except Exception as e:  # noqa: BLE001  一台主机的任何错误都只记在它自己身上
+            error = e
+        elapsed = time.perf_counter() - start
+        self.done.put((host, elapsed, error, written))
+
+    # ----- 调度线程 -----
+
+    def _finish(self, host, elapsed, error, written):
+        now = self.clock()
+        host.busy = False
+        host.last_elapsed = elapsed
+        if self.metrics is not None:
+            self.metrics.observe("x11fan_fleet_cycle_seconds", elapsed)
+
+        if error is None:
+            if host.failures:
+                self.logmsg(f"{host.name}：已恢复（之前连续失败 {host.failures} 次）")
+            host.failures = 0
+            host.last_error = None
+            host.last_ok = now
+            host.next_due = now + host.interval
+            failed = [zone for zone, _duty, ok in written if not ok]
+            if failed:
+                self.logmsg(f"{host.name}：写入 zone {', '.join(map(str, failed))} 失败，下次采样重写")
+            if written and self.debug_log is not None:
+                duties = "，".join(f"zone={z} {d}%" for z, d, ok in written if ok)
+                cpu = host.temps.get(CPU_SENSOR)
+                self.debug_log(f"{host.name}：{'--.-' if cpu is None else f'{cpu:.1f}'} °C → {duties}")
+            return
+
+        host.errors += 1
+        host.failures += 1
+        host.last_error = str(error)
+        backoff = min(self.max_backoff, host.interval * 2 ** (host.failures - 1))
+        host.next_due = now + backoff
+        if host.failures == 1 or (backoff >= self.max_backoff and host.failures % 10 == 0):
+            self.logmsg(f"{host.name}：{error}（{backoff:.0f} 秒后重试）")
+
+    def _dispatch(self, now):
+        """
+        按到期时间先后把空闲主机交给线程池，返回距离下一台到期主机的秒数（None：等任务完成）。
+        同时执行的任务不超过 workers；异常主机最多占 degraded_slots 个，
+        其余的等有任务完成时再派发，保证正常主机总有空闲的工作线程。
+        """
+        busy = sum(1 for h in self.hosts if h.busy)
+        degraded_busy = sum(1 for h in self.hosts if h.busy and h.degraded(now))
+        due = sorted((h.next_due, i) for i, h in enumerate(self.hosts) if not h.busy)
+        for due_at, i in due:
+            if due_at > now:
+                return due_at - now
+            host = self.hosts[i]
+            degraded = host.degraded(now)
+            if busy >= self.workers or (degraded and degraded_busy >= self.degraded_slots):
+                continue
+            host.busy = True
+            host.started = now
+            busy += 1
+            degraded_busy += degraded
+            self.pool.submit(self._work, host, now)
+        return None
+
+    def run(self, duration=None):
+        """调度直到 stop()（或经过 duration 秒）；返回前等待进行中的任务结束"""
+        self.stop_event.clear()
+        end = None if duration is None else self.clock() + duration
+        with concurrent.futures.ThreadPoolExecutor(self.workers, thread_name_prefix="fleet") as pool:
+            self.pool = pool
+            try:
+                while not self.stop_event.is_set():
+                    now = self.clock()
+                    if end is not None and now >= end:
+                        break
+                    wait = self._dispatch(now)
+                    self.cycles += 1
+                    if end is not None:
+                        wait = end - now if wait is None else min(wait, end - now)
+                    try:
+                        item = self.done.get(timeout=wait)
+                    except queue.Empty:
+                        continue
+                    while item is not None:
+                        self._finish(*item)
+                        try:
+                            item = self.done.get_nowait()
+                        except queue.Empty:
+                            item = None
+            finally:
+                self.stop_event.set()
+        self.pool = None
+        # 线程池已关闭：取回最后一批结果
+        while True:
+            try:
+                item = self.done.get_nowait()
+            except queue.Empty:
+                break
+            if item is not None:
+                self._finish(*item)
+
+    def _each(self, fn):
+        """在线程池里对每台主机执行 fn(host)，返回 {主机名: 异常}"""
+        errors = {}
+        with concurrent.futures.ThreadPoolExecutor(self.workers, thread_name_prefix="fleet") as pool:
+            futures = {pool.submit(fn, host): host for host in self.hosts}
+            for future in concurrent.futures.as_completed(futures):
+                error = future.exception()
+                if error is not None:
+                    errors[futures[future].name] = error
+        return errors
+
+    def restore_auto(self):
+        """所有主机恢复 BMC 自动风扇模式（并发执行），返回 {主机名: 异常}"""
+        return self._each(lambda host: host.restore_auto())
+
+    def close(self):
+        self._each(lambda host: host.close())
+
+    def status(self):
+        return [h.status() for h in self.hosts]
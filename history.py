@@ -0,0 +1,162 @@
+"""
+遥测历史：固定容量的环形缓冲区。
+
+每个采样存 时间戳 / 温度 / 占空比 / 读取耗时，分别放在四个 array 里
+（8 + 4 + 1 + 4 = 17 字节 / 采样），不为每个采样建 Python 对象：
+1 秒一次的 24 小时（86400 个采样）约 1.5 MB。
+
+- downsample()：把一段时间切成若干桶，每桶给出温度 min / max 和占空比 max，供绘图
+- export_csv() / export_binary() / TelemetryHistory.load_binary()：离线分析
+"""
+
+import csv
+import struct
+import sys
+from array import array
+
+
+# 默认容量：1 秒一次采样的 24 小时
+HISTORY_CAPACITY = 24 * 3600
+
+BINARY_MAGIC = b"X11H"
+BINARY_VERSION = 1
+# magic, 版本, 采样数
+_HEADER = struct.Struct("<4sHI")
+
+FIELDS = ("timestamp", "temp", "duty", "latency_ms")
+_TYPECODES = {"timestamp": "d", "temp": "f", "duty": "B", "latency_ms": "f"}
+
+
+class TelemetryHistory:
+    """定长环形缓冲区，写满后覆盖最旧的采样"""
+
+    def __init__(self, capacity=HISTORY_CAPACITY):
+        if capacity <= 0:
+            raise ValueError("历史容量必须为正数")
+        self.capacity = capacity
+        self.arrays = {
+            name: array(code, [0]) * capacity for name, code in _TYPECODES.items()
+        }
+        self.head = 0   # 下一个写入位置
+        self.count = 0
+
+    def __len__(self):
+        return self.count
+
+    @property
+    def nbytes(self) -> int:
+        return sum(a.itemsize * len(a) for a in self.arrays.values())
+
+    def append(self, timestamp: float, temp: float, duty: int, latency_ms: float):
+        i = self.head
+        a = self.arrays
+        a["timestamp"][i] = timestamp
+        a["temp"][i] = temp
+        a["duty"][i] = max(0, min(255, int(duty)))
+        a["latency_ms"][i] = latency_ms
+        self.head = (i + 1) % self.capacity
+        if self.count < self.capacity:
+            self.count += 1
+
+    def clear(self):
+        self.head = 0
+        self.count = 0
+
+    def field(self, name):
+        """按时间顺序返回某一列（新 array）"""
+        data = self.arrays[name]
+        if self.count < self.capacity:
+            return data[: self.count]
+        return data[self.head :] + data[: self.head]
+
+    def last(self):
+        """最近一个采样 (timestamp, temp, duty, latency_ms)，没有时为 None"""
+        if not self.count:
+            return None
+        i = (self.head - 1) % self.capacity
+        return tuple(self.arrays[name][i] for name in FIELDS)
+
+    def _start_index(self, timestamps, since):
+        """timestamps 升序，返回第一个 >= since 的下标（二分）"""
+        lo, hi = 0, len(timestamps)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if timestamps[mid] < since:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    def downsample(self, buckets: int, since=None, until=None):
+        """
+        把 [since, until] 均分成 buckets 个时间桶，返回四个等长列表：
+        (桶起点时间, 温度 min, 温度 max, 占空比 max)；空桶跳过。
+        """
+        ts = self.field("timestamp")
+        if not ts or buckets <= 0:
+            return [], [], [], []
+        temps = self.field("temp")
+        duties = self.field("duty")
+
+        if since is None:
+            since = ts[0]
+        if until is None:
+            until = ts[-1]
+        start = self._start_index(ts, since)
+        end = self._start_index(ts, until + 1e-9)
+        if start >= end:
+            return [], [], [], []
+
+        width = max((until - since) / buckets, 1e-9)
+        out_t, out_min, out_max, out_duty = [], [], [], []
+        i = start
+        while i < end:
+            bucket = int((ts[i] - since) / width)
+            bucket_end = since + (bucket + 1) * width
+            j = self._start_index(ts, bucket_end)
+            j = max(i + 1, min(j, end))
+            seg = temps[i:j]
+            out_t.append(since + bucket * width)
+            out_min.append(min(seg))
+            out_max.append(max(seg))
+            out_duty.append(max(duties[i:j]))
+            i = j
+        return out_t, out_min, out_max, out_duty
+
+    # ----- 导出 / 导入 -----
+
+    def export_csv(self, path):
+        columns = [self.field(name) for name in FIELDS]
+        with open(path, "w", newline="", encoding="utf-8") as f:
+            writer = csv.writer(f)
+            writer.writerow(FIELDS)
+            for t, temp, duty, latency in zip(*columns):
+                writer.writerow((f"{t:.3f}", f"{temp:.2f}", duty, f"{latency:.2f}"))
+
+    def export_binary(self, path):
+        """头部 + 四列原始数组（小端），按时间顺序"""
+        with open(path, "wb") as f:
+            f.write(_HEADER.pack(BINARY_MAGIC, BINARY_VERSION, self.count))
+            for name in FIELDS:
+                column = self.field(name)
+                if sys.byteorder != "little":
+                    column.byteswap()
+                column.tofile(f)
+
+    @classmethod
+    def load_binary(cls, path, capacity=None):
+        with open(path, "rb") as f:
+            magic, version, count = _HEADER.unpack(f.read(_HEADER.size))
+            if magic != BINARY_MAGIC or version != BINARY_VERSION:
+                raise ValueError(f"不是遥测历史文件：{path}")
+            history = cls(max(capacity or count, 1))
+            columns = {}
+            for name in FIELDS:
+                column = array(_TYPECODES[name])
+                column.fromfile(f, count)
+                if sys.byteorder != "little":
+                    column.byteswap()
+                columns[name] = column
+        for row in zip(*(columns[name] for name in FIELDS)):
+            history.append(*row)
+        return history
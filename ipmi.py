@@ -0,0 +1,1054 @@
+"""
+IPMI 传输层
+
+run_ipmi 不再直接拼 IPMICFG 命令行，而是把 RAW 命令交给一个 IpmiTransport：
+
+- IpmicfgTransport：每条命令启动一次 IPMICFG-Win.exe（最慢，作为兜底）
+- WinIpmiTransport：Windows 自带 IPMI 驱动（root\\WMI 下的 Microsoft_IPMI），进程内直接发 RAW
+- OpenIpmiTransport：Linux /dev/ipmi0（OpenIPMI 驱动），文件句柄常驻
+- LanTransport：IPMI over LAN（RMCP+ / IPMI 2.0），会话建立一次后复用
+
+所有通道只有一个核心接口：raw(netfn, cmd, data) -> 响应数据（不含完成码）。
+"""
+
+import hashlib
+import hmac
+import os
+import socket
+import struct
+import subprocess
+import threading
+import time
+
+
+# Supermicro OEM 命令
+NETFN_APP = 0x06
+NETFN_SUPERMICRO = 0x30
+CMD_FAN_MODE = 0x45
+CMD_FAN_DUTY = 0x70
+
+# IPMI 消息地址
+BMC_SLAVE_ADDR = 0x20
+REMOTE_SWID = 0x81
+
+PRIV_ADMIN = 0x04
+
+
+class IpmiError(Exception):
+    """
+    IPMI 命令失败。
+    completion_code 为 None 表示通道本身出错（超时、进程启动失败、会话断开等），
+    否则是 BMC 返回的非零完成码。
+    """
+
+    def __init__(self, message, completion_code=None):
+        super().__init__(message)
+        self.completion_code = completion_code
+
+
+# ---------- 通用工具 ----------
+
+def parse_raw_args(args):
+    """把 IPMICFG 风格的 ["-raw", "0x30", "0x70", ...] 解析成 (netfn, cmd, data)"""
+    if not args or args[0] != "-raw":
+        raise ValueError(f"只支持 -raw 命令：{args}")
+    values = [int(a, 16) for a in args[1:]]
+    if len(values) < 2 or any(v < 0 or v > 0xFF for v in values):
+        raise ValueError(f"无效的 RAW 参数：{args}")
+    return values[0], values[1], bytes(values[2:])
+
+
+def format_raw(netfn, cmd, data=b"") -> str:
+    return " ".join(f"0x{b:02x}" for b in bytes([netfn, cmd]) + bytes(data))
+
+
+def fan_duty_command(zone: int, percent: int):
+    """设置某个风扇区占空比：-raw 0x30 0x70 0x66 0x01 <zone> <duty>"""
+    p = max(0, min(100, int(round(percent))))
+    return NETFN_SUPERMICRO, CMD_FAN_DUTY, bytes([0x66, 0x01, zone & 0xFF, p])
+
+
+def fan_mode_command(mode: int):
+    """设置 BMC 风扇模式：-raw 0x30 0x45 0x01 <mode>"""
+    return NETFN_SUPERMICRO, CMD_FAN_MODE, bytes([0x01, mode & 0xFF])
+
+
+def fan_duty_query(zone: int):
+    """读取某个风扇区当前占空比：-raw 0x30 0x70 0x66 0x00 <zone>，响应 1 字节（%）"""
+    return NETFN_SUPERMICRO, CMD_FAN_DUTY, bytes([0x66, 0x00, zone & 0xFF])
+
+
+def fan_mode_query():
+    """读取 BMC 风扇模式：-raw 0x30 0x45 0x00，响应 1 字节"""
+    return NETFN_SUPERMICRO, CMD_FAN_MODE, bytes([0x00])
+
+
+# X11 的风扇模式值
+FAN_MODE_NAMES = {0x00: "Standard", 0x01: "Full", 0x02: "Optimal", 0x04: "Heavy IO"}
+# 只有 Full 模式下风扇区保持写入的占空比；其它模式下读到的是 BMC 自己随时在调的值
+FAN_MODE_FULL = 0x01
+# 恢复 BMC 自动风扇模式时写入的模式值（GUI 按钮、fanctl、fleet 共用）
+BMC_AUTO_FAN_MODE = 0x01
+
+
+def describe_fan_mode(mode) -> str:
+    if mode is None:
+        return "未知"
+    return FAN_MODE_NAMES.get(mode, f"0x{mode:02x}")
+
+
+def ipmi_checksum(data) -> int:
+    return (-sum(data)) & 0xFF
+
+
+def pack_message(netfn, cmd, body, seq, dst=BMC_SLAVE_ADDR, src=REMOTE_SWID) -> bytes:
+    """
+    IPMB 格式的 IPMI 消息：
+    dst, netFn/LUN, chk1, src, seq/LUN, cmd, body..., chk2
+    请求时 body 是数据，响应时 body 是 完成码 + 数据。
+    """
+    head = bytes([dst, (netfn << 2) & 0xFF])
+    tail = bytes([src, (seq << 2) & 0xFF, cmd]) + bytes(body)
+    return head + bytes([ipmi_checksum(head)]) + tail + bytes([ipmi_checksum(tail)])
+
+
+def unpack_message(msg):
+    """pack_message 的逆操作，返回 (netfn, seq, cmd, body)"""
+    if len(msg) < 7:
+        raise IpmiError("IPMI 消息过短")
+    if ipmi_checksum(msg[:2]) != msg[2] or ipmi_checksum(msg[3:-1]) != msg[-1]:
+        raise IpmiError("IPMI 消息校验和错误")
+    return msg[1] >> 2, msg[4] >> 2, msg[5], bytes(msg[6:-1])
+
+
+# ---------- 传输层基类 ----------
+
+class IpmiTransport:
+    """所有 IPMI 通道的基类"""
+
+    name = "base"
+    log = None
+
+    def raw(self, netfn: int, cmd: int, data=b"") -> bytes:
+        raise NotImplementedError
+
+    def set_log(self, log):
+        self.log = log
+
+    def raw_many(self, requests):
+        """
+        批量发送 [(netfn, cmd, data), ...]，按顺序返回每条的响应数据或 IpmiError 实例。
+        默认逐条发送；支持流水线的通道（LAN）会覆盖。
+        """
+        results = []
+        for netfn, cmd, data in requests:
+            try:
+                results.append(self.raw(netfn, cmd, data))
+            except IpmiError as e:
+                results.append(e)
+        return results
+
+    def describe(self) -> str:
+        return self.name
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class IpmicfgTransport(IpmiTransport):
+    """每条命令启动一次 IPMICFG-Win.exe（原先 run_ipmi 的做法）"""
+
+    name = "ipmicfg"
+
+    def __init__(self, ipmi_exe, timeout=10.0, log=None):
+        # ipmi_exe 可以是路径，也可以是命令前缀列表（例如 [python, fake_ipmicfg.py]）
+        if isinstance(ipmi_exe, (list, tuple)):
+            self.command = list(ipmi_exe)
+        else:
+            self.command = [ipmi_exe]
+        self.timeout = timeout
+        self.log = log
+
+        self.creationflags = 0
+        if os.name == "nt" and hasattr(subprocess, "CREATE_NO_WINDOW"):
+            self.creationflags = subprocess.CREATE_NO_WINDOW
+
+    def describe(self) -> str:
+        return f"IPMICFG（{self.command[-1]}）"
+
+    def run(self, args):
+        cmd = self.command + list(args)
+        try:
+            result = subprocess.run(
+                cmd,
+                cwd=os.path.dirname(os.path.abspath(self.command[-1])),
+                stdout=subprocess.PIPE,
+                stderr=subprocess.PIPE,
+                text=True,
+                encoding="mbcs" if os.name == "nt" else "utf-8",
+                errors="ignore",
+                creationflags=self.creationflags,
+                timeout=self.timeout,
+            )
+        except Exception as e:
+            raise IpmiError(f"IPMICFG 运行异常: {e}") from e
+
+        if self.log is not None:
+            # 成功时标准输出就是响应字节，由调用方汇总，不再逐条整段转储
+            if result.returncode != 0 and result.stdout.strip():
+                self.log("IPMICFG 标准输出:\n" + result.stdout.strip())
+            if result.stderr.strip():
+                self.log("IPMICFG 错误输出:\n" + result.stderr.strip())
+        return result
+
+    def raw(self, netfn, cmd, data=b""):
+        args = ["-raw"] + format_raw(netfn, cmd, data).split()
+        result = self.run(args)
+        if result.returncode != 0:
+            raise IpmiError(f"IPMICFG 退出码 {result.returncode} (失败)")
+
+        # IPMICFG -raw 的输出是以空格分隔的十六进制响应字节
+        out = []
+        for token in result.stdout.split():
+            try:
+                value = int(token, 16)
+            except ValueError:
+                continue
+            if 0 <= value <= 0xFF:
+                out.append(value)
+        return bytes(out)
+
+
+class WinIpmiTransport(IpmiTransport):
+    """
+    Windows 自带 IPMI 驱动：root\\WMI 的 Microsoft_IPMI.RequestResponse。
+    COM 对象与创建它的线程绑定，必须在同一线程里创建、raw() 和 close()。
+    """
+
+    name = "wmi"
+
+    def __init__(self):
+        import pythoncom
+        import wmi
+
+        self._pythoncom = pythoncom
+        pythoncom.CoInitialize()
+        try:
+            conn = wmi.WMI(namespace="root\\WMI")
+            instances = conn.Microsoft_IPMI()
+        except Exception as e:
+            pythoncom.CoUninitialize()
+            raise IpmiError(f"无法连接 Microsoft_IPMI：{e}") from e
+        if not instances:
+            pythoncom.CoUninitialize()
+            raise IpmiError("系统中没有 Microsoft_IPMI 实例（未加载 IPMI 驱动？）")
+
+        self._obj = instances[0].ole_object
+        self._method = self._obj.Methods_("RequestResponse")
+
+    def describe(self) -> str:
+        return "Windows IPMI 驱动（Microsoft_IPMI）"
+
+    def raw(self, netfn, cmd, data=b""):
+        params = self._method.InParameters.SpawnInstance_()
+        params.Properties_.Item("Command").Value = cmd
+        params.Properties_.Item("Lun").Value = 0
+        params.Properties_.Item("NetworkFunction").Value = netfn
+        params.Properties_.Item("RequestData").Value = list(bytes(data))
+        params.Properties_.Item("RequestDataSize").Value = len(data)
+        params.Properties_.Item("ResponderAddress").Value = BMC_SLAVE_ADDR
+
+        try:
+            out = self._obj.ExecMethod_("RequestResponse", params)
+        except Exception as e:
+            raise IpmiError(f"Microsoft_IPMI 调用失败：{e}") from e
+
+        cc = int(out.Properties_.Item("CompletionCode").Value)
+        size = int(out.Properties_.Item("ResponseDataSize").Value or 0)
+        resp = bytes(out.Properties_.Item("ResponseData").Value or ())[:size]
+        if cc != 0:
+            raise IpmiError(f"BMC 返回完成码 0x{cc:02x}", cc)
+        # ResponseData 第一个字节同样是完成码
+        return resp[1:]
+
+    def close(self):
+        if self._pythoncom is not None:
+            self._obj = self._method = None
+            self._pythoncom.CoUninitialize()
+            self._pythoncom = None
+
+
+class OpenIpmiTransport(IpmiTransport):
+    """Linux OpenIPMI 驱动（/dev/ipmi0），打开一次，之后每条命令一次 ioctl"""
+
+    name = "openipmi"
+
+    def __init__(self, device=None, timeout=5.0):
+        import ctypes
+        import fcntl
+
+        self._ctypes = ctypes
+        self._fcntl = fcntl
+        self.timeout = timeout
+
+        candidates = [device] if device else ["/dev/ipmi0", "/dev/ipmi/0", "/dev/ipmidev/0"]
+        self.device = None
+        self.fd = None
+        for path in candidates:
+            try:
+                self.fd = os.open(path, os.O_RDWR)
+                self.device = path
+                break
+            except OSError:
+                continue
+        if self.fd is None:
+            raise IpmiError(f"无法打开 IPMI 设备：{', '.join(candidates)}")
+
+        class IpmiMsg(ctypes.Structure):
+            _fields_ = [
+                ("netfn", ctypes.c_ubyte),
+                ("cmd", ctypes.c_ubyte),
+                ("data_len", ctypes.c_ushort),
+                ("data", ctypes.c_void_p),
+            ]
+
+        class SystemInterfaceAddr(ctypes.Structure):
+            _fields_ = [
+                ("addr_type", ctypes.c_int),
+                ("channel", ctypes.c_short),
+                ("lun", ctypes.c_ubyte),
+            ]
+
+        class IpmiReq(ctypes.Structure):
+            _fields_ = [
+                ("addr", ctypes.c_void_p),
+                ("addr_len", ctypes.c_uint),
+                ("msgid", ctypes.c_long),
+                ("msg", IpmiMsg),
+            ]
+
+        class IpmiRecv(ctypes.Structure):
+            _fields_ = [
+                ("recv_type", ctypes.c_int),
+                ("addr", ctypes.c_void_p),
+                ("addr_len", ctypes.c_uint),
+                ("msgid", ctypes.c_long),
+                ("msg", IpmiMsg),
+            ]
+
+        def ioc(direction, nr, size):
+            return (direction << 30) | (size << 16) | (ord("i") << 8) | nr
+
+        # _IOR('i', 13, struct ipmi_req) / _IOWR('i', 11, struct ipmi_recv)
+        self._send_ioctl = ioc(2, 13, ctypes.sizeof(IpmiReq))
+        self._recv_ioctl = ioc(3, 11, ctypes.sizeof(IpmiRecv))
+
+        # 0x0c = IPMI_SYSTEM_INTERFACE_ADDR_TYPE，0x0f = IPMI_BMC_CHANNEL
+        self._addr = SystemInterfaceAddr(0x0C, 0x0F, 0)
+        self._req = IpmiReq()
+        self._recv = IpmiRecv()
+        self._recv_addr = SystemInterfaceAddr()
+        self._recv_buf = (ctypes.c_ubyte * 272)()
+        self._msgid = 0
+
+    def describe(self) -> str:
+        return f"OpenIPMI（{self.device}）"
+
+    def raw(self, netfn, cmd, data=b""):
+        import select
+
+        ctypes = self._ctypes
+        if self.fd is None:
+            raise IpmiError("IPMI 设备已关闭")
+
+        self._msgid = (self._msgid + 1) & 0x7FFFFFFF
+        buf = (ctypes.c_ubyte * max(1, len(data))).from_buffer_copy(bytes(data) or b"\0")
+        req = self._req
+        req.addr = ctypes.addressof(self._addr)
+        req.addr_len = ctypes.sizeof(self._addr)
+        req.msgid = self._msgid
+        req.msg.netfn = netfn
+        req.msg.cmd = cmd
+        req.msg.data_len = len(data)
+        req.msg.data = ctypes.addressof(buf)
+
+        try:
+            self._fcntl.ioctl(self.fd, self._send_ioctl, req)
+        except OSError as e:
+            raise IpmiError(f"IPMI ioctl 发送失败：{e}") from e
+
+        deadline = time.monotonic() + self.timeout
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise IpmiError("等待 BMC 响应超时")
+            ready, _, _ = select.select([self.fd], [], [], remaining)
+            if not ready:
+                continue
+
+            recv = self._recv
+            recv.addr = ctypes.addressof(self._recv_addr)
+            recv.addr_len = ctypes.sizeof(self._recv_addr)
+            recv.msg.data = ctypes.addressof(self._recv_buf)
+            recv.msg.data_len = len(self._recv_buf)
+            try:
+                self._fcntl.ioctl(self.fd, self._recv_ioctl, recv)
+            except OSError as e:
+                raise IpmiError(f"IPMI ioctl 接收失败：{e}") from e
+            if recv.msgid != self._msgid:
+                continue  # 之前超时请求的迟到响应
+
+            resp = bytes(self._recv_buf[: recv.msg.data_len])
+            if not resp:
+                raise IpmiError("BMC 返回空响应")
+            if resp[0] != 0:
+                raise IpmiError(f"BMC 返回完成码 0x{resp[0]:02x}", resp[0])
+            return resp[1:]
+
+    def close(self):
+        if self.fd is not None:
+            os.close(self.fd)
+            self.fd = None
+
+
+# ---------- IPMI over LAN (RMCP+) ----------
+
+RMCP_HEADER = b"\x06\x00\xff\x07"
+AUTH_TYPE_RMCPP = 0x06
+
+PAYLOAD_IPMI = 0x00
+PAYLOAD_OPEN_SESSION_REQ = 0x10
+PAYLOAD_OPEN_SESSION_RESP = 0x11
+PAYLOAD_RAKP1 = 0x12
+PAYLOAD_RAKP2 = 0x13
+PAYLOAD_RAKP3 = 0x14
+PAYLOAD_RAKP4 = 0x15
+
+# cipher suite -> (认证算法, 完整性算法, 加密算法)
+# 1 = RAKP-HMAC-SHA1 / HMAC-SHA1-96 / AES-CBC-128，0 = 无
+CIPHER_SUITES = {
+    1: (1, 0, 0),
+    2: (1, 1, 0),
+    3: (1, 1, 1),
+}
+
+
+_aes = None
+
+
+def _load_aes():
+    """
+    第一次用到 AES 时才导入 cryptography（导入要几十毫秒，本机通道用不到）。
+    返回 (Cipher, algorithms, modes)，未安装时返回 None。
+    """
+    global _aes
+    if _aes is None:
+        try:
+            from cryptography.hazmat.primitives.ciphers import Cipher, algorithms, modes
+        except ImportError:  # 没有 cryptography 时只支持不加密的 cipher suite
+            _aes = ()
+        else:
+            _aes = (Cipher, algorithms, modes)
+    return _aes or None
+
+
+def hmac_sha1(key, data) -> bytes:
+    return hmac.new(key, data, hashlib.sha1).digest()
+
+
+def _aes_encrypt(key, data):
+    pad_len = (16 - (len(data) + 1) % 16) % 16
+    data = bytes(data) + bytes(range(1, pad_len + 1)) + bytes([pad_len])
+    iv = os.urandom(16)
+    Cipher, algorithms, modes = _load_aes()
+    enc = Cipher(algorithms.AES(key), modes.CBC(iv)).encryptor()
+    return iv + enc.update(data) + enc.finalize()
+
+
+def _aes_decrypt(key, payload):
+    if len(payload) < 32 or len(payload) % 16:
+        raise IpmiError("加密负载长度错误")
+    Cipher, algorithms, modes = _load_aes()
+    dec = Cipher(algorithms.AES(key), modes.CBC(payload[:16])).decryptor()
+    plain = dec.update(payload[16:]) + dec.finalize()
+    return plain[: -(plain[-1] + 1)]
+
+
+def session_keys(auth_key, rm, rc, role, user):
+    """RAKP 完成后由双方随机数推导 SIK、K1、K2"""
+    sik = hmac_sha1(auth_key, rm + rc + bytes([role, len(user)]) + user)
+    return sik, hmac_sha1(sik, b"\x01" * 20), hmac_sha1(sik, b"\x02" * 20)
+
+
+class SessionCodec:
+    """RMCP+ 报文的封装/解析；客户端和测试用的假 BMC 共用"""
+
+    def __init__(self, k1=None, k2=None):
+        self.k1 = k1  # 完整性密钥（HMAC-SHA1-96），None 表示不签名
+        self.k2 = k2  # 加密密钥（AES-CBC-128），None 表示不加密
+
+    def wrap(self, ptype, sid, seq, payload) -> bytes:
+        flags = ptype
+        if self.k2 is not None:
+            payload = _aes_encrypt(self.k2[:16], payload)
+            flags |= 0x80
+        if self.k1 is not None:
+            flags |= 0x40
+
+        body = bytes([AUTH_TYPE_RMCPP, flags]) + struct.pack("<IIH", sid, seq, len(payload)) + payload
+        if self.k1 is not None:
+            pad = (4 - (len(body) + 2) % 4) % 4
+            body += b"\xff" * pad + bytes([pad, 0x07])
+            body += hmac_sha1(self.k1, body)[:12]
+        return RMCP_HEADER + body
+
+    def unwrap(self, packet):
+        """返回 (payload_type, session_id, session_seq, payload)"""
+        if len(packet) < 16 or packet[:4] != RMCP_HEADER or packet[4] != AUTH_TYPE_RMCPP:
+            raise IpmiError("不是 RMCP+ 数据包")
+        flags = packet[5]
+        sid, seq, length = struct.unpack_from("<IIH", packet, 6)
+        payload = packet[16 : 16 + length]
+        if len(payload) != length:
+            raise IpmiError("RMCP+ 数据包被截断")
+
+        if flags & 0x40:
+            if self.k1 is None or len(packet) < 16 + length + 14:
+                raise IpmiError("收到未协商的签名数据包")
+            expected = hmac_sha1(self.k1, packet[4:-12])[:12]
+            if not hmac.compare_digest(expected, packet[-12:]):
+                raise IpmiError("RMCP+ 完整性校验失败")
+        elif self.k1 is not None:
+            raise IpmiError("会话要求签名，但数据包未签名")
+
+        if flags & 0x80:
+            if self.k2 is None:
+                raise IpmiError("收到未协商的加密数据包")
+            payload = _aes_decrypt(self.k2[:16], payload)
+        return flags & 0x3F, sid, seq, bytes(payload)
+
+
+class LanTransport(IpmiTransport):
+    """
+    IPMI over LAN（RMCP+）。open() 时做一次 Open Session + RAKP 握手，
+    之后所有 RAW 命令都在这个会话里收发，一条命令只需一个 UDP 来回。
+    会话空闲太久（BMC 会回收）或通道出错时自动重新握手一次。
+    """
+
+    name = "lan"
+
+    def __init__(
+        self,
+        host,
+        user,
+        password,
+        port=623,
+        timeout=1.0,
+        retries=2,
+        cipher_suite=None,
+        privilege=PRIV_ADMIN,
+        kg=None,
+        idle_reopen=50.0,
+    ):
+        if cipher_suite is None:
+            cipher_suite = 3 if _load_aes() is not None else 2
+        if cipher_suite not in CIPHER_SUITES:
+            raise ValueError(f"不支持的 cipher suite：{cipher_suite}")
+        if CIPHER_SUITES[cipher_suite][2] and _load_aes() is None:
+            raise ValueError(f"cipher suite {cipher_suite} 需要安装 cryptography")
+
+        self.host = host
+        self.port = port
+        self.user = user.encode("utf-8")
+        self.password = password.encode("utf-8")
+        self.timeout = timeout
+        self.retries = retries
+        self.cipher_suite = cipher_suite
+        self.privilege = privilege
+        self.kg = kg.encode("utf-8") if isinstance(kg, str) else kg
+        self.idle_reopen = idle_reopen
+
+        self.sock = None
+        self.codec = SessionCodec()
+        self.bmc_sid = 0
+        self.session_seq = 0
+        self.rq_seq = 0
+        self.last_activity = 0.0
+
+    def describe(self) -> str:
+        return f"IPMI LAN（{self.user.decode()}@{self.host}:{self.port}，cipher {self.cipher_suite}）"
+
+    @property
+    def is_open(self) -> bool:
+        return self.sock is not None and self.bmc_sid != 0
+
+    # ----- 握手 -----
+
+    def open(self):
+        self.close()
+        try:
+            self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+            self.sock.settimeout(self.timeout)
+            self.sock.connect((self.host, self.port))
+        except OSError as e:
+            self.close()
+            raise IpmiError(f"{self.host}:{self.port} 连接失败：{e}") from e
+        self.codec = SessionCodec()
+        self.bmc_sid = 0
+
+        auth_algo, integ_algo, conf_algo = CIPHER_SUITES[self.cipher_suite]
+        console_sid = struct.unpack("<I", os.urandom(4))[0] | 1
+        kuid = self.password.ljust(20, b"\0")[:20]
+        tag = os.urandom(1)[0]
+
+        # Open Session
+        req = bytes([tag, 0, 0, 0]) + struct.pack("<I", console_sid)
+        req += bytes([0x00, 0, 0, 0x08, auth_algo, 0, 0, 0])
+        req += bytes([0x01, 0, 0, 0x08, integ_algo, 0, 0, 0])
+        req += bytes([0x02, 0, 0, 0x08, conf_algo, 0, 0, 0])
+        resp = self._handshake(PAYLOAD_OPEN_SESSION_REQ, req, PAYLOAD_OPEN_SESSION_RESP, tag)
+        if resp[1] != 0:
+            raise IpmiError(f"Open Session 被拒绝，状态码 0x{resp[1]:02x}")
+        bmc_sid = struct.unpack_from("<I", resp, 8)[0]
+
+        # RAKP 1/2
+        rm = os.urandom(16)
+        role = self.privilege | 0x10  # 按用户名查找
+        rakp1 = bytes([tag, 0, 0, 0]) + struct.pack("<I", bmc_sid) + rm
+        rakp1 += bytes([role, 0, 0, len(self.user)]) + self.user
+        resp = self._handshake(PAYLOAD_RAKP1, rakp1, PAYLOAD_RAKP2, tag)
+        if resp[1] != 0:
+            raise IpmiError(f"RAKP2 失败，状态码 0x{resp[1]:02x}（用户名错误？）")
+        rc, guid, auth_code = resp[8:24], resp[24:40], resp[40:60]
+        who = bytes([role, len(self.user)]) + self.user
+        expected = hmac_sha1(kuid, struct.pack("<II", console_sid, bmc_sid) + rm + rc + guid + who)
+        if not hmac.compare_digest(expected, auth_code):
+            raise IpmiError("RAKP2 校验失败（密码错误？）")
+
+        # RAKP 3/4
+        auth3 = hmac_sha1(kuid, rc + struct.pack("<I", console_sid) + who)
+        rakp3 = bytes([tag, 0, 0, 0]) + struct.pack("<I", bmc_sid) + auth3
+        resp = self._handshake(PAYLOAD_RAKP3, rakp3, PAYLOAD_RAKP4, tag)
+        if resp[1] != 0:
+            raise IpmiError(f"RAKP4 失败，状态码 0x{resp[1]:02x}")
+        sik, k1, k2 = session_keys(self.kg or kuid, rm, rc, role, self.user)
+        if not hmac.compare_digest(hmac_sha1(sik, rm + struct.pack("<I", bmc_sid) + guid)[:12], resp[8:20]):
+            raise IpmiError("RAKP4 校验失败")
+
+        self.codec = SessionCodec(k1 if integ_algo else None, k2 if conf_algo else None)
+        self.bmc_sid = bmc_sid
+        self.session_seq = 0
+        self.last_activity = time.monotonic()
+
+        # 会话默认是 User 权限，风扇 OEM 命令需要 Administrator
+        self._request(NETFN_APP, 0x3B, bytes([self.privilege]))
+
+    def _handshake(self, ptype, payload, expect_type, tag):
+        packet = SessionCodec().wrap(ptype, 0, 0, payload)
+        for _ in range(self.retries + 1):
+            self._send(packet)
+            deadline = time.monotonic() + self.timeout
+            while True:
+                data = self._recv_until(deadline)
+                if data is None:
+                    break
+                try:
+                    rtype, _sid, _seq, resp = SessionCodec().unwrap(data)
+                except IpmiError:
+                    continue
+                if rtype == expect_type and len(resp) >= 2 and resp[0] == tag:
+                    if resp[1] == 0 and len(resp) < {0x11: 36, 0x13: 60, 0x15: 20}[expect_type]:
+                        raise IpmiError("握手响应过短")
+                    return resp
+        raise IpmiError(f"连接 {self.host}:{self.port} 握手超时")
+
+    def _send(self, packet):
+        try:
+            self.sock.send(packet)
+        except OSError as e:
+            raise IpmiError(f"{self.host}:{self.port} 发送失败：{e}") from e
+
+    def _recv_until(self, deadline):
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            return None
+        self.sock.settimeout(remaining)
+        try:
+            return self.sock.recv(4096)
+        except socket.timeout:
+            return None
+        except OSError as e:
+            raise IpmiError(f"网络错误：{e}") from e
+
+    # ----- 会话内收发 -----
+
+    def _request(self, netfn, cmd, data=b""):
+        self.rq_seq = (self.rq_seq + 1) & 0x3F
+        msg = pack_message(netfn, cmd, data, self.rq_seq)
+
+        for _ in range(self.retries + 1):
+            self.session_seq = (self.session_seq + 1) & 0xFFFFFFFF or 1
+            self._send(self.codec.wrap(PAYLOAD_IPMI, self.bmc_sid, self.session_seq, msg))
+            deadline = time.monotonic() + self.timeout
+            while True:
+                packet = self._recv_until(deadline)
+                if packet is None:
+                    break
+                try:
+                    ptype, _sid, _seq, payload = self.codec.unwrap(packet)
+                    if ptype != PAYLOAD_IPMI:
+                        continue
+                    r_netfn, r_seq, r_cmd, body = unpack_message(payload)
+                except IpmiError:
+                    continue
+                if r_seq != self.rq_seq or r_cmd != cmd or r_netfn != (netfn | 1) or not body:
+                    continue  # 迟到的旧响应
+
+                self.last_activity = time.monotonic()
+                if body[0] != 0:
+                    raise IpmiError(f"BMC 返回完成码 0x{body[0]:02x}", body[0])
+                return body[1:]
+        raise IpmiError(f"{self.host}:{self.port} 响应超时")
+
+    def _request_many(self, requests):
+        """流水线：一次发出一批请求，再按 rqSeq 收回响应，丢失的整体重发"""
+        results = [None] * len(requests)
+        pending = {}  # rq_seq -> (index, netfn, cmd, msg)
+        for i, (netfn, cmd, data) in enumerate(requests):
+            self.rq_seq = (self.rq_seq + 1) & 0x3F
+            pending[self.rq_seq] = (i, netfn, cmd, pack_message(netfn, cmd, data, self.rq_seq))
+
+        for _ in range(self.retries + 1):
+            for _i, _netfn, _cmd, msg in pending.values():
+                self.session_seq = (self.session_seq + 1) & 0xFFFFFFFF or 1
+                self._send(self.codec.wrap(PAYLOAD_IPMI, self.bmc_sid, self.session_seq, msg))
+
+            deadline = time.monotonic() + self.timeout
+            while pending:
+                packet = self._recv_until(deadline)
+                if packet is None:
+                    break
+                try:
+                    ptype, _sid, _seq, payload = self.codec.unwrap(packet)
+                    if ptype != PAYLOAD_IPMI:
+                        continue
+                    r_netfn, r_seq, r_cmd, body = unpack_message(payload)
+                except IpmiError:
+                    continue
+                entry = pending.get(r_seq)
+                if entry is None or r_cmd != entry[2] or r_netfn != (entry[1] | 1) or not body:
+                    continue
+
+                del pending[r_seq]
+                self.last_activity = time.monotonic()
+                if body[0] != 0:
+                    results[entry[0]] = IpmiError(f"BMC 返回完成码 0x{body[0]:02x}", body[0])
+                else:
+                    results[entry[0]] = body[1:]
+            if not pending:
+                break
+
+        for i, _netfn, _cmd, _msg in pending.values():
+            results[i] = IpmiError(f"{self.host}:{self.port} 响应超时")
+        return results
+
+    def raw_many(self, requests, window=16):
+        if not self.is_open or time.monotonic() - self.last_activity > self.idle_reopen:
+            self.open()
+        results = []
+        # rqSeq 只有 6 位，每批不超过 window 条，保证批内序号不重复
+        for start in range(0, len(requests), window):
+            batch = self._request_many(requests[start : start + window])
+            if all(isinstance(r, IpmiError) and r.completion_code is None for r in batch):
+                # 整批超时：会话可能已被 BMC 回收，重新握手后再试一次
+                self.open()
+                batch = self._request_many(requests[start : start + window])
+            results.extend(batch)
+        return results
+
+    def raw(self, netfn, cmd, data=b""):
+        if not self.is_open or time.monotonic() - self.last_activity > self.idle_reopen:
+            self.open()
+        try:
+            return self._request(netfn, cmd, data)
+        except IpmiError as e:
+            if e.completion_code is not None:
+                raise
+        # 会话可能已被 BMC 回收：重新握手后再试一次
+        self.open()
+        return self._request(netfn, cmd, data)
+
+    def close(self):
+        if self.sock is None:
+            return
+        if self.bmc_sid:
+            # Close Session 只发不等，BMC 没收到也会在超时后自行回收
+            self.rq_seq = (self.rq_seq + 1) & 0x3F
+            self.session_seq = (self.session_seq + 1) & 0xFFFFFFFF or 1
+            msg = pack_message(NETFN_APP, 0x3C, struct.pack("<I", self.bmc_sid), self.rq_seq)
+            try:
+                self.sock.send(self.codec.wrap(PAYLOAD_IPMI, self.bmc_sid, self.session_seq, msg))
+            except OSError:
+                pass
+        self.sock.close()
+        self.sock = None
+        self.bmc_sid = 0
+
+
+# ---------- 合并命令队列 ----------
+
+class CommandQueue:
+    """
+    按 key 合并的待发命令队列（线程安全）：
+    同一个 key（例如某个风扇区）只保留最新提交的一条，旧的未发送命令直接丢弃；
+    出队顺序按各 key 最近一次提交的先后。
+    配合单个消费线程使用时，每个 key 最多一条在发送中、一条在排队。
+    """
+
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._pending = {}
+        self._closed = False
+        self.submitted = 0
+        self.coalesced = 0
+
+    def put(self, key, item):
+        with self._cond:
+            if self._closed:
+                return
+            self.submitted += 1
+            if self._pending.pop(key, None) is not None:
+                self.coalesced += 1
+            self._pending[key] = item
+            self._cond.notify()
+
+    def get(self, timeout=None):
+        """取出 (key, item)；队列关闭且已排空时返回 None，超时也返回 None"""
+        with self._cond:
+            if not self._cond.wait_for(lambda: self._pending or self._closed, timeout):
+                return None
+            if not self._pending:
+                return None
+            key = next(iter(self._pending))
+            return key, self._pending.pop(key)
+
+    @property
+    def closed(self) -> bool:
+        return self._closed
+
+    def close(self):
+        """不再接受新命令；已排队的命令仍会被取完"""
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+
+    def __len__(self):
+        with self._cond:
+            return len(self._pending)
+
+
+# ---------- 风扇状态（读） ----------
+
+# BMC 风扇状态缓存的有效期（秒）
+FAN_STATE_TTL = 5.0
+
+
+class FanState:
+    """
+    BMC 当前的风扇模式和各风扇区占空比，读到的值缓存 ttl 秒。
+
+    refresh() 用一个 raw_many 批次读模式 + 所有风扇区（LAN 通道一个来回），
+    mode() / duty() 在缓存过期时自动刷新，读取失败时返回 None 而不抛异常
+    （失败也缓存 ttl 秒，不支持读取的 BMC 不会每次都重试）。
+    写入成功后调用 record_duty() 直接更新缓存，不必再读一次；
+    写入失败或改了风扇模式（BMC 会自己调整占空比）后调用 invalidate()。
+    只有 Full 模式下读到的占空比才能当作“已经写好”的值（held_duty()），其它模式下 BMC 随时会改。
+    """
+
+    def __init__(self, transport, zones=(0, 1), ttl=FAN_STATE_TTL, clock=time.monotonic, log=None):
+        self.transport = transport
+        self.zones = tuple(zones)
+        self.ttl = ttl
+        self.clock = clock
+        self.log = log
+        self._mode = None         # (值, 读到 / 写入的时间)，值为 None 表示读取失败
+        self._duties = {}         # zone -> (占空比, 时间)
+        self.refreshes = 0
+
+    def _fresh(self, entry):
+        return entry is not None and self.clock() - entry[1] <= self.ttl
+
+    def refresh(self) -> bool:
+        """读一次 BMC；返回是否成功读到了模式"""
+        self.refreshes += 1
+        requests = [fan_mode_query()] + [fan_duty_query(z) for z in self.zones]
+        try:
+            results = self.transport.raw_many(requests)
+        except IpmiError as e:
+            results = [e] * len(requests)
+        now = self.clock()
+        mode, duties = results[0], results[1:]
+        if isinstance(mode, IpmiError) or not mode:
+            if self.log is not None:
+                self.log(f"读取 BMC 风扇模式失败：{mode or '空响应'}")
+            self._mode = (None, now)
+        else:
+            self._mode = (mode[0], now)
+        for zone, resp in zip(self.zones, duties):
+            ok = not isinstance(resp, IpmiError) and resp
+            self._duties[zone] = (resp[0] if ok else None, now)
+        return self._mode[0] is not None
+
+    def mode(self):
+        if not self._fresh(self._mode):
+            self.refresh()
+        return self._mode[0]
+
+    def duty(self, zone: int):
+        """zone 当前的占空比（%）；BMC 不支持读取或读取失败时为 None"""
+        if not self._fresh(self._duties.get(zone)):
+            self.refresh()
+        entry = self._duties.get(zone)
+        return entry[0] if entry is not None else None
+
+    def held_duty(self, zone: int):
+        """Full 模式下 zone 保持的占空比；BMC 自己调速（其它模式）或读不到时为 None"""
+        if self.mode() != FAN_MODE_FULL:
+            return None
+        return self.duty(zone)
+
+    def duties(self) -> dict:
+        """{zone: 占空比}，只含读得到的区"""
+        if not all(self._fresh(self._duties.get(z)) for z in self.zones):
+            self.refresh()
+        return {zone: entry[0] for zone, entry in self._duties.items() if entry[0] is not None}
+
+    def record_duty(self, zone: int, duty: int):
+        self._duties[zone] = (duty, self.clock())
+
+    def invalidate(self, zone=None):
+        """写入失败等情况下 BMC 的实际值不确定：下次读取时重新问 BMC"""
+        if zone is None:
+            self._mode = None
+            self._duties.clear()
+        else:
+            self._duties.pop(zone, None)
+
+    def describe(self) -> str:
+        duties = ", ".join(
+            f"zone{z} {d[0]}%" for z, d in sorted(self._duties.items()) if d[0] is not None
+        )
+        mode = describe_fan_mode(self._mode[0] if self._mode is not None else None)
+        return f"BMC 风扇模式 {mode}" + (f"，{duties}" if duties else "")
+
+
+# ---------- 兜底组合 & 工厂 ----------
+
+class FallbackTransport(IpmiTransport):
+    """主通道出错（非 BMC 完成码错误）时改用兜底通道（通常是 IPMICFG）"""
+
+    def __init__(self, primary, fallback, log=None):
+        self.primary = primary
+        self.fallback = fallback
+        self.log = log
+        self.name = f"{primary.name}+{fallback.name}"
+
+    def describe(self) -> str:
+        return f"{self.primary.describe()}，兜底 {self.fallback.describe()}"
+
+    def set_log(self, log):
+        self.log = log
+        self.primary.set_log(log)
+        self.fallback.set_log(log)
+
+    def raw(self, netfn, cmd, data=b""):
+        try:
+            return self.primary.raw(netfn, cmd, data)
+        except IpmiError as e:
+            if e.completion_code is not None:
+                raise
+            if self.log is not None:
+                self.log(f"{self.primary.name} 通道失败（{e}），改用 {self.fallback.name}")
+        return self.fallback.raw(netfn, cmd, data)
+
+    def raw_many(self, requests):
+        results = self.primary.raw_many(requests)
+        for i, result in enumerate(results):
+            if isinstance(result, IpmiError) and result.completion_code is None:
+                netfn, cmd, data = requests[i]
+                try:
+                    results[i] = self.fallback.raw(netfn, cmd, data)
+                except IpmiError as e:
+                    results[i] = e
+        return results
+
+    def close(self):
+        self.primary.close()
+        self.fallback.close()
+
+
+TRANSPORT_KINDS = ("auto", "ipmicfg", "wmi", "openipmi", "lan")
+
+
+def open_transport(
+    kind="auto",
+    ipmi_exe=None,
+    host=None,
+    user="ADMIN",
+    password="",
+    port=623,
+    cipher_suite=None,
+    log=None,
+):
+    """
+    按 kind 打开 IPMI 通道：
+    - auto：给了 host 用 LAN；否则 Windows 用 Microsoft_IPMI、Linux 用 /dev/ipmi0；
+            都不可用时退回 IPMICFG。只要有 ipmi_exe，运行中出错也会临时改用 IPMICFG。
+    """
+
+    def logmsg(msg: str):
+        if log is not None:
+            log(msg)
+
+    if kind not in TRANSPORT_KINDS:
+        raise ValueError(f"未知的 IPMI 通道：{kind}")
+
+    fallback = IpmicfgTransport(ipmi_exe, log=log) if ipmi_exe else None
+    if kind == "ipmicfg":
+        if fallback is None:
+            raise IpmiError("未找到 IPMICFG")
+        return fallback
+
+    if kind == "lan" or (kind == "auto" and host):
+        if not host:
+            raise ValueError("LAN 通道需要 host")
+        candidates = [
+            lambda: LanTransport(host, user, password, port=port, cipher_suite=cipher_suite)
+        ]
+    elif kind == "wmi" or (kind == "auto" and os.name == "nt"):
+        candidates = [WinIpmiTransport]
+    else:
+        candidates = [OpenIpmiTransport]
+
+    for factory in candidates:
+        try:
+            transport = factory()
+            if isinstance(transport, LanTransport):
+                transport.open()
+        except (IpmiError, OSError, ImportError) as e:
+            if kind != "auto" or fallback is None:
+                raise IpmiError(f"无法打开 IPMI 通道：{e}") from e
+            logmsg(f"IPMI 常驻通道不可用（{e}），使用 IPMICFG。")
+            return fallback
+
+        if fallback is not None:
+            return FallbackTransport(transport, fallback, log=log)
+        return transport
+
+    return fallback
@@ -1,13 +1,17 @@
-import os
-import sys
 import time
-import subprocess
-import ctypes
 
-import wmi
-import pythoncom
+# 启动计时起点：必须在 PyQt6 等重量级 import 之前
+STARTUP_T0 = time.perf_counter()
+
+import os
+import sys
+import argparse
+import functools
+import logging
+import threading
+import weakref
 
-from PyQt6.QtCore import Qt, QThread, pyqtSignal
+from PyQt6.QtCore import QPointF, Qt, QThread, QTimer, pyqtSignal
 from PyQt6.QtWidgets import (
     QApplication,
     QMainWindow,
@@ -21,110 +25,83 @@ from PyQt6.QtWidgets import (
     QPushButton,
     QPlainTextEdit,
     QSpinBox,
+    QComboBox,
+    QFileDialog,
+)
+from PyQt6.QtGui import QFont, QPainter, QPen, QColor, QPixmap, QPolygonF
+
+from applog import LOG_LEVELS, BufferedHandler, WriteSummary, log, parse_level, setup_logging
+from control import (
+    CONTROLLER_KINDS,
+    DEFAULT_DEADBAND,
+    DEFAULT_FAILSAFE_AFTER,
+    DEFAULT_FAILSAFE_DUTY,
+    DEFAULT_HYST_DOWN,
+    DEFAULT_HYST_UP,
+    DEFAULT_MIN_DWELL,
+    DEFAULT_PID_SETPOINT,
+    CurveController,
+    DutyFilter,
+    PidController,
+    SensorFallback,
+)
+from curve import DEFAULT_CURVE_POINTS, FanCurve
+from history import HISTORY_CAPACITY, TelemetryHistory
+from sdr import BmcSensors
+from scheduler import MAX_INTERVAL, MIN_INTERVAL, AdaptiveInterval, DeadlineSchedule
+from sensors import (
+    LHM_HTTP_URL,
+    READ_TIMEOUT,
+    READER_KINDS,
+    BoundedReader,
+    open_sensor_reader,
+    resolve_reader_kind,
+)
+from zones import CPU_SENSOR, load_zone_map
+from metrics import JsonDumper, Metrics, MetricsServer
+from replay import TraceRecorder
+from ipmi import (
+    BMC_AUTO_FAN_MODE,
+    CommandQueue,
+    FAN_MODE_FULL,
+    FanState,
+    IpmiError,
+    TRANSPORT_KINDS,
+    describe_fan_mode,
+    format_raw,
+    open_transport,
+    parse_raw_args,
+)
+from runtime import LhmSupervisor, StartupTimer, find_ipmicfg, is_admin, user_data_dir
+from service import (
+    MODE_LABELS,
+    MSG_LOG,
+    MSG_RESULT,
+    MSG_STATE,
+    MSG_TELEMETRY,
+    SERVICE_ADDRESS,
+    ServiceClient,
+    load_token,
 )
-from PyQt6.QtGui import QFont, QPainter, QPen, QColor
-
-
-# 温度刷新间隔（秒）
-TEMP_POLL_INTERVAL = 5
-
-
-# ---------- 工具函数：管理员 & 资源路径 ----------
-
-def is_admin() -> bool:
-    try:
-        return bool(ctypes.windll.shell32.IsUserAnAdmin())
-    except Exception:
-        return False
-
-
-def base_dir_for_resources() -> str:
-    """
-    资源目录：
-    - 运行 .py 时：脚本所在目录
-    - 打包后单 exe：PyInstaller 解压目录 sys._MEIPASS
-    """
-    if getattr(sys, "frozen", False) and hasattr(sys, "_MEIPASS"):
-        return sys._MEIPASS
-    return os.path.dirname(os.path.abspath(__file__))
-
-
-def find_ipmicfg() -> str:
-    base_dir = base_dir_for_resources()
-    ipmi_exe = os.path.join(base_dir, "IPMICFG-Win.exe")
-    if not os.path.exists(ipmi_exe):
-        raise FileNotFoundError(f"未找到 IPMICFG-Win.exe：{ipmi_exe}")
-    return ipmi_exe
-
-
-def find_lhm_exe() -> str:
-    """
-    在资源目录下的 LibreHardwareMonitor\LibreHardwareMonitor.exe
-    （适配：打包时 --add-data "LibreHardwareMonitor;LibreHardwareMonitor"）
-    """
-    base_dir = base_dir_for_resources()
-    exe = os.path.join(base_dir, "LibreHardwareMonitor", "LibreHardwareMonitor.exe")
-    if not os.path.exists(exe):
-        raise FileNotFoundError(f"未找到 LibreHardwareMonitor.exe：{exe}")
-    return exe
-def has_lhm_sensors() -> bool:
-    """检查 root\\LibreHardwareMonitor 里是否有温度传感器"""
-    try:
-        conn = wmi.WMI(namespace="root\\LibreHardwareMonitor")
-        sensors = conn.Sensor(SensorType="Temperature")
-        return len(sensors) > 0
-    except Exception:
-        return False
-
-def ensure_lhm_running(log=None):
-    """
-    确保 LibreHardwareMonitor 在运行：
-    - 如果 WMI 里已经有温度传感器，就直接用（可能是你自己开着 LHM）；
-    - 否则从本地 LibreHardwareMonitor\\LibreHardwareMonitor.exe 启动一个，
-      再检查一次是否出现传感器。
-    """
-
-    def logmsg(msg: str):
-        if log is not None:
-            log(msg)
-        else:
-            print(msg)
-
-    logmsg("检查 LibreHardwareMonitor 状态...")
-
-    # 第一次检查：有没有可用的温度传感器
-    if has_lhm_sensors():
-        logmsg("检测到 root\\LibreHardwareMonitor 已有温度传感器，直接使用现有实例。")
-        return
-
-    logmsg("未检测到有效的 LibreHardwareMonitor 温度传感器，准备启动内置 LibreHardwareMonitor.exe ...")
 
-    # 找 exe
-    try:
-        exe = find_lhm_exe()
-    except FileNotFoundError as e:
-        logmsg(str(e))
-        return
+STARTUP_IMPORTED = time.perf_counter()
 
-    # 后台启动（不弹黑框）
-    creationflags = 0
-    if os.name == "nt" and hasattr(subprocess, "CREATE_NO_WINDOW"):
-        creationflags = subprocess.CREATE_NO_WINDOW
 
-    try:
-        subprocess.Popen([exe], creationflags=creationflags)
-        logmsg(f"已启动 LibreHardwareMonitor：{exe}")
-        # 给它一点时间初始化并注册 WMI 命名空间
-        time.sleep(3.0)
-    except Exception as e:
-        logmsg(f"启动 LibreHardwareMonitor 失败：{e}")
-        return
-
-    # 再检查一次传感器是否出现
-    if has_lhm_sensors():
-        logmsg("内置 LibreHardwareMonitor 已启动并提供温度传感器。")
-    else:
-        logmsg("警告：启动内置 LibreHardwareMonitor 后仍未检测到温度传感器。")
+# 温度刷新间隔（秒）：自适应采样在 [最小, 最大] 之间调整，两者相等时为固定间隔
+TEMP_POLL_MIN_INTERVAL = MIN_INTERVAL
+TEMP_POLL_MAX_INTERVAL = MAX_INTERVAL
+# BMC 传感器（风扇转速 / 主板温度）快照间隔（秒）
+BMC_POLL_INTERVAL = 10
+# 日志窗口：批量刷新间隔（毫秒）与最多保留的行数
+LOG_FLUSH_INTERVAL_MS = 200
+LOG_MAX_BLOCKS = 2000
+# 控制服务断开后重连的间隔（秒）
+SERVICE_RETRY_INTERVAL = 2.0
+# 连接控制服务时，曲线控制点停止修改这么久（毫秒）后才发给服务，输入中途的值不下发
+CURVE_SEND_DELAY_MS = 800
+# CPU 温度达到该值时显示为红色
+TEMP_ALARM_C = 80.0
+TEMP_STYLES = {"unknown": "color: gray;", "normal": "color: black;", "alarm": "color: red;"}
 
 
 # ---------- 曲线图控件 ----------
@@ -135,46 +112,62 @@ class FanCurveWidget(QWidget):
     X 轴：温度（°C）
     Y 轴：风扇百分比（0–100）
     折线 = 曲线，蓝色 X = 当前温度/转速点
+
+    坐标轴、刻度和折线画在缓存的 QPixmap 里，只在尺寸或曲线变化时重画；
+    平时每帧只贴背景、画当前点。当前点的刷新不超过屏幕刷新率。
     """
 
+    MARGINS = (40, 20, 20, 30)   # 左、上、右、下
+    MARKER_SIZE = 6
+
     def __init__(self, parent=None):
         super().__init__(parent)
         self.curve_points = []      # [(temp, fan), ...]
         self.current_point = None   # (temp, fan) or None
+        self.background = None      # 缓存的静态部分
+        self.mapping = None         # (plot_rect, t_min, t_max, f_min, f_max)
         self.setMinimumHeight(160)
 
+        # 帧节流：一帧内多次 set_current_point 只重画一次
+        self.frame_timer = QTimer(self)
+        self.frame_timer.setSingleShot(True)
+        self.frame_timer.timeout.connect(self.update)
+
     def set_curve_points(self, points):
-        self.curve_points = points or []
-        self.update()
+        points = list(points or [])
+        if points == self.curve_points:
+            return
+        self.curve_points = points
+        self.invalidate()
 
     def set_current_point(self, temp, fan):
         if temp is None or fan is None:
-            self.current_point = None
+            point = None
         else:
-            self.current_point = (float(temp), float(fan))
-        self.update()
-
-    def paintEvent(self, event):
-        painter = QPainter(self)
-        painter.setRenderHint(QPainter.RenderHint.Antialiasing, True)
+            point = (float(temp), float(fan))
+        if point == self.current_point:
+            return
+        self.current_point = point
+        self.schedule_frame()
 
-        painter.fillRect(self.rect(), QColor(250, 250, 250))
+    def invalidate(self):
+        self.background = None
+        self.update()
 
-        if not self.curve_points:
+    def schedule_frame(self):
+        if self.frame_timer.isActive():
             return
+        screen = self.screen()
+        rate = screen.refreshRate() if screen is not None else 0.0
+        self.frame_timer.start(int(1000.0 / rate) if rate > 0 else 16)
 
-        rect = self.rect()
-        margin_left = 40
-        margin_right = 20
-        margin_top = 20
-        margin_bottom = 30
-
-        plot_rect = rect.adjusted(
-            margin_left,
-            margin_top,
-            -margin_right,
-            -margin_bottom,
-        )
+    def resizeEvent(self, event):
+        self.background = None
+        super().resizeEvent(event)
+
+    def compute_mapping(self):
+        left, top, right, bottom = self.MARGINS
+        plot_rect = self.rect().adjusted(left, top, -right, -bottom)
 
         temps = [p[0] for p in self.curve_points]
         fans = [p[1] for p in self.curve_points] + [0, 100]
@@ -188,12 +181,27 @@ class FanCurveWidget(QWidget):
         if f_max == f_min:
             f_min = 0
             f_max = 100
-
-        def map_x(temp):
-            return plot_rect.left() + (temp - t_min) / (t_max - t_min) * plot_rect.width()
-
-        def map_y(fan):
-            return plot_rect.bottom() - (fan - f_min) / (f_max - f_min) * plot_rect.height()
+        return plot_rect, t_min, t_max, f_min, f_max
+
+    def map_point(self, temp, fan):
+        plot_rect, t_min, t_max, f_min, f_max = self.mapping
+        x = plot_rect.left() + (temp - t_min) / (t_max - t_min) * plot_rect.width()
+        y = plot_rect.bottom() - (fan - f_min) / (f_max - f_min) * plot_rect.height()
+        return x, y
+
+    def render_background(self):
+        """把背景、坐标轴、刻度和曲线折线画进缓存"""
+        ratio = self.devicePixelRatioF()
+        pixmap = QPixmap(int(self.width() * ratio), int(self.height() * ratio))
+        pixmap.setDevicePixelRatio(ratio)
+        pixmap.fill(QColor(250, 250, 250))
+        self.mapping = self.compute_mapping() if self.curve_points else None
+        if self.mapping is None:
+            return pixmap
+
+        painter = QPainter(pixmap)
+        painter.setRenderHint(QPainter.RenderHint.Antialiasing, True)
+        plot_rect = self.mapping[0]
 
         # 坐标轴
         pen_axis = QPen(QColor(150, 150, 150))
@@ -218,7 +226,7 @@ class FanCurveWidget(QWidget):
         font.setPointSize(8)
         painter.setFont(font)
         for val in (0, 50, 100):
-            y = map_y(val)
+            _, y = self.map_point(self.mapping[1], val)
             painter.drawLine(
                 int(plot_rect.left() - 5),
                 int(y),
@@ -232,8 +240,8 @@ class FanCurveWidget(QWidget):
             )
 
         # X 轴刻度（用曲线点的温度）
-        for t in temps:
-            x = map_x(t)
+        for t, _fan in self.curve_points:
+            x, _ = self.map_point(t, 0)
             painter.drawLine(
                 int(x),
                 int(plot_rect.bottom()),
@@ -243,7 +251,7 @@ class FanCurveWidget(QWidget):
             painter.drawText(
                 int(x - 12),
                 int(plot_rect.bottom() + 18),
-                f"{t}°",
+                f"{t:g}°",
             )
 
         # 画曲线
@@ -252,137 +260,504 @@ class FanCurveWidget(QWidget):
             pen_curve = QPen(QColor(80, 80, 80))
             pen_curve.setWidth(2)
             painter.setPen(pen_curve)
-            prev_x = map_x(pts[0][0])
-            prev_y = map_y(pts[0][1])
-            for temp, fan in pts[1:]:
-                x = map_x(temp)
-                y = map_y(fan)
-                painter.drawLine(
-                    int(prev_x),
-                    int(prev_y),
-                    int(x),
-                    int(y),
-                )
-                prev_x, prev_y = x, y
+            painter.drawPolyline(QPolygonF([QPointF(*self.map_point(t, f)) for t, f in pts]))
+        painter.end()
+        return pixmap
+
+    def paintEvent(self, event):
+        if self.background is None:
+            self.background = self.render_background()
+
+        painter = QPainter(self)
+        painter.drawPixmap(0, 0, self.background)
 
         # 当前点：蓝色 X
-        if self.current_point is not None:
-            temp, fan = self.current_point
-            x = map_x(temp)
-            y = map_y(fan)
-            size = 6
-            pen_x = QPen(QColor(0, 80, 200))
-            pen_x.setWidth(2)
-            painter.setPen(pen_x)
-            painter.drawLine(
-                int(x - size),
-                int(y - size),
-                int(x + size),
-                int(y + size),
-            )
-            painter.drawLine(
-                int(x - size),
-                int(y + size),
-                int(x + size),
-                int(y - size),
-            )
+        if self.current_point is None or self.mapping is None:
+            return
+        painter.setRenderHint(QPainter.RenderHint.Antialiasing, True)
+        x, y = self.map_point(*self.current_point)
+        size = self.MARKER_SIZE
+        pen_x = QPen(QColor(0, 80, 200))
+        pen_x.setWidth(2)
+        painter.setPen(pen_x)
+        painter.drawLine(
+            int(x - size),
+            int(y - size),
+            int(x + size),
+            int(y + size),
+        )
+        painter.drawLine(
+            int(x - size),
+            int(y + size),
+            int(x + size),
+            int(y - size),
+        )
+
 
+# ---------- 历史曲线控件 ----------
 
-# ---------- LibreHardwareMonitor 读取封装 ----------
+class HistoryChartWidget(QWidget):
+    """
+    最近一段时间的温度 / 占空比走势，直接从 TelemetryHistory 降采样绘制：
+    每个像素列一个桶，红色竖线 = 该桶温度 min~max，蓝线 = 占空比（右轴 0–100%）
+    """
 
-class LibreHWReader:
-    """在工作线程中通过 WMI 访问 LibreHardwareMonitor 的温度传感器"""
+    def __init__(self, history, span_sec=3600.0, parent=None):
+        super().__init__(parent)
+        self.history = history
+        self.span_sec = span_sec
+        self.setMinimumHeight(160)
+        self.setMinimumWidth(240)
 
-    def __init__(self):
-        try:
-            self.conn = wmi.WMI(namespace="root\\LibreHardwareMonitor")
-        except wmi.x_wmi as e:
-            raise RuntimeError(
-                "无法连接到 root\\LibreHardwareMonitor。\n\n"
-                "请确认 LibreHardwareMonitor 已启动。"
-            ) from e
-
-    def read_max_cpu_temp(self):
-        all_cpu_temps = {}
-        max_core = None
-        package_temp = None
-
-        for sensor in self.conn.Sensor(SensorType="Temperature"):
-            if sensor.Value is None:
-                continue
+    def set_span(self, span_sec: float):
+        self.span_sec = span_sec
+        self.update()
 
-            name = sensor.Name
-            upper_name = name.upper()
-            value = float(sensor.Value)
+    def paintEvent(self, event):
+        painter = QPainter(self)
+        painter.fillRect(self.rect(), QColor(250, 250, 250))
 
-            if "CPU" in upper_name:
-                all_cpu_temps[name] = value
+        rect = self.rect()
+        plot_rect = rect.adjusted(40, 20, -40, -30)
+        last = self.history.last()
+        if last is None or plot_rect.width() <= 0:
+            painter.setPen(QPen(QColor(150, 150, 150)))
+            painter.drawText(rect, Qt.AlignmentFlag.AlignCenter, "暂无历史数据")
+            return
 
-        if "CPU Package" in all_cpu_temps:
-            package_temp = all_cpu_temps["CPU Package"]
+        until = last[0]
+        since = until - self.span_sec
+        ts, t_lo, t_hi, duty = self.history.downsample(plot_rect.width(), since, until)
+        if not ts:
+            return
 
-        for name, value in all_cpu_temps.items():
-            if name.upper().startswith("CPU CORE #"):
-                if (max_core is None) or (value > max_core):
-                    max_core = value
+        y_min = min(t_lo)
+        y_max = max(t_hi)
+        y_min = 5.0 * int(y_min // 5.0)
+        y_max = max(y_min + 10.0, 5.0 * (int(y_max // 5.0) + 1))
 
-        if max_core is not None:
-            return max_core
-        return package_temp
+        def map_x(t):
+            return plot_rect.left() + (t - since) / self.span_sec * plot_rect.width()
+
+        def map_temp(v):
+            return plot_rect.bottom() - (v - y_min) / (y_max - y_min) * plot_rect.height()
+
+        def map_duty(v):
+            return plot_rect.bottom() - v / 100.0 * plot_rect.height()
+
+        # 坐标轴和刻度
+        pen_axis = QPen(QColor(150, 150, 150))
+        pen_axis.setWidth(2)
+        painter.setPen(pen_axis)
+        painter.drawLine(
+            int(plot_rect.left()),
+            int(plot_rect.bottom()),
+            int(plot_rect.right()),
+            int(plot_rect.bottom()),
+        )
+
+        painter.setPen(QPen(QColor(180, 180, 180)))
+        font = painter.font()
+        font.setPointSize(8)
+        painter.setFont(font)
+        painter.drawText(5, int(map_temp(y_max) + 3), f"{y_max:g}°")
+        painter.drawText(5, int(map_temp(y_min) + 3), f"{y_min:g}°")
+        painter.drawText(int(plot_rect.right() + 5), int(map_duty(100) + 3), "100%")
+        painter.drawText(int(plot_rect.right() + 5), int(map_duty(0) + 3), "0%")
+        minutes = self.span_sec / 60.0
+        painter.drawText(int(plot_rect.left()), int(plot_rect.bottom() + 18), f"-{minutes:g} 分钟")
+        painter.drawText(int(plot_rect.right() - 20), int(plot_rect.bottom() + 18), "现在")
+
+        # 温度：每桶一条 min~max 竖线
+        pen_temp = QPen(QColor(200, 60, 60))
+        painter.setPen(pen_temp)
+        for t, lo, hi in zip(ts, t_lo, t_hi):
+            x = int(map_x(t))
+            painter.drawLine(x, int(map_temp(lo)), x, int(map_temp(hi)))
+
+        # 占空比：折线
+        pen_duty = QPen(QColor(0, 80, 200))
+        pen_duty.setWidth(2)
+        painter.setPen(pen_duty)
+        prev = None
+        for t, d in zip(ts, duty):
+            pt = (int(map_x(t)), int(map_duty(d)))
+            if prev is not None:
+                painter.drawLine(prev[0], prev[1], pt[0], pt[1])
+            prev = pt
 
 
 # ---------- 后台线程：周期读取温度 ----------
 
 class TempWorker(QThread):
     tempsUpdated = pyqtSignal(object, float)  # max_temp, dt_ms
+    socketsUpdated = pyqtSignal(object)       # [SocketTemps, ...]
+    samplingUpdated = pyqtSignal(float, float)  # next_interval_sec, samples_per_sec
     errorOccurred = pyqtSignal(str, float)    # error_message, dt_ms
-
-    def __init__(self, interval_sec=TEMP_POLL_INTERVAL, parent=None):
+    sensorsUpdated = pyqtSignal(object)       # {名称: 温度}，仅在 watch_sensors 非空时
+
+    def __init__(
+        self,
+        reader_factory,
+        min_interval=TEMP_POLL_MIN_INTERVAL,
+        max_interval=TEMP_POLL_MAX_INTERVAL,
+        watch_sensors=(),
+        metrics=None,
+        trace_path=None,
+        read_timeout=READ_TIMEOUT,
+        parent=None,
+    ):
         super().__init__(parent)
-        self.interval_sec = interval_sec
-        self._running = True
+        self.reader_factory = reader_factory
+        # 单次读取的时限（秒）：LHM 卡住时按读取失败处理，不拖住采样；None 为不限时
+        self.read_timeout = read_timeout
+        self.watch_sensors = frozenset(watch_sensors)
+        self.metrics = metrics
+        # --record-trace：把采样流录制成轨迹文件（在本线程里打开和写入）
+        self.trace_path = trace_path
+        self.sampler = AdaptiveInterval(min_interval, max_interval)
+        # 按截止时间排采样；stop() 立即打断等待
+        self.schedule = DeadlineSchedule()
+        self._stop_event = threading.Event()
 
     def stop(self):
-        self._running = False
+        self._stop_event.set()
+
+    def set_breakpoints(self, temps):
+        """曲线拐点附近加密采样（GUI 线程调用，替换整个元组，无需加锁）"""
+        self.sampler.set_breakpoints(temps)
 
     def run(self):
-        pythoncom.CoInitialize()
+        # 读取后端在本线程里创建和关闭（LibreHWReader 的 COM 对象与线程绑定），
+        # 检查 / 启动 LibreHardwareMonitor 也在这里做，不阻塞窗口显示
         try:
+            if self.read_timeout:
+                reader = BoundedReader(
+                    functools.partial(self.reader_factory, log=log.info),
+                    self.read_timeout,
+                    log=log.warning,
+                )
+            else:
+                reader = self.reader_factory(log=log.info)
+        except Exception as e:
+            self.errorOccurred.emit(str(e), 0.0)
+            return
+        reader.watch(self.watch_sensors)
+        metrics = self.metrics
+        if metrics is not None:
+            metrics.set_info("x11fan_sensor_backend_info", backend=reader.name)
+            if hasattr(reader, "collect_metrics"):
+                metrics.add_collector(reader.collect_metrics)
+        recorder = None
+        if self.trace_path:
             try:
-                reader = LibreHWReader()
-            except Exception as e:
-                self.errorOccurred.emit(str(e), 0.0)
-                return
+                recorder = TraceRecorder(self.trace_path, sorted(self.watch_sensors))
+                log.info(f"录制温度轨迹：{self.trace_path}")
+            except (OSError, ValueError) as e:
+                log.warning(f"无法录制温度轨迹：{e}")
 
-            while self._running:
+        schedule = self.schedule
+        try:
+            while not self._stop_event.is_set():
+                jitter = schedule.begin()
+                if metrics is not None:
+                    metrics.observe("x11fan_sample_jitter_seconds", jitter)
                 start = time.perf_counter()
+                max_temp = None
                 try:
-                    max_temp = reader.read_max_cpu_temp()
+                    temps = reader.read_cpu_temps()
+                    max_temp = temps.max
                     dt_ms = (time.perf_counter() - start) * 1000.0
+                    if metrics is not None:
+                        metrics.observe("x11fan_sensor_read_seconds", dt_ms / 1000.0)
+                        metrics.inc("x11fan_samples_total")
+                        if max_temp is not None:
+                            metrics.set("x11fan_cpu_temperature_celsius", max_temp)
+                    sensors = reader.read_sensors() if self.watch_sensors else None
+                    if sensors is not None:
+                        self.sensorsUpdated.emit(sensors)
+                    if recorder is not None and max_temp is not None:
+                        recorder.record(time.time(), max_temp, sensors)
                     self.tempsUpdated.emit(max_temp, dt_ms)
+                    self.socketsUpdated.emit(temps.sockets)
                 except Exception as e:
                     dt_ms = (time.perf_counter() - start) * 1000.0
+                    if metrics is not None:
+                        metrics.inc("x11fan_sensor_read_errors_total")
                     self.errorOccurred.emit(str(e), dt_ms)
 
-                total = self.interval_sec
-                step = 0.1
-                loops = int(total / step)
-                for _ in range(loops):
-                    if not self._running:
+                interval = self.sampler.update(time.monotonic(), max_temp)
+                self.samplingUpdated.emit(interval, self.sampler.sample_rate)
+
+                wait = schedule.advance(interval)
+                report = schedule.overrun_report()
+                if report is not None:
+                    count, behind = report
+                    log.warning(
+                        f"采样超时 {count} 次：读取耗时超过采样间隔（最近一次落后 {behind * 1000.0:.0f} ms）"
+                    )
+                self._stop_event.wait(wait)
+        finally:
+            if recorder is not None:
+                recorder.close()
+            reader.close()
+
+
+# ---------- 后台线程：发送 IPMI 命令 ----------
+
+class IpmiWorker(QThread):
+    """
+    在后台线程里收发 IPMI，GUI 线程只负责投递命令。
+    命令按 key（风扇区 / 风扇模式）合并，连续拖动滑条或温度骤变时只发最新的值。
+    IPMI 通道在本线程里打开（Microsoft_IPMI 的 COM 对象不能跨线程使用）。
+    打开通道后、改风扇模式后和 request_fan_state() 时读一次 BMC 的风扇模式和各区占空比。
+    """
+
+    commandFinished = pyqtSignal(object, bool, str, bytes)  # key, ok, message, 实际发出的数据
+    snapshotReady = pyqtSignal(object)               # SensorSnapshot
+    fanStateReady = pyqtSignal(object, object)       # 风扇模式（None 为读不到）, {zone: 占空比}
+
+    def __init__(
+        self,
+        transport_factory,
+        sdr_cache_path=None,
+        bmc_poll_interval=BMC_POLL_INTERVAL,
+        metrics=None,
+        zones=(0, 1),
+        parent=None,
+    ):
+        super().__init__(parent)
+        self.transport_factory = transport_factory
+        self.zones = tuple(zones)
+        self.metrics = metrics
+        self.sdr_cache_path = sdr_cache_path
+        self.bmc_poll_interval = bmc_poll_interval
+        self.queue = CommandQueue()
+
+    def submit(self, key, netfn, cmd, data, desc=""):
+        self.queue.put(key, (netfn, cmd, bytes(data), desc))
+
+    def request_fan_state(self):
+        self.queue.put("fan_state", None)
+
+    def stop(self):
+        # 已排队的命令仍会发完再退出
+        self.queue.close()
+
+    def publish_fan_state(self, fan_state):
+        fan_state.refresh()
+        self.fanStateReady.emit(fan_state.mode(), fan_state.duties())
+
+    def take_snapshot(self, bmc_sensors):
+        """读取一次 BMC 传感器；失败只记日志，不影响风扇命令"""
+        try:
+            snapshot = bmc_sensors.snapshot()
+        except IpmiError as e:
+            log.warning(f"读取 BMC 传感器失败：{e}")
+            return
+        self.snapshotReady.emit(snapshot)
+
+    def run(self):
+        transport = None
+        bmc_sensors = None
+        fan_state = None
+        try:
+            try:
+                transport = self.transport_factory(log=log.info)
+            except Exception as e:
+                log.error(f"无法打开 IPMI 通道：{e}")
+            else:
+                log.info(f"使用 IPMI 通道：{transport.describe()}")
+                if self.metrics is not None:
+                    self.metrics.set_info("x11fan_ipmi_transport_info", transport=transport.name)
+                if transport.name == "ipmicfg":
+                    # 每个传感器都要启动一次 IPMICFG，代价太高
+                    log.info("IPMICFG 通道下不读取 BMC 传感器。")
+                elif self.bmc_poll_interval:
+                    bmc_sensors = BmcSensors(transport, self.sdr_cache_path, log=log.info)
+                fan_state = FanState(transport, self.zones, log=log.warning)
+                self.publish_fan_state(fan_state)
+
+            next_snapshot = time.monotonic()
+            while True:
+                timeout = None
+                if bmc_sensors is not None:
+                    if time.monotonic() >= next_snapshot:
+                        self.take_snapshot(bmc_sensors)
+                        next_snapshot = time.monotonic() + self.bmc_poll_interval
+                    timeout = max(0.0, next_snapshot - time.monotonic())
+                job = self.queue.get(timeout)
+                if job is None:
+                    if self.queue.closed:
                         break
-                    time.sleep(step)
+                    continue
+
+                key, item = job
+                if item is None:
+                    # request_fan_state()
+                    if fan_state is not None:
+                        self.publish_fan_state(fan_state)
+                    continue
+                netfn, cmd, data, desc = item
+                if transport is None:
+                    self.commandFinished.emit(key, False, "IPMI 通道不可用", data)
+                    continue
+                is_zone = isinstance(key, tuple) and key[0] == "zone"
+
+                # 例行命令只记 DEBUG（进日志文件，不进窗口）
+                log.debug(f"执行 IPMI（{transport.name}）：{format_raw(netfn, cmd, data)} {desc}")
+                start = time.perf_counter()
+                try:
+                    resp = transport.raw(netfn, cmd, data)
+                except IpmiError as e:
+                    if self.metrics is not None:
+                        self.metrics.observe("x11fan_ipmi_command_seconds", time.perf_counter() - start)
+                        self.metrics.inc("x11fan_ipmi_errors_total")
+                    if is_zone:
+                        fan_state.invalidate(key[1])
+                    self.commandFinished.emit(key, False, f"IPMI 命令失败：{e}", data)
+                    continue
+                if self.metrics is not None:
+                    self.metrics.observe("x11fan_ipmi_command_seconds", time.perf_counter() - start)
+
+                message = "IPMI 命令执行成功。"
+                if resp:
+                    message = "IPMI 响应：" + " ".join(f"{b:02x}" for b in resp) + "，" + message
+                self.commandFinished.emit(key, True, message, data)
+                if is_zone:
+                    fan_state.record_duty(key[1], data[-1])
+                elif key == "fan_mode":
+                    # BMC 接管后会自己调整占空比：读回实际值
+                    self.publish_fan_state(fan_state)
         finally:
-            pythoncom.CoUninitialize()
+            if transport is not None:
+                transport.close()
+
+
+# ---------- 后台线程：连接控制服务 ----------
+
+class ServiceWorker(QThread):
+    """
+    --connect：在后台线程里连接控制服务（fanctl.py run --listen），接收遥测 / 状态 / 日志，
+    断开后每 SERVICE_RETRY_INTERVAL 秒重连。命令由 GUI 线程直接发送（ServiceClient 允许一收一发）。
+    """
+
+    telemetryReceived = pyqtSignal(object)   # service.Telemetry
+    stateReceived = pyqtSignal(object)       # service.ServiceState
+    resultReceived = pyqtSignal(object)      # service.Result
+    connected = pyqtSignal(bool)             # 是否可以控制
+    disconnected = pyqtSignal(str)           # 原因
+
+    def __init__(self, address, token=None, parent=None):
+        super().__init__(parent)
+        self.address = address
+        self.token = token
+        self.client = None
+        self._stop_event = threading.Event()
+
+    def stop(self):
+        self._stop_event.set()
+        client = self.client
+        if client is not None:
+            client.close()
+
+    def send(self, method, *args) -> bool:
+        """GUI 线程调用 ServiceClient 的命令方法；没连上或发送失败时返回 False"""
+        client = self.client
+        if client is None:
+            return False
+        try:
+            getattr(client, method)(*args)
+        except OSError:
+            return False
+        return True
+
+    def run(self):
+        while not self._stop_event.is_set():
+            client = ServiceClient(self.address, self.token)
+            try:
+                welcome = client.connect()
+            except RuntimeError as e:
+                self.disconnected.emit(str(e))
+                self._stop_event.wait(SERVICE_RETRY_INTERVAL)
+                continue
+            self.client = client
+            self.connected.emit(welcome.can_control)
+            while True:
+                message = client.recv()
+                if message is None:
+                    break
+                kind, body = message
+                if kind == MSG_TELEMETRY:
+                    self.telemetryReceived.emit(body)
+                elif kind == MSG_STATE:
+                    self.stateReceived.emit(body)
+                elif kind == MSG_RESULT:
+                    self.resultReceived.emit(body)
+                elif kind == MSG_LOG:
+                    log.log(body.level, "[服务] " + body.text)
+            self.client = None
+            client.close()
+            if not self._stop_event.is_set():
+                self.disconnected.emit("控制服务已断开")
+                self._stop_event.wait(SERVICE_RETRY_INTERVAL)
 
 
 # ---------- 主窗口 ----------
 
 class MainWindow(QMainWindow):
-    def __init__(self, ipmi_exe: str):
+    def __init__(
+        self,
+        transport_factory,
+        reader_kind="auto",
+        lhm_url=LHM_HTTP_URL,
+        poll_min=TEMP_POLL_MIN_INTERVAL,
+        poll_max=TEMP_POLL_MAX_INTERVAL,
+        duty_filter=None,
+        controller_kind="curve",
+        pid=None,
+        history_capacity=HISTORY_CAPACITY,
+        zone_map=None,
+        metrics=None,
+        trace_path=None,
+        read_timeout=READ_TIMEOUT,
+        fallback=None,
+        startup=None,
+    ):
         super().__init__()
-        self.ipmi_exe = ipmi_exe
-        self.last_auto_target = None
+        self.startup = startup or StartupTimer()
+        self.startup_reported = False
+        # 温度线程里创建的 LhmSupervisor（每个有自己的 cancel）：关闭窗口时打断它们对 LHM 的等待
+        self.lhm_supervisors = weakref.WeakSet()
+        self.lhm_lock = threading.Lock()
+        self.closing = False
+        self.lhm_url = lhm_url
+        # 自动模式下曲线目标 → 实际写入之间的抑制（死区 / 迟滞 / 最短停留）
+        self.duty_filter = duty_filter or DutyFilter()
+        # 控制策略：曲线（随控制点重建）或 PID（跨采样保留状态）
+        self.pid = pid or PidController()
+        self.initial_controller_kind = controller_kind
+        # 多风扇区映射（--zone-map）：给出时自动模式按它逐区控制，不再用界面上的单条曲线
+        self.zone_map = zone_map
+        self.reader_sensors = {}   # 读取后端的其它传感器（zone_map 用到的）
+        # 运行指标（--metrics-port / --metrics-json）；抑制次数在抓取时从写入抑制读取
+        self.metrics = metrics
+        self.failed_zones = set()
+        if metrics is not None:
+            metrics.add_collector(self.collect_metrics)
+        # 温度 / 占空比 / 读取耗时的历史（定长环形缓冲区）
+        self.history = TelemetryHistory(history_capacity)
         self.last_max_temp = None
+        self.last_snapshot = None
+        self.temp_state = None   # 温度标签当前的样式状态（见 TEMP_STYLES）
+        # 日志：各线程写入 applog.log，这里的缓冲由定时器批量刷到窗口；
+        # 自动模式下的例行写入只计数，定期汇总一行
+        self.log_handler = BufferedHandler()
+        log.addHandler(self.log_handler)
+        self.write_summary = WriteSummary()
+        self.zone_duty = {}   # 每个风扇区最近一次投递（或从 BMC 读到）的占空比
+        # CPU 温度读取失败 / 超时：自动模式改用 BMC 的 CPU 温度，都没有时写失效保护占空比
+        self.sensor_fallback = fallback or SensorFallback()
 
         self.setWindowTitle("X11 Fan Master - 自动曲线")
         self.resize(800, 650)
@@ -393,25 +768,101 @@ class MainWindow(QMainWindow):
 
         # UI
         self.create_temperature_group(main_layout)
+        self.create_bmc_sensor_group(main_layout)
         self.create_auto_control_group(main_layout)
         self.create_manual_control_group(main_layout)
         self.create_log_area(main_layout)
 
-        # 这里检查 / 启动 LibreHardwareMonitor，并写入日志区
-        ensure_lhm_running(log=self.append_log)
+        self.startup.mark("启动后台线程")
+        self.start_workers(
+            transport_factory, reader_kind, poll_min, poll_max, trace_path, read_timeout
+        )
+        if zone_map is not None:
+            self.append_log("多风扇区映射：")
+            for line in zone_map.describe():
+                self.append_log("  " + line)
+            for widget in (self.source_combo, self.mode_combo, self.setpoint_spin):
+                widget.setEnabled(False)
+                widget.setToolTip("已由 --zone-map 指定")
+
+        # 初始化曲线图
+        self.update_curve_widget()
+
+    def start_workers(self, transport_factory, reader_kind, poll_min, poll_max, trace_path, read_timeout):
+        """本进程直接读温度、写 BMC：启动 IPMI 线程和温度线程"""
+        metrics = self.metrics
+        zone_map = self.zone_map
+        # IPMI 线程
+        self.ipmi_worker = IpmiWorker(
+            functools.partial(self.open_transport, transport_factory),
+            sdr_cache_path=os.path.join(user_data_dir(), "sdr_cache.json"),
+            metrics=metrics,
+            zones=zone_map.zones if zone_map is not None else (0, 1),
+            parent=self,
+        )
+        self.ipmi_worker.commandFinished.connect(self.on_ipmi_finished)
+        self.ipmi_worker.snapshotReady.connect(self.on_bmc_snapshot)
+        self.ipmi_worker.fanStateReady.connect(self.on_fan_state)
+        self.ipmi_worker.start()
 
         # 温度线程
-        self.worker = TempWorker(interval_sec=TEMP_POLL_INTERVAL, parent=self)
+        self.worker = TempWorker(
+            functools.partial(self.open_reader, reader_kind),
+            min_interval=poll_min,
+            max_interval=poll_max,
+            watch_sensors=zone_map.sensor_names() if zone_map is not None else (),
+            metrics=metrics,
+            trace_path=trace_path,
+            read_timeout=read_timeout,
+            parent=self,
+        )
+        self.worker.set_breakpoints(self.auto_breakpoints())
         self.worker.tempsUpdated.connect(self.on_temps_updated)
+        self.worker.samplingUpdated.connect(self.on_sampling_updated)
+        self.worker.socketsUpdated.connect(self.on_sockets_updated)
         self.worker.errorOccurred.connect(self.on_temp_error)
+        self.worker.sensorsUpdated.connect(self.on_sensors_updated)
         self.worker.start()
 
-        self.append_log(f"使用 IPMICFG：{self.ipmi_exe}")
         if not is_admin():
-            self.append_log("警告：当前进程不是管理员，IPMICFG 可能无法访问 BMC。")
+            self.append_log("警告：当前进程不是管理员，可能无法访问 BMC。")
 
-        # 初始化曲线图
-        self.update_curve_widget()
+    # ----- 后台线程里调用的工厂 -----
+
+    def open_reader(self, reader_kind, log):
+        """温度线程：检查 / 启动 LibreHardwareMonitor，再创建读取后端"""
+        supervisor = None
+        try:
+            if reader_kind == "lhm":
+                supervisor = LhmSupervisor(log=log)
+                with self.lhm_lock:
+                    if self.closing:
+                        raise RuntimeError("窗口已关闭")
+                    self.lhm_supervisors.add(supervisor)
+                with self.startup.phase("LHM 检查"):
+                    supervisor.start()
+            with self.startup.phase("温度读取后端初始化"):
+                return open_sensor_reader(reader_kind, lhm_supervisor=supervisor, lhm_url=self.lhm_url)
+        except Exception:
+            if supervisor is not None:
+                supervisor.close()
+            raise
+
+    def open_transport(self, transport_factory, log):
+        """IPMI 线程：打开 IPMI 通道"""
+        with self.startup.phase("IPMI 通道"):
+            return transport_factory(log=log)
+
+    def report_startup(self):
+        """首次拿到温度读数（或读取失败）时输出一次启动耗时"""
+        if self.startup_reported:
+            return
+        self.startup_reported = True
+        self.startup.mark("首次读数")
+        self.append_log("启动耗时：")
+        for line in self.startup.report():
+            self.append_log("  " + line)
+            print("[startup] " + line)
 
     # ----- UI 构建 -----
 
@@ -429,22 +880,44 @@ class MainWindow(QMainWindow):
         row = QHBoxLayout()
         self.cpu_label = QLabel("CPU 最大温度：")
         self.cpu_label.setFont(font_label)
-        self.cpu_value = QLabel("--.- °C")
+        self.cpu_value = QLabel("连接中…")
         self.cpu_value.setFont(font_big)
+        self.set_temp_state("unknown")
         row.addWidget(self.cpu_label)
         row.addStretch()
         row.addWidget(self.cpu_value)
         vbox.addLayout(row)
 
         row2 = QHBoxLayout()
-        self.delay_label = QLabel("上次读取：-- ms")
+        self.delay_label = QLabel("正在连接温度来源…")
         self.delay_label.setFont(font_label)
+        self.socket_label = QLabel("")
+        self.rate_label = QLabel("采样间隔：-- s")
+        self.rate_label.setFont(font_label)
         row2.addWidget(self.delay_label)
+        row2.addSpacing(20)
+        row2.addWidget(self.rate_label)
         row2.addStretch()
+        row2.addWidget(self.socket_label)
         vbox.addLayout(row2)
 
         layout.addWidget(group)
 
+    def create_bmc_sensor_group(self, layout: QVBoxLayout):
+        group = QGroupBox("BMC 传感器")
+        vbox = QVBoxLayout(group)
+
+        self.bmc_fan_label = QLabel("风扇转速：--")
+        self.bmc_fan_label.setWordWrap(True)
+        self.bmc_temp_label = QLabel("主板温度：--")
+        self.bmc_temp_label.setWordWrap(True)
+        self.bmc_cost_label = QLabel("BMC 快照：正在连接…")
+        vbox.addWidget(self.bmc_fan_label)
+        vbox.addWidget(self.bmc_temp_label)
+        vbox.addWidget(self.bmc_cost_label)
+
+        layout.addWidget(group)
+
     def create_auto_control_group(self, layout: QVBoxLayout):
         group = QGroupBox("自动控制")
         vbox = QVBoxLayout(group)
@@ -453,6 +926,35 @@ class MainWindow(QMainWindow):
         self.auto_check.toggled.connect(self.on_auto_toggled)
         vbox.addWidget(self.auto_check)
 
+        row_source = QHBoxLayout()
+        row_source.addWidget(QLabel("曲线温度来源："))
+        # 第一项是 CPU 最大温度，BMC 温度传感器在第一次快照后追加
+        self.source_combo = QComboBox()
+        self.source_combo.addItem("CPU 最大温度", None)
+        self.source_combo.currentIndexChanged.connect(self.on_curve_source_changed)
+        row_source.addWidget(self.source_combo)
+        row_source.addStretch()
+        vbox.addLayout(row_source)
+
+        row_mode = QHBoxLayout()
+        row_mode.addWidget(QLabel("控制方式："))
+        self.mode_combo = QComboBox()
+        self.mode_combo.addItem("风扇曲线", "curve")
+        self.mode_combo.addItem("PID 目标温度", "pid")
+        self.mode_combo.setCurrentIndex(CONTROLLER_KINDS.index(self.initial_controller_kind))
+        self.mode_combo.currentIndexChanged.connect(self.on_controller_changed)
+        row_mode.addWidget(self.mode_combo)
+        row_mode.addSpacing(20)
+        row_mode.addWidget(QLabel("目标温度："))
+        self.setpoint_spin = QSpinBox()
+        self.setpoint_spin.setRange(30, 100)
+        self.setpoint_spin.setSuffix(" °C")
+        self.setpoint_spin.setValue(int(round(self.pid.setpoint)))
+        self.setpoint_spin.valueChanged.connect(self.on_setpoint_changed)
+        row_mode.addWidget(self.setpoint_spin)
+        row_mode.addStretch()
+        vbox.addLayout(row_mode)
+
         curve_box = QGroupBox("风扇曲线 (°C → %)")
         curve_layout = QVBoxLayout(curve_box)
 
@@ -460,25 +962,22 @@ class MainWindow(QMainWindow):
         self.fan_spins = []
 
         # 默认曲线：50/65/75/80℃ → 20/30/60/100%
-        default_temps = [50, 65, 75, 80]
-        default_fans = [20, 30, 60, 100]
-
-        for i in range(4):
+        for i, (default_temp, default_fan) in enumerate(DEFAULT_CURVE_POINTS):
             row = QHBoxLayout()
             label = QLabel(f"点 {i+1} 温度：")
             temp_spin = QSpinBox()
             temp_spin.setRange(-20, 120)
-            temp_spin.setValue(default_temps[i])
+            temp_spin.setValue(default_temp)
             temp_spin.valueChanged.connect(
-                lambda _v, self=self: self.update_curve_widget()
+                lambda _v, self=self: self.on_curve_changed()
             )
 
             fan_label = QLabel("风扇占空比：")
             fan_spin = QSpinBox()
             fan_spin.setRange(0, 100)
-            fan_spin.setValue(default_fans[i])
+            fan_spin.setValue(default_fan)
             fan_spin.valueChanged.connect(
-                lambda _v, self=self: self.update_curve_widget()
+                lambda _v, self=self: self.on_curve_changed()
             )
 
             self.temp_spins.append(temp_spin)
@@ -493,13 +992,43 @@ class MainWindow(QMainWindow):
 
         vbox.addWidget(curve_box)
 
+        # 曲线只在控制点变化时重新编译，采样和重绘都直接查表
+        self.curve = self.build_curve()
+        self.curve_controller = CurveController(self.curve)
+        self.setpoint_spin.setEnabled(self.mode_combo.currentData() == "pid")
+
         self.curve_widget = FanCurveWidget()
-        vbox.addWidget(self.curve_widget)
+        self.history_widget = HistoryChartWidget(self.history)
+        row_charts = QHBoxLayout()
+        row_charts.addWidget(self.curve_widget, 1)
+        row_charts.addWidget(self.history_widget, 1)
+        vbox.addLayout(row_charts)
+
+        row_history = QHBoxLayout()
+        row_history.addWidget(QLabel("历史范围："))
+        self.span_combo = QComboBox()
+        for label, seconds in (("10 分钟", 600), ("1 小时", 3600), ("6 小时", 6 * 3600), ("24 小时", 24 * 3600)):
+            self.span_combo.addItem(label, seconds)
+        self.span_combo.setCurrentIndex(1)
+        self.span_combo.currentIndexChanged.connect(
+            lambda _i: self.history_widget.set_span(float(self.span_combo.currentData()))
+        )
+        row_history.addWidget(self.span_combo)
+        row_history.addStretch()
+        export_csv_btn = QPushButton("导出 CSV")
+        export_csv_btn.clicked.connect(lambda: self.on_export_history("csv"))
+        export_bin_btn = QPushButton("导出二进制")
+        export_bin_btn.clicked.connect(lambda: self.on_export_history("bin"))
+        row_history.addWidget(export_csv_btn)
+        row_history.addWidget(export_bin_btn)
+        vbox.addLayout(row_history)
 
         row_target = QHBoxLayout()
         self.auto_target_label = QLabel("当前自动目标：-- %")
+        self.write_stats_label = QLabel("写入 0 次，抑制 0 次")
         row_target.addWidget(self.auto_target_label)
         row_target.addStretch()
+        row_target.addWidget(self.write_stats_label)
         vbox.addLayout(row_target)
 
         layout.addWidget(group)
@@ -541,162 +1070,459 @@ class MainWindow(QMainWindow):
         row_per.addWidget(self.per_slider_value)
         vbox.addLayout(row_per)
 
-        reset_btn = QPushButton("恢复 BMC 自动风扇模式")
-        reset_btn.clicked.connect(self.on_reset_bmc_auto)
-        vbox.addWidget(reset_btn)
+        self.reset_btn = QPushButton("恢复 BMC 自动风扇模式")
+        self.reset_btn.clicked.connect(self.on_reset_bmc_auto)
+        vbox.addWidget(self.reset_btn)
 
         layout.addWidget(group)
 
     def create_log_area(self, layout: QVBoxLayout):
         self.log_edit = QPlainTextEdit()
         self.log_edit.setReadOnly(True)
+        # 超出上限时自动丢弃最早的行，长时间运行也不会无限增长
+        self.log_edit.setMaximumBlockCount(LOG_MAX_BLOCKS)
         layout.addWidget(self.log_edit)
 
-    # ----- 日志 & IPMI -----
-
-    def append_log(self, text: str):
-        ts = time.strftime("%H:%M:%S")
-        self.log_edit.appendPlainText(f"[{ts}] {text}")
-        self.log_edit.verticalScrollBar().setValue(
-            self.log_edit.verticalScrollBar().maximum()
-        )
+        self.log_timer = QTimer(self)
+        self.log_timer.timeout.connect(self.flush_log)
+        self.log_timer.start(LOG_FLUSH_INTERVAL_MS)
 
-    def run_ipmi(self, args, desc=""):
-        cmd = [self.ipmi_exe] + args
-        self.append_log(f"执行 IPMICFG：{' '.join(cmd)} {desc}")
+    # ----- 日志 & IPMI -----
 
-        creationflags = 0
-        if os.name == "nt" and hasattr(subprocess, "CREATE_NO_WINDOW"):
-            creationflags = subprocess.CREATE_NO_WINDOW
+    def append_log(self, text: str, level=logging.INFO):
+        log.log(level, text)
 
+    def flush_log(self):
+        """定时器回调：一次追加缓冲里的全部行；原本停在底部时才自动滚动"""
+        summary = self.write_summary.summarize()
+        if summary:
+            log.info(summary)
+        lines = self.log_handler.drain()
+        if not lines:
+            return
+        bar = self.log_edit.verticalScrollBar()
+        at_bottom = bar.value() >= bar.maximum() - 4
+        self.log_edit.appendPlainText("\n".join(lines))
+        if at_bottom:
+            bar.setValue(bar.maximum())
+
+    def run_ipmi(self, args, desc="", key=None):
+        """
+        把 RAW 命令投递给后台 IPMI 线程，立即返回。
+        key 相同的命令只保留最新一条；结果通过 on_ipmi_finished 回来。
+        """
         try:
-            result = subprocess.run(
-                cmd,
-                cwd=os.path.dirname(self.ipmi_exe),
-                stdout=subprocess.PIPE,
-                stderr=subprocess.PIPE,
-                text=True,
-                encoding="mbcs",
-                errors="ignore",
-                creationflags=creationflags,
-            )
-        except Exception as e:
-            self.append_log(f"IPMICFG 运行异常: {e}")
+            netfn, cmd, data = parse_raw_args(args)
+        except ValueError as e:
+            self.append_log(str(e), logging.WARNING)
             return False
 
-        if result.stdout.strip():
-            self.append_log("IPMICFG 标准输出:\n" + result.stdout.strip())
-        if result.stderr.strip():
-            self.append_log("IPMICFG 错误输出:\n" + result.stderr.strip())
+        if key is None:
+            key = " ".join(args)
+        self.ipmi_worker.submit(key, netfn, cmd, data, desc)
+        return True
 
-        if result.returncode != 0:
-            self.append_log(f"IPMICFG 退出码 {result.returncode} (失败)")
-            return False
+    def on_ipmi_finished(self, key, ok: bool, message: str, data: bytes):
+        is_zone = isinstance(key, tuple) and key[0] == "zone"
+        if not ok:
+            self.append_log(message, logging.WARNING)
+        elif is_zone:
+            # 例行的风扇区写入：窗口里只看定期汇总，逐条记录留给 DEBUG
+            log.debug(message)
+        else:
+            self.append_log(message)
+        if is_zone:
+            # 记录这条命令实际写入的占空比（zone_duty 可能已被之后的模式切换清空或改写）
+            duty = data[-1]
+            self.write_summary.record(key[1], duty, ok)
+            self.record_write_metrics(key[1], duty, ok)
+        if not ok and is_zone:
+            # 写入失败：BMC 上的实际值不确定，下一次采样时重新下发
+            self.zone_duty.pop(key[1], None)
+            if self.zone_map is not None:
+                self.zone_map.mark_failed(key[1])
+            else:
+                self.duty_filter.reset()
+        if key == "fan_mode" and ok:
+            # BMC 接管后占空比由它决定；IPMI 线程随后读回实际值（on_fan_state）
+            self.zone_duty.clear()
+            self.reset_auto_state()
+            self.update_curve_widget()
 
-        self.append_log("IPMICFG 命令执行成功。")
-        return True
+    def on_fan_state(self, mode, duties):
+        """BMC 当前的风扇模式和各区占空比：手动滑条从实际值开始，自动模式下相同的值不再重写"""
+        self.append_log(
+            f"BMC 风扇模式：{describe_fan_mode(mode)}"
+            + "".join(f"，zone{z} {d}%" for z, d in sorted(duties.items()))
+        )
+        if mode == FAN_MODE_FULL:
+            # 其它模式下占空比由 BMC 随时调整，读到的值不能当作已写入，第一次仍要写
+            for zone, duty in duties.items():
+                self.zone_duty.setdefault(zone, duty)
+        if 0 in duties:
+            self.cpu_slider.setValue(duties[0])
+        if 1 in duties:
+            self.per_slider.setValue(duties[1])
+
+    def collect_metrics(self, metrics):
+        source = self.zone_map if self.zone_map is not None else self.duty_filter
+        metrics.set_counter("x11fan_fan_writes_suppressed_total", source.suppressed)
+        worker = getattr(self, "worker", None)
+        if worker is not None:
+            metrics.set_counter("x11fan_sample_overruns_total", worker.schedule.overruns)
+
+    def record_write_metrics(self, zone: int, duty: int, ok: bool):
+        if ok:
+            self.failed_zones.discard(zone)
+        else:
+            self.failed_zones.add(zone)
+        if self.metrics is None or not ok:
+            return
+        self.metrics.inc("x11fan_fan_writes_total", zone=zone)
+        self.metrics.set("x11fan_zone_duty_percent", duty, zone=zone)
 
     def set_fan_pwm(self, zone: int, percent: int):
         p = max(0, min(100, int(round(percent))))
         hex_val = f"0x{p:02x}"
         zone_hex = f"0x{zone:02x}"
+        self.zone_duty[zone] = p
+        if self.metrics is not None and zone in self.failed_zones:
+            self.metrics.inc("x11fan_fan_write_retries_total", zone=zone)
         args = ["-raw", "0x30", "0x70", "0x66", "0x01", zone_hex, hex_val]
-        self.run_ipmi(args, desc=f"(zone={zone}, {p}%)")
+        self.run_ipmi(args, desc=f"(zone={zone}, {p}%)", key=("zone", zone))
 
     # ----- 自动控制 & 曲线图 -----
 
+    def build_curve(self) -> FanCurve:
+        return FanCurve(
+            (t.value(), f.value()) for t, f in zip(self.temp_spins, self.fan_spins)
+        )
+
+    @property
+    def controller(self):
+        if self.mode_combo.currentData() == "pid":
+            return self.pid
+        return self.curve_controller
+
+    def on_curve_changed(self):
+        self.curve = self.build_curve()
+        self.curve_controller = CurveController(self.curve)
+        self.on_controller_params_changed()
+
+    def on_controller_changed(self, _index):
+        self.setpoint_spin.setEnabled(self.mode_combo.currentData() == "pid")
+        self.pid.reset()
+        self.reset_auto_state()
+        self.append_log(f"控制方式：{self.controller.describe()}")
+        self.on_controller_params_changed()
+
+    def on_setpoint_changed(self, value: int):
+        self.pid.setpoint = float(value)
+        self.on_controller_params_changed()
+
+    def auto_breakpoints(self):
+        if self.zone_map is not None:
+            return self.zone_map.breakpoints()
+        return self.controller.breakpoints()
+
+    def reset_auto_state(self):
+        """切换模式 / 来源或 BMC 接管后：下一次采样无条件写入"""
+        self.duty_filter.reset()
+        if self.zone_map is not None:
+            self.zone_map.reset()
+
+    def on_controller_params_changed(self):
+        if hasattr(self, "worker"):
+            self.worker.set_breakpoints(self.auto_breakpoints())
+        temp = self.curve_input_temp()
+        if self.auto_check.isChecked() and temp is not None:
+            self.apply_auto_from_temp(temp)
+        else:
+            self.update_curve_widget()
+
     def compute_auto_target(self, temp_c: float) -> int:
-        points = [
-            (self.temp_spins[i].value(), self.fan_spins[i].value())
-            for i in range(4)
-        ]
-        points.sort(key=lambda x: x[0])
-
-        if temp_c <= points[0][0]:
-            return points[0][1]
-        if temp_c >= points[-1][0]:
-            return points[-1][1]
-
-        for (t1, p1), (t2, p2) in zip(points, points[1:]):
-            if t1 <= temp_c <= t2:
-                if t2 == t1:
-                    return max(p1, p2)
-                frac = (temp_c - t1) / (t2 - t1)
-                val = p1 + frac * (p2 - p1)
-                return int(round(val))
-
-        return points[-1][1]
+        """每个新读数调用一次（PID 会更新内部状态）"""
+        return self.controller.update(temp_c, time.monotonic())
+
+    def display_target(self, temp_c: float):
+        """曲线图上显示的自动目标：曲线直接查表，PID 用最近一次输出"""
+        if self.controller is self.pid:
+            return self.pid.output
+        return self.curve.lookup(temp_c)
 
     def apply_auto_from_temp(self, temp_c: float):
+        if self.zone_map is not None:
+            self.apply_zone_map()
+            return
         if temp_c is None:
             return
         target = self.compute_auto_target(temp_c)
         self.auto_target_label.setText(f"当前自动目标：{target}%")
-        if target == self.last_auto_target:
+        if all(self.zone_duty.get(zone) == target for zone in (0, 1)):
+            # BMC 已经是这个值（刚启动时读回的状态）：不经过写入抑制，不计入写入，也不移动迟滞基准
+            self.update_curve_widget()
+            return
+        filter_temp = temp_c if self.controller.follows_temp else None
+        duty = self.duty_filter.update(filter_temp, target, time.monotonic())
+        self.update_write_stats()
+        if duty is None:
+            self.update_curve_widget()
             return
-        self.last_auto_target = target
-        self.set_fan_pwm(0, target)
-        self.set_fan_pwm(1, target)
+        if self.metrics is not None:
+            for zone in (0, 1):
+                self.metrics.set("x11fan_zone_temperature_celsius", temp_c, zone=zone)
+        for zone in (0, 1):
+            # BMC 已经是这个值（刚启动时读回的状态）就不写
+            if self.zone_duty.get(zone) != duty:
+                self.set_fan_pwm(zone, duty)
         self.update_curve_widget()
 
+    def sensor_values(self):
+        """多风扇区映射的输入：CPU 最大温度 + 读取后端的其它传感器 + 最近一次 BMC 快照"""
+        values = self.last_snapshot.temperatures() if self.last_snapshot is not None else {}
+        values.update(self.reader_sensors)
+        values[CPU_SENSOR] = self.last_max_temp
+        return values
+
+    def apply_zone_map(self):
+        """一次算完所有风扇区，只下发占空比有变化的区"""
+        changes = self.zone_map.update(self.sensor_values(), time.monotonic())
+        self.auto_target_label.setText(
+            "当前自动目标："
+            + "  ".join(
+                f"zone{s.zone} {'--' if s.target is None else s.target}%"
+                for s in self.zone_map.specs
+            )
+        )
+        self.update_write_stats()
+        if self.metrics is not None:
+            for spec in self.zone_map.specs:
+                if spec.temp is not None:
+                    self.metrics.set("x11fan_zone_temperature_celsius", spec.temp, zone=spec.zone)
+        for zone, duty, _temp in changes:
+            if self.zone_duty.get(zone) != duty:
+                self.set_fan_pwm(zone, duty)
+        self.update_curve_widget()
+
+    def update_write_stats(self):
+        source = self.zone_map if self.zone_map is not None else self.duty_filter
+        issued, suppressed = source.issued, source.suppressed
+        total = issued + suppressed
+        ratio = suppressed / total if total else 0.0
+        self.write_stats_label.setText(
+            f"写入 {issued} 次，抑制 {suppressed} 次（{ratio * 100.0:.0f}%）"
+        )
+
+    def curve_input_temp(self):
+        """当前曲线所用的温度：CPU 最大温度，或选中的 BMC 温度传感器"""
+        name = self.source_combo.currentData()
+        if name is None:
+            return self.last_max_temp
+        if self.last_snapshot is None:
+            return None
+        return self.last_snapshot.get(name)
+
     def update_curve_widget(self):
-        points = [
-            (self.temp_spins[i].value(), self.fan_spins[i].value())
-            for i in range(4)
-        ]
-        self.curve_widget.set_curve_points(points)
+        self.curve_widget.set_curve_points(self.curve.points)
 
-        if self.last_max_temp is None:
+        temp = self.curve_input_temp()
+        if temp is None:
             self.curve_widget.set_current_point(None, None)
             return
 
         if self.auto_check.isChecked():
-            y = self.compute_auto_target(self.last_max_temp)
+            y = self.display_target(temp)
         else:
             y = self.cpu_slider.value()
 
-        self.curve_widget.set_current_point(self.last_max_temp, y)
+        self.curve_widget.set_current_point(temp, y)
 
     def on_auto_toggled(self, checked: bool):
         self.cpu_slider.setEnabled(not checked)
         self.per_slider.setEnabled(not checked)
-        self.last_auto_target = None
+        self.reset_auto_state()
 
-        if checked and self.last_max_temp is not None:
-            self.apply_auto_from_temp(self.last_max_temp)
+        temp = self.curve_input_temp()
+        if checked and temp is not None:
+            self.apply_auto_from_temp(temp)
         else:
             self.auto_target_label.setText("当前自动目标：-- %")
             self.update_curve_widget()
 
+    def on_curve_source_changed(self, _index):
+        self.reset_auto_state()
+        temp = self.curve_input_temp()
+        if self.auto_check.isChecked() and temp is not None:
+            self.apply_auto_from_temp(temp)
+        else:
+            self.update_curve_widget()
+
     # ----- 温度线程回调 -----
 
+    def set_temp_state(self, state: str):
+        """只在状态切换时改样式表（setStyleSheet 会触发整个控件重新计算样式）"""
+        if state == self.temp_state:
+            return
+        self.temp_state = state
+        self.cpu_value.setStyleSheet(TEMP_STYLES[state])
+
     def on_temps_updated(self, max_temp, dt_ms: float):
+        self.report_startup()
         self.last_max_temp = max_temp
 
         if max_temp is None:
             self.cpu_value.setText("--.- °C")
-            self.cpu_value.setStyleSheet("color: gray;")
+            self.set_temp_state("unknown")
         else:
             self.cpu_value.setText(f"{max_temp:.1f} °C")
-            if max_temp >= 80.0:
-                self.cpu_value.setStyleSheet("color: red;")
-            else:
-                self.cpu_value.setStyleSheet("color: black;")
+            self.set_temp_state("alarm" if max_temp >= TEMP_ALARM_C else "normal")
+            outage = self.sensor_fallback.recovered(time.monotonic())
+            if outage is not None:
+                if self.metrics is not None:
+                    self.metrics.set("x11fan_sensor_last_outage_seconds", outage)
+                self.append_log(f"CPU 温度读取已恢复，中断 {outage:.1f} 秒")
 
         self.delay_label.setText(f"上次读取：{dt_ms:.0f} ms")
 
-        if self.auto_check.isChecked() and max_temp is not None:
+        from_cpu = self.source_combo.currentData() is None or self.zone_map is not None
+        if from_cpu and self.auto_check.isChecked() and max_temp is not None:
             self.apply_auto_from_temp(max_temp)
         else:
+            if max_temp is None:
+                self.on_cpu_temp_missing()
             self.update_curve_widget()
 
+        if max_temp is not None:
+            self.record_history(max_temp, dt_ms)
+
+    def on_sensors_updated(self, values):
+        self.reader_sensors = values
+
+    def record_history(self, temp: float, dt_ms: float):
+        if self.auto_check.isChecked() and self.zone_map is not None:
+            duty = max(self.zone_duty.values(), default=None)
+        elif self.auto_check.isChecked():
+            duty = self.duty_filter.duty
+        else:
+            duty = self.cpu_slider.value()
+        self.history.append(time.time(), temp, duty if duty is not None else 0, dt_ms)
+        self.history_widget.update()
+
+    def on_export_history(self, fmt: str):
+        if fmt == "csv":
+            path, _ = QFileDialog.getSaveFileName(self, "导出历史", "history.csv", "CSV (*.csv)")
+        else:
+            path, _ = QFileDialog.getSaveFileName(self, "导出历史", "history.bin", "二进制 (*.bin)")
+        if not path:
+            return
+        try:
+            if fmt == "csv":
+                self.history.export_csv(path)
+            else:
+                self.history.export_binary(path)
+        except OSError as e:
+            self.append_log(f"导出历史失败：{e}")
+            return
+        self.append_log(f"已导出 {len(self.history)} 个采样到 {path}")
+
+    def on_sampling_updated(self, interval: float, rate: float):
+        self.rate_label.setText(f"采样间隔：{interval:.2f} s（{rate * 60.0:.1f} 次/分）")
+
+    def on_sockets_updated(self, sockets):
+        def fmt(value):
+            return "--.-" if value is None else f"{value:.1f}"
+
+        self.socket_label.setText(
+            "    ".join(
+                f"CPU{s.socket}：核心 {fmt(s.max_core)} / 封装 {fmt(s.package)} °C"
+                for s in sockets
+            )
+        )
+
+    def on_bmc_snapshot(self, snapshot):
+        first = self.last_snapshot is None
+        self.last_snapshot = snapshot
+
+        fans = snapshot.fans()
+        temps = snapshot.temperatures()
+        self.bmc_fan_label.setText(
+            "风扇转速：" + ("  ".join(f"{n} {v:.0f} RPM" for n, v in fans.items()) or "--")
+        )
+        self.bmc_temp_label.setText(
+            "主板温度：" + ("  ".join(f"{n} {v:.0f} °C" for n, v in temps.items()) or "--")
+        )
+        self.bmc_cost_label.setText(
+            f"BMC 快照：{len(snapshot)} 个传感器，耗时 {snapshot.elapsed_ms:.0f} ms"
+        )
+        if first or snapshot.elapsed_ms > 1000.0:
+            self.append_log(
+                f"BMC 传感器快照：{len(snapshot)} 个传感器，耗时 {snapshot.elapsed_ms:.0f} ms"
+            )
+
+        # 新出现的 BMC 温度传感器加入曲线来源下拉框
+        known = {self.source_combo.itemData(i) for i in range(self.source_combo.count())}
+        for name in temps:
+            if name not in known:
+                self.source_combo.addItem(f"BMC：{name}", name)
+
+        if self.zone_map is not None:
+            # BMC 传感器参与映射时，新快照也触发一次逐区计算
+            if self.auto_check.isChecked() and self.zone_map.sensor_names() & set(temps):
+                self.apply_zone_map()
+            return
+        name = self.source_combo.currentData()
+        if name is not None and self.auto_check.isChecked():
+            temp = snapshot.get(name)
+            if temp is not None:
+                self.apply_auto_from_temp(temp)
+
     def on_temp_error(self, message: str, dt_ms: float):
+        self.report_startup()
         self.cpu_value.setText("--.- °C")
-        self.cpu_value.setStyleSheet("color: gray;")
+        self.set_temp_state("unknown")
         self.delay_label.setText(f"读取失败，耗时 {dt_ms:.0f} ms")
-        self.append_log(f"读取 LibreHardwareMonitor 温度失败：{message}")
+        self.append_log(f"读取温度失败：{message}", logging.WARNING)
+        self.on_cpu_temp_missing()
         self.update_curve_widget()
 
+    def on_cpu_temp_missing(self):
+        """CPU 温度读不到：自动模式下按 SensorFallback 改用 BMC 的 CPU 温度或写失效保护占空比"""
+        self.last_max_temp = None
+        from_cpu = self.source_combo.currentData() is None or self.zone_map is not None
+        if not (from_cpu and self.auto_check.isChecked()):
+            return
+        snapshot = self.last_snapshot
+        bmc_temp = age = None
+        if snapshot is not None:
+            bmc_temp = snapshot.cpu_temperature()
+            age = time.time() - snapshot.timestamp
+        previous = self.sensor_fallback.state
+        kind, value = self.sensor_fallback.fail(time.monotonic(), bmc_temp, age)
+        if kind != previous:
+            if kind == "bmc":
+                self.append_log(f"CPU 温度不可用，改用 BMC 的 CPU 温度（{value:.1f} °C）", logging.WARNING)
+            elif kind == "failsafe":
+                self.append_log(
+                    f"CPU 温度持续不可用，所有风扇区写失效保护占空比 {value}%", logging.WARNING
+                )
+        if kind == "bmc":
+            self.last_max_temp = value
+            self.apply_auto_from_temp(value)
+        elif kind == "failsafe":
+            self.apply_failsafe(value)
+
+    def apply_failsafe(self, duty: int):
+        """所有风扇区写 duty；写入抑制清零，CPU 温度恢复后的第一次采样按策略重写"""
+        zones = self.zone_map.zones if self.zone_map is not None else (0, 1)
+        for zone in zones:
+            if self.zone_duty.get(zone) != duty:
+                self.set_fan_pwm(zone, duty)
+        self.auto_target_label.setText(f"当前自动目标：失效保护 {duty}%")
+        self.duty_filter.reset()
+        if self.zone_map is not None:
+            for zone in zones:
+                self.zone_map.mark_failed(zone)
+
     # ----- 手动控制槽函数 -----
 
     def on_cpu_manual_released(self):
@@ -709,39 +1535,460 @@ class MainWindow(QMainWindow):
         self.set_fan_pwm(1, value)
 
     def on_reset_bmc_auto(self):
-        args = ["-raw", "0x30", "0x45", "0x01", "0x01"]
-        ok = self.run_ipmi(args, desc="(reset to BMC auto fan mode)")
-        if ok:
-            self.cpu_slider.setValue(0)
-            self.per_slider.setValue(0)
-            self.last_auto_target = None
-            self.update_curve_widget()
+        args = ["-raw", "0x30", "0x45", "0x01", f"0x{BMC_AUTO_FAN_MODE:02x}"]
+        self.run_ipmi(args, desc="(reset to BMC auto fan mode)", key="fan_mode")
 
     # ----- 关闭窗口时，停线程 -----
 
     def closeEvent(self, event):
+        with self.lhm_lock:
+            self.closing = True
+            supervisors = list(self.lhm_supervisors)
+        for supervisor in supervisors:
+            supervisor.cancel.set()
         if hasattr(self, "worker") and self.worker.isRunning():
             self.worker.stop()
             self.worker.wait(2000)
+        if hasattr(self, "ipmi_worker") and self.ipmi_worker.isRunning():
+            self.ipmi_worker.stop()
+            self.ipmi_worker.wait(5000)
+        summary = self.write_summary.summarize(force=True)
+        if summary:
+            log.info(summary)
+        self.log_timer.stop()
+        log.removeHandler(self.log_handler)
         event.accept()
 
 
+# ---------- 控制服务客户端窗口 ----------
+
+class RemoteWindow(MainWindow):
+    """
+    --connect：控制服务（fanctl.py run --listen）的客户端窗口。
+    温度读取、曲线计算和 BMC 写入都在服务进程里，关闭窗口不影响风扇控制；
+    这里只显示服务广播的遥测，把自动 / 手动 / 曲线 / 恢复 BMC 的操作作为命令发给服务。
+    不需要管理员权限，也不启动 LibreHardwareMonitor、不打开 IPMI 通道。
+    """
+
+    def __init__(self, address, token=None, history_capacity=HISTORY_CAPACITY, startup=None):
+        self.service_address = address
+        self.service_token = token
+        self.service_connected = None   # None：还没有连接过
+        self.can_control = False
+        self.remote_zones = ()
+        self.remote_duties = {}   # zone → 服务最近一次报告的占空比
+        self.remote_target = None
+        self.remote_state = None
+        super().__init__(None, history_capacity=history_capacity, startup=startup)
+        self.setWindowTitle(f"X11 Fan Master - 控制服务 {address}")
+        self.curve_timer = QTimer(self)
+        self.curve_timer.setSingleShot(True)
+        self.curve_timer.setInterval(CURVE_SEND_DELAY_MS)
+        self.curve_timer.timeout.connect(self.send_curve)
+
+    def start_workers(self, *_args):
+        self.bmc_fan_label.setText("风扇转速：--（连接控制服务时不读取 BMC 传感器）")
+        self.bmc_temp_label.setText("主板温度：--")
+        self.bmc_cost_label.setText(f"控制服务：正在连接 {self.service_address}…")
+        self.delay_label.setText("正在连接控制服务…")
+        for widget in (self.source_combo, self.mode_combo, self.setpoint_spin):
+            widget.setEnabled(False)
+            widget.setToolTip("由控制服务的配置决定")
+        self.set_controls_enabled(False)
+
+        self.service_worker = ServiceWorker(self.service_address, self.service_token, parent=self)
+        self.service_worker.telemetryReceived.connect(self.on_service_telemetry)
+        self.service_worker.stateReceived.connect(self.on_service_state)
+        self.service_worker.resultReceived.connect(self.on_service_result)
+        self.service_worker.connected.connect(self.on_service_connected)
+        self.service_worker.disconnected.connect(self.on_service_disconnected)
+        self.service_worker.start()
+
+    def set_controls_enabled(self, enabled: bool):
+        auto = self.auto_check.isChecked()
+        self.auto_check.setEnabled(enabled)
+        self.reset_btn.setEnabled(enabled)
+        self.cpu_slider.setEnabled(enabled and not auto)
+        self.per_slider.setEnabled(enabled and not auto)
+        state = self.remote_state
+        editable = (
+            enabled
+            and state is not None
+            and state.curve_editable
+            and len(state.curve) in (0, len(self.temp_spins))
+        )
+        for spin in self.temp_spins + self.fan_spins:
+            spin.setEnabled(editable)
+
+    def send(self, method, *args):
+        if not self.service_worker.send(method, *args):
+            self.append_log("控制服务未连接，操作没有发出", logging.WARNING)
+
+    # ----- 控制服务回调 -----
+
+    def on_service_connected(self, can_control: bool):
+        self.service_connected = True
+        self.can_control = can_control
+        self.bmc_cost_label.setText(
+            f"控制服务：{self.service_address}（{'可控制' if can_control else '只读，没有控制令牌'}）"
+        )
+        self.append_log(f"已连接控制服务 {self.service_address}（{'可控制' if can_control else '只读'}）")
+        self.set_controls_enabled(can_control)
+
+    def on_service_disconnected(self, reason: str):
+        # 重连失败不重复刷日志
+        if self.service_connected is not False:
+            self.append_log(f"{reason}，每 {SERVICE_RETRY_INTERVAL:g} 秒重试", logging.WARNING)
+        self.service_connected = False
+        self.bmc_cost_label.setText(f"控制服务：未连接（{reason}）")
+        self.cpu_value.setText("--.- °C")
+        self.set_temp_state("unknown")
+        self.set_controls_enabled(False)
+
+    def on_service_state(self, state):
+        previous = self.remote_state
+        self.remote_state = state
+        self.remote_zones = state.zones
+        self.auto_check.blockSignals(True)
+        self.auto_check.setChecked(state.mode == "auto")
+        self.auto_check.blockSignals(False)
+
+        # 本地刚改过、还没发出的曲线（curve_timer 在计时）优先，不被服务的旧曲线覆盖
+        if state.curve and not self.curve_timer.isActive():
+            if len(state.curve) == len(self.temp_spins):
+                # 服务的曲线显示在控制点上；不触发 on_curve_changed（不回发给服务）
+                for spin, value in zip(self.temp_spins + self.fan_spins,
+                                       [t for t, _ in state.curve] + [p for _, p in state.curve]):
+                    spin.blockSignals(True)
+                    spin.setValue(int(round(value)))
+                    spin.blockSignals(False)
+            else:
+                for spin in self.temp_spins + self.fan_spins:
+                    spin.setToolTip(f"服务的曲线有 {len(state.curve)} 个控制点，请在配置文件中修改")
+            self.curve = FanCurve(state.curve)
+            self.curve_controller = CurveController(self.curve)
+        self.set_controls_enabled(self.can_control)
+
+        if previous is None or (previous.mode, previous.controller) != (state.mode, state.controller):
+            self.append_log(f"控制服务：{MODE_LABELS.get(state.mode, state.mode)}，{state.controller}")
+        self.update_curve_widget()
+
+    def on_service_result(self, result):
+        if not result.ok:
+            self.append_log(f"控制服务拒绝了操作：{result.text}", logging.WARNING)
+
+    def on_service_telemetry(self, t):
+        self.report_startup()
+        self.last_max_temp = t.temp
+        if t.temp is None:
+            self.cpu_value.setText("--.- °C")
+            self.set_temp_state("unknown")
+        else:
+            self.cpu_value.setText(f"{t.temp:.1f} °C")
+            self.set_temp_state("alarm" if t.temp >= TEMP_ALARM_C else "normal")
+        self.delay_label.setText(f"上次读取：{t.read_ms:.0f} ms")
+        self.rate_label.setText(f"采样间隔：{t.interval:.2f} s")
+        self.on_sockets_updated(t.sockets)
+
+        self.remote_duties = {z: d for z, (d, _target) in t.zones.items() if d is not None}
+        targets = {target for _duty, target in t.zones.values() if target is not None}
+        self.remote_target = max(targets) if targets else None
+        if t.mode != "auto":
+            self.auto_target_label.setText(f"当前自动目标：--（{MODE_LABELS.get(t.mode, t.mode)}）")
+        elif t.fallback == "failsafe":
+            self.auto_target_label.setText("当前自动目标：失效保护")
+        elif len(targets) == 1:
+            self.auto_target_label.setText(f"当前自动目标：{self.remote_target}%")
+        else:
+            self.auto_target_label.setText(
+                "当前自动目标："
+                + "  ".join(f"zone{z} {'--' if tg is None else tg}%" for z, (_d, tg) in sorted(t.zones.items()))
+            )
+        total = t.writes + t.suppressed
+        ratio = t.suppressed / total if total else 0.0
+        self.write_stats_label.setText(f"写入 {t.writes} 次，抑制 {t.suppressed} 次（{ratio * 100.0:.0f}%）")
+
+        # 滑条跟随服务的实际占空比（正在拖动时不动）
+        for zone, slider in ((0, self.cpu_slider), (1, self.per_slider)):
+            if zone in self.remote_duties and not slider.isSliderDown():
+                slider.setValue(self.remote_duties[zone])
+
+        if t.temp is not None:
+            self.history.append(t.time, t.temp, max(self.remote_duties.values(), default=0), t.read_ms)
+            self.history_widget.update()
+        self.update_curve_widget()
+
+    # ----- 操作 → 命令 -----
+
+    def display_target(self, temp_c: float):
+        if self.remote_target is not None:
+            return self.remote_target
+        return self.curve.lookup(temp_c)
+
+    def on_auto_toggled(self, checked: bool):
+        self.cpu_slider.setEnabled(not checked)
+        self.per_slider.setEnabled(not checked)
+        if checked:
+            self.send("set_auto")
+            return
+        # 关掉自动：与本地模式一样，各风扇区停在当前占空比
+        for zone in self.remote_zones:
+            if zone in self.remote_duties:
+                self.send("set_duty", zone, self.remote_duties[zone])
+        self.update_curve_widget()
+
+    def on_controller_params_changed(self):
+        # 每次改动只重新计时，停手 CURVE_SEND_DELAY_MS 毫秒后由 send_curve() 发一次
+        if self.can_control:
+            self.curve_timer.start()
+        self.update_curve_widget()
+
+    def send_curve(self):
+        if self.can_control:
+            self.send("set_curve", self.curve.points)
+
+    def set_fan_pwm(self, zone: int, percent: int):
+        self.send("set_duty", zone, percent)
+
+    def on_reset_bmc_auto(self):
+        self.send("release_to_bmc")
+
+    def closeEvent(self, event):
+        if self.service_worker.isRunning():
+            self.service_worker.stop()
+            self.service_worker.wait(2000)
+        super().closeEvent(event)
+
+
 # ---------- 程序入口 ----------
 
+def parse_args(argv):
+    parser = argparse.ArgumentParser(description="X11 Fan Master")
+    parser.add_argument(
+        "--transport",
+        choices=TRANSPORT_KINDS,
+        default="auto",
+        help="IPMI 通道：auto / ipmicfg / wmi / openipmi / lan",
+    )
+    parser.add_argument(
+        "--sensors",
+        choices=READER_KINDS,
+        default="auto",
+        help="温度来源：auto（Windows 用 LibreHardwareMonitor，Linux 用 hwmon）/ lhm / lhm-http / hwmon",
+    )
+    parser.add_argument(
+        "--lhm-url",
+        default=LHM_HTTP_URL,
+        help="--sensors lhm-http 时 LibreHardwareMonitor 的 data.json 地址（Options → Remote Web Server）",
+    )
+    parser.add_argument(
+        "--poll-min",
+        type=float,
+        default=TEMP_POLL_MIN_INTERVAL,
+        help="温度上升或接近曲线拐点时的最短采样间隔（秒）",
+    )
+    parser.add_argument(
+        "--poll-max",
+        type=float,
+        default=TEMP_POLL_MAX_INTERVAL,
+        help="温度稳定时的最长采样间隔（秒）；与 --poll-min 相同则为固定间隔",
+    )
+    parser.add_argument(
+        "--controller",
+        choices=CONTROLLER_KINDS,
+        default="curve",
+        help="自动控制方式：curve（风扇曲线）/ pid（跟踪目标温度）",
+    )
+    parser.add_argument(
+        "--setpoint",
+        type=float,
+        default=DEFAULT_PID_SETPOINT,
+        help="PID 目标温度（°C）",
+    )
+    parser.add_argument(
+        "--history",
+        type=int,
+        default=HISTORY_CAPACITY,
+        help="历史缓冲区容量（采样数），默认 86400",
+    )
+    parser.add_argument(
+        "--deadband",
+        type=int,
+        default=DEFAULT_DEADBAND,
+        help="自动模式下目标占空比变化不超过这么多（%%）时不写入",
+    )
+    parser.add_argument(
+        "--hyst-up",
+        type=float,
+        default=DEFAULT_HYST_UP,
+        help="升速前温度至少比上次写入时高多少（°C）",
+    )
+    parser.add_argument(
+        "--hyst-down",
+        type=float,
+        default=DEFAULT_HYST_DOWN,
+        help="降速前温度至少比上次写入时低多少（°C）",
+    )
+    parser.add_argument(
+        "--min-dwell",
+        type=float,
+        default=DEFAULT_MIN_DWELL,
+        help="距上次写入不到这么多秒不降速",
+    )
+    parser.add_argument(
+        "--zone-map",
+        help="多风扇区映射（JSON：列表，或带 zone_map 键的 fanctl 配置文件），每个区独立的曲线和温度来源",
+    )
+    parser.add_argument(
+        "--metrics-port",
+        type=int,
+        help="在 127.0.0.1 的该端口提供 /metrics（Prometheus 文本格式）和 /metrics.json",
+    )
+    parser.add_argument("--metrics-json", help="每 15 秒把运行指标写成 JSON 文件")
+    parser.add_argument(
+        "--record-trace",
+        help="把温度采样流录制成轨迹文件（.x11t，可追加），供 fanctl.py replay 离线整定曲线",
+    )
+    parser.add_argument(
+        "--read-timeout",
+        type=float,
+        default=READ_TIMEOUT,
+        help="单次温度读取的时限（秒），超时按读取失败处理；0 为不限时",
+    )
+    parser.add_argument(
+        "--failsafe-duty",
+        type=int,
+        default=DEFAULT_FAILSAFE_DUTY,
+        help="CPU 温度持续不可用、又没有 BMC 温度时写入的占空比（%%）",
+    )
+    parser.add_argument(
+        "--failsafe-after",
+        type=float,
+        default=DEFAULT_FAILSAFE_AFTER,
+        help="CPU 温度持续不可用多少秒后写失效保护占空比",
+    )
+    parser.add_argument(
+        "--log-file",
+        default=os.path.join(user_data_dir(), "x11fan.log"),
+        help="日志文件（按大小轮转）；传空字符串不写文件",
+    )
+    parser.add_argument(
+        "--log-level",
+        choices=LOG_LEVELS,
+        default="info",
+        help="写入日志文件的最低级别；debug 时记录每条 IPMI 命令",
+    )
+    parser.add_argument(
+        "--connect",
+        nargs="?",
+        const=SERVICE_ADDRESS,
+        help=f"作为控制服务（fanctl.py run --listen）的客户端运行，不直接访问传感器和 BMC（默认 {SERVICE_ADDRESS}）",
+    )
+    parser.add_argument("--token-file", help="--connect 时的控制令牌文件（默认数据目录下的 service.token）")
+    parser.add_argument("--host", help="BMC 地址（IPMI over LAN）")
+    parser.add_argument("--port", type=int, default=623)
+    parser.add_argument("--user", default="ADMIN")
+    parser.add_argument(
+        "--password",
+        default=os.environ.get("IPMI_PASSWORD", ""),
+        help="BMC 密码，默认取环境变量 IPMI_PASSWORD",
+    )
+    args, qt_args = parser.parse_known_args(argv)
+    if args.read_timeout < 0:
+        parser.error("--read-timeout 不能为负数（0 为不限时）")
+    return args, qt_args
+
+
 def main():
+    startup = StartupTimer(STARTUP_T0)
+    startup.add("import", STARTUP_T0, STARTUP_IMPORTED)
+    args, qt_args = parse_args(sys.argv[1:])
+    try:
+        if args.log_file:
+            os.makedirs(os.path.dirname(os.path.abspath(args.log_file)), exist_ok=True)
+        setup_logging(args.log_file, parse_level(args.log_level))
+    except OSError as e:
+        print(f"无法打开日志文件：{e}")
+        setup_logging()
+
+    if args.connect:
+        # 控制服务的客户端：不需要管理员权限，不打开 IPMI / 温度来源
+        with startup.phase("QApplication"):
+            app = QApplication(sys.argv[:1] + qt_args)
+        with startup.phase("窗口构建"):
+            window = RemoteWindow(
+                args.connect, load_token(args.token_file), history_capacity=args.history, startup=startup
+            )
+            window.show()
+        sys.exit(app.exec())
+
     if not is_admin():
-        print("警告：当前进程不是管理员，IPMICFG 可能无法访问 BMC。")
+        print("警告：当前进程不是管理员，可能无法访问 BMC。")
 
     try:
         ipmi_exe = find_ipmicfg()
     except FileNotFoundError as e:
         print(e)
-        return
+        ipmi_exe = None
+
+    transport_factory = functools.partial(
+        open_transport,
+        args.transport,
+        ipmi_exe=ipmi_exe,
+        host=args.host,
+        user=args.user,
+        password=args.password,
+        port=args.port,
+    )
+
+    zone_map = None
+    if args.zone_map:
+        try:
+            zone_map = load_zone_map(
+                args.zone_map,
+                DEFAULT_CURVE_POINTS,
+                lambda: DutyFilter(args.deadband, args.hyst_up, args.hyst_down, args.min_dwell),
+            )
+        except (OSError, ValueError) as e:
+            print(f"无法读取风扇区映射：{e}")
 
-    app = QApplication(sys.argv)
-    window = MainWindow(ipmi_exe)
-    window.show()
-    sys.exit(app.exec())
+    metrics = None
+    exporters = []
+    if args.metrics_port is not None or args.metrics_json:
+        metrics = Metrics()
+        try:
+            if args.metrics_port is not None:
+                exporters.append(MetricsServer(metrics, port=args.metrics_port).start())
+            if args.metrics_json:
+                exporters.append(JsonDumper(metrics, args.metrics_json, log=log.warning).start())
+        except OSError as e:
+            print(f"无法启动指标端点：{e}")
+
+    with startup.phase("QApplication"):
+        app = QApplication(sys.argv[:1] + qt_args)
+    with startup.phase("窗口构建"):
+        window = MainWindow(
+            transport_factory,
+            reader_kind=resolve_reader_kind(args.sensors),
+            lhm_url=args.lhm_url,
+            poll_min=args.poll_min,
+            poll_max=max(args.poll_min, args.poll_max),
+            duty_filter=DutyFilter(args.deadband, args.hyst_up, args.hyst_down, args.min_dwell),
+            controller_kind=args.controller,
+            pid=PidController(args.setpoint),
+            history_capacity=args.history,
+            zone_map=zone_map,
+            metrics=metrics,
+            trace_path=args.record_trace,
+            read_timeout=args.read_timeout or None,
+            fallback=SensorFallback(args.failsafe_duty, args.failsafe_after),
+            startup=startup,
+        )
+        window.show()
+    code = app.exec()
+    for exporter in exporters:
+        exporter.close()
+    sys.exit(code)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,301 @@
+"""
+运行指标：Prometheus 文本格式的本地 HTTP 端点，外加可选的定期 JSON 转储。
+
+只用标准库。采样路径上的开销只有一次 bisect 和几次整数加法；
+写入抑制次数这类已经在别处计数的值，通过 collector 在抓取时读取，不在采样路径上重复计数。
+
+    metrics = Metrics()
+    server = MetricsServer(metrics, port=9842).start()   # GET /metrics、/metrics.json
+    dumper = JsonDumper(metrics, "metrics.json", 15).start()
+
+各个 observe / inc / set 由采样线程和 IPMI 线程调用，每个指标只有一个线程写入；
+抓取线程只读，读到的是某一时刻前后的值，不加锁。
+"""
+
+import bisect
+import http.server
+import json
+import os
+import threading
+import time
+
+
+METRICS_HOST = "127.0.0.1"
+METRICS_JSON_INTERVAL = 15.0
+
+# 延迟直方图的桶上限（秒）：hwmon 的 pread 在几十微秒，IPMICFG 启动一次在几十到几百毫秒
+LATENCY_BUCKETS = (
+    0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025,
+    0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0,
+)
+
+# 名称 → (类型, 说明)
+METRIC_HELP = {
+    "x11fan_sensor_read_seconds": ("histogram", "CPU 温度读取（read_cpu_temps）耗时"),
+    "x11fan_ipmi_command_seconds": ("histogram", "单条 IPMI 命令耗时"),
+    "x11fan_fan_writes_total": ("counter", "成功写入风扇占空比的次数"),
+    "x11fan_fan_writes_suppressed_total": ("counter", "被写入抑制跳过的次数"),
+    "x11fan_fan_write_retries_total": ("counter", "写入失败后对同一风扇区的重写次数"),
+    "x11fan_sensor_read_errors_total": ("counter", "温度读取失败次数"),
+    "x11fan_sensor_read_timeouts_total": ("counter", "温度读取超过时限的次数"),
+    "x11fan_sensor_reader_rebuilds_total": ("counter", "读取后端无响应后在后台重建的次数"),
+    "x11fan_sensor_reader_rebuild_seconds": ("gauge", "最近一次重建读取后端到重新可用的秒数"),
+    "x11fan_sensor_fallbacks_total": ("counter", "CPU 温度不可用时进入各退路（bmc / failsafe）的次数"),
+    "x11fan_sensor_last_outage_seconds": ("gauge", "最近一次 CPU 温度中断到恢复的秒数"),
+    "x11fan_ipmi_errors_total": ("counter", "IPMI 命令失败次数"),
+    "x11fan_samples_total": ("counter", "温度采样次数"),
+    "x11fan_sample_jitter_seconds": ("histogram", "采样实际开始时间晚于计划截止时间的秒数"),
+    "x11fan_sample_overruns_total": ("counter", "一次采样做完时下一次截止已经过去的次数"),
+    "x11fan_cpu_temperature_celsius": ("gauge", "最近一次读取的 CPU 最大温度"),
+    "x11fan_zone_temperature_celsius": ("gauge", "风扇区的输入温度（多风扇区映射时每次采样更新，否则为最近一次写入时）"),
+    "x11fan_zone_duty_percent": ("gauge", "风扇区最近一次写入的占空比"),
+    "x11fan_sensor_backend_info": ("gauge", "使用中的温度读取后端"),
+    "x11fan_ipmi_transport_info": ("gauge", "使用中的 IPMI 通道"),
+    "x11fan_fleet_cycle_seconds": ("histogram", "fleet 模式下一台主机一次采样 + 写入的耗时"),
+    "x11fan_fleet_host_up": ("gauge", "fleet 模式下主机最近一次是否成功"),
+    "x11fan_fleet_host_errors_total": ("counter", "fleet 模式下主机采样失败次数"),
+}
+
+
+def _label_key(labels):
+    return tuple(sorted(labels.items()))
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(key, extra=()):
+    items = list(key) + list(extra)
+    if not items:
+        return ""
+    body = ",".join(f'{name}="{_escape(value)}"' for name, value in items)
+    return "{" + body + "}"
+
+
+def _format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Histogram:
+    """固定桶的直方图：counts[i] 为落在第 i 个桶（含）以内、前一个桶以外的次数"""
+
+    __slots__ = ("buckets", "counts", "sum", "count")
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)   # 最后一个是 +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def cumulative(self):
+        """[(上限, 累计次数), ...]，最后一项上限为 +Inf"""
+        total = 0
+        result = []
+        for bound, n in zip(self.buckets + (float("inf"),), self.counts):
+            total += n
+            result.append((bound, total))
+        return result
+
+    def quantile(self, q: float):
+        """按桶上限估计分位数（JSON 转储里给人看）；没有数据时为 None"""
+        if not self.count:
+            return None
+        rank = q * self.count
+        for bound, total in self.cumulative():
+            if total >= rank:
+                return bound
+        return None
+
+
+class Metrics:
+    """指标注册表：计数器 / 仪表 / 直方图，按 (名称, 标签) 存放"""
+
+    def __init__(self):
+        self.counters = {}     # name -> {label_key: value}
+        self.gauges = {}
+        self.histograms = {}   # name -> Histogram（不带标签）
+        self.collectors = []
+        self.started = time.time()
+
+    def inc(self, name, amount=1, **labels):
+        series = self.counters.setdefault(name, {})
+        key = _label_key(labels)
+        series[key] = series.get(key, 0) + amount
+
+    def set_counter(self, name, value, **labels):
+        """由 collector 调用：直接给出别处已经累计好的计数"""
+        self.counters.setdefault(name, {})[_label_key(labels)] = value
+
+    def set(self, name, value, **labels):
+        self.gauges.setdefault(name, {})[_label_key(labels)] = value
+
+    def set_info(self, name, **labels):
+        """*_info 指标：只保留当前这一组标签，值为 1"""
+        self.gauges[name] = {_label_key(labels): 1}
+
+    def observe(self, name, value):
+        hist = self.histograms.get(name)
+        if hist is None:
+            hist = self.histograms[name] = Histogram()
+        hist.observe(value)
+
+    def add_collector(self, fn):
+        """fn(metrics) 在每次抓取 / 转储前调用，用来读取别处已有的统计"""
+        self.collectors.append(fn)
+
+    def collect(self):
+        for fn in list(self.collectors):
+            fn(self)
+
+    # ----- 输出 -----
+
+    def render_prometheus(self) -> str:
+        self.collect()
+        lines = []
+
+        def header(name):
+            kind, help_text = METRIC_HELP.get(name, ("untyped", name))
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+
+        for table in (self.counters, self.gauges):
+            for name in sorted(table):
+                header(name)
+                for key, value in sorted(table[name].items()):
+                    lines.append(f"{name}{_format_labels(key)} {_format_value(value)}")
+        for name in sorted(self.histograms):
+            hist = self.histograms[name]
+            header(name)
+            for bound, total in hist.cumulative():
+                le = (("le", _format_value(bound) if bound != float("inf") else "+Inf"),)
+                lines.append(f"{name}_bucket{_format_labels((), le)} {total}")
+            lines.append(f"{name}_sum {_format_value(hist.sum)}")
+            lines.append(f"{name}_count {hist.count}")
+        return "\n".join(lines) + "\n"
+
+    def snapshot(self) -> dict:
+        """JSON 友好的快照；直方图给出次数、总和和 p50 / p99（桶上限估计）"""
+        self.collect()
+
+        def series(table):
+            return {
+                name: [dict(key, value=value) for key, value in sorted(values.items())]
+                for name, values in sorted(table.items())
+            }
+
+        return {
+            "timestamp": time.time(),
+            "uptime_s": time.time() - self.started,
+            "counters": series(self.counters),
+            "gauges": series(self.gauges),
+            "histograms": {
+                name: {
+                    "count": h.count,
+                    "sum": h.sum,
+                    "p50": h.quantile(0.5),
+                    "p99": h.quantile(0.99),
+                    "buckets": [[b if b != float("inf") else "+Inf", n] for b, n in h.cumulative()],
+                }
+                for name, h in sorted(self.histograms.items())
+            },
+        }
+
+
+# ---------- HTTP 端点 ----------
+
+class _Handler(http.server.BaseHTTPRequestHandler):
+    metrics = None
+
+    def do_GET(self):
+        path = self.path.split("?", 1)[0]
+        if path in ("/", "/metrics"):
+            body = self.metrics.render_prometheus().encode("utf-8")
+            ctype = "text/plain; version=0.0.4; charset=utf-8"
+        elif path == "/metrics.json":
+            body = json.dumps(self.metrics.snapshot(), ensure_ascii=False).encode("utf-8")
+            ctype = "application/json; charset=utf-8"
+        else:
+            self.send_error(404)
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", ctype)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class MetricsServer:
+    """后台线程里的 HTTP 服务：/metrics（Prometheus 文本）、/metrics.json"""
+
+    def __init__(self, metrics, host=METRICS_HOST, port=0):
+        handler = type("MetricsHandler", (_Handler,), {"metrics": metrics})
+        self.httpd = http.server.ThreadingHTTPServer((host, port), handler)
+        self.httpd.daemon_threads = True
+        self.thread = None
+
+    @property
+    def address(self):
+        return self.httpd.server_address[:2]
+
+    def start(self):
+        self.thread = threading.Thread(
+            target=self.httpd.serve_forever, name="metrics-http", daemon=True
+        )
+        self.thread.start()
+        return self
+
+    def close(self):
+        if self.thread is not None:
+            self.httpd.shutdown()
+            self.thread.join()
+            self.thread = None
+        self.httpd.server_close()
+
+
+class JsonDumper:
+    """每 interval 秒把 Metrics.snapshot() 原子地写到 path（先写临时文件再替换）"""
+
+    def __init__(self, metrics, path, interval=METRICS_JSON_INTERVAL, log=None):
+        self.metrics = metrics
+        self.path = path
+        self.interval = interval
+        self.log = log
+        self.stop_event = threading.Event()
+        self.thread = None
+
+    def dump(self):
+        tmp = self.path + ".tmp"
+        try:
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(self.metrics.snapshot(), f, ensure_ascii=False, indent=1)
+            os.replace(tmp, self.path)
+        except OSError as e:
+            if self.log is not None:
+                self.log(f"写入指标文件失败：{e}")
+
+    def _run(self):
+        while not self.stop_event.wait(self.interval):
+            self.dump()
+
+    def start(self):
+        self.thread = threading.Thread(target=self._run, name="metrics-json", daemon=True)
+        self.thread.start()
+        return self
+
+    def close(self):
+        self.stop_event.set()
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+        self.dump()
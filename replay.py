@@ -0,0 +1,513 @@
+"""
+温度轨迹的录制与回放：不需要 Qt 和硬件，比实时快几千倍地整定风扇曲线。
+
+录制：TraceRecorder 把采样流（时间戳、CPU 最大温度、若干其它传感器）按块追加到 .x11t 文件，
+每个采样 4 字节时间偏移 + 每个传感器 2 字节（0.01 °C），1 秒一次的一周约 3.6 MB；
+进程中途退出时最多丢掉最后一个没写完的块。
+
+回放：
+- replay()：任意控制策略（CurveController / PidController）+ DutyFilter，逐个采样执行
+- evaluate_curves()：同一条轨迹上批量评估多条候选曲线。曲线查表用 FanCurve.evaluate_many()；
+  写入抑制只在状态变化（写入）处推进，两次写入之间用向量运算一次找出下一次写入的位置，
+  有 numpy 时整段向量化，没有时退回逐个采样（结果完全相同）
+
+回放是开环的：轨迹里的温度不会因为候选曲线不同而改变。因此除了写入次数和平均占空比，
+还给出温度超过阈值的时长，以及其中风扇没到满速的时长（候选曲线在高温时“给得不够”的程度）。
+
+    trace = load_trace("week.x11t")
+    for r in evaluate_curves(trace, [FanCurve(...), FanCurve(...)], threshold=80):
+        print(r.name, r.writes, r.mean_duty, r.above_not_full_s)
+"""
+
+import csv
+import math
+import struct
+import sys
+from array import array
+
+from curve import _numpy
+from zones import CPU_SENSOR
+
+
+TRACE_MAGIC = b"X11T"
+TRACE_VERSION = 1
+# magic, 版本, 传感器列数
+_HEADER = struct.Struct("<4sHH")
+# 每块：采样数, 块起点时间（秒）
+_BLOCK = struct.Struct("<Id")
+
+# 温度按 0.01 °C 存成 int16，读数缺失记为 TEMP_MISSING
+TEMP_SCALE = 100.0
+TEMP_MISSING = -32768
+
+# 默认每多少个采样写一块
+TRACE_FLUSH_ROWS = 60
+
+# 两个采样间隔超过这么多秒（录制中断、程序重启）时，这段时间不计入时长统计
+REPLAY_MAX_GAP = 60.0
+DEFAULT_THRESHOLD = 80.0
+
+
+# ---------- 录制 ----------
+
+class TraceRecorder:
+    """
+    按块追加写入 .x11t 轨迹文件。columns 为 CPU 以外要录制的传感器名（固定顺序），
+    record() 时缺失的传感器记为缺失值。文件已存在时要求列相同，接着追加。
+    """
+
+    def __init__(self, path, columns=(), flush_rows=TRACE_FLUSH_ROWS):
+        self.path = path
+        self.columns = (CPU_SENSOR,) + tuple(c for c in columns if c != CPU_SENSOR)
+        self.flush_rows = flush_rows
+        self.rows = 0
+        self._base = None
+        self._offsets = array("I")
+        self._temps = [array("h") for _ in self.columns]
+
+        existing = None
+        try:
+            existing = read_header(path)
+        except FileNotFoundError:
+            pass
+        if existing is not None and existing != self.columns:
+            raise ValueError(f"轨迹文件的传感器列与本次不同：{path}")
+        self.file = open(path, "ab")
+        if existing is None:
+            self.file.write(_HEADER.pack(TRACE_MAGIC, TRACE_VERSION, len(self.columns)))
+            for name in self.columns:
+                encoded = name.encode("utf-8")
+                self.file.write(struct.pack("<H", len(encoded)) + encoded)
+            self.file.flush()
+
+    def record(self, timestamp: float, cpu_temp, sensors=None):
+        if self._base is None:
+            self._base = timestamp
+        offset = int(round((timestamp - self._base) * 1000.0))
+        if not 0 <= offset <= 0xFFFFFFFF:
+            # 时钟回拨或块跨度过长：另起一块
+            self.flush()
+            self._base = timestamp
+            offset = 0
+        self._offsets.append(offset)
+        for i, name in enumerate(self.columns):
+            value = cpu_temp if i == 0 else (sensors or {}).get(name)
+            self._temps[i].append(_encode_temp(value))
+        self.rows += 1
+        if len(self._offsets) >= self.flush_rows:
+            self.flush()
+
+    def flush(self):
+        count = len(self._offsets)
+        if not count:
+            return
+        chunks = [self._offsets] + self._temps
+        if sys.byteorder != "little":
+            chunks = [array(c.typecode, c) for c in chunks]
+            for c in chunks:
+                c.byteswap()
+        self.file.write(_BLOCK.pack(count, self._base))
+        for chunk in chunks:
+            chunk.tofile(self.file)
+        self.file.flush()
+        self._base = None
+        self._offsets = array("I")
+        self._temps = [array("h") for _ in self.columns]
+
+    def close(self):
+        if self.file is None:
+            return
+        self.flush()
+        self.file.close()
+        self.file = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def _encode_temp(value):
+    if value is None or value != value:
+        return TEMP_MISSING
+    return max(-32767, min(32767, int(round(value * TEMP_SCALE))))
+
+
+def read_header(path):
+    """返回轨迹文件的传感器列；文件为空时返回 None"""
+    with open(path, "rb") as f:
+        head = f.read(_HEADER.size)
+        if not head:
+            return None
+        return _read_columns(f, head, path)
+
+
+def _read_columns(f, head, path):
+    if len(head) < _HEADER.size:
+        raise ValueError(f"不是温度轨迹文件：{path}")
+    magic, version, ncols = _HEADER.unpack(head)
+    if magic != TRACE_MAGIC or version != TRACE_VERSION:
+        raise ValueError(f"不是温度轨迹文件：{path}")
+    columns = []
+    for _ in range(ncols):
+        (length,) = struct.unpack("<H", f.read(2))
+        columns.append(f.read(length).decode("utf-8"))
+    return tuple(columns)
+
+
+# ---------- 轨迹 ----------
+
+class Trace:
+    """一条轨迹：时间戳 array('d') + 每个传感器一列 array('f')（缺失为 NaN）"""
+
+    def __init__(self, timestamps, columns):
+        self.timestamps = timestamps
+        self.columns = columns
+
+    def __len__(self):
+        return len(self.timestamps)
+
+    @property
+    def duration(self) -> float:
+        return self.timestamps[-1] - self.timestamps[0] if len(self.timestamps) > 1 else 0.0
+
+    @classmethod
+    def from_samples(cls, samples):
+        """[(秒, 温度), ...]（bench_filter 的轨迹格式）"""
+        return cls(
+            array("d", (t for t, _ in samples)),
+            {CPU_SENSOR: array("f", (temp for _, temp in samples))},
+        )
+
+    def series(self, sensor=CPU_SENSOR):
+        """某个传感器的 (时间戳, 温度)，跳过缺失的采样；温度为 Python float 列表"""
+        column = self.columns.get(sensor)
+        if column is None:
+            raise ValueError(f"轨迹中没有传感器：{sensor}（有：{', '.join(self.columns)}）")
+        times, temps = array("d"), []
+        for t, value in zip(self.timestamps, column):
+            if value == value:
+                times.append(t)
+                temps.append(float(value))
+        return times, temps
+
+
+def load_trace(path) -> Trace:
+    """读取 .x11t 轨迹；.csv 按 bench_filter 的格式（每行：秒, 温度）"""
+    if path.lower().endswith(".csv"):
+        with open(path, newline="", encoding="utf-8") as f:
+            return Trace.from_samples([(float(row[0]), float(row[1])) for row in csv.reader(f) if row])
+
+    timestamps = array("d")
+    with open(path, "rb") as f:
+        columns = _read_columns(f, f.read(_HEADER.size), path)
+        data = {name: array("f") for name in columns}
+        while True:
+            head = f.read(_BLOCK.size)
+            if len(head) < _BLOCK.size:
+                break
+            count, base = _BLOCK.unpack(head)
+            offsets = array("I")
+            temps = [array("h") for _ in columns]
+            try:
+                offsets.fromfile(f, count)
+                for column in temps:
+                    column.fromfile(f, count)
+            except EOFError:
+                break   # 最后一块没写完（录制进程中途退出）
+            if sys.byteorder != "little":
+                offsets.byteswap()
+                for column in temps:
+                    column.byteswap()
+            timestamps.extend(base + o / 1000.0 for o in offsets)
+            for name, column in zip(columns, temps):
+                data[name].extend(math.nan if v == TEMP_MISSING else v / TEMP_SCALE for v in column)
+    return Trace(timestamps, data)
+
+
+# ---------- 回放 ----------
+
+class ReplayResult:
+    """
+    一次回放的结果。duties 是每个采样时实际生效的占空比（与 times 等长），
+    writes / suppressed 与 DutyFilter 的 issued / suppressed 含义相同。
+    时长按相邻采样的间隔累计（超过 max_gap 的间隔不计），单位秒。
+    """
+
+    def __init__(self, name, times, temps, duties, writes, suppressed, threshold, stats):
+        self.name = name
+        self.times = times
+        self.temps = temps
+        self.duties = duties
+        self.writes = writes
+        self.suppressed = suppressed
+        self.threshold = threshold
+        self.seconds, self.mean_duty, self.deficit_mean, self.above_s, self.above_not_full_s = stats
+
+    @property
+    def writes_per_hour(self) -> float:
+        return self.writes * 3600.0 / self.seconds if self.seconds else 0.0
+
+    def summary(self) -> dict:
+        return {
+            "name": self.name,
+            "samples": len(self.times),
+            "hours": self.seconds / 3600.0,
+            "writes": self.writes,
+            "writes_per_hour": self.writes_per_hour,
+            "suppressed": self.suppressed,
+            "mean_duty": self.mean_duty,
+            "deficit_mean": self.deficit_mean,
+            "threshold": self.threshold,
+            "above_s": self.above_s,
+            "above_not_full_s": self.above_not_full_s,
+        }
+
+
+class _Weights:
+    """每个采样代表的时长（到下一个采样为止）和高温标记；同一条轨迹上的所有候选共用"""
+
+    def __init__(self, times, temps, threshold, max_gap, np=None):
+        n = len(times)
+        dt = [times[i + 1] - times[i] for i in range(n - 1)] + [0.0]
+        dt = [d if 0 < d <= max_gap else 0.0 for d in dt]
+        self.total = sum(dt)
+        hot = [temp > threshold for temp in temps]
+        self.above = sum(d for d, h in zip(dt, hot) if h)
+        self.dt = dt
+        self.hot = hot
+        self.np = np
+        if np is not None:
+            self.dt_np = np.asarray(dt)
+            self.hot_dt_np = self.dt_np * np.asarray(hot)
+
+    def stats(self, targets, duties):
+        """(总时长, 平均占空比, 平均欠缺的占空比, 高温时长, 高温且未满速的时长)"""
+        total = self.total
+        if not total:
+            return 0.0, float(duties[0]) if duties else 0.0, 0.0, 0.0, 0.0
+        np = self.np
+        if np is not None:
+            d = np.frombuffer(duties, dtype=np.uint8).astype(np.float64)
+            tg = np.frombuffer(targets, dtype=np.uint8).astype(np.float64)
+            duty_s = float(d @ self.dt_np)
+            deficit_s = float(np.maximum(tg - d, 0.0) @ self.dt_np)
+            not_full = float((d < 100) @ self.hot_dt_np)
+        else:
+            duty_s = deficit_s = not_full = 0.0
+            for dt, hot, target, duty in zip(self.dt, self.hot, targets, duties):
+                duty_s += duty * dt
+                if target > duty:
+                    deficit_s += (target - duty) * dt
+                if hot and duty < 100:
+                    not_full += dt
+        return total, duty_s / total, deficit_s / total, self.above, not_full
+
+
+def replay(
+    trace,
+    controller,
+    duty_filter=None,
+    threshold=DEFAULT_THRESHOLD,
+    sensor=CPU_SENSOR,
+    name=None,
+    max_gap=REPLAY_MAX_GAP,
+):
+    """
+    逐个采样回放任意控制策略（controller.update(temp, t, None)）。
+    duty_filter 为 None 时目标一变就写（不抑制）。
+    """
+    times, temps = trace.series(sensor)
+    controller.reset()
+    if duty_filter is not None:
+        duty_filter.reset()
+        duty_filter.reset_counters()
+    follows_temp = controller.follows_temp
+    targets = array("B")
+    duties = array("B")
+    applied = None
+    writes = 0
+    for t, temp in zip(times, temps):
+        target = max(0, min(255, int(round(controller.update(temp, t, None)))))
+        if duty_filter is None:
+            duty = None if target == applied else target
+        else:
+            duty = duty_filter.update(temp if follows_temp else None, target, t)
+        if duty is not None:
+            writes += 1
+            applied = duty
+        targets.append(target)
+        duties.append(applied)
+    suppressed = duty_filter.suppressed if duty_filter is not None else 0
+    stats = _Weights(times, temps, threshold, max_gap).stats(targets, duties)
+    return ReplayResult(
+        name or controller.describe(), times, temps, duties, writes, suppressed, threshold, stats
+    )
+
+
+def filter_params(duty_filter):
+    """DutyFilter → evaluate_curves 用的参数元组"""
+    return (
+        duty_filter.deadband,
+        duty_filter.hyst_up,
+        duty_filter.hyst_down,
+        duty_filter.min_dwell,
+        duty_filter.max_duty,
+    )
+
+
+def _filter_writes(times, temps, targets, params):
+    """逐个采样按 DutyFilter 的规则推进，返回 (写入位置, 写入值, 抑制次数)"""
+    deadband, hyst_up, hyst_down, min_dwell, max_duty = params
+    duty = targets[0]
+    w_temp = temps[0]
+    w_time = times[0]
+    positions = [0]
+    values = [duty]
+    suppressed = 0
+    for i in range(1, len(targets)):
+        target = targets[i]
+        if target == duty:
+            continue
+        delta = target - duty
+        if delta > 0:
+            ok = target >= max_duty or (delta > deadband and temps[i] >= w_temp + hyst_up)
+        else:
+            ok = -delta > deadband and times[i] - w_time >= min_dwell and temps[i] <= w_temp - hyst_down
+        if ok:
+            duty, w_temp, w_time = target, temps[i], times[i]
+            positions.append(i)
+            values.append(target)
+        else:
+            suppressed += 1
+    return positions, values, suppressed
+
+
+def _filter_writes_np(np, t, x, tg, params, window=64):
+    """
+    同 _filter_writes，用 numpy：写入之间的状态不变，
+    从上次写入往后按窗口（逐次加倍）向量化地找出第一个满足写入条件的采样。
+    """
+    deadband, hyst_up, hyst_down, min_dwell, max_duty = params
+    n = len(tg)
+    pos = 0
+    positions = [0]
+    values = [int(tg[0])]
+    suppressed = 0
+    while True:
+        duty = int(tg[pos])
+        w_temp = x[pos]
+        w_time = t[pos]
+        start = pos + 1
+        size = window
+        found = None
+        while start < n:
+            end = min(n, start + size)
+            seg = tg[start:end]
+            delta = seg - duty
+            up = (delta > 0) & ((seg >= max_duty) | ((delta > deadband) & (x[start:end] >= w_temp + hyst_up)))
+            down = (
+                (delta < -deadband)
+                & (t[start:end] - w_time >= min_dwell)
+                & (x[start:end] <= w_temp - hyst_down)
+            )
+            hit = up | down
+            k = int(hit.argmax())
+            if hit[k]:
+                found = start + k
+                suppressed += int(np.count_nonzero(delta[:k]))
+                break
+            suppressed += int(np.count_nonzero(delta))
+            start = end
+            size *= 2
+        if found is None:
+            return positions, values, suppressed
+        pos = found
+        positions.append(pos)
+        values.append(int(tg[pos]))
+
+
+def _expand(positions, values, n):
+    """写入位置 / 值 → 每个采样生效的占空比 array('B')"""
+    duties = array("B")
+    bounds = positions[1:] + [n]
+    for start, end, value in zip(positions, bounds, values):
+        duties.extend(array("B", [value]) * (end - start))
+    return duties
+
+
+def evaluate_curves(
+    trace,
+    curves,
+    duty_filter=None,
+    threshold=DEFAULT_THRESHOLD,
+    sensor=CPU_SENSOR,
+    names=None,
+    max_gap=REPLAY_MAX_GAP,
+):
+    """
+    同一条轨迹上批量评估多条 FanCurve（等同于对每条曲线做 CurveController 的 replay()，
+    但快得多）。duty_filter 只提供参数，不会被修改；为 None 时不做写入抑制。
+    """
+    times, temps = trace.series(sensor)
+    if not temps:
+        raise ValueError("轨迹中没有可用的采样")
+    params = filter_params(duty_filter) if duty_filter is not None else None
+    np = _numpy()
+    weights = _Weights(times, temps, threshold, max_gap, np)
+    if np is not None:
+        t = np.frombuffer(times, dtype=np.float64)
+        x = np.asarray(temps, dtype=np.float64)
+
+    results = []
+    for i, curve in enumerate(curves):
+        name = names[i] if names else " ".join(f"{t:g}:{p}" for t, p in curve.points)
+        if np is not None:
+            target_np = curve.evaluate_many(x)
+            targets = array("B", target_np.tobytes())
+            tg = target_np.astype(np.int16)
+            if params is None:
+                positions = [0] + (np.flatnonzero(np.diff(tg)) + 1).tolist()
+                suppressed = 0
+            else:
+                positions, _values, suppressed = _filter_writes_np(np, t, x, tg, params)
+            values = [int(v) for v in tg[positions]]
+        else:
+            targets = curve.evaluate_many(temps)
+            if params is None:
+                positions = [0] + [k for k in range(1, len(targets)) if targets[k] != targets[k - 1]]
+                values = [targets[k] for k in positions]
+                suppressed = 0
+            else:
+                positions, values, suppressed = _filter_writes(times, temps, targets, params)
+        duties = _expand(positions, values, len(targets))
+        stats = weights.stats(targets, duties)
+        results.append(
+            ReplayResult(name, times, temps, duties, len(positions), suppressed, threshold, stats)
+        )
+    return results
+
+
+def parse_curve(text):
+    """ "50:20,65:30,80:100" → [(50.0, 20), (65.0, 30), (80.0, 100)] """
+    try:
+        points = [(float(t), int(p)) for t, p in (item.split(":") for item in text.split(","))]
+    except ValueError as e:
+        raise ValueError(f"曲线格式应为 温度:占空比,温度:占空比,...：{text}") from e
+    if not points:
+        raise ValueError("曲线至少需要一个控制点")
+    return points
+
+
+def export_timeline(path, results):
+    """把各候选的占空比时间线写成 CSV：时间, 温度, 每个候选一列"""
+    if not results:
+        return
+    first = results[0]
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(["timestamp", "temp"] + [r.name for r in results])
+        columns = [r.duties for r in results]
+        for i, (t, temp) in enumerate(zip(first.times, first.temps)):
+            writer.writerow([f"{t:.3f}", f"{temp:.2f}"] + [c[i] for c in columns])
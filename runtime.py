@@ -0,0 +1,276 @@
+"""
+运行环境：管理员检测、资源路径、数据目录，以及 LibreHardwareMonitor 进程管理。
+
+不依赖 Qt，GUI（main.py）和无界面守护进程（fanctl.py）共用。
+"""
+
+import os
+import sys
+import time
+import subprocess
+import ctypes
+import contextlib
+import threading
+
+
+# ---------- 启动计时 ----------
+
+class StartupTimer:
+    """
+    记录启动各阶段的开始时间和耗时（毫秒，相对 origin）。
+    origin 取进程里最早的 perf_counter()，各阶段可以在不同线程里记录。
+    """
+
+    def __init__(self, origin=None):
+        self.origin = time.perf_counter() if origin is None else origin
+        self.phases = []  # (名称, 开始 ms, 耗时 ms)
+
+    def add(self, name, start, end):
+        self.phases.append((name, (start - self.origin) * 1000.0, (end - start) * 1000.0))
+
+    @contextlib.contextmanager
+    def phase(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, start, time.perf_counter())
+
+    def mark(self, name):
+        """只记录时间点（耗时为 0）"""
+        now = time.perf_counter()
+        self.add(name, now, now)
+
+    def report(self):
+        """按开始时间排序的报告行"""
+        lines = []
+        for name, start_ms, dur_ms in sorted(self.phases, key=lambda p: p[1]):
+            if dur_ms:
+                lines.append(f"{name}：{start_ms:.0f} ms 起，耗时 {dur_ms:.0f} ms")
+            else:
+                lines.append(f"{name}：{start_ms:.0f} ms")
+        return lines
+
+
+# ---------- 工具函数：管理员 & 资源路径 ----------
+
+def is_admin() -> bool:
+    if os.name != "nt":
+        return os.geteuid() == 0
+    try:
+        return bool(ctypes.windll.shell32.IsUserAnAdmin())
+    except Exception:
+        return False
+
+
+def base_dir_for_resources() -> str:
+    """
+    资源目录：
+    - 运行 .py 时：脚本所在目录
+    - 打包后单 exe：PyInstaller 解压目录 sys._MEIPASS
+    """
+    if getattr(sys, "frozen", False) and hasattr(sys, "_MEIPASS"):
+        return sys._MEIPASS
+    return os.path.dirname(os.path.abspath(__file__))
+
+
+def find_ipmicfg() -> str:
+    base_dir = base_dir_for_resources()
+    ipmi_exe = os.path.join(base_dir, "IPMICFG-Win.exe")
+    if not os.path.exists(ipmi_exe):
+        raise FileNotFoundError(f"未找到 IPMICFG-Win.exe：{ipmi_exe}")
+    return ipmi_exe
+
+
+def user_data_dir() -> str:
+    """可写的数据目录（SDR 缓存等）"""
+    base = os.environ.get("LOCALAPPDATA") or os.path.join(os.path.expanduser("~"), ".cache")
+    return os.path.join(base, "X11FanMaster")
+
+
+def find_lhm_exe() -> str:
+    """
+    在资源目录下的 LibreHardwareMonitor\LibreHardwareMonitor.exe
+    （适配：打包时 --add-data "LibreHardwareMonitor;LibreHardwareMonitor"）
+    """
+    base_dir = base_dir_for_resources()
+    exe = os.path.join(base_dir, "LibreHardwareMonitor", "LibreHardwareMonitor.exe")
+    if not os.path.exists(exe):
+        raise FileNotFoundError(f"未找到 LibreHardwareMonitor.exe：{exe}")
+    return exe
+
+
+# ---------- LibreHardwareMonitor 进程 ----------
+
+LHM_NAMESPACE = "root\\LibreHardwareMonitor"
+
+
+class LhmSupervisor:
+    """
+    LibreHardwareMonitor 的启动与守护，在温度线程里创建和使用（WMI 连接与线程绑定）：
+
+    - start()：已有实例提供温度传感器就直接用；否则启动内置的 LibreHardwareMonitor.exe，
+      按指数退避轮询 WMI 命名空间，直到出现温度传感器或超过 timeout；
+    - 轮询全程复用同一个 WMI 连接，就绪后 conn 直接交给 LibreHWReader；
+    - restart()：WMI 失效（LHM 崩溃 / 被关闭）时重新连接，必要时重启自己启动的进程；
+    - close()：结束自己启动的进程（用户自己开的实例不动）。
+
+    每个 supervisor 有自己的 cancel（threading.Event），置位后正在进行的等待立即以 RuntimeError 结束；
+    调用方要打断等待时置位它，close() 只影响这一个 supervisor。
+
+    本程序启动的 LHM 进程同一时间只归一个 supervisor：后 start() 的 supervisor 接管前一个的进程，
+    被放弃的旧后端（BoundedReader 重建）随后 close() 时不会结束新后端正在用的实例。
+    """
+
+    # 等待就绪的总时限和轮询退避（秒）
+    READY_TIMEOUT = 30.0
+    POLL_INITIAL = 0.1
+    POLL_MAX = 2.0
+    # 两次自动重启之间至少间隔（秒），避免 LHM 反复崩溃时不停重启
+    RESTART_INTERVAL = 30.0
+
+    # 当前拥有本程序启动的 LHM 进程的 supervisor
+    _owner = None
+    _owner_lock = threading.Lock()
+
+    def __init__(self, exe=None, timeout=None, log=None):
+        self.exe = exe
+        self.timeout = self.READY_TIMEOUT if timeout is None else timeout
+        self.log = log
+        self.cancel = threading.Event()
+        self.conn = None
+        self.process = None     # 自己启动的 LHM 进程
+        self.last_restart = None
+        self._pythoncom = None
+
+    def logmsg(self, msg: str):
+        if self.log is not None:
+            self.log(msg)
+
+    @property
+    def owns_process(self) -> bool:
+        return self.process is not None and self.process.poll() is None
+
+    def probe(self) -> bool:
+        """检查一次：命名空间可连接且已有温度传感器。连接只建立一次，失效时丢弃"""
+        import wmi
+
+        if self.conn is None:
+            try:
+                self.conn = wmi.WMI(namespace=LHM_NAMESPACE)
+            except wmi.x_wmi:
+                return False
+        try:
+            rows = self.conn.query("SELECT Identifier FROM Sensor WHERE SensorType = 'Temperature'")
+        except Exception:
+            self.conn = None
+            return False
+        return len(rows) > 0
+
+    def launch(self):
+        exe = self.exe or find_lhm_exe()
+        creationflags = 0
+        if os.name == "nt" and hasattr(subprocess, "CREATE_NO_WINDOW"):
+            creationflags = subprocess.CREATE_NO_WINDOW
+        process = subprocess.Popen([exe], creationflags=creationflags)
+        with LhmSupervisor._owner_lock:
+            self.process = process
+            LhmSupervisor._owner = self
+        self.logmsg(f"已启动 LibreHardwareMonitor：{exe}（pid {process.pid}）")
+
+    def take_over(self):
+        """接管此前的 supervisor 启动、仍在运行的 LHM 进程"""
+        with LhmSupervisor._owner_lock:
+            owner = LhmSupervisor._owner
+            if owner is None or owner is self or not owner.owns_process:
+                return
+            self.process, owner.process = owner.process, None
+            LhmSupervisor._owner = self
+
+    def wait_ready(self):
+        """指数退避轮询直到就绪，返回 WMI 连接；超时、进程退出或被取消时抛 RuntimeError"""
+        start = time.monotonic()
+        deadline = start + self.timeout
+        delay = self.POLL_INITIAL
+        while True:
+            if self.probe():
+                self.logmsg(
+                    f"LibreHardwareMonitor 已就绪（等待 {time.monotonic() - start:.1f} 秒）。"
+                )
+                return self.conn
+            if self.process is not None and self.process.poll() is not None:
+                raise RuntimeError(
+                    f"LibreHardwareMonitor 已退出（返回码 {self.process.returncode}）"
+                )
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise RuntimeError(
+                    f"等待 LibreHardwareMonitor 超时（{self.timeout:.0f} 秒内未出现温度传感器）"
+                )
+            if self.cancel.wait(min(delay, remaining)):
+                raise RuntimeError("已取消等待 LibreHardwareMonitor")
+            delay = min(delay * 2.0, self.POLL_MAX)
+
+    def start(self):
+        """确保 LHM 可用并返回 WMI 连接"""
+        if self._pythoncom is None:
+            import pythoncom
+
+            pythoncom.CoInitialize()
+            self._pythoncom = pythoncom
+
+        self.take_over()
+        self.logmsg("检查 LibreHardwareMonitor 状态...")
+        if self.probe():
+            self.logmsg("检测到 root\\LibreHardwareMonitor 已有温度传感器，直接使用现有实例。")
+            return self.conn
+
+        if self.conn is None:
+            self.logmsg("未检测到 LibreHardwareMonitor，启动内置 LibreHardwareMonitor.exe ...")
+            self.launch()
+        else:
+            # 命名空间已存在（LHM 在运行）但还没有传感器：多半正在初始化，等它
+            self.logmsg("LibreHardwareMonitor 正在初始化，等待温度传感器出现...")
+        return self.wait_ready()
+
+    def restart(self):
+        """WMI 失效后调用：重新连接，必要时重启 LHM，返回新的 WMI 连接"""
+        self.conn = None
+        if self.probe():
+            self.logmsg("已重新连接到 LibreHardwareMonitor。")
+            return self.conn
+
+        now = time.monotonic()
+        if self.last_restart is not None and now - self.last_restart < self.RESTART_INTERVAL:
+            raise RuntimeError("LibreHardwareMonitor 无响应，稍后重试")
+        self.last_restart = now
+
+        if self.owns_process:
+            self.logmsg("LibreHardwareMonitor 无响应，重启进程...")
+            self.terminate()
+        else:
+            self.logmsg("LibreHardwareMonitor 已退出，重新启动...")
+        self.launch()
+        return self.wait_ready()
+
+    def terminate(self, timeout=5.0):
+        with LhmSupervisor._owner_lock:
+            process, self.process = self.process, None
+            if LhmSupervisor._owner is self:
+                LhmSupervisor._owner = None
+        if process is None or process.poll() is not None:
+            return
+        process.terminate()
+        try:
+            process.wait(timeout)
+        except subprocess.TimeoutExpired:
+            process.kill()
+            process.wait()
+        self.logmsg("已关闭自己启动的 LibreHardwareMonitor。")
+
+    def close(self):
+        self.conn = None
+        self.terminate()
+        if self._pythoncom is not None:
+            self._pythoncom.CoUninitialize()
+            self._pythoncom = None
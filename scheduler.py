@@ -0,0 +1,166 @@
+"""
+采样调度
+
+AdaptiveInterval：根据温度变化率（EWMA 斜率）调整下一次采样间隔。
+温度快速上升或接近曲线拐点时缩短到 min_interval，稳定时逐步放宽到 max_interval。
+
+DeadlineSchedule：按单调时钟的截止时间排下一次采样，读取耗时不累加到周期里，
+并记录每次醒来的延迟（抖动）和超时（一次采样做完时下一次截止已经过去）。
+"""
+
+import time
+
+
+# 默认采样间隔范围（秒）
+MIN_INTERVAL = 0.25
+MAX_INTERVAL = 10.0
+
+
+class AdaptiveInterval:
+    """
+    自适应采样间隔。每次拿到新读数调用 update(t, temp)，返回下一次采样前应等待的秒数。
+
+    - 目标：相邻两次采样之间温度变化不超过 step_c
+    - 上升按斜率全额计入，下降只按 fall_weight 计入（降转速不急）
+    - 离曲线拐点不到 breakpoint_margin °C 时，间隔不超过 near_interval
+    - 间隔缩短立即生效，放宽时每次最多乘以 growth
+    """
+
+    def __init__(
+        self,
+        min_interval=MIN_INTERVAL,
+        max_interval=MAX_INTERVAL,
+        alpha=0.3,
+        step_c=0.5,
+        fall_weight=0.25,
+        breakpoint_margin=2.0,
+        near_interval=None,
+        growth=1.5,
+    ):
+        if min_interval <= 0 or max_interval < min_interval:
+            raise ValueError("采样间隔需满足 0 < min_interval <= max_interval")
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.alpha = alpha
+        self.step_c = step_c
+        self.fall_weight = fall_weight
+        self.breakpoint_margin = breakpoint_margin
+        if near_interval is None:
+            near_interval = max(min_interval, max_interval / 4.0)
+        self.near_interval = near_interval
+        self.growth = growth
+        self.breakpoints = ()
+
+        self.interval = min_interval if min_interval == max_interval else max_interval
+        self.slope = 0.0        # EWMA 斜率（°C/s）
+        self.last_t = None
+        self.last_temp = None
+        self.samples = 0
+        self.last_sample_t = None
+        self.mean_dt = max_interval  # 实际采样间隔的 EWMA
+
+    @property
+    def fixed(self) -> bool:
+        return self.min_interval == self.max_interval
+
+    def set_breakpoints(self, temps):
+        self.breakpoints = tuple(temps)
+
+    def update(self, t: float, temp) -> float:
+        """t：单调时钟秒数；temp：本次读数（None 表示读取失败，保持当前间隔）"""
+        self.samples += 1
+        if self.last_sample_t is not None and t > self.last_sample_t:
+            self.mean_dt = 0.1 * (t - self.last_sample_t) + 0.9 * self.mean_dt
+        self.last_sample_t = t
+        if self.fixed:
+            return self.min_interval
+        if temp is None:
+            return self.interval
+
+        if self.last_t is not None and t > self.last_t:
+            slope = (temp - self.last_temp) / (t - self.last_t)
+            self.slope = self.alpha * slope + (1.0 - self.alpha) * self.slope
+        self.last_t = t
+        self.last_temp = temp
+
+        rate = self.slope if self.slope > 0 else -self.slope * self.fall_weight
+        target = self.step_c / rate if rate > 1e-6 else self.max_interval
+
+        for bp in self.breakpoints:
+            if abs(temp - bp) < self.breakpoint_margin:
+                target = min(target, self.near_interval)
+                break
+
+        target = max(self.min_interval, min(self.max_interval, target))
+        if target > self.interval:
+            target = min(target, self.interval * self.growth)
+        self.interval = target
+        return target
+
+    @property
+    def sample_rate(self) -> float:
+        """近期实际采样率（次/秒）"""
+        return 1.0 / self.mean_dt
+
+
+# 两次超时报告之间的最短间隔（秒）
+OVERRUN_REPORT_INTERVAL = 60.0
+
+
+class DeadlineSchedule:
+    """
+    周期性采样的截止时间：下一次截止 = 本次截止 + 间隔（间隔可以每次不同）。
+    采样做完时下一次截止已经过去（超时）不补跑，从当前时间重新对齐并计一次 overrun。
+
+        schedule = DeadlineSchedule()
+        while not stop_event.is_set():
+            lateness = schedule.begin()              # 比截止时间晚醒了多少秒
+            ...采样...
+            stop_event.wait(schedule.advance(interval))
+    """
+
+    def __init__(self, clock=time.monotonic):
+        self.clock = clock
+        self.deadline = None
+        self.jitter = 0.0       # 最近一次醒来晚于截止时间的秒数
+        self.max_jitter = 0.0
+        self.overruns = 0
+        self.overrun_s = 0.0    # 最近一次超时时落后了多少秒
+        self.reported = 0       # 已报告过的超时次数
+        self.reported_at = None
+
+    def begin(self) -> float:
+        """一次采样开始时调用，返回本次的延迟（秒）"""
+        now = self.clock()
+        if self.deadline is None:
+            self.deadline = now
+        self.jitter = max(0.0, now - self.deadline)
+        if self.jitter > self.max_jitter:
+            self.max_jitter = self.jitter
+        return self.jitter
+
+    def advance(self, interval: float) -> float:
+        """排下一次截止，返回距离它的秒数（>= 0）"""
+        now = self.clock()
+        deadline = self.deadline + interval
+        if deadline < now:
+            self.overruns += 1
+            self.overrun_s = now - deadline
+            deadline = now
+        self.deadline = deadline
+        return deadline - now
+
+    def overrun_report(self, min_gap=OVERRUN_REPORT_INTERVAL):
+        """
+        有新的超时且距上次报告满 min_gap 秒时返回 (新增次数, 最近一次落后的秒数)，否则 None；
+        调用方据此记日志，不会每次超时都刷一行。
+        """
+        new = self.overruns - self.reported
+        if not new:
+            return None
+        now = self.clock()
+        if self.reported_at is not None and now - self.reported_at < min_gap:
+            return None
+        self.reported = self.overruns
+        self.reported_at = now
+        return new, self.overrun_s
@@ -0,0 +1,311 @@
+"""
+BMC 传感器（SDR）读取
+
+- 第一次使用时下载 SDR 仓库并解析出所有模拟量传感器（温度、风扇转速、电压...），
+  以 BMC 的 SDR 变更时间戳为键缓存到磁盘，之后启动直接加载，不再重复下载；
+- 每次快照对所有传感器各发一条 Get Sensor Reading，通过 transport.raw_many
+  批量发送（LAN 通道会流水线并发，一个来回取回一批），
+  结果放进以数组存储的 SensorSnapshot。
+"""
+
+import json
+import math
+import os
+import re
+import struct
+import time
+from array import array
+
+from ipmi import IpmiError
+
+
+NETFN_SENSOR = 0x04
+NETFN_STORAGE = 0x0A
+
+CMD_GET_SENSOR_READING = 0x2D
+CMD_GET_SDR_REPO_INFO = 0x20
+CMD_RESERVE_SDR_REPO = 0x22
+CMD_GET_SDR = 0x23
+
+SENSOR_TYPE_TEMPERATURE = 0x01
+SENSOR_TYPE_VOLTAGE = 0x02
+SENSOR_TYPE_FAN = 0x04
+
+# IPMI 传感器单位代码（部分）
+UNIT_NAMES = {1: "°C", 2: "°F", 4: "V", 5: "A", 6: "W", 18: "RPM"}
+
+# 完成码：预留被取消 / 无法返回请求的字节数
+CC_RESERVATION_CANCELLED = 0xC5
+CC_CANNOT_RETURN_BYTES = 0xCA
+
+# 算作 CPU 温度的传感器名称："CPU1 Temp"、"CPU2 Temp"（不含 "CPU1_VRMIN Temp"）
+CPU_TEMP_RE = re.compile(r"^CPU\d* Temp$")
+
+
+def _signed(value, bits):
+    if value & (1 << (bits - 1)):
+        value -= 1 << bits
+    return value
+
+
+class SdrRecord:
+    """一个模拟量传感器的 SDR（Full Sensor Record）及其换算系数"""
+
+    __slots__ = ("number", "name", "sensor_type", "unit", "fmt", "m", "b", "b_exp", "r_exp")
+
+    def __init__(self, number, name, sensor_type, unit, fmt, m, b, b_exp, r_exp):
+        self.number = number
+        self.name = name
+        self.sensor_type = sensor_type
+        self.unit = unit
+        self.fmt = fmt          # 0 无符号，1 反码，2 补码
+        self.m = m
+        self.b = b
+        self.b_exp = b_exp
+        self.r_exp = r_exp
+
+    def convert(self, raw: int) -> float:
+        """y = (M * x + B * 10^Bexp) * 10^Rexp"""
+        if self.fmt == 1:
+            x = _signed(raw, 8)
+            if x < 0:
+                x += 1
+        elif self.fmt == 2:
+            x = _signed(raw, 8)
+        else:
+            x = raw
+        return (self.m * x + self.b * 10.0 ** self.b_exp) * 10.0 ** self.r_exp
+
+    def __repr__(self):
+        return f"SdrRecord({self.number}, {self.name!r}, type=0x{self.sensor_type:02x})"
+
+
+def parse_sdr_record(data):
+    """
+    解析一条 SDR。只保留 BMC 自己（0x20 / LUN 0）拥有的阈值型模拟量传感器，
+    其它记录（离散传感器、FRU、OEM 记录等）返回 None。
+    """
+    if len(data) < 48 or data[3] != 0x01:  # 0x01 = Full Sensor Record
+        return None
+    owner, lun, number = data[5], data[6] & 0x03, data[7]
+    if owner != 0x20 or lun != 0:
+        return None
+    if data[13] != 0x01:  # 事件/读数类型 0x01 = 阈值型
+        return None
+    fmt = data[20] >> 6
+    if fmt == 3 or data[23] != 0:  # 无模拟读数 / 非线性
+        return None
+
+    m = _signed(data[24] | ((data[25] & 0xC0) << 2), 10)
+    b = _signed(data[26] | ((data[27] & 0xC0) << 2), 10)
+    r_exp = _signed(data[29] >> 4, 4)
+    b_exp = _signed(data[29] & 0x0F, 4)
+    id_len = data[47] & 0x1F
+    name = bytes(data[48 : 48 + id_len]).decode("ascii", "replace").strip()
+    return SdrRecord(number, name, data[12], data[21], fmt, m, b, b_exp, r_exp)
+
+
+# ---------- SDR 仓库下载 ----------
+
+def read_sdr_repo_info(transport):
+    """返回 (记录数, 最近添加时间戳, 最近删除时间戳)"""
+    resp = transport.raw(NETFN_STORAGE, CMD_GET_SDR_REPO_INFO)
+    if len(resp) < 13:
+        raise IpmiError("SDR 仓库信息响应过短")
+    count, _free, added, erased = struct.unpack_from("<HHII", resp, 1)
+    return count, added, erased
+
+
+def download_sdr(transport, chunk=16):
+    """逐条下载整个 SDR 仓库，返回原始记录列表"""
+
+    def reserve():
+        return transport.raw(NETFN_STORAGE, CMD_RESERVE_SDR_REPO)[:2]
+
+    def get_sdr(reservation, record_id, offset, count):
+        data = reservation + struct.pack("<HBB", record_id, offset, count)
+        resp = transport.raw(NETFN_STORAGE, CMD_GET_SDR, data)
+        return struct.unpack_from("<H", resp)[0], resp[2:]
+
+    reservation = reserve()
+    records = []
+    record_id = 0x0000
+    while record_id != 0xFFFF and len(records) < 0x1000:
+        for _ in range(3):
+            try:
+                next_id, header = get_sdr(reservation, record_id, 0, 5)
+                body = b""
+                length = header[4]
+                while len(body) < length:
+                    n = min(chunk, length - len(body))
+                    _, part = get_sdr(reservation, record_id, 5 + len(body), n)
+                    if not part:
+                        raise IpmiError("SDR 记录读取为空")
+                    body += part
+                break
+            except IpmiError as e:
+                if e.completion_code == CC_RESERVATION_CANCELLED:
+                    reservation = reserve()
+                    continue
+                if e.completion_code == CC_CANNOT_RETURN_BYTES and chunk > 4:
+                    chunk //= 2
+                    continue
+                raise
+        else:
+            raise IpmiError(f"读取 SDR 记录 0x{record_id:04x} 失败")
+        records.append(bytes(header[:5]) + body[:length])
+        record_id = next_id
+    return records
+
+
+class SdrCache:
+    """
+    SDR 磁盘缓存：一个 JSON 文件，以 (记录数, 添加时间戳, 删除时间戳) 为键。
+    BMC 的 SDR 没有变化时直接复用，不必重新下载。
+    """
+
+    def __init__(self, path):
+        self.path = path
+
+    def load(self, key):
+        if not self.path:
+            return None
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                doc = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if doc.get("key") != list(key):
+            return None
+        return [bytes.fromhex(r) for r in doc.get("records", [])]
+
+    def save(self, key, records):
+        if not self.path:
+            return
+        tmp = self.path + ".tmp"
+        try:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump({"key": list(key), "records": [r.hex() for r in records]}, f)
+            os.replace(tmp, self.path)
+        except OSError:
+            pass
+
+
+# ---------- 快照 ----------
+
+class SensorSnapshot:
+    """
+    一次批量读取的结果。名称 / 类型 / 单位与 BmcSensors 共享，
+    读数放在 array('d') 里（不可用的传感器为 NaN），不为每个传感器建对象。
+    """
+
+    __slots__ = ("names", "types", "units", "values", "timestamp", "elapsed_ms")
+
+    def __init__(self, names, types, units, values, timestamp, elapsed_ms):
+        self.names = names
+        self.types = types
+        self.units = units
+        self.values = values
+        self.timestamp = timestamp
+        self.elapsed_ms = elapsed_ms
+
+    def __len__(self):
+        return len(self.values)
+
+    def get(self, name, default=None):
+        try:
+            value = self.values[self.names.index(name)]
+        except ValueError:
+            return default
+        return default if math.isnan(value) else value
+
+    def select(self, sensor_type):
+        """{名称: 读数}，只含指定类型且当前可用的传感器"""
+        return {
+            name: value
+            for name, t, value in zip(self.names, self.types, self.values)
+            if t == sensor_type and not math.isnan(value)
+        }
+
+    def temperatures(self):
+        return self.select(SENSOR_TYPE_TEMPERATURE)
+
+    def cpu_temperature(self):
+        """各 CPU 温度传感器的最大值；没有可用读数时为 None"""
+        cpu = [v for n, v in self.temperatures().items() if CPU_TEMP_RE.match(n)]
+        return max(cpu) if cpu else None
+
+    def fans(self):
+        return self.select(SENSOR_TYPE_FAN)
+
+
+class BmcSensors:
+    """BMC 传感器读取器：SDR 只下载一次，之后每次 snapshot() 批量读取所有读数"""
+
+    # 多久复查一次 SDR 仓库是否变化（秒）
+    INFO_CHECK_INTERVAL = 60.0
+
+    def __init__(self, transport, cache_path=None, log=None):
+        self.transport = transport
+        self.cache = SdrCache(cache_path)
+        self.log = log
+        self.key = None
+        self.records = []
+        self.names = ()
+        self.types = b""
+        self.units = b""
+        self.last_check = 0.0
+
+    def logmsg(self, msg: str):
+        if self.log is not None:
+            self.log(msg)
+
+    def refresh_sdr(self, force=False):
+        """SDR 仓库变化（或首次）时重新加载记录"""
+        now = time.monotonic()
+        if not force and self.key is not None and now - self.last_check < self.INFO_CHECK_INTERVAL:
+            return
+        self.last_check = now
+        key = read_sdr_repo_info(self.transport)
+        if key == self.key and not force:
+            return
+
+        raw_records = self.cache.load(key)
+        if raw_records is None:
+            start = time.perf_counter()
+            raw_records = download_sdr(self.transport)
+            self.cache.save(key, raw_records)
+            self.logmsg(
+                f"已下载 SDR 仓库：{len(raw_records)} 条记录，"
+                f"耗时 {(time.perf_counter() - start) * 1000.0:.0f} ms"
+            )
+        else:
+            self.logmsg(f"使用缓存的 SDR 仓库（{len(raw_records)} 条记录）")
+
+        records = [r for r in map(parse_sdr_record, raw_records) if r is not None]
+        self.key = key
+        self.records = records
+        self.names = tuple(r.name for r in records)
+        self.types = bytes(r.sensor_type for r in records)
+        self.units = bytes(r.unit for r in records)
+        self._requests = [
+            (NETFN_SENSOR, CMD_GET_SENSOR_READING, bytes([r.number])) for r in records
+        ]
+
+    def snapshot(self) -> SensorSnapshot:
+        start = time.perf_counter()
+        self.refresh_sdr()
+
+        values = array("d", [math.nan]) * len(self.records)
+        results = self.transport.raw_many(self._requests)
+        for i, (record, resp) in enumerate(zip(self.records, results)):
+            if isinstance(resp, Exception) or len(resp) < 2:
+                continue
+            # 第 2 字节：bit6 = 扫描已启用，bit5 = 读数不可用
+            if not resp[1] & 0x40 or resp[1] & 0x20:
+                continue
+            values[i] = record.convert(resp[0])
+
+        elapsed_ms = (time.perf_counter() - start) * 1000.0
+        return SensorSnapshot(self.names, self.types, self.units, values, time.time(), elapsed_ms)
@@ -0,0 +1,936 @@
+"""
+温度读取后端
+
+- LibreHWReader：Windows，通过 WMI 读取 LibreHardwareMonitor 的传感器
+- LhmHttpReader：LibreHardwareMonitor 自带 Web 服务器的 /data.json，不经过 COM / WMI
+- HwmonReader：Linux，直接读 /sys/class/hwmon/*/temp*_input（coretemp / k10temp / nvme ...）
+
+两者都实现 SensorReader 接口，必须在采样线程里创建、使用和关闭
+（LibreHWReader 内部的 COM 对象与线程绑定）。
+BoundedReader 把任意后端放进专用线程，每次读取限时，卡住时在后台重建后端。
+"""
+
+import errno
+import http.client
+import json
+import os
+import queue
+import re
+import threading
+import time
+import urllib.parse
+from collections import namedtuple
+
+
+# 每个 CPU 插槽：最大核心温度、封装温度（没有对应传感器时为 None）
+SocketTemps = namedtuple("SocketTemps", "socket max_core package")
+# max：所有插槽的最大核心温度（若无 core 传感器则回退封装温度）
+CpuTemps = namedtuple("CpuTemps", "max sockets")
+
+
+def summarize_cpu_temps(cores, packages) -> CpuTemps:
+    """cores / packages：{socket: 温度}，合成 CpuTemps"""
+    sockets = [
+        SocketTemps(s, cores.get(s), packages.get(s))
+        for s in sorted(set(cores) | set(packages))
+    ]
+    if cores:
+        return CpuTemps(max(cores.values()), sockets)
+    if packages:
+        return CpuTemps(max(packages.values()), sockets)
+    return CpuTemps(None, sockets)
+
+
+def collect_indexed(readings):
+    """
+    readings：[((socket, kind, name), 温度), ...]，kind 为 "core" / "package" / "extra"；
+    返回 (CpuTemps, {名称: 温度})
+    """
+    cores = {}
+    packages = {}
+    values = {}
+    for (socket, kind, name), value in readings:
+        values[name] = value
+        if kind == "core":
+            if socket not in cores or value > cores[socket]:
+                cores[socket] = value
+        elif kind == "package":
+            packages[socket] = value
+    return summarize_cpu_temps(cores, packages), values
+
+
+def classify_temp_sensor(socket, sensor_name, key, ident, watched):
+    """
+    LHM 温度传感器的索引项 (socket, kind, name)，不需要时为 None。
+    key 为 "硬件名/传感器名"，ident 为 Identifier / SensorId；watched 里的名称优先。
+    """
+    if watched:
+        for name in (key, ident):
+            if name in watched:
+                return socket, "extra", name
+    if socket is None:
+        return None
+    upper_name = sensor_name.upper()
+    if upper_name == "CPU PACKAGE":
+        return socket, "package", f"CPU{socket} {sensor_name}"
+    if upper_name.startswith("CPU CORE #") and "DISTANCE" not in upper_name:
+        # 排除 "CPU Core #N Distance to TjMax"，它是离 TjMax 的差值，不是温度
+        return socket, "core", f"CPU{socket} {sensor_name}"
+    return None
+
+
+class SensorReader:
+    """温度读取后端的公共接口"""
+
+    name = "base"
+
+    def read_cpu_temps(self) -> CpuTemps:
+        raise NotImplementedError
+
+    def read_max_cpu_temp(self):
+        return self.read_cpu_temps().max
+
+    def read_sensors(self) -> dict:
+        """最近一次读取到的全部已索引传感器：{名称: 温度}"""
+        return {}
+
+    def watch(self, names):
+        """
+        除 CPU 温度外还需要读取的传感器名（多风扇区映射用）。
+        默认什么都不做：已经读取全部传感器的后端不需要额外声明。
+        """
+
+    def describe(self) -> str:
+        return self.name
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+# ---------- LibreHardwareMonitor（WMI） ----------
+
+class LibreHWReader(SensorReader):
+    """
+    在工作线程中通过 WMI 访问 LibreHardwareMonitor 的温度传感器。
+
+    第一次读取时枚举一次传感器，按 Identifier 建立索引（插槽 → core / package，
+    以及 watch() 声明的其它温度传感器），之后每次只用一条 WQL 取这些 Identifier 的 Value，
+    多关注几个传感器不会增加查询次数。
+    传感器集合发生变化（读不全，或定期复查发现数量变了）时重建索引。
+    """
+
+    name = "lhm"
+
+    # 定期复查传感器集合的间隔（秒），用来发现新出现的传感器
+    RESCAN_INTERVAL = 300.0
+
+    def __init__(self, supervisor=None, conn=None):
+        """
+        supervisor：runtime.LhmSupervisor，已在本线程 start() 过。
+        给出时直接用它就绪的 WMI 连接，WMI 失效时由它重连 / 重启 LHM；
+        读取后端关闭时一并关闭它。
+        conn：现成的连接对象（只需要 query(wql)，例如 bench/fake_lhm.py 的替身），
+        给出时不初始化 COM。
+        """
+        self.supervisor = supervisor
+        self._pythoncom = None
+        self.index = {}        # Identifier -> (socket, "core" | "package" | "extra", name)
+        self.watched = frozenset()
+        self.poll_query = None
+        self.sensor_count = 0
+        self.last_scan = 0.0
+        self.last_values = {}
+        if conn is not None:
+            self.conn = conn
+            return
+
+        import pythoncom
+        import wmi
+
+        self._pythoncom = pythoncom
+        pythoncom.CoInitialize()
+        if supervisor is not None and supervisor.conn is not None:
+            self.conn = supervisor.conn
+        else:
+            try:
+                self.conn = wmi.WMI(namespace="root\\LibreHardwareMonitor")
+            except wmi.x_wmi as e:
+                pythoncom.CoUninitialize()
+                raise RuntimeError(
+                    "无法连接到 root\\LibreHardwareMonitor。\n\n"
+                    "请确认 LibreHardwareMonitor 已启动。"
+                ) from e
+
+    def describe(self) -> str:
+        return "LibreHardwareMonitor（WMI）"
+
+    def watch(self, names):
+        """names 按 "硬件名/传感器名" 或 LHM 的 Identifier 匹配；下次读取时重建索引"""
+        names = frozenset(names)
+        if names != self.watched:
+            self.watched = names
+            self.poll_query = None
+
+    def build_index(self):
+        """枚举一次温度传感器，保留 CPU 的 core / package 和 watch() 声明的传感器"""
+        hardware = self.conn.query("SELECT Identifier, Name, HardwareType FROM Hardware")
+        cpu_parents = sorted(hw.Identifier for hw in hardware if hw.HardwareType == "Cpu")
+        sockets = {parent: i for i, parent in enumerate(cpu_parents)}
+        hw_names = {hw.Identifier: hw.Name for hw in hardware}
+
+        sensors = self.conn.query(
+            "SELECT Identifier, Name, Parent FROM Sensor WHERE SensorType = 'Temperature'"
+        )
+        index = {}
+        for sensor in sensors:
+            entry = classify_temp_sensor(
+                sockets.get(sensor.Parent),
+                sensor.Name,
+                f"{hw_names.get(sensor.Parent, sensor.Parent)}/{sensor.Name}",
+                sensor.Identifier,
+                self.watched,
+            )
+            if entry is not None:
+                index[sensor.Identifier] = entry
+
+        self.index = index
+        self.sensor_count = len(sensors)
+        self.last_scan = time.monotonic()
+        if index:
+            where = " OR ".join(f"Identifier = '{ident}'" for ident in index)
+            self.poll_query = f"SELECT Identifier, Value FROM Sensor WHERE {where}"
+        else:
+            self.poll_query = None
+
+    def sensor_set_changed(self) -> bool:
+        rows = self.conn.query("SELECT Identifier FROM Sensor WHERE SensorType = 'Temperature'")
+        self.last_scan = time.monotonic()
+        return len(rows) != self.sensor_count
+
+    def read_cpu_temps(self) -> CpuTemps:
+        try:
+            return self._read_cpu_temps()
+        except Exception:
+            if self.supervisor is None:
+                raise
+        # WMI 查询失败：LHM 多半退出或卡住了，换一个新连接（必要时重启 LHM）再读一次
+        self.conn = self.supervisor.restart()
+        self.poll_query = None
+        return self._read_cpu_temps()
+
+    def _read_cpu_temps(self) -> CpuTemps:
+        if self.poll_query is None or time.monotonic() - self.last_scan > self.RESCAN_INTERVAL:
+            if self.poll_query is None or self.sensor_set_changed():
+                self.build_index()
+        if self.poll_query is None:
+            return CpuTemps(None, [])
+
+        rows = self.conn.query(self.poll_query)
+        if len(rows) != len(self.index):
+            # 有传感器消失了（LHM 重启等），重建索引后再读一次
+            self.build_index()
+            if self.poll_query is None:
+                return CpuTemps(None, [])
+            rows = self.conn.query(self.poll_query)
+
+        temps, self.last_values = collect_indexed(
+            (self.index[row.Identifier], float(row.Value))
+            for row in rows
+            if row.Identifier in self.index and row.Value is not None
+        )
+        return temps
+
+    def read_sensors(self) -> dict:
+        return dict(self.last_values)
+
+    def close(self):
+        self.conn = None
+        if self._pythoncom is not None:
+            self._pythoncom.CoUninitialize()
+            self._pythoncom = None
+        if self.supervisor is not None:
+            self.supervisor.close()
+            self.supervisor = None
+
+
+# ---------- LibreHardwareMonitor（HTTP data.json） ----------
+
+# LHM 的 Remote Web Server 默认端口
+LHM_HTTP_URL = "http://127.0.0.1:8085/data.json"
+LHM_HTTP_TIMEOUT = 2.0
+
+_CPU_HARDWARE_RE = re.compile(r"^/(?:intel|amd)cpu/(\d+)")
+_LHM_VALUE_RE = re.compile(r"-?\d+(?:[.,]\d+)?")
+# 叶子节点内的 "Value" / "SensorId" 字段（LHM 用紧凑 JSON，容许冒号两侧有空白）
+_LEAF_VALUE_RE = re.compile(rb'"Value"\s*:\s*"([^"]*)"')
+_LEAF_SENSOR_ID_RE = re.compile(rb'"SensorId"\s*:\s*$')
+
+
+def parse_lhm_value(text):
+    """data.json 里的 "45.0 °C" / "45,0 °C"（随 LHM 的区域设置）→ 45.0；没有读数时为 None"""
+    match = _LHM_VALUE_RE.search(text or "")
+    return float(match.group().replace(",", ".")) if match else None
+
+
+class LhmHttpReader(SensorReader):
+    """
+    通过 LibreHardwareMonitor 自带 Web 服务器（Options → Remote Web Server → Run）的
+    /data.json 读取温度，不经过 COM / WMI，可以在任何线程里使用。
+
+    HTTP 连接常驻（keep-alive），断开时重连一次。
+    第一次读取（以及每 RESCAN_INTERVAL 秒）完整解析一次传感器树，按 SensorId 建立索引；
+    之后每次只在响应字节里按文档顺序查找已索引的 SensorId，
+    在所在的叶子节点（扁平对象）范围内取出 Value 字段，不解析整棵树。
+    找不到某个节点（LHM 重启、硬件变化）或节点对不上时，用同一份响应重建索引。
+    老版本 LHM 的 data.json 没有 SensorId，此时每次完整解析。
+    """
+
+    name = "lhm-http"
+
+    RESCAN_INTERVAL = 300.0
+
+    def __init__(self, url=LHM_HTTP_URL, timeout=LHM_HTTP_TIMEOUT):
+        parts = urllib.parse.urlsplit(url)
+        if parts.scheme != "http" or not parts.hostname:
+            raise ValueError(f"LHM 地址必须是 http://主机:端口/data.json：{url}")
+        self.url = url
+        self.host = parts.hostname
+        self.port = parts.port or 80
+        self.path = parts.path or "/data.json"
+        self.timeout = timeout
+        self.conn = None
+        self.index = {}        # SensorId -> (socket, kind, name)
+        self.needles = []      # [(b'"SensorId"', SensorId)]，按文档顺序
+        self.indexed = False
+        self.watched = frozenset()
+        self.last_scan = 0.0
+        self.last_values = {}
+        self.requests = 0
+        self.connects = 0
+        self.full_parses = 0
+
+    def describe(self) -> str:
+        return f"LibreHardwareMonitor（HTTP {self.host}:{self.port}）"
+
+    def watch(self, names):
+        names = frozenset(names)
+        if names != self.watched:
+            self.watched = names
+            self.indexed = False
+
+    def fetch(self) -> bytes:
+        """GET data.json；复用的连接已被对方关闭时换一个新连接重试一次"""
+        for attempt in range(2):
+            if self.conn is None:
+                self.conn = http.client.HTTPConnection(self.host, self.port, timeout=self.timeout)
+                self.connects += 1
+            try:
+                self.conn.request("GET", self.path)
+                resp = self.conn.getresponse()
+                body = resp.read()
+            except (OSError, http.client.HTTPException) as e:
+                self.conn.close()
+                self.conn = None
+                if attempt:
+                    raise RuntimeError(
+                        f"无法从 {self.url} 读取：{e}\n\n"
+                        "请确认 LibreHardwareMonitor 已启动，并开启了 Options → Remote Web Server。"
+                    ) from e
+                continue
+            self.requests += 1
+            if resp.will_close:
+                self.conn.close()
+                self.conn = None
+            if resp.status != 200:
+                raise RuntimeError(f"{self.url} 返回 HTTP {resp.status}")
+            return body
+        raise AssertionError("unreachable")
+
+    def build_index(self, body):
+        """完整解析一次，建立索引；返回本次的 [(索引项, 温度), ...]"""
+        self.full_parses += 1
+        try:
+            root = json.loads(body)
+        except ValueError as e:
+            raise RuntimeError(f"{self.url} 返回的不是 JSON：{e}") from e
+
+        # 温度传感器：(传感器节点, 所属硬件节点)；硬件 = 传感器分组（"Temperatures"）的上一级
+        found = []
+        cpu_ids = []
+
+        def walk(node, parent, grandparent):
+            children = node.get("Children") or ()
+            if not children:
+                is_temp = node.get("Type") == "Temperature" or (
+                    "Type" not in node and parent is not None and parent.get("Text") == "Temperatures"
+                )
+                if is_temp and grandparent is not None:
+                    found.append((node, grandparent))
+                return
+            hw_id = node.get("HardwareId") or ""
+            if _CPU_HARDWARE_RE.match(hw_id) or node.get("ImageURL", "").endswith("cpu.png"):
+                cpu_ids.append(id(node))
+            for child in children:
+                walk(child, node, parent)
+
+        walk(root, None, None)
+        # 与 WMI 路径一致：CPU 插槽按硬件 Identifier 排序（没有 HardwareId 时按文档顺序）
+        cpu_nodes = {}
+        for node, hardware in found:
+            if id(hardware) in cpu_ids:
+                cpu_nodes[id(hardware)] = hardware
+        ordered = sorted(
+            cpu_nodes.values(),
+            key=lambda hw: (hw.get("HardwareId") or "", cpu_ids.index(id(hw))),
+        )
+        sockets = {id(hw): i for i, hw in enumerate(ordered)}
+
+        index = {}
+        readings = []
+        needles = []
+        all_have_ids = True
+        for node, hardware in found:
+            ident = node.get("SensorId")
+            name = node.get("Text", "")
+            key = f"{hardware.get('Text', '')}/{name}"
+            entry = classify_temp_sensor(sockets.get(id(hardware)), name, key, ident or key, self.watched)
+            if entry is None:
+                continue
+            if not ident:
+                all_have_ids = False
+                ident = key
+            index[ident] = entry
+            needles.append((json.dumps(ident).encode("utf-8"), ident))
+            value = parse_lhm_value(node.get("Value"))
+            if value is not None:
+                readings.append((entry, value))
+
+        self.index = index
+        self.needles = needles if all_have_ids else None
+        self.indexed = True
+        self.last_scan = time.monotonic()
+        return readings
+
+    def scan(self, body):
+        """按索引在响应字节里取值；有节点找不到或对不上时返回 None"""
+        readings = []
+        pos = 0
+        for needle, ident in self.needles:
+            at = body.find(needle, pos)
+            if at < 0:
+                at = body.find(needle)
+                if at < 0:
+                    return None
+            start = body.rfind(b"{", 0, at)
+            end = body.find(b"}", at)
+            if start < 0 or end < 0 or not _LEAF_SENSOR_ID_RE.search(body, start, at):
+                return None
+            match = _LEAF_VALUE_RE.search(body, start, end)
+            if match is None:
+                return None
+            pos = end
+            value = parse_lhm_value(match.group(1).decode("utf-8", "replace"))
+            if value is not None:
+                readings.append((self.index[ident], value))
+        return readings
+
+    def read_cpu_temps(self) -> CpuTemps:
+        body = self.fetch()
+        readings = None
+        if (
+            self.indexed
+            and self.needles is not None
+            and time.monotonic() - self.last_scan <= self.RESCAN_INTERVAL
+        ):
+            readings = self.scan(body)
+        if readings is None:
+            readings = self.build_index(body)
+        temps, self.last_values = collect_indexed(readings)
+        return temps
+
+    def read_sensors(self) -> dict:
+        return dict(self.last_values)
+
+    def close(self):
+        if self.conn is not None:
+            self.conn.close()
+            self.conn = None
+
+
+# ---------- Linux hwmon ----------
+
+HWMON_ROOT = "/sys/class/hwmon"
+
+# 这些驱动的传感器算作 CPU 温度
+CPU_HWMON_DRIVERS = ("coretemp", "k10temp", "zenpower")
+
+_TEMP_INPUT_RE = re.compile(r"^temp(\d+)_input$")
+_PACKAGE_ID_RE = re.compile(r"^Package id (\d+)$")
+
+
+def _natural_key(name):
+    return [int(part) if part.isdigit() else part for part in re.split(r"(\d+)", name)]
+
+
+def _input_paths(layout):
+    return frozenset(os.path.join(path, name) for path, names in layout for name in names)
+
+
+def _read_text(path):
+    try:
+        with open(path) as f:
+            return f.read().strip()
+    except OSError:
+        return None
+
+
+class HwmonSensor:
+    __slots__ = ("key", "path", "fd", "kind", "socket")
+
+    def __init__(self, key, path, kind, socket):
+        self.key = key          # 例如 "coretemp0/Package id 0"、"nvme0/Composite"
+        self.path = path
+        self.fd = None
+        self.kind = kind        # "core" / "package" / "nvme" / "other"
+        self.socket = socket    # CPU 插槽号，非 CPU 传感器为 None
+
+
+class HwmonReader(SensorReader):
+    """
+    直接读取 hwmon 的 temp*_input（单位：毫摄氏度）。
+
+    发现一次传感器后保持文件描述符打开，每次采样只做 pread，
+    不需要 LibreHardwareMonitor / COM。root 可以指向一棵假的 sysfs 目录树。
+    """
+
+    name = "hwmon"
+
+    RESCAN_INTERVAL = 300.0
+
+    def __init__(self, root=HWMON_ROOT):
+        self.root = root
+        self.sensors = []
+        self.inputs = frozenset()
+        self.last_scan = 0.0
+        self.needs_rescan = True
+        self.last_values = {}
+        if not os.path.isdir(root):
+            raise RuntimeError(f"未找到 hwmon 目录：{root}")
+
+    def describe(self) -> str:
+        return f"Linux hwmon（{self.root}）"
+
+    def list_inputs(self):
+        """返回 [(hwmon 目录, [temp*_input 文件名...]), ...]"""
+        result = []
+        try:
+            entries = sorted(os.listdir(self.root), key=_natural_key)
+        except OSError:
+            return result
+        for entry in entries:
+            path = os.path.join(self.root, entry)
+            try:
+                names = os.listdir(path)
+            except OSError:
+                continue
+            inputs = sorted((n for n in names if _TEMP_INPUT_RE.match(n)), key=_natural_key)
+            if inputs:
+                result.append((path, inputs))
+        return result
+
+    def discover(self):
+        """枚举传感器并打开文件描述符"""
+        self.close_fds()
+
+        layout = self.list_inputs()
+        sensors = []
+        driver_counts = {}
+        cpu_sockets = 0
+        for path, inputs in layout:
+            driver = _read_text(os.path.join(path, "name")) or os.path.basename(path)
+            instance = driver_counts.get(driver, 0)
+            driver_counts[driver] = instance + 1
+
+            labels = {}
+            for input_name in inputs:
+                n = _TEMP_INPUT_RE.match(input_name).group(1)
+                labels[input_name] = _read_text(os.path.join(path, f"temp{n}_label")) or f"temp{n}"
+
+            is_cpu = driver in CPU_HWMON_DRIVERS
+            socket = None
+            if is_cpu:
+                # coretemp 每个插槽一个设备，"Package id N" 给出插槽号
+                socket = cpu_sockets
+                for label in labels.values():
+                    m = _PACKAGE_ID_RE.match(label)
+                    if m:
+                        socket = int(m.group(1))
+                        break
+                cpu_sockets += 1
+
+            for input_name in inputs:
+                label = labels[input_name]
+                if is_cpu:
+                    if label.startswith("Package id") or label in ("Tctl", "Tdie"):
+                        kind = "package"
+                    elif label.startswith("Core") or label.startswith("Tccd"):
+                        kind = "core"
+                    else:
+                        kind = "other"
+                elif driver == "nvme":
+                    kind = "nvme"
+                else:
+                    kind = "other"
+                sensors.append(
+                    HwmonSensor(
+                        f"{driver}{instance}/{label}",
+                        os.path.join(path, input_name),
+                        kind,
+                        socket if kind in ("core", "package") else None,
+                    )
+                )
+
+        for sensor in sensors:
+            try:
+                sensor.fd = os.open(sensor.path, os.O_RDONLY)
+            except OSError:
+                sensor.fd = None
+
+        self.sensors = [s for s in sensors if s.fd is not None]
+        self.inputs = _input_paths(layout)
+        self.last_scan = time.monotonic()
+        self.needs_rescan = False
+
+    def read_all(self):
+        """读取所有已发现的传感器，返回 [(sensor, 温度), ...]"""
+        if self.needs_rescan:
+            self.discover()
+        elif time.monotonic() - self.last_scan > self.RESCAN_INTERVAL:
+            self.last_scan = time.monotonic()
+            if _input_paths(self.list_inputs()) != self.inputs:
+                self.discover()
+
+        result = []
+        for sensor in self.sensors:
+            try:
+                raw = os.pread(sensor.fd, 32, 0)
+            except OSError as e:
+                if e.errno in (errno.ENODEV, errno.ENOENT, errno.EBADF):
+                    self.needs_rescan = True  # 设备被移除，下次重新发现
+                continue  # 其它错误（NVMe 休眠时的 EAGAIN 等）只跳过本次
+            try:
+                result.append((sensor, int(raw) / 1000.0))
+            except ValueError:
+                continue
+        return result
+
+    def read_cpu_temps(self) -> CpuTemps:
+        cores = {}
+        packages = {}
+        values = {}
+        for sensor, value in self.read_all():
+            values[sensor.key] = value
+            if sensor.kind == "core":
+                if sensor.socket not in cores or value > cores[sensor.socket]:
+                    cores[sensor.socket] = value
+            elif sensor.kind == "package":
+                packages[sensor.socket] = value
+        self.last_values = values
+        return summarize_cpu_temps(cores, packages)
+
+    def read_sensors(self) -> dict:
+        return dict(self.last_values)
+
+    def close_fds(self):
+        for sensor in self.sensors:
+            if sensor.fd is not None:
+                try:
+                    os.close(sensor.fd)
+                except OSError:
+                    pass
+                sensor.fd = None
+        self.sensors = []
+
+    def close(self):
+        self.close_fds()
+
+
+# ---------- 限时读取 ----------
+
+# 单次读取的时限（秒）：LHM 的 WMI 查询正常在几十毫秒，hwmon 在微秒级
+READ_TIMEOUT = 2.0
+# 连续超时这么多次后放弃卡住的后端，在后台重新创建
+REBUILD_AFTER_TIMEOUTS = 3
+# 两次重建之间至少隔这么久（秒），卡住的旧线程不会越积越多
+REBUILD_RETRY_INTERVAL = 10.0
+
+
+class ReadTimeout(RuntimeError):
+    """读取没有在时限内完成（或后端正在重建）"""
+
+
+class _ReadJob:
+    __slots__ = ("kind", "arg", "done", "result", "error", "cancelled")
+
+    def __init__(self, kind, arg=None):
+        self.kind = kind
+        self.arg = arg
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.cancelled = False
+
+
+class _ReaderThread:
+    """
+    一个专用线程：在线程里创建后端，依次执行读取请求。
+    调用方等不及而放弃的请求（cancelled）不再执行；
+    被放弃（abandon）的线程在手头的调用返回后关闭自己的后端并退出。
+    """
+
+    def __init__(self, factory, watched, started):
+        self.jobs = queue.SimpleQueue()
+        self.ready = threading.Event()
+        self.started = started    # 开始创建后端的时间（重建耗时从这里算）
+        self.reader = None
+        self.error = None         # 创建后端失败时的异常
+        self.abandoned = False
+        self.thread = threading.Thread(
+            target=self._run, args=(factory, watched), name="sensor-reader", daemon=True
+        )
+        self.thread.start()
+
+    def submit(self, kind, arg=None) -> _ReadJob:
+        job = _ReadJob(kind, arg)
+        self.jobs.put(job)
+        return job
+
+    def abandon(self):
+        self.abandoned = True
+        self.jobs.put(None)
+
+    def _run(self, factory, watched):
+        try:
+            reader = factory()
+            reader.watch(watched)
+        except Exception as e:
+            self.error = e
+            self.ready.set()
+            return
+        self.reader = reader
+        self.ready.set()
+        try:
+            while not self.abandoned:
+                job = self.jobs.get()
+                if job is None:
+                    continue
+                if job.cancelled:
+                    continue
+                try:
+                    if job.kind == "read":
+                        job.result = (reader.read_cpu_temps(), reader.read_sensors())
+                    elif job.kind == "watch":
+                        reader.watch(job.arg)
+                except Exception as e:
+                    job.error = e
+                job.done.set()
+        finally:
+            reader.close()
+
+
+class BoundedReader(SensorReader):
+    """
+    限时读取：后端在专用线程里创建和使用，read_cpu_temps() 最多等 timeout 秒，
+    超时抛 ReadTimeout，调用方按读取失败处理，不会因为一次卡住的 WMI 调用停住控制循环。
+
+    卡住的调用无法从外部打断，本次请求作废，排在它后面的过期请求也不再执行。
+    连续 rebuild_after 次超时后（两次重建至少相隔 REBUILD_RETRY_INTERVAL 秒）放弃这个线程，另起一个线程重新创建后端
+    （factory() 在新线程里调用，LHM 会由 LhmSupervisor 重连 / 重启）；
+    旧线程等卡住的调用返回后关闭旧后端并退出。
+
+    第一次创建也最多等 timeout 秒：没等到就按“正在重建”开始，read_cpu_temps() 抛 ReadTimeout，
+    由调用方的退路（SensorFallback）接管，后端创建完成后自动转为正常读取。
+
+    timeouts / rebuilds 为累计次数，最近一次重建从放弃旧线程到新后端可用的耗时记在 last_rebuild_s。
+    """
+
+    def __init__(
+        self,
+        factory,
+        timeout=READ_TIMEOUT,
+        rebuild_after=REBUILD_AFTER_TIMEOUTS,
+        log=None,
+        clock=time.monotonic,
+    ):
+        """factory()：在读取线程里创建后端；第一次创建在 timeout 秒内失败时在这里抛出"""
+        if timeout <= 0:
+            raise ValueError("读取时限必须为正数")
+        self.factory = factory
+        self.timeout = timeout
+        self.rebuild_after = max(1, int(rebuild_after))
+        self.log = log
+        self.clock = clock
+        self.watched = frozenset()
+        self.last_values = {}
+        self.streak = 0            # 连续超时次数
+        self.timeouts = 0
+        self.rebuilds = 0
+        self.last_rebuild_s = None
+        self.next_rebuild = 0.0
+        self.rebuilding = False
+
+        self.name = "pending"
+        self._describe = "温度读取后端（创建中）"
+        self.worker = _ReaderThread(factory, self.watched, clock())
+        if not self.worker.ready.wait(timeout):
+            self.rebuilding = True
+            self.next_rebuild = clock() + REBUILD_RETRY_INTERVAL
+            self.logmsg(f"温度读取后端 {timeout:g} 秒内未创建完成，后台继续等待")
+            return
+        if self.worker.error is not None:
+            raise self.worker.error
+        self.adopt(self.worker.reader)
+
+    def adopt(self, reader):
+        self.name = reader.name
+        self._describe = reader.describe()
+
+    def logmsg(self, msg: str):
+        if self.log is not None:
+            self.log(msg)
+
+    def describe(self) -> str:
+        return f"{self._describe}，读取时限 {self.timeout:g} 秒"
+
+    def watch(self, names):
+        names = frozenset(names)
+        if names != self.watched:
+            self.watched = names
+            self.worker.submit("watch", names)
+
+    def rebuild(self, now):
+        self.worker.abandon()
+        self.rebuilds += 1
+        self.streak = 0
+        self.next_rebuild = now + REBUILD_RETRY_INTERVAL
+        self.logmsg(f"温度读取后端无响应，后台重新创建（第 {self.rebuilds} 次）")
+        started = self.worker.started if self.rebuilding else now
+        self.rebuilding = True
+        self.worker = _ReaderThread(self.factory, self.watched, started)
+
+    def read_cpu_temps(self) -> CpuTemps:
+        worker = self.worker
+        if not worker.ready.wait(self.timeout):
+            raise ReadTimeout("温度读取后端正在重建")
+        if worker.error is not None:
+            now = self.clock()
+            if now >= self.next_rebuild:
+                self.rebuild(now)
+            raise ReadTimeout(f"温度读取后端创建失败：{worker.error}")
+        if self.rebuilding:
+            self.rebuilding = False
+            self.last_rebuild_s = self.clock() - worker.started
+            self.adopt(worker.reader)
+            self.logmsg(f"温度读取后端已可用（{self._describe}），用时 {self.last_rebuild_s:.1f} 秒")
+
+        job = worker.submit("read")
+        if not job.done.wait(self.timeout):
+            job.cancelled = True
+            self.timeouts += 1
+            self.streak += 1
+            now = self.clock()
+            if self.streak >= self.rebuild_after and now >= self.next_rebuild:
+                self.rebuild(now)
+            raise ReadTimeout(f"读取温度超过 {self.timeout:g} 秒未返回")
+        self.streak = 0
+        if job.error is not None:
+            raise job.error
+        temps, self.last_values = job.result
+        return temps
+
+    def read_sensors(self) -> dict:
+        return dict(self.last_values)
+
+    def collect_metrics(self, metrics):
+        metrics.set_info("x11fan_sensor_backend_info", backend=self.name)
+        metrics.set_counter("x11fan_sensor_read_timeouts_total", self.timeouts)
+        metrics.set_counter("x11fan_sensor_reader_rebuilds_total", self.rebuilds)
+        if self.last_rebuild_s is not None:
+            metrics.set("x11fan_sensor_reader_rebuild_seconds", self.last_rebuild_s)
+
+    def close(self):
+        """不等卡住的读取：线程在调用返回后自行关闭后端"""
+        worker = self.worker
+        worker.abandon()
+        if worker.ready.is_set():
+            worker.thread.join(self.timeout)
+
+
+# ---------- CPU 占用率 ----------
+
+class CpuLoad:
+    """
+    整机 CPU 占用率（0..1），取两次 read() 之间的平均值，供前馈控制使用。
+    Linux 读 /proc/stat，Windows 用 GetSystemTimes，每次只是一次系统调用。
+    """
+
+    def __init__(self):
+        self.last = self._times()
+
+    @staticmethod
+    def _times():
+        """返回 (空闲时间, 总时间)，单位无所谓，只用差值"""
+        if os.name == "nt":
+            import ctypes
+
+            idle, kernel, user = (ctypes.c_ulonglong() for _ in range(3))
+            if not ctypes.windll.kernel32.GetSystemTimes(
+                ctypes.byref(idle), ctypes.byref(kernel), ctypes.byref(user)
+            ):
+                raise OSError("GetSystemTimes 失败")
+            # kernel 时间包含 idle
+            return idle.value, kernel.value + user.value
+
+        with open("/proc/stat", "rb") as f:
+            fields = [int(v) for v in f.readline().split()[1:]]
+        idle = fields[3] + (fields[4] if len(fields) > 4 else 0)  # idle + iowait
+        return idle, sum(fields)
+
+    def read(self):
+        idle, total = self._times()
+        last_idle, last_total = self.last
+        self.last = (idle, total)
+        if total <= last_total:
+            return None
+        return max(0.0, min(1.0, 1.0 - (idle - last_idle) / (total - last_total)))
+
+
+# ---------- 工厂 ----------
+
+READER_KINDS = ("auto", "lhm", "lhm-http", "hwmon")
+
+
+def resolve_reader_kind(kind="auto") -> str:
+    if kind not in READER_KINDS:
+        raise ValueError(f"未知的温度读取后端：{kind}")
+    if kind == "auto":
+        return "lhm" if os.name == "nt" else "hwmon"
+    return kind
+
+
+def open_sensor_reader(
+    kind="auto", hwmon_root=HWMON_ROOT, lhm_supervisor=None, lhm_url=LHM_HTTP_URL
+) -> SensorReader:
+    """在当前线程里创建温度读取后端"""
+    kind = resolve_reader_kind(kind)
+    if kind == "lhm":
+        return LibreHWReader(lhm_supervisor)
+    if kind == "lhm-http":
+        return LhmHttpReader(lhm_url)
+    return HwmonReader(hwmon_root)
@@ -0,0 +1,692 @@
+"""
+控制服务：常驻的控制循环（daemon.ControlLoop）和界面分成两个进程。
+
+服务进程（fanctl.py run --listen，需要访问 BMC 的权限）独占温度读取和 IPMI，
+在本机 TCP 端口（POSIX 上也可以是 Unix socket）上：
+
+- 每次采样后把遥测编码一次，原样发给所有已连接的客户端，多开查看端不增加任何传感器 / BMC 读取
+- 转发 INFO 以上的日志
+- 接收带令牌的客户端发来的命令（自动 / 手动占空比 / 交还 BMC / 换曲线），在控制线程的采样间隙执行
+
+客户端（GUI 的 --connect、fanctl.py watch）不需要管理员权限；令牌不对或没有令牌时只读。
+令牌由服务写到数据目录下的 service.token（仅本用户可读），同一用户的客户端自动读取。
+
+消息：帧头 <2sBI（魔数 b"XF"、消息类型、负载字节数），负载按类型用 struct 小端打包，
+温度为 float32（NaN 表示没有读数），占空比 255 表示未知。
+一帧遥测（2 个风扇区、2 个 CPU）69 字节。
+
+    service = ControlService(loop, "127.0.0.1:9843", token).start()
+    ...
+    with ServiceClient("127.0.0.1:9843", load_token()) as client:
+        client.set_duty(0, 40)
+        while (message := client.recv()) is not None:
+            kind, body = message
+"""
+
+import hmac
+import logging
+import math
+import os
+import queue
+import secrets
+import socket
+import struct
+import threading
+import time
+from collections import namedtuple
+
+import applog
+from daemon import CONTROL_AUTO, CONTROL_BMC, CONTROL_MANUAL
+from runtime import user_data_dir
+from sensors import SocketTemps
+
+
+SERVICE_ADDRESS = "127.0.0.1:9843"
+SERVICE_TOKEN_FILE = "service.token"
+PROTOCOL_VERSION = 1
+
+CONNECT_TIMEOUT = 3.0
+# 连上后必须在这么多秒内发 HELLO
+HELLO_TIMEOUT = 5.0
+MAX_CLIENTS = 16
+# 每个客户端待发送的帧数上限；满了说明对方不再读，断开它，不拖住控制线程
+CLIENT_QUEUE_FRAMES = 256
+MAX_PAYLOAD = 64 * 1024
+MAX_LOG_BYTES = 4096
+
+# ---------- 消息 ----------
+
+MAGIC = b"XF"
+
+MSG_HELLO = 1        # 客户端 → 服务：<B 协议版本> + 令牌
+MSG_WELCOME = 2      # 服务 → 客户端：<B 协议版本, ? 可以控制>
+MSG_STATE = 3        # 服务 → 客户端：控制方式、风扇区、手动占空比、曲线（连上时和每条命令之后）
+MSG_TELEMETRY = 4    # 服务 → 客户端：每次采样
+MSG_LOG = 5          # 服务 → 客户端：<d 时间, B 级别> + 文本
+MSG_RESULT = 6       # 服务 → 客户端：<B 命令类型, ? 成功> + 说明
+MSG_SET_MODE = 16    # 客户端 → 服务：<B 控制方式>（自动 / 交还 BMC）
+MSG_SET_DUTY = 17    # 客户端 → 服务：<B 风扇区（255 为全部）, B 占空比>，进入手动
+MSG_SET_CURVE = 18   # 客户端 → 服务：<B 点数> + 点数 × <f 温度, B 占空比>
+
+ALL_ZONES = 255
+UNKNOWN = 255
+
+MODE_CODES = {CONTROL_AUTO: 0, CONTROL_MANUAL: 1, CONTROL_BMC: 2}
+MODE_NAMES = {code: name for name, code in MODE_CODES.items()}
+MODE_LABELS = {CONTROL_AUTO: "自动", CONTROL_MANUAL: "手动", CONTROL_BMC: "BMC 自动风扇模式"}
+FALLBACK_CODES = {None: 0, "bmc": 1, "failsafe": 2}
+FALLBACK_NAMES = {code: name for name, code in FALLBACK_CODES.items()}
+
+_HEADER = struct.Struct("<2sBI")
+_VERSION = struct.Struct("<B")
+_WELCOME = struct.Struct("<B?")
+_STATE = struct.Struct("<B?BB")          # 控制方式, 曲线可改, 风扇区数, 手动占空比数
+_TELEMETRY = struct.Struct("<dfffBBBBIIII")
+_ZONE = struct.Struct("<BBB")            # 风扇区, 占空比, 目标
+_SOCKET = struct.Struct("<ff")           # 核心最高, 封装
+_PAIR = struct.Struct("<BB")
+_POINT = struct.Struct("<fB")
+_COUNT = struct.Struct("<B")
+_LOG = struct.Struct("<dB")
+_RESULT = struct.Struct("<B?")
+
+Welcome = namedtuple("Welcome", "version can_control")
+ServiceState = namedtuple("ServiceState", "mode zones manual curve curve_editable controller")
+Telemetry = namedtuple(
+    "Telemetry",
+    "time temp read_ms interval mode fallback samples writes suppressed write_errors zones sockets",
+)
+LogRecord = namedtuple("LogRecord", "time level text")
+Result = namedtuple("Result", "command ok text")
+
+
+class ProtocolError(ValueError):
+    pass
+
+
+def _f32(value):
+    return math.nan if value is None else value
+
+
+def _opt(value):
+    return None if math.isnan(value) else round(value, 2)
+
+
+def _byte(value):
+    return UNKNOWN if value is None else max(0, min(100, int(value)))
+
+
+def frame(kind, payload=b"") -> bytes:
+    return _HEADER.pack(MAGIC, kind, len(payload)) + payload
+
+
+def _recv_exact(sock, size):
+    buf = bytearray()
+    while len(buf) < size:
+        chunk = sock.recv(size - len(buf))
+        if not chunk:
+            if buf:
+                raise ProtocolError("连接在一帧中间断开")
+            return None
+        buf += chunk
+    return bytes(buf)
+
+
+def read_frame(sock):
+    """读一帧，返回 (消息类型, 负载)；对方正常关闭时返回 None"""
+    header = _recv_exact(sock, _HEADER.size)
+    if header is None:
+        return None
+    magic, kind, size = _HEADER.unpack(header)
+    if magic != MAGIC:
+        raise ProtocolError("不是 X11 Fan Master 控制服务的数据")
+    if size > MAX_PAYLOAD:
+        raise ProtocolError(f"消息过长：{size} 字节")
+    payload = _recv_exact(sock, size) if size else b""
+    if payload is None:
+        raise ProtocolError("连接在一帧中间断开")
+    return kind, payload
+
+
+def _pack_points(points):
+    points = list(points)
+    if len(points) > 255:
+        raise ValueError("曲线控制点太多")
+    return _COUNT.pack(len(points)) + b"".join(_POINT.pack(t, max(0, min(100, int(p)))) for t, p in points)
+
+
+def _unpack_points(payload, offset):
+    (count,) = _COUNT.unpack_from(payload, offset)
+    offset += _COUNT.size
+    points = [
+        (round(t, 2), p) for t, p in (_POINT.unpack_from(payload, offset + i * _POINT.size) for i in range(count))
+    ]
+    return points, offset + count * _POINT.size
+
+
+def encode_hello(token):
+    return frame(MSG_HELLO, _VERSION.pack(PROTOCOL_VERSION) + (token or "").encode("utf-8"))
+
+
+def encode_welcome(can_control):
+    return frame(MSG_WELCOME, _WELCOME.pack(PROTOCOL_VERSION, can_control))
+
+
+def encode_state(loop) -> bytes:
+    """在控制线程里调用（读 loop 的控制状态）"""
+    zones = list(loop.zones)
+    manual = sorted(loop.manual.items())
+    controller = getattr(loop.controller, "curve", None)
+    points = controller.points if controller is not None and loop.zone_map is None else ()
+    describe = "多风扇区映射" if loop.zone_map is not None else loop.controller.describe()
+    payload = (
+        _STATE.pack(MODE_CODES[loop.control], loop.zone_map is None, len(zones), len(manual))
+        + bytes(zones)
+        + b"".join(_PAIR.pack(z, d) for z, d in manual)
+        + _pack_points(points)
+        + describe.encode("utf-8")
+    )
+    return frame(MSG_STATE, payload)
+
+
+def encode_telemetry(loop, now) -> bytes:
+    """一次采样的遥测；在控制线程里调用"""
+    temps = loop.last_temps
+    sockets = temps.sockets if temps is not None else ()
+    target = loop.last_target
+    zones = b"".join(
+        _ZONE.pack(
+            zone,
+            _byte(loop.last_duty.get(zone)),
+            _byte(target.get(zone) if isinstance(target, dict) else target),
+        )
+        for zone in loop.zones
+    )
+    fallback = loop.fallback.state if loop.fallback is not None else None
+    payload = (
+        _TELEMETRY.pack(
+            now,
+            _f32(temps.max if temps is not None else None),
+            loop.last_read_s * 1000.0,
+            loop.sampler.interval,
+            MODE_CODES[loop.control],
+            FALLBACK_CODES.get(fallback, 0),
+            len(loop.zones),
+            len(sockets),
+            loop.samples,
+            loop.writes,
+            loop.suppressed,
+            loop.write_errors,
+        )
+        + zones
+        + b"".join(_SOCKET.pack(_f32(s.max_core), _f32(s.package)) for s in sockets)
+    )
+    return frame(MSG_TELEMETRY, payload)
+
+
+def encode_log(created, level, text):
+    # 超长的日志行截断（客户端按 "replace" 解码，截在多字节字符中间也无妨）
+    return frame(MSG_LOG, _LOG.pack(created, min(level, 255)) + text.encode("utf-8")[:MAX_LOG_BYTES])
+
+
+def encode_result(command, ok, text):
+    return frame(MSG_RESULT, _RESULT.pack(command, ok) + text.encode("utf-8"))
+
+
+def decode(kind, payload):
+    """服务 → 客户端的消息 → 对应的 namedtuple；不认识的类型返回 None"""
+    try:
+        if kind == MSG_TELEMETRY:
+            (now, temp, read_ms, interval, mode, fallback, n_zones, n_sockets,
+             samples, writes, suppressed, write_errors) = _TELEMETRY.unpack_from(payload)
+            offset = _TELEMETRY.size
+            zones = {}
+            for _ in range(n_zones):
+                zone, duty, target = _ZONE.unpack_from(payload, offset)
+                offset += _ZONE.size
+                zones[zone] = (None if duty == UNKNOWN else duty, None if target == UNKNOWN else target)
+            sockets = []
+            for i in range(n_sockets):
+                core, package = _SOCKET.unpack_from(payload, offset)
+                offset += _SOCKET.size
+                sockets.append(SocketTemps(i, _opt(core), _opt(package)))
+            return Telemetry(
+                now, _opt(temp), read_ms, interval, MODE_NAMES.get(mode), FALLBACK_NAMES.get(fallback),
+                samples, writes, suppressed, write_errors, zones, sockets,
+            )
+        if kind == MSG_LOG:
+            created, level = _LOG.unpack_from(payload)
+            return LogRecord(created, level, payload[_LOG.size:].decode("utf-8", "replace"))
+        if kind == MSG_STATE:
+            mode, editable, n_zones, n_manual = _STATE.unpack_from(payload)
+            offset = _STATE.size
+            zones = tuple(payload[offset:offset + n_zones])
+            offset += n_zones
+            manual = {}
+            for _ in range(n_manual):
+                zone, duty = _PAIR.unpack_from(payload, offset)
+                offset += _PAIR.size
+                manual[zone] = duty
+            points, offset = _unpack_points(payload, offset)
+            return ServiceState(
+                MODE_NAMES.get(mode), zones, manual, points, editable,
+                payload[offset:].decode("utf-8", "replace"),
+            )
+        if kind == MSG_RESULT:
+            command, ok = _RESULT.unpack_from(payload)
+            return Result(command, ok, payload[_RESULT.size:].decode("utf-8", "replace"))
+        if kind == MSG_WELCOME:
+            return Welcome(*_WELCOME.unpack_from(payload))
+    except struct.error as e:
+        raise ProtocolError(f"消息 {kind} 格式错误：{e}") from e
+    return None
+
+
+# ---------- 地址与令牌 ----------
+
+def parse_address(text):
+    """
+    "主机:端口" / "端口" → (AF_INET, (主机, 端口))，主机缺省为 127.0.0.1；
+    "unix:/路径" → (AF_UNIX, 路径)（仅 POSIX）
+    """
+    if text.startswith("unix:"):
+        if not hasattr(socket, "AF_UNIX"):
+            raise ValueError("当前系统不支持 Unix socket，请用 主机:端口")
+        return socket.AF_UNIX, text[len("unix:"):]
+    host, sep, port = text.rpartition(":")
+    try:
+        port = int(port)
+    except ValueError:
+        raise ValueError(f"控制服务地址格式应为 主机:端口 或 unix:/路径：{text}") from None
+    return socket.AF_INET, ((host if sep else "") or "127.0.0.1", port)
+
+
+def default_token_path():
+    return os.path.join(user_data_dir(), SERVICE_TOKEN_FILE)
+
+
+def load_token(path=None):
+    """读取控制令牌；没有或读不了时返回 None（只读连接）"""
+    try:
+        with open(path or default_token_path(), "r", encoding="ascii") as f:
+            return f.read().strip() or None
+    except (OSError, UnicodeDecodeError):
+        return None
+
+
+def create_token(path=None) -> str:
+    """生成新的控制令牌写到 path（仅本用户可读写），每次服务启动换一个"""
+    path = path or default_token_path()
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    token = secrets.token_hex(16)
+    tmp = path + ".tmp"
+    fd = os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    with os.fdopen(fd, "w", encoding="ascii") as f:
+        f.write(token)
+    os.replace(tmp, path)
+    return token
+
+
+# ---------- 服务端 ----------
+
+class _Client:
+    """一个已连接的客户端：发送走自己的线程和有界队列"""
+
+    def __init__(self, sock, name):
+        self.sock = sock
+        self.name = name
+        self.can_control = False
+        self.queue = queue.Queue(CLIENT_QUEUE_FRAMES)
+        self.closed = False
+
+    def send(self, data) -> bool:
+        """投递一帧；队列满（对方不读）时返回 False"""
+        if self.closed:
+            return True
+        try:
+            self.queue.put_nowait(data)
+        except queue.Full:
+            return False
+        return True
+
+    def writer(self):
+        try:
+            while True:
+                data = self.queue.get()
+                if data is None:
+                    break
+                self.sock.sendall(data)
+        except OSError:
+            pass
+        finally:
+            self.close()
+
+    def close(self):
+        if self.closed:
+            return
+        self.closed = True
+        try:
+            self.sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        self.sock.close()
+        try:
+            self.queue.put_nowait(None)
+        except queue.Full:
+            pass
+
+
+class _LogForwarder(logging.Handler):
+    """applog.log 上 INFO 以上的日志转发给所有客户端"""
+
+    def __init__(self, service):
+        super().__init__(logging.INFO)
+        self.service = service
+
+    def emit(self, record):
+        try:
+            text = record.getMessage()
+        except Exception:
+            self.handleError(record)
+            return
+        self.service.broadcast(encode_log(record.created, record.levelno, text))
+
+
+class ControlService:
+    """
+    在 loop 所在进程里提供控制服务：遥测广播 + 命令入口。
+
+    遥测在控制线程里每次采样编码一次，再投递到各客户端的发送队列，
+    控制线程不做任何网络 I/O；跟不上的客户端直接断开。
+    token 为 None 时所有客户端都可以控制。
+    """
+
+    def __init__(self, loop, address=SERVICE_ADDRESS, token=None, log=None, max_clients=MAX_CLIENTS):
+        self.loop = loop
+        self.token = token
+        self.log = log
+        self.max_clients = max_clients
+        self.family, self.bind_address = parse_address(address)
+        if self.family != socket.AF_INET and os.path.exists(self.bind_address):
+            # 上次异常退出留下的 socket 文件
+            os.unlink(self.bind_address)
+        self.sock = socket.socket(self.family, socket.SOCK_STREAM)
+        try:
+            if self.family == socket.AF_INET and os.name != "nt":
+                self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+            self.sock.bind(self.bind_address)
+            self.sock.listen(max_clients)
+        except OSError:
+            self.sock.close()
+            raise
+        self.clients = set()
+        self.lock = threading.Lock()
+        self.last_telemetry = None
+        self.dropped = 0
+        self.thread = None
+        self.log_handler = _LogForwarder(self)
+
+    @property
+    def address(self) -> str:
+        if self.family == socket.AF_INET:
+            host, port = self.sock.getsockname()[:2]
+            return f"{host}:{port}"
+        return "unix:" + self.bind_address
+
+    def logmsg(self, msg, level=logging.INFO):
+        if self.log is not None:
+            self.log(msg, level)
+
+    def start(self):
+        self.loop.add_listener(self.publish)
+        applog.log.addHandler(self.log_handler)
+        self.thread = threading.Thread(target=self._accept, name="service-accept", daemon=True)
+        self.thread.start()
+        return self
+
+    def close(self):
+        applog.log.removeHandler(self.log_handler)
+        try:
+            self.sock.close()
+        finally:
+            with self.lock:
+                clients = list(self.clients)
+                self.clients.clear()
+            for client in clients:
+                client.close()
+            if self.thread is not None:
+                self.thread.join(1.0)
+                self.thread = None
+            if self.family != socket.AF_INET:
+                try:
+                    os.unlink(self.bind_address)
+                except OSError:
+                    pass
+
+    # ----- 广播 -----
+
+    def publish(self, loop):
+        """ControlLoop 的采样回调：编码一次，发给所有客户端"""
+        data = encode_telemetry(loop, time.time())
+        self.last_telemetry = data
+        self.broadcast(data)
+
+    def broadcast(self, data):
+        with self.lock:
+            clients = list(self.clients)
+        slow = [client for client in clients if not client.send(data)]
+        for client in slow:
+            self.drop(client, "跟不上，已断开")
+
+    def drop(self, client, reason):
+        with self.lock:
+            if client not in self.clients:
+                return
+            self.clients.discard(client)
+            self.dropped += 1
+        client.close()
+        self.logmsg(f"控制服务：客户端 {client.name} {reason}", logging.WARNING)
+
+    # ----- 连接 -----
+
+    def _accept(self):
+        while True:
+            try:
+                conn, peer = self.sock.accept()
+            except OSError:
+                return
+            with self.lock:
+                full = len(self.clients) >= self.max_clients
+            if full:
+                conn.close()
+                continue
+            name = f"{peer[0]}:{peer[1]}" if isinstance(peer, tuple) else "local"
+            threading.Thread(
+                target=self._serve, args=(conn, name), name=f"service-{name}", daemon=True
+            ).start()
+
+    def _handshake(self, conn):
+        """读 HELLO，返回客户端是否可以控制"""
+        conn.settimeout(HELLO_TIMEOUT)
+        message = read_frame(conn)
+        if message is None:
+            return None
+        kind, payload = message
+        if kind != MSG_HELLO or len(payload) < _VERSION.size:
+            raise ProtocolError("第一条消息必须是 HELLO")
+        (version,) = _VERSION.unpack_from(payload)
+        if version != PROTOCOL_VERSION:
+            raise ProtocolError(f"协议版本不符：客户端 {version}，服务 {PROTOCOL_VERSION}")
+        conn.settimeout(None)
+        if self.token is None:
+            return True
+        return hmac.compare_digest(payload[_VERSION.size:], self.token.encode("ascii"))
+
+    def _serve(self, conn, name):
+        if self.family == socket.AF_INET:
+            conn.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        try:
+            can_control = self._handshake(conn)
+        except (OSError, ProtocolError) as e:
+            self.logmsg(f"控制服务：拒绝 {name}：{e}", logging.WARNING)
+            conn.close()
+            return
+        if can_control is None:
+            conn.close()
+            return
+
+        client = _Client(conn, name)
+        client.can_control = can_control
+        client.send(encode_welcome(can_control))
+        if self.last_telemetry is not None:
+            client.send(self.last_telemetry)
+        with self.lock:
+            self.clients.add(client)
+        threading.Thread(target=client.writer, name=f"service-{name}-tx", daemon=True).start()
+
+        def send_state(loop):
+            # 控制状态在控制线程里编码，与命令不会交错
+            client.send(encode_state(loop))
+
+        self.loop.submit(send_state)
+        self.logmsg(f"控制服务：{name} 已连接（{'可控制' if can_control else '只读'}）")
+
+        try:
+            while True:
+                message = read_frame(conn)
+                if message is None:
+                    break
+                self.handle(client, *message)
+        except (OSError, ProtocolError):
+            pass
+        finally:
+            with self.lock:
+                known = client in self.clients
+                self.clients.discard(client)
+            client.close()
+            if known:
+                self.logmsg(f"控制服务：{name} 已断开")
+
+    def handle(self, client, kind, payload):
+        if not client.can_control:
+            client.send(encode_result(kind, False, "只读连接（没有控制令牌），不能修改"))
+            return
+        try:
+            command = parse_command(kind, payload)
+        except ProtocolError as e:
+            client.send(encode_result(kind, False, str(e)))
+            return
+
+        def done(ok, message):
+            client.send(encode_result(kind, ok, message))
+            self.broadcast(encode_state(self.loop))
+
+        self.loop.submit(command, done)
+
+
+def parse_command(kind, payload):
+    """客户端命令 → 在控制线程里执行的 fn(loop)"""
+    try:
+        if kind == MSG_SET_MODE:
+            (code,) = _COUNT.unpack_from(payload)
+            mode = MODE_NAMES.get(code)
+            if mode == CONTROL_AUTO:
+                return lambda loop: loop.set_auto()
+            if mode == CONTROL_BMC:
+                return lambda loop: loop.release_to_bmc()
+            raise ProtocolError("手动控制请直接设置占空比")
+        if kind == MSG_SET_DUTY:
+            zone, duty = _PAIR.unpack_from(payload)
+            if zone == ALL_ZONES:
+                return lambda loop: "，".join(loop.set_manual(z, duty) for z in loop.zones)
+            return lambda loop: loop.set_manual(zone, duty)
+        if kind == MSG_SET_CURVE:
+            points, _ = _unpack_points(payload, 0)
+            return lambda loop: loop.set_curve(points)
+    except struct.error as e:
+        raise ProtocolError(f"命令 {kind} 格式错误：{e}") from e
+    raise ProtocolError(f"未知的命令：{kind}")
+
+
+# ---------- 客户端 ----------
+
+class ServiceClient:
+    """
+    连接控制服务的客户端（阻塞式）：一个线程里 recv() 收遥测 / 日志 / 状态，
+    其它线程可以同时调用 set_auto() 等发命令；close() 会打断正在等待的 recv()。
+    """
+
+    def __init__(self, address=SERVICE_ADDRESS, token=None, timeout=CONNECT_TIMEOUT):
+        self.address = address
+        self.token = token
+        self.timeout = timeout
+        self.sock = None
+        self.can_control = False
+        self.send_lock = threading.Lock()
+
+    def connect(self):
+        family, address = parse_address(self.address)
+        sock = socket.socket(family, socket.SOCK_STREAM)
+        sock.settimeout(self.timeout)
+        try:
+            sock.connect(address)
+            if family == socket.AF_INET:
+                sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            sock.sendall(encode_hello(self.token))
+            message = read_frame(sock)
+            if message is None or message[0] != MSG_WELCOME:
+                raise ProtocolError("控制服务没有应答")
+            welcome = decode(*message)
+        except (OSError, ProtocolError) as e:
+            sock.close()
+            raise RuntimeError(f"无法连接控制服务 {self.address}：{e}") from e
+        sock.settimeout(None)
+        self.sock = sock
+        self.can_control = welcome.can_control
+        return welcome
+
+    def recv(self):
+        """下一条消息 (消息类型, namedtuple)；连接关闭时返回 None"""
+        while True:
+            try:
+                message = read_frame(self.sock)
+                if message is None:
+                    return None
+                body = decode(*message)
+            except (OSError, ProtocolError):
+                return None
+            if body is not None:
+                return message[0], body
+
+    def send(self, kind, payload):
+        with self.send_lock:
+            self.sock.sendall(frame(kind, payload))
+
+    def set_auto(self):
+        self.send(MSG_SET_MODE, _COUNT.pack(MODE_CODES[CONTROL_AUTO]))
+
+    def release_to_bmc(self):
+        self.send(MSG_SET_MODE, _COUNT.pack(MODE_CODES[CONTROL_BMC]))
+
+    def set_duty(self, zone, duty):
+        """zone 为 None 时设置所有风扇区"""
+        self.send(MSG_SET_DUTY, _PAIR.pack(ALL_ZONES if zone is None else zone, max(0, min(100, int(duty)))))
+
+    def set_curve(self, points):
+        self.send(MSG_SET_CURVE, _pack_points(points))
+
+    def close(self):
+        if self.sock is None:
+            return
+        try:
+            self.sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        self.sock.close()
+
+    def __enter__(self):
+        self.connect()
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
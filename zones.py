@@ -0,0 +1,210 @@
+"""
+多风扇区映射：每个风扇区有自己的曲线和温度来源。
+
+例如 CPU 区跟随 CPU 最大温度，外围区（zone 1）跟随 PCH / NVMe / 进风口温度：
+
+    [
+      {"zone": 0, "sensors": ["cpu"], "curve": [[50, 20], [80, 100]]},
+      {"zone": 1, "sensors": ["PCH Temp", "nvme0/Composite"], "aggregate": "max",
+       "curve": [[40, 25], [70, 100]]}
+    ]
+
+传感器名："cpu" 表示 CPU 最大温度；其余与 SensorReader.read_sensors() 的键
+（hwmon 的 "nvme0/Composite"、LHM 的 "硬件名/传感器名"）或 BMC 传感器名（"PCH Temp"）一致。
+
+每次采样调用方拼好一份 {名称: 温度}，ZoneMap.update() 一次算完所有风扇区，
+只返回占空比需要改变的区。
+"""
+
+import json
+
+from control import CurveController, DutyFilter
+from curve import FanCurve
+
+
+CPU_SENSOR = "cpu"
+AGGREGATES = ("max", "mean", "weighted")
+
+# 配置里每个风扇区允许的键
+ZONE_ENTRY_KEYS = ("zone", "sensors", "aggregate", "weights", "curve")
+
+
+class ZoneSpec:
+    """一个风扇区：温度来源（传感器 + 聚合方式）→ 控制策略 → 写入抑制"""
+
+    def __init__(
+        self,
+        zone: int,
+        controller,
+        sensors=(CPU_SENSOR,),
+        aggregate="max",
+        weights=None,
+        duty_filter=None,
+    ):
+        if not 0 <= zone <= 0xFF:
+            raise ValueError(f"风扇区编号超出范围：{zone}")
+        if not sensors:
+            raise ValueError(f"zone {zone} 没有指定温度传感器")
+        if aggregate not in AGGREGATES:
+            raise ValueError(f"未知的聚合方式：{aggregate}")
+        if aggregate == "weighted":
+            if weights is None or len(weights) != len(sensors):
+                raise ValueError(f"zone {zone} 的 weights 必须与 sensors 一一对应")
+            if any(w < 0 for w in weights) or not any(weights):
+                raise ValueError(f"zone {zone} 的 weights 不能为负且不能全为 0")
+        self.zone = zone
+        self.controller = controller
+        self.sensors = tuple(sensors)
+        self.aggregate = aggregate
+        self.weights = tuple(float(w) for w in weights) if weights is not None else None
+        self.duty_filter = duty_filter or DutyFilter()
+
+        self.temp = None     # 最近一次聚合出的温度
+        self.target = None   # 最近一次策略输出
+
+    def temperature(self, values):
+        """按聚合方式合成温度；缺失的传感器跳过（加权时其余权重重新归一），全缺时为 None"""
+        if self.aggregate == "weighted":
+            total = 0.0
+            weight_sum = 0.0
+            for name, weight in zip(self.sensors, self.weights):
+                value = values.get(name)
+                if value is not None and weight:
+                    total += weight * value
+                    weight_sum += weight
+            return total / weight_sum if weight_sum else None
+
+        present = [v for v in map(values.get, self.sensors) if v is not None]
+        if not present:
+            return None
+        if self.aggregate == "max":
+            return max(present)
+        return sum(present) / len(present)
+
+    def describe(self) -> str:
+        if self.aggregate == "weighted":
+            source = " + ".join(f"{w:g}×{n}" for n, w in zip(self.sensors, self.weights))
+        else:
+            source = f"{self.aggregate}({', '.join(self.sensors)})"
+        return f"zone{self.zone} ← {source}，{self.controller.describe()}"
+
+
+class ZoneMap:
+    """
+    所有风扇区的映射。update() 每次采样调用一次，返回本次需要写入的
+    [(zone, duty, temp), ...]；写入失败时调用 mark_failed()，下次采样无条件重写该区。
+    """
+
+    def __init__(self, specs):
+        specs = list(specs)
+        if not specs:
+            raise ValueError("风扇区映射为空")
+        zones = [s.zone for s in specs]
+        if len(set(zones)) != len(zones):
+            raise ValueError("风扇区映射中有重复的 zone")
+        self.specs = specs
+
+    @property
+    def zones(self):
+        return tuple(s.zone for s in self.specs)
+
+    def sensor_names(self):
+        """用到的全部传感器名（不含 "cpu"），供读取后端建立索引"""
+        names = set()
+        for spec in self.specs:
+            names.update(spec.sensors)
+        names.discard(CPU_SENSOR)
+        return frozenset(names)
+
+    def breakpoints(self):
+        temps = set()
+        for spec in self.specs:
+            temps.update(spec.controller.breakpoints())
+        return tuple(sorted(temps))
+
+    @property
+    def issued(self) -> int:
+        return sum(s.duty_filter.issued for s in self.specs)
+
+    @property
+    def suppressed(self) -> int:
+        return sum(s.duty_filter.suppressed for s in self.specs)
+
+    def update(self, values, now: float, load=None):
+        changes = []
+        for spec in self.specs:
+            temp = spec.temperature(values)
+            spec.temp = temp
+            if temp is None:
+                continue
+            controller = spec.controller
+            spec.target = controller.update(temp, now, load)
+            duty = spec.duty_filter.update(
+                temp if controller.follows_temp else None, spec.target, now
+            )
+            if duty is not None:
+                changes.append((spec.zone, duty, temp))
+        return changes
+
+    def mark_failed(self, zone: int):
+        for spec in self.specs:
+            if spec.zone == zone:
+                spec.duty_filter.reset()
+
+    def reset(self):
+        for spec in self.specs:
+            spec.controller.reset()
+            spec.duty_filter.reset()
+
+    def describe(self):
+        return [spec.describe() for spec in self.specs]
+
+
+def build_zone_map(entries, default_curve, filter_factory=DutyFilter) -> ZoneMap:
+    """
+    由配置（字典列表）建立 ZoneMap。没写 curve 的区用 default_curve；
+    filter_factory() 为每个区创建一个独立的 DutyFilter。格式错误抛 ValueError。
+    """
+    if not isinstance(entries, list):
+        raise ValueError("zone_map 必须是列表")
+    specs = []
+    for entry in entries:
+        if not isinstance(entry, dict) or "zone" not in entry:
+            raise ValueError("zone_map 的每一项都必须是带 zone 的对象")
+        unknown = sorted(set(entry) - set(ZONE_ENTRY_KEYS))
+        if unknown:
+            raise ValueError(f"zone_map 中有未知的键：{', '.join(unknown)}")
+        try:
+            zone = int(entry["zone"])
+            sensors = entry.get("sensors", [CPU_SENSOR])
+            if isinstance(sensors, str):
+                sensors = [sensors]
+            sensors = [str(name) for name in sensors]
+            weights = entry.get("weights")
+            if weights is not None:
+                weights = [float(w) for w in weights]
+            points = [(float(t), int(p)) for t, p in entry.get("curve", default_curve)]
+        except (TypeError, ValueError) as e:
+            raise ValueError(f"zone_map 格式错误：{e}") from e
+        specs.append(
+            ZoneSpec(
+                zone,
+                CurveController(FanCurve(points)),
+                sensors,
+                entry.get("aggregate", "max"),
+                weights,
+                filter_factory(),
+            )
+        )
+    return ZoneMap(specs)
+
+
+def load_zone_map(path, default_curve, filter_factory=DutyFilter) -> ZoneMap:
+    """从 JSON 文件读取：可以直接是列表，也可以是带 "zone_map" 键的 fanctl 配置文件"""
+    with open(path, "r", encoding="utf-8") as f:
+        doc = json.load(f)
+    if isinstance(doc, dict):
+        if "zone_map" not in doc:
+            raise ValueError(f"配置文件中没有 zone_map：{path}")
+        doc = doc["zone_map"]
+    return build_zone_map(doc, default_curve, filter_factory)